@@ -1,9 +1,10 @@
 import asyncio
 import sys
 import os
+from logging.config import fileConfig
 sys.path.append(os.getcwd())
-from sqlalchemy.ext.asyncio import create_async_engine
 from app.core.config import settings
+from app.core.db import create_engine
 from app.models.all_models import Base
 
 # This file is auto-generated by alembic init, but we need to modify it for async
@@ -11,6 +12,10 @@ from alembic import context
 
 config = context.config
 
+# Migration progress is logged per alembic.ini
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
 # Overwrite sqlalchemy.url with our settings
 config.set_main_option("sqlalchemy.url", settings.DATABASE_URL)
 
@@ -29,15 +34,17 @@ def run_migrations_offline() -> None:
         context.run_migrations()
 
 def do_run_migrations(connection):
-    context.configure(connection=connection, target_metadata=target_metadata)
+    # SQLite cannot ALTER most columns in place; batch mode rebuilds the table
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        render_as_batch=connection.dialect.name == "sqlite",
+    )
     with context.begin_transaction():
         context.run_migrations()
 
 async def run_migrations_online() -> None:
-    connectable = create_async_engine(
-        settings.DATABASE_URL,
-        future=True,
-    )
+    connectable = create_engine(settings.DATABASE_URL)
 
     async with connectable.connect() as connection:
         await connection.run_sync(do_run_migrations)
@@ -0,0 +1,189 @@
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Literal, Optional, Tuple
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.v1.deps import get_current_admin
+from app.core.db import get_db
+from app.models.all_models import Persona, UsageRollup, User
+from app.schemas.all_schemas import PersonaUsage, UpstreamUsage, UsageBucket
+from app.services.scheduler import get_pipeline_scheduler
+from app.services.usage_rollup import DAY
+
+router = APIRouter()
+
+DEFAULT_RANGE_DAYS = 30
+
+def _date_range(start: Optional[date], end: Optional[date]) -> Tuple[datetime, datetime]:
+    """[start, end] in UTC days (end inclusive) as bucket bounds; defaults to the last 30 days."""
+    end = end or datetime.utcnow().date()
+    start = start or end - timedelta(days=DEFAULT_RANGE_DAYS - 1)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    return datetime.combine(start, time.min), datetime.combine(end + timedelta(days=1), time.min)
+
+def _rate(part: int, whole: int) -> float:
+    return round(part / whole, 4) if whole else 0.0
+
+@router.get("/analytics/usage", response_model=list[UsageBucket])
+async def get_usage(
+    granularity: Literal["hour", "day"] = DAY,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_admin)
+):
+    """
+    Active users, message counts, STT/LLM/TTS and pipeline failure rates and
+    average reply latency per bucket. Reads only the usage rollups.
+    """
+    since, until = _date_range(start, end)
+    stmt = (
+        select(
+            UsageRollup.bucket_start,
+            func.count(func.distinct(UsageRollup.user_id)).label("active_users"),
+            func.sum(UsageRollup.messages).label("messages"),
+            func.sum(UsageRollup.replies).label("replies"),
+            func.sum(UsageRollup.stt_failures).label("stt_failures"),
+            func.sum(UsageRollup.llm_failures).label("llm_failures"),
+            func.sum(UsageRollup.tts_failures).label("tts_failures"),
+            func.sum(UsageRollup.failures).label("failures"),
+            func.sum(UsageRollup.latency_ms_sum).label("latency_ms_sum"),
+            func.sum(UsageRollup.latency_count).label("latency_count"),
+        )
+        .where(
+            UsageRollup.granularity == granularity,
+            UsageRollup.bucket_start >= since,
+            UsageRollup.bucket_start < until,
+            UsageRollup.messages > 0,
+        )
+        .group_by(UsageRollup.bucket_start)
+        .order_by(UsageRollup.bucket_start)
+    )
+    rows = (await db.execute(stmt)).all()
+    return [
+        UsageBucket(
+            bucket_start=row.bucket_start,
+            active_users=row.active_users,
+            messages=row.messages,
+            replies=row.replies,
+            stt_failure_rate=_rate(row.stt_failures, row.messages),
+            llm_failure_rate=_rate(row.llm_failures, row.replies),
+            tts_failure_rate=_rate(row.tts_failures, row.replies),
+            failure_rate=_rate(row.failures, row.messages),
+            avg_reply_latency_ms=round(row.latency_ms_sum / row.latency_count, 1) if row.latency_count else None,
+        )
+        for row in rows
+    ]
+
+@router.get("/analytics/personas", response_model=list[PersonaUsage])
+async def get_persona_usage(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_admin)
+):
+    """Messages and distinct users per persona over the range, busiest first. Reads only the day rollups."""
+    since, until = _date_range(start, end)
+    messages = func.sum(UsageRollup.messages).label("messages")
+    stmt = (
+        select(
+            UsageRollup.persona_id,
+            Persona.name,
+            func.count(func.distinct(UsageRollup.user_id)).label("active_users"),
+            messages,
+            func.sum(UsageRollup.replies).label("replies"),
+        )
+        .join(Persona, Persona.id == UsageRollup.persona_id)
+        .where(
+            UsageRollup.granularity == DAY,
+            UsageRollup.bucket_start >= since,
+            UsageRollup.bucket_start < until,
+        )
+        .group_by(UsageRollup.persona_id, Persona.name)
+        .order_by(messages.desc(), UsageRollup.persona_id)
+        .limit(limit)
+    )
+    rows = (await db.execute(stmt)).all()
+    return [
+        PersonaUsage(
+            persona_id=row.persona_id,
+            persona_name=row.name,
+            active_users=row.active_users,
+            messages=row.messages,
+            replies=row.replies,
+        )
+        for row in rows
+    ]
+
+@router.get("/analytics/upstream", response_model=list[UpstreamUsage])
+async def get_upstream_usage(
+    by: Literal["user", "conversation"] = "user",
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_admin)
+):
+    """
+    LLM tokens, transcribed audio and synthesized characters per user, or
+    per conversation (user x persona), biggest token spenders first. Reads
+    only the day rollups.
+    """
+    since, until = _date_range(start, end)
+    tokens = func.sum(UsageRollup.llm_tokens_in) + func.sum(UsageRollup.llm_tokens_out)
+    keys = [UsageRollup.user_id, User.username]
+    order = [tokens.desc(), UsageRollup.user_id]
+    if by == "conversation":
+        keys += [UsageRollup.persona_id, Persona.name]
+        order.append(UsageRollup.persona_id)
+    stmt = (
+        select(
+            *keys,
+            func.sum(UsageRollup.messages).label("messages"),
+            func.sum(UsageRollup.llm_tokens_in).label("llm_tokens_in"),
+            func.sum(UsageRollup.llm_tokens_out).label("llm_tokens_out"),
+            func.sum(UsageRollup.stt_audio_ms).label("stt_audio_ms"),
+            func.sum(UsageRollup.tts_chars).label("tts_chars"),
+        )
+        .join(User, User.id == UsageRollup.user_id)
+    )
+    if by == "conversation":
+        stmt = stmt.join(Persona, Persona.id == UsageRollup.persona_id)
+    stmt = (
+        stmt.where(
+            UsageRollup.granularity == DAY,
+            UsageRollup.bucket_start >= since,
+            UsageRollup.bucket_start < until,
+        )
+        .group_by(*keys)
+        .order_by(*order)
+        .limit(limit)
+    )
+    rows = (await db.execute(stmt)).all()
+    return [
+        UpstreamUsage(
+            user_id=row.user_id,
+            username=row.username,
+            persona_id=row.persona_id if by == "conversation" else None,
+            persona_name=row.name if by == "conversation" else None,
+            messages=row.messages,
+            llm_tokens_in=row.llm_tokens_in,
+            llm_tokens_out=row.llm_tokens_out,
+            stt_seconds=round(row.stt_audio_ms / 1000, 1),
+            tts_chars=row.tts_chars,
+        )
+        for row in rows
+    ]
+
+@router.get("/pipeline/queues", response_model=Dict[str, Dict[str, int]])
+async def get_pipeline_queues(current_user: User = Depends(get_current_admin)):
+    """
+    Jobs waiting for an upstream slot in this process, per upstream and
+    user id: who is causing contention right now. Admin-only, since
+    /metrics exports queue depth per priority tier alone.
+    """
+    return get_pipeline_scheduler().user_queue_depths()
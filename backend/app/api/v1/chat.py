@@ -1,30 +1,128 @@
+import asyncio
 import os
+import time
 import uuid
 import shutil
 import logging
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, BackgroundTasks
+from datetime import datetime
+from functools import partial
+from typing import Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Header, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, update
+from app.core.config import settings
 from app.core.db import get_db
-from app.models.all_models import User, Persona, Conversation, Message
+from app.models.all_models import User, Conversation, Message
 from app.schemas.all_schemas import MessageResponse, ChatResponse
 from app.api.v1.deps import get_current_user
-from app.services.llm_service import get_llm_provider
-from app.services.stt_service import get_stt_provider
-from app.services.tts_service import get_tts_provider
+from app.core.logging import log_context
+from app.core.tracing import tracer, continue_trace, current_trace_id
+from app.services.llm_service import FALLBACK_RESPONSE, get_llm_provider
+from app.services.stt_service import STT_ERROR_TEXT, get_stt_provider
+from app.services.tts_service import concat_wavs, generate_silent_wav, get_tts_provider, split_sentences
+from app.services.scheduler import get_pipeline_scheduler, INTERACTIVE, BATCH
+from app.services.jobs import get_job_runner, JobRunnerClosed
+from app.services.context_builder import build_context, prompt_tokens, refresh_summary
+from app.services.memory_store import recall, remember
+from app.services.persona_cache import get_persona_cache
+from app.services.admission import ACCEPT, REJECT, TEXT_ONLY, get_admission_controller
+from app.services.waveform import waveform_for
+from app.services.usage_rollup import TurnOutcome, record_late_usage, record_turn
+from app.services.usage_meter import TurnUsage, metering
+from app.services.usage_budget import get_budget_guard
+from app.services.traffic_recorder import note as note_traffic, recording
+from app.services.archive import archived_page
+from app.services.export import ndjson_stream, zip_stream
+from app.services.phrase_pack import greeting_message, phrase_for, phrases_served
+from app.services.conversation_version import bump_versions, get_conversation_version, history_etag
+from app.services.idempotency import (
+    PENDING,
+    build_idempotency_key,
+    duplicate_sends,
+    get_idempotency_store,
+    hash_upload,
+)
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+class PipelineEvents:
+    """
+    Progress hooks for a pipeline run. The upload flow ignores them (the
+    client polls for messages); the realtime mode pushes them to its socket
+    and sets `streams_audio` so the reply is synthesized and delivered
+    sentence by sentence.
+    """
+    streams_audio = False
+
+    async def transcript(self, user_msg_id: int, text: str):
+        pass
+
+    async def reply(self, asst_msg_id: int, text: str, tone: str):
+        pass
+
+    async def audio(self, asst_msg_id: int, index: int, wav_bytes: bytes):
+        pass
+
+    async def done(self, asst_msg_id: int, audio_url: str):
+        pass
+
+    async def failed(self, user_msg_id: int, reason: str):
+        pass
+
 async def process_voice_message(
     conversation_id: int, 
     user_msg_id: int, 
     audio_path: str, 
-    db_session_factory
+    db_session_factory,
+    priority: str = INTERACTIVE,
+    traceparent: Optional[str] = None,
+    events: Optional[PipelineEvents] = None,
+    text_only: bool = False
 ):
     """
-    Background task to handle: STT -> LLM -> TTS
+    Background task to handle: STT -> LLM -> TTS (skipped when `text_only`)
+    Every log line emitted by the pipeline carries the user message id, its
+    spans join the trace started by the upload request (`traceparent`), and
+    every upstream call it makes is metered into one TurnUsage. With the
+    traffic recorder on, the run's shape is appended to its recording.
+    """
+    usage = TurnUsage()
+    with log_context(message_id=user_msg_id), continue_trace(traceparent), metering(usage), \
+            recording(usage, priority, text_only):
+        with tracer.start_span("pipeline.process_voice_message", attributes={
+            "conversation.id": conversation_id,
+            "message.id": user_msg_id,
+            "pipeline.priority": priority,
+        }):
+            await _run_voice_pipeline(
+                conversation_id, user_msg_id, audio_path, db_session_factory, priority, events or PipelineEvents(),
+                text_only, usage
+            )
+
+async def _run_voice_pipeline(
+    conversation_id: int,
+    user_msg_id: int,
+    audio_path: str,
+    db_session_factory,
+    priority: str,
+    events: PipelineEvents,
+    text_only: bool = False,
+    usage: Optional[TurnUsage] = None
+):
     """
+    Each upstream call waits for a slot from the pipeline scheduler.
+    The user message stays `pending` until the reply row exists, so a run
+    interrupted before that point is re-enqueued by the recovery scan.
+    However the run ends, it is added to the usage rollups, upstream usage
+    included; the messages keep theirs under analysis["usage"].
+    """
+    scheduler = get_pipeline_scheduler()
+    started = time.perf_counter()
+    asst_msg_id = None
+    rollup_key = None
+    outcome = TurnOutcome(usage=usage or TurnUsage())
     # Create a new session for the background task
     async with db_session_factory() as db:
         try:
@@ -32,95 +130,294 @@ async def process_voice_message(
             stmt = select(Conversation).where(Conversation.id == conversation_id)
             result = await db.execute(stmt)
             conversation = result.scalar_one()
+            # Read now: a rollback below expires the instance
+            rollup_key = (conversation.user_id, conversation.persona_id)
+            note_traffic(user_id=conversation.user_id)
             
-            # Load Persona details eagerly
-            stmt_p = select(Persona).where(Persona.id == conversation.persona_id)
-            res_p = await db.execute(stmt_p)
-            persona = res_p.scalar_one()
+            # Persona details, prompt prefix and voice come from the persona cache
+            persona = await get_persona_cache().get(db, conversation.persona_id)
+            if persona is None:
+                raise LookupError(f"Persona {conversation.persona_id} not found")
 
             # 2. STT
             stt = get_stt_provider()
-            transcription = await stt.transcribe(audio_path)
+            # The upload's waveform summary is computed while STT runs
+            user_waveform = asyncio.create_task(waveform_for(audio_path))
+            with tracer.start_span("pipeline.stt"):
+                transcription = await scheduler.run(
+                    "stt", conversation.user_id, stt.transcribe, audio_path, priority=priority, fallback=STT_ERROR_TEXT
+                )
             
             # Update user message with text
             stmt_m = select(Message).where(Message.id == user_msg_id)
             res_m = await db.execute(stmt_m)
             user_msg = res_m.scalar_one()
             user_msg.content_text = transcription
+            user_msg.waveform = await user_waveform
+            user_msg.analysis = {**(user_msg.analysis or {}), "usage": outcome.usage.user_analysis()}
+            outcome.stt_failed = transcription == STT_ERROR_TEXT
+            note_traffic(transcript_chars=len(transcription))
             await db.commit()
+            await events.transcript(user_msg_id, transcription)
 
             # 3. LLM
-            # Build Prompt
-            system_prompt = f"""
-            You are roleplaying as {persona.name}.
-            Your relationship to the user: {persona.relationship_type}.
-            The user calls you: {persona.persona_called_by}.
-            You call the user: {persona.user_called_by}.
-            
-            Analyze the user's input for emotion and intent.
-            Reply in JSON format:
-            {{
-                "tone": "emotion_label",
-                "content": "your_reply_text"
-            }}
-            Keep the reply conversational and concise.
-            """
-            
+            # Byte-identical per persona, so upstream prompt caching can reuse it
+            system_prompt = persona.prompt_prefix
+            context = None
             llm = get_llm_provider()
-            llm_result = await llm.generate_response(system_prompt, transcription)
-            
-            reply_text = llm_result.get("content", "I didn't catch that.")
-            reply_tone = llm_result.get("tone", "neutral")
+
+            # An unusable transcript is answered with the persona's voiced "say that again"
+            phrase = phrase_for(persona, "stt_fallback") if transcription == STT_ERROR_TEXT else None
+            if phrase is None:
+                context = await build_context(db, conversation, user_msg_id, system_prompt, transcription)
+                if settings.MEMORY_ENABLED:
+                    await _add_long_term_memory(context, db, conversation, transcription, priority)
+                prompt_tokens.observe(context.prompt_tokens)
+
+                with tracer.start_span("pipeline.llm", attributes={"llm.prompt_tokens": context.prompt_tokens}):
+                    llm_result = await scheduler.run(
+                        "llm",
+                        conversation.user_id,
+                        llm.generate_response,
+                        system_prompt,
+                        transcription,
+                        history=context.history,
+                        priority=priority,
+                        fallback=FALLBACK_RESPONSE
+                    )
+                outcome.llm_failed = llm_result == FALLBACK_RESPONSE
+                if outcome.llm_failed:
+                    phrase = phrase_for(persona, "llm_fallback")
+
+            if phrase is not None:
+                reply_text, reply_tone = phrase["text"], "gentle"
+            else:
+                reply_text = llm_result.get("content", "I didn't catch that.")
+                reply_tone = llm_result.get("tone", "neutral")
+            note_traffic(reply_chars=len(reply_text))
 
             # 4. Create Assistant Message (Pending Audio)
+            user_msg.status = "completed"
+            analysis = {"tone": reply_tone, "trace_id": current_trace_id()}
+            if phrase is not None:
+                analysis["phrase"] = "stt_fallback" if context is None else "llm_fallback"
             asst_msg = Message(
                 conversation_id=conversation_id,
                 role="assistant",
                 content_text=reply_text,
-                analysis={"tone": reply_tone},
+                analysis=analysis,
                 status="processing"
             )
             db.add(asst_msg)
             await db.commit()
             await db.refresh(asst_msg)
+            asst_msg_id = asst_msg.id
+            await events.reply(asst_msg_id, reply_text, reply_tone)
 
             # 5. TTS
-            tts = get_tts_provider()
-            output_filename = f"reply_{asst_msg.id}_{uuid.uuid4()}.wav"
-            output_path = os.path.join("static/audio", output_filename)
+            if phrase is not None:
+                # Already in the persona's voice; no TTS call on the error path
+                phrases_served.inc(phrase=analysis["phrase"])
+                asst_msg.audio_url = phrase["audio_url"]
+                asst_msg.waveform = phrase.get("waveform")
+                _complete_reply(asst_msg, outcome, started)
+                await db.commit()
+                if events.streams_audio:
+                    with open(phrase["audio_url"].lstrip("/"), "rb") as f:
+                        await events.audio(asst_msg_id, 0, f.read())
+                await events.done(asst_msg_id, asst_msg.audio_url)
+                return
+
+            if text_only:
+                # Shed under load: the reply is delivered as text without waiting on TTS
+                asst_msg.analysis = {**(asst_msg.analysis or {}), "tts_status": "skipped"}
+                _complete_reply(asst_msg, outcome, started)
+                await db.commit()
+                await events.done(asst_msg_id, None)
+            else:
+                tts = get_tts_provider()
+                output_filename = f"reply_{asst_msg.id}_{uuid.uuid4()}.wav"
+                output_path = os.path.join("static/audio", output_filename)
             
-            # Use voice_file_path if available (absolute path for IndexTTS), otherwise fallback
-            # Priority: 
-            # 1. persona.voice_file_path (Uploaded via our new API)
-            # 2. persona.voice_id (Legacy or directly set ID)
-            # 3. "default" (Fallback)
-            voice_ref = persona.voice_file_path if persona.voice_file_path else (persona.voice_id or "default")
+                # Resolved once per persona: voice_file_path, then voice_id, then "default"
+                voice_ref = persona.voice_ref
             
-            # If we are using IndexTTS (implied by non-mock URL in config), voice_ref MUST be a path or valid ID
-            # If it's "mock-voice-id-123" or "default", and we are trying to use real IndexTTS, it will fail.
-            # But here we just pass what we have.
+                # If we are using IndexTTS (implied by non-mock URL in config), voice_ref MUST be a path or valid ID
+                # If it's "mock-voice-id-123" or "default", and we are trying to use real IndexTTS, it will fail.
+                # But here we just pass what we have.
             
-            logger.info(f"Generating audio via {type(tts).__name__} | Voice Ref: {voice_ref} | Text: {reply_text[:20]}...")
+                logger.info(
+                    "Generating audio via %s | Voice Ref: %s | Text: %.20s...",
+                    type(tts).__name__, voice_ref, reply_text,
+                )
             
-            success = await tts.generate_audio(
-                text=reply_text, 
-                voice_id=voice_ref, 
-                output_path=output_path
-            )
+                with tracer.start_span("pipeline.tts", attributes={"tts.streamed": events.streams_audio}):
+                    if events.streams_audio:
+                        success = await _stream_tts(
+                            scheduler, conversation.user_id, tts, reply_text, voice_ref, output_path, priority,
+                            events, asst_msg_id
+                        )
+                    else:
+                        success = await scheduler.run(
+                            "tts",
+                            conversation.user_id,
+                            tts.generate_audio,
+                            text=reply_text, 
+                            voice_id=voice_ref, 
+                            output_path=output_path,
+                            priority=priority,
+                            fallback=False
+                        )
+                        if not success and not os.path.exists(output_path):
+                            # Gave up queueing: nothing was written, so leave the placeholder a failed call would
+                            generate_silent_wav(output_path)
             
-            asst_msg.audio_url = f"/static/audio/{output_filename}"
-            asst_msg.status = "completed"
-            if not success:
-                if asst_msg.analysis is None:
-                    asst_msg.analysis = {}
-                asst_msg.analysis["tts_status"] = "fallback"
+                asst_msg.audio_url = f"/static/audio/{output_filename}"
+                asst_msg.waveform = await waveform_for(output_path)
+                if not success:
+                    # Reassign rather than mutate so the JSON column is flagged dirty
+                    asst_msg.analysis = {**(asst_msg.analysis or {}), "tts_status": "fallback"}
+                    outcome.tts_failed = True
+                _complete_reply(asst_msg, outcome, started)
             
-            await db.commit()
+                await db.commit()
+                await events.done(asst_msg_id, asst_msg.audio_url)
+            
+            if context.needs_summary:
+                _schedule_summary_refresh(conversation, persona.name, db_session_factory, llm)
+            if settings.MEMORY_ENABLED:
+                _schedule_memory_index(conversation, [(user_msg_id, transcription), (asst_msg_id, reply_text)])
             
         except Exception as e:
-            logger.error(f"Background task failed: {e}")
-            # Update status to failed if possible
-            pass
+            logger.exception("Background task failed: %s", e)
+            await db.rollback()
+            await _mark_failed(db, conversation_id, user_msg_id, asst_msg_id, type(e).__name__)
+            outcome.failed = True
+            await events.failed(user_msg_id, type(e).__name__)
+        finally:
+            note_traffic(outcome=outcome)
+            if rollup_key is not None:
+                # Usage after this point (the summary refresh it scheduled) is queued on its own
+                outcome.usage.late_sink = partial(record_late_usage, *rollup_key)
+                await record_turn(db_session_factory, *rollup_key, outcome)
+
+def _complete_reply(asst_msg: Message, outcome: TurnOutcome, started: float):
+    """Marks the reply delivered and stores how long the turn took and what it used (kept for rollup backfills)."""
+    outcome.replied = True
+    outcome.latency_ms = int((time.perf_counter() - started) * 1000)
+    asst_msg.status = "completed"
+    asst_msg.analysis = {
+        **(asst_msg.analysis or {}),
+        "latency_ms": outcome.latency_ms,
+        "usage": outcome.usage.reply_analysis(),
+    }
+
+async def _stream_tts(scheduler, user_id: int, tts, text: str, voice_ref: str, output_path: str, priority: str,
+                      events: PipelineEvents, asst_msg_id: int) -> bool:
+    """
+    Synthesizes the reply one sentence at a time, handing each clip to
+    `events` as soon as it exists, then joins the clips into `output_path`
+    for the stored message. Each sentence takes its own TTS slot, so other
+    users' replies interleave instead of waiting for the whole text.
+    """
+    parts = []
+    success = True
+    for index, sentence in enumerate(split_sentences(text)):
+        part_path = f"{output_path}.part{index}.wav"
+        ok = await scheduler.run(
+            "tts", user_id, tts.generate_audio, text=sentence, voice_id=voice_ref, output_path=part_path,
+            priority=priority, fallback=False
+        )
+        if not ok:
+            # The provider left a silent placeholder; do not play it
+            success = False
+            if os.path.exists(part_path):
+                os.remove(part_path)
+            continue
+        parts.append(part_path)
+        with open(part_path, "rb") as f:
+            await events.audio(asst_msg_id, index, f.read())
+
+    if parts:
+        await asyncio.to_thread(concat_wavs, parts, output_path)
+    else:
+        generate_silent_wav(output_path)
+    for part in parts:
+        os.remove(part)
+    return success
+
+async def _add_long_term_memory(context, db: AsyncSession, conversation: Conversation, query_text: str, priority: str):
+    """Recalls older messages relevant to the new input; memory is best effort and never fails the reply."""
+    with tracer.start_span("pipeline.memory") as span:
+        try:
+            snippets = await get_pipeline_scheduler().run(
+                "llm",
+                conversation.user_id,
+                recall,
+                db,
+                conversation.id,
+                query_text,
+                context.oldest_turn_id,
+                priority=priority
+            )
+            span.set_attribute("memory.hits", context.add_memories(snippets))
+        except Exception as e:
+            logger.warning("Memory recall failed for conversation %s: %s", conversation.id, e)
+
+def _schedule_memory_index(conversation: Conversation, items):
+    """Embeds the finished turn into long-term memory as a batch-priority job."""
+    try:
+        get_job_runner().submit(
+            get_pipeline_scheduler().run,
+            "llm",
+            conversation.user_id,
+            remember,
+            conversation.id,
+            items,
+            priority=BATCH
+        )
+    except JobRunnerClosed:
+        pass
+
+def _schedule_summary_refresh(conversation: Conversation, persona_name: str, db_session_factory, llm):
+    """Folds old turns into the rolling summary as a batch-priority LLM job."""
+    try:
+        get_job_runner().submit(
+            get_pipeline_scheduler().run,
+            "llm",
+            conversation.user_id,
+            refresh_summary,
+            conversation.id,
+            db_session_factory,
+            llm,
+            persona_name,
+            priority=BATCH
+        )
+    except JobRunnerClosed:
+        pass
+
+async def _mark_failed(
+    db: AsyncSession, conversation_id: int, user_msg_id: int, asst_msg_id: Optional[int], reason: str
+):
+    """Moves whatever this run left unfinished to `failed`."""
+    try:
+        await db.execute(
+            update(Message)
+            # A re-enqueued message was claimed by the recovery scan as processing
+            .where(Message.id == user_msg_id, Message.status.in_(("pending", "processing")))
+            .values(status="failed")
+        )
+        if asst_msg_id is not None:
+            await db.execute(
+                update(Message)
+                .where(Message.id == asst_msg_id, Message.status == "processing")
+                .values(status="failed")
+            )
+        await bump_versions(db, [conversation_id])
+        await db.commit()
+        logger.info("Marked message %s failed (%s)", user_msg_id, reason)
+    except Exception:
+        logger.exception("Could not mark message %s failed", user_msg_id)
 
 @router.get("/conversations", response_model=list)
 async def get_conversations(db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
@@ -131,10 +428,26 @@ async def get_conversations(db: AsyncSession = Depends(get_db), current_user: Us
 @router.get("/conversations/{persona_id}/messages", response_model=list[MessageResponse])
 async def get_messages(
     persona_id: int, 
+    response: Response,
     db: AsyncSession = Depends(get_db), 
     current_user: User = Depends(get_current_user),
-    limit: int = 50
+    limit: int = 50,
+    before_id: Optional[int] = None,
+    if_none_match: Optional[str] = Header(None)
 ):
+    """
+    The newest `limit` messages (older than `before_id` when scrolling back),
+    oldest first. Once the hot table runs out the page continues into
+    archived history.
+    """
+    # Polling clients send back the ETag; unchanged history costs one version lookup
+    version = await get_conversation_version(db, current_user.id, persona_id)
+    if version is not None:
+        etag = history_etag(version, limit, before_id)
+        if if_none_match == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+        response.headers["ETag"] = etag
+
     # Find or create conversation
     result = await db.execute(
         select(Conversation).where(
@@ -147,24 +460,167 @@ async def get_messages(
     if not conversation:
         conversation = Conversation(user_id=current_user.id, persona_id=persona_id)
         db.add(conversation)
+        await db.flush()
+        # Open with the persona's pre-synthesized greeting when it has one
+        persona = await get_persona_cache().get(db, persona_id)
+        greeting = greeting_message(persona, conversation.id) if persona is not None else None
+        if greeting is not None:
+            db.add(greeting)
         await db.commit()
-        await db.refresh(conversation)
-        return []
+        if greeting is None:
+            return []
+        await db.refresh(greeting)
+        return [greeting]
         
-    stmt = select(Message).where(Message.conversation_id == conversation.id).order_by(Message.created_at.desc()).limit(limit)
-    res = await db.execute(stmt)
-    msgs = res.scalars().all()
-    return list(reversed(msgs)) # Return oldest first for chat view
+    stmt = select(Message).where(Message.conversation_id == conversation.id)
+    if before_id is not None:
+        stmt = stmt.where(Message.id < before_id)
+    res = await db.execute(stmt.order_by(Message.id.desc()).limit(limit))
+    msgs = list(reversed(res.scalars().all())) # Return oldest first for chat view
+    if len(msgs) < limit:
+        # Archived turns are all older than the hot ones
+        older_than = msgs[0].id if msgs else before_id
+        msgs = await archived_page(db, conversation.id, older_than, limit - len(msgs)) + msgs
+    return msgs
+
+@router.get("/conversations/{persona_id}/export")
+async def export_conversation(
+    persona_id: int,
+    format: Literal["ndjson", "zip"] = "ndjson",
+    after_id: int = 0,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    The whole conversation, streamed: NDJSON, or a zip with the audio.
+    To resume an interrupted download, pass the last message id received
+    as `after_id`.
+    """
+    from app.core.db import AsyncSessionLocal
+
+    result = await db.execute(
+        select(Conversation).where(
+            Conversation.user_id == current_user.id,
+            Conversation.persona_id == persona_id
+        )
+    )
+    conversation = result.scalar_one_or_none()
+    if not conversation:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+
+    # The stream outlives this request's session, so it reads through its own
+    filename = f"conversation_{conversation.id}" + (f"_after_{after_id}" if after_id else "")
+    if format == "ndjson":
+        body = ndjson_stream(AsyncSessionLocal, conversation.id, after_id)
+        media_type, filename = "application/x-ndjson", f"{filename}.ndjson"
+    else:
+        persona = await get_persona_cache().get(db, persona_id)
+        manifest = {
+            "conversation_id": conversation.id,
+            "persona": persona.name if persona else None,
+            "exported_at": datetime.utcnow().isoformat(),
+        }
+        body = zip_stream(AsyncSessionLocal, conversation.id, manifest, after_id)
+        media_type, filename = "application/zip", f"{filename}.zip"
+    return StreamingResponse(
+        body, media_type=media_type, headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
 
 @router.post("/conversations/{persona_id}/send", response_model=MessageResponse)
 async def send_voice_message(
     persona_id: int,
-    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
+    idempotency_key: Optional[str] = Header(None),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    # 1. Get Conversation
+    runner = get_job_runner()
+    if not runner.accepting:
+        raise HTTPException(
+            status_code=503, detail="Server is shutting down, please retry", headers={"Retry-After": "5"}
+        )
+
+    # The trace starts here and is handed to the background job via traceparent
+    with tracer.start_span("chat.send_voice_message", kind="server", attributes={"persona.id": persona_id}) as span:
+        # 1. Deduplicate client retries (Idempotency-Key header, else audio content hash)
+        audio_digest = await asyncio.to_thread(hash_upload, file.file)
+        idem_store = get_idempotency_store()
+        idem_key = build_idempotency_key(current_user.id, persona_id, idempotency_key, audio_digest)
+        claimed = await idem_store.claim(idem_key)
+        if claimed is not None:
+            return await _original_message(db, claimed, current_user.id)
+
+        # Shed load before any work is queued: reject, or answer without TTS
+        admission = get_admission_controller().decide(get_pipeline_scheduler(), runner)
+        span.set_attribute("admission.decision", admission.decision)
+        if admission.decision == REJECT:
+            await idem_store.release(idem_key)
+            raise HTTPException(
+                status_code=503,
+                detail="Too many voice messages in progress, please retry",
+                headers={"Retry-After": str(admission.retry_after)}
+            )
+        # Per-user daily budgets: text only when close to the limit, refused past it
+        budget = await get_budget_guard().check(db, current_user)
+        if budget.decision != ACCEPT:
+            span.set_attribute("budget.decision", budget.decision)
+        if budget.decision == REJECT:
+            await idem_store.release(idem_key)
+            raise HTTPException(
+                status_code=429,
+                detail="Daily usage limit reached, please try again tomorrow",
+                headers={"Retry-After": str(budget.retry_after)}
+            )
+        text_only = TEXT_ONLY in (admission.decision, budget.decision)
+
+        try:
+            user_msg, file_path = await _store_user_message(
+                db, current_user, persona_id, file, span, audio_digest, text_only
+            )
+        except BaseException:
+            await idem_store.release(idem_key)
+            raise
+        await idem_store.complete(idem_key, user_msg.id)
+    
+        # 4. Trigger Background Processing (tracked so shutdown can drain it)
+        from app.core.db import AsyncSessionLocal
+        runner.submit(
+            process_voice_message, 
+            user_msg.conversation_id, 
+            user_msg.id, 
+            file_path,
+            AsyncSessionLocal,
+            traceparent=span.traceparent,
+            text_only=text_only
+        )
+    
+        return user_msg
+
+async def _original_message(db: AsyncSession, claimed: str, user_id: int) -> Message:
+    """Answers a duplicate send with the message created by the first request."""
+    if claimed == PENDING:
+        raise HTTPException(status_code=409, detail="Duplicate request still in progress", headers={"Retry-After": "1"})
+    result = await db.execute(
+        select(Message)
+        .join(Conversation, Message.conversation_id == Conversation.id)
+        .where(Message.id == int(claimed), Conversation.user_id == user_id)
+    )
+    original = result.scalar_one_or_none()
+    if original is None:
+        raise HTTPException(status_code=409, detail="Duplicate of a message that no longer exists")
+    duplicate_sends.inc()
+    return original
+
+async def _store_user_message(
+    db: AsyncSession,
+    current_user: User,
+    persona_id: int,
+    file: UploadFile,
+    span,
+    audio_digest: str,
+    text_only: bool = False
+):
+    # 2. Get Conversation
     result = await db.execute(
         select(Conversation).where(
             Conversation.user_id == current_user.id, 
@@ -178,34 +634,28 @@ async def send_voice_message(
         await db.commit()
         await db.refresh(conversation)
 
-    # 2. Save User Audio
+    # 3. Save User Audio
     file_ext = file.filename.split(".")[-1]
     filename = f"msg_{conversation.id}_{uuid.uuid4()}.{file_ext}"
     file_path = os.path.join("static/audio", filename)
     os.makedirs(os.path.dirname(file_path), exist_ok=True)
-    
+
     with open(file_path, "wb") as buffer:
         shutil.copyfileobj(file.file, buffer)
-        
-    # 3. Create User Message Record
+    
+    # Create User Message Record
     user_msg = Message(
         conversation_id=conversation.id,
         role="user",
         audio_url=f"/static/audio/{filename}",
-        status="completed" # User audio is uploaded, so it's done
+        analysis={
+            "trace_id": span.trace_id,
+            "audio_sha256": audio_digest,
+            **({"admission": TEXT_ONLY} if text_only else {})
+        },
+        status="pending" # Completed once the pipeline has produced the reply
     )
     db.add(user_msg)
     await db.commit()
     await db.refresh(user_msg)
-    
-    # 4. Trigger Background Processing
-    from app.core.db import AsyncSessionLocal
-    background_tasks.add_task(
-        process_voice_message, 
-        conversation.id, 
-        user_msg.id, 
-        file_path,
-        AsyncSessionLocal
-    )
-    
-    return user_msg
+    return user_msg, file_path
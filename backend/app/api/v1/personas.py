@@ -4,8 +4,10 @@ from sqlalchemy import select
 from app.core.db import get_db
 from app.models.all_models import User, Persona
 from app.schemas.all_schemas import PersonaCreate, PersonaResponse
-from app.core.security import settings
+from app.core.config import settings
 from app.services.tts_service import get_tts_provider
+from app.services.persona_cache import get_persona_cache
+from app.services.phrase_pack import schedule_phrase_pack
 from typing import Annotated
 from app.api.v1.deps import get_current_user
 import shutil
@@ -14,13 +16,22 @@ import uuid
 
 router = APIRouter()
 
+async def _get_owned_persona(db: AsyncSession, persona_id: int, user_id: int) -> Persona:
+    """Ownership is checked against the persona cache; only owners' requests load the row to modify."""
+    if await get_persona_cache().get_owned(db, persona_id, user_id) is None:
+        raise HTTPException(status_code=404, detail="Persona not found")
+    result = await db.execute(select(Persona).where(Persona.id == persona_id))
+    persona = result.scalar_one_or_none()
+    if not persona:
+        raise HTTPException(status_code=404, detail="Persona not found")
+    return persona
+
 @router.get("/", response_model=list[PersonaResponse])
 async def get_personas(
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    result = await db.execute(select(Persona).where(Persona.creator_id == current_user.id))
-    return result.scalars().all()
+    return await get_persona_cache().list_for_user(db, current_user.id)
 
 @router.post("/", response_model=PersonaResponse)
 async def create_persona(
@@ -38,6 +49,7 @@ async def create_persona(
     db.add(new_persona)
     await db.commit()
     await db.refresh(new_persona)
+    await get_persona_cache().invalidate(None, current_user.id)
     return new_persona
 
 @router.post("/{persona_id}/voice", response_model=PersonaResponse)
@@ -47,11 +59,7 @@ async def upload_voice_sample(
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    # Verify ownership
-    result = await db.execute(select(Persona).where(Persona.id == persona_id, Persona.creator_id == current_user.id))
-    persona = result.scalar_one_or_none()
-    if not persona:
-        raise HTTPException(status_code=404, detail="Persona not found")
+    persona = await _get_owned_persona(db, persona_id, current_user.id)
 
     # Save file locally first (for UI playback if needed)
     os.makedirs("static/audio", exist_ok=True)
@@ -65,6 +73,7 @@ async def upload_voice_sample(
     persona.voice_sample_url = f"/static/audio/{filename}"
     persona.voice_model_status = "processing"
     await db.commit()
+    await get_persona_cache().invalidate(persona.id, persona.creator_id)
     
     try:
         # Upload to TTS Service
@@ -82,6 +91,9 @@ async def upload_voice_sample(
         
     await db.commit()
     await db.refresh(persona)
+    await get_persona_cache().invalidate(persona.id, persona.creator_id)
+    if persona.voice_model_status == "ready" and settings.PHRASE_PACK_ENABLED:
+        schedule_phrase_pack(persona.id)
     
     return persona
 
@@ -92,11 +104,7 @@ async def upload_avatar(
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    # Verify ownership
-    result = await db.execute(select(Persona).where(Persona.id == persona_id, Persona.creator_id == current_user.id))
-    persona = result.scalar_one_or_none()
-    if not persona:
-        raise HTTPException(status_code=404, detail="Persona not found")
+    persona = await _get_owned_persona(db, persona_id, current_user.id)
 
     # Save file
     os.makedirs("static/images", exist_ok=True)
@@ -113,5 +121,6 @@ async def upload_avatar(
     persona.avatar_url = f"/static/images/{filename}"
     await db.commit()
     await db.refresh(persona)
+    await get_persona_cache().invalidate(persona.id, persona.creator_id)
     
     return persona
@@ -0,0 +1,322 @@
+"""
+Realtime voice mode: one WebSocket per call, full duplex.
+
+    ws://.../api/v1/conversations/{persona_id}/realtime?token=<access token>
+
+Client -> server
+    binary frames   16-bit little-endian mono PCM at the negotiated rate
+    {"type": "start", "sample_rate": 16000}   optional, before any audio;
+                                              clamped to 8000-48000
+    {"type": "end_turn"}                      end the current utterance now
+
+Server -> client
+    {"type": "ready", "conversation_id", "sample_rate"}
+    {"type": "speech_start"} / {"type": "speech_end", "message_id"}
+    {"type": "transcript", "message_id", "text"}
+    {"type": "reply", "message_id", "text", "tone"}
+    {"type": "audio", "message_id", "index"}  followed by one binary WAV frame
+    {"type": "done", "message_id", "audio_url"}
+    {"type": "failed", "message_id", "reason"}
+    {"type": "busy", "retry_after"}           utterance dropped under load
+    {"type": "over_budget", "retry_after"}    daily budget spent; the socket
+                                              then closes with 4429
+    {"type": "error", "reason"}               control frame not understood
+
+Utterances are endpointed on the server (EnergyVAD) and run through the
+same pipeline as uploads, with the reply synthesized and pushed sentence by
+sentence. Turns are answered in order; speech during a reply is queued as
+the next turn rather than interrupting it. Each turn goes through the same
+admission and budget checks as an upload: shed with "busy", answered as
+text only, or, once the user's daily budget is spent, refused and the call
+ended.
+"""
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import uuid
+import wave
+from typing import Optional
+
+from fastapi import APIRouter, Query, WebSocket, WebSocketDisconnect
+from sqlalchemy import select
+
+from app.api.v1.chat import PipelineEvents, process_voice_message
+from app.api.v1.deps import get_user_from_token
+from app.core.logging import log_context
+from app.core.metrics import registry
+from app.core.tracing import tracer
+from app.models.all_models import Conversation, Message
+from app.services.admission import REJECT, TEXT_ONLY, get_admission_controller
+from app.services.jobs import JobRunnerClosed, get_job_runner
+from app.services.persona_cache import get_persona_cache
+from app.services.scheduler import get_pipeline_scheduler
+from app.services.usage_budget import get_budget_guard
+from app.services.vad import EnergyVAD
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+realtime_sessions = registry.gauge("realtime_sessions", "Open realtime voice sockets")
+realtime_utterances = registry.counter("realtime_utterances_total", "Utterances endpointed by the realtime VAD")
+
+# Application close codes (4000-4999)
+CLOSE_UNAUTHORIZED = 4401
+CLOSE_NOT_FOUND = 4404
+CLOSE_OVER_BUDGET = 4429
+
+MIN_SAMPLE_RATE = 8000
+MAX_SAMPLE_RATE = 48000
+
+
+class WebSocketEvents(PipelineEvents):
+    """Pushes pipeline progress to the caller's socket; sends after a hang-up are dropped."""
+    streams_audio = True
+
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        self.closed = False
+
+    async def _send(self, payload: dict, data: Optional[bytes] = None):
+        if self.closed:
+            return
+        try:
+            await self.websocket.send_text(json.dumps(payload))
+            if data is not None:
+                await self.websocket.send_bytes(data)
+        except Exception:
+            # The pipeline keeps going so the turn is still stored for the history view
+            self.closed = True
+
+    async def speech_start(self):
+        await self._send({"type": "speech_start"})
+
+    async def speech_end(self, user_msg_id: int):
+        await self._send({"type": "speech_end", "message_id": user_msg_id})
+
+    async def transcript(self, user_msg_id: int, text: str):
+        await self._send({"type": "transcript", "message_id": user_msg_id, "text": text})
+
+    async def reply(self, asst_msg_id: int, text: str, tone: str):
+        await self._send({"type": "reply", "message_id": asst_msg_id, "text": text, "tone": tone})
+
+    async def audio(self, asst_msg_id: int, index: int, wav_bytes: bytes):
+        await self._send({"type": "audio", "message_id": asst_msg_id, "index": index}, wav_bytes)
+
+    async def done(self, asst_msg_id: int, audio_url: str):
+        await self._send({"type": "done", "message_id": asst_msg_id, "audio_url": audio_url})
+
+    async def failed(self, user_msg_id: int, reason: str):
+        await self._send({"type": "failed", "message_id": user_msg_id, "reason": reason})
+
+    async def busy(self, retry_after: int):
+        await self._send({"type": "busy", "retry_after": retry_after})
+
+    async def over_budget(self, retry_after: int):
+        await self._send({"type": "over_budget", "retry_after": retry_after})
+
+    async def error(self, reason: str):
+        await self._send({"type": "error", "reason": reason})
+
+    async def close(self, code: int):
+        if self.closed:
+            return
+        self.closed = True
+        with contextlib.suppress(Exception):
+            await self.websocket.close(code=code)
+
+
+def start_sample_rate(requested, current: int) -> Optional[int]:
+    """The rate a start frame asks for, within MIN/MAX_SAMPLE_RATE; None when it is not a number."""
+    if requested is None:
+        return current
+    if isinstance(requested, bool) or not isinstance(requested, (int, float)):
+        return None
+    return int(min(MAX_SAMPLE_RATE, max(MIN_SAMPLE_RATE, requested)))
+
+
+def write_pcm_wav(path: str, pcm: bytes, sample_rate: int):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with contextlib.closing(wave.open(path, "wb")) as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(pcm)
+
+
+@router.websocket("/conversations/{persona_id}/realtime")
+async def realtime_voice(websocket: WebSocket, persona_id: int, token: str = Query(...)):
+    from app.core.db import AsyncSessionLocal
+
+    async with AsyncSessionLocal() as db:
+        user = await get_user_from_token(token, db)
+        if user is None:
+            await websocket.close(code=CLOSE_UNAUTHORIZED)
+            return
+        if await get_persona_cache().get_owned(db, persona_id, user.id) is None:
+            await websocket.close(code=CLOSE_NOT_FOUND)
+            return
+        # Re-checked per turn, where being near the limit also makes the replies text only
+        if (await get_budget_guard().check(db, user)).decision == REJECT:
+            await websocket.close(code=CLOSE_OVER_BUDGET)
+            return
+        conversation = (
+            await db.execute(
+                select(Conversation).where(Conversation.user_id == user.id, Conversation.persona_id == persona_id)
+            )
+        ).scalar_one_or_none()
+        if conversation is None:
+            conversation = Conversation(user_id=user.id, persona_id=persona_id)
+            db.add(conversation)
+            await db.commit()
+            await db.refresh(conversation)
+        conversation_id = conversation.id
+
+    runner = get_job_runner()
+    if not runner.accepting:
+        await websocket.close(code=1013)  # Try again later
+        return
+
+    await websocket.accept()
+    events = WebSocketEvents(websocket)
+    vad = EnergyVAD.from_settings()
+    turns: asyncio.Queue = asyncio.Queue()
+    worker = asyncio.create_task(_answer_turns(turns, conversation_id, user, events, AsyncSessionLocal))
+    realtime_sessions.inc()
+    logger.info("Realtime session opened (conversation %s)", conversation_id)
+    try:
+        await websocket.send_text(json.dumps(
+            {"type": "ready", "conversation_id": conversation_id, "sample_rate": vad.sample_rate}
+        ))
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if message.get("bytes") is not None:
+                for event in vad.feed(message["bytes"]):
+                    await _on_vad_event(event, vad, turns, events)
+                continue
+
+            try:
+                control = json.loads(message.get("text") or "")
+            except ValueError:
+                control = None
+            if not isinstance(control, dict):
+                await events.error("invalid_frame")
+                continue
+            if control.get("type") == "start" and not vad.in_speech:
+                sample_rate = start_sample_rate(control.get("sample_rate"), vad.sample_rate)
+                if sample_rate is None:
+                    await events.error("invalid_sample_rate")
+                    continue
+                vad = EnergyVAD.from_settings(sample_rate=sample_rate)
+            elif control.get("type") == "end_turn":
+                event = vad.flush()
+                if event is not None:
+                    await _on_vad_event(event, vad, turns, events)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        events.closed = True
+        realtime_sessions.dec()
+        # Whatever was said last still becomes a turn; queued turns finish in the background
+        event = vad.flush()
+        if event is not None:
+            realtime_utterances.inc()
+            turns.put_nowait((event.audio, vad.sample_rate))
+        turns.put_nowait(None)
+        logger.info("Realtime session closed (conversation %s)", conversation_id)
+
+    await worker
+
+
+async def _on_vad_event(event, vad: EnergyVAD, turns: asyncio.Queue, events: WebSocketEvents):
+    if event.kind == "start":
+        await events.speech_start()
+        return
+    realtime_utterances.inc()
+    turns.put_nowait((event.audio, vad.sample_rate))
+
+
+async def _answer_turns(
+    turns: asyncio.Queue, conversation_id: int, user, events: WebSocketEvents, db_session_factory
+):
+    """Answers utterances one at a time, in the order they were spoken, until the user's budget runs out."""
+    runner = get_job_runner()
+    while True:
+        turn = await turns.get()
+        if turn is None:
+            return
+        pcm, sample_rate = turn
+        # A long call can spend far past what was left when it connected
+        async with db_session_factory() as db:
+            budget = await get_budget_guard().check(db, user)
+        if budget.decision == REJECT:
+            logger.info("Realtime call ended: user %s is over budget (%s)", user.id, budget.reason)
+            await events.over_budget(budget.retry_after)
+            await events.close(CLOSE_OVER_BUDGET)
+            return
+        # Per utterance, as /send checks per upload: a call can outlast the load it started under
+        admission = get_admission_controller().decide(get_pipeline_scheduler(), runner)
+        if admission.decision == REJECT:
+            logger.warning("Realtime turn shed under load (%s)", admission.reason)
+            await events.busy(admission.retry_after)
+            continue
+        text_only = TEXT_ONLY in (admission.decision, budget.decision)
+        try:
+            with tracer.start_span("chat.realtime_turn", kind="server", attributes={
+                "conversation.id": conversation_id,
+                "audio.seconds": len(pcm) / 2 / sample_rate,
+                "admission.decision": admission.decision,
+            }) as span:
+                user_msg_id, file_path = await _store_utterance(
+                    db_session_factory, conversation_id, pcm, sample_rate, span.trace_id,
+                    text_only=text_only
+                )
+                await events.speech_end(user_msg_id)
+                # Tracked by the runner so shutdown drains it; shielded so a hang-up does not cut it short
+                job = runner.submit(
+                    process_voice_message,
+                    conversation_id,
+                    user_msg_id,
+                    file_path,
+                    db_session_factory,
+                    traceparent=span.traceparent,
+                    events=events,
+                    text_only=text_only
+                )
+            await asyncio.shield(job)
+        except JobRunnerClosed:
+            # Left pending; the startup recovery scan picks it up
+            logger.warning("Realtime turn not answered: server is shutting down")
+            return
+        except Exception as e:
+            logger.exception("Realtime turn failed: %s", e)
+
+
+async def _store_utterance(
+    db_session_factory, conversation_id: int, pcm: bytes, sample_rate: int, trace_id: str, text_only: bool = False
+):
+    filename = f"msg_{conversation_id}_{uuid.uuid4()}.wav"
+    file_path = os.path.join("static/audio", filename)
+    await asyncio.to_thread(write_pcm_wav, file_path, pcm, sample_rate)
+
+    async with db_session_factory() as db:
+        user_msg = Message(
+            conversation_id=conversation_id,
+            role="user",
+            audio_url=f"/static/audio/{filename}",
+            analysis={
+                "trace_id": trace_id,
+                "source": "realtime",
+                **({"admission": TEXT_ONLY} if text_only else {})
+            },
+            status="pending"  # Completed once the pipeline has produced the reply
+        )
+        db.add(user_msg)
+        await db.commit()
+        with log_context(message_id=user_msg.id):
+            logger.info("Realtime utterance stored (%.1fs)", len(pcm) / 2 / sample_rate)
+        return user_msg.id, file_path
@@ -0,0 +1,84 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_redis = None
+
+
+def get_redis():
+    """
+    Shared redis.asyncio client built from REDIS_URL, or None when Redis is
+    disabled (REDIS_URL=memory://) so callers use their in-process fallback.
+    """
+    global _redis
+    if settings.REDIS_URL.startswith("memory://"):
+        return None
+    if _redis is None:
+        import redis.asyncio as aioredis
+
+        _redis = aioredis.from_url(
+            settings.REDIS_URL,
+            decode_responses=True,
+            socket_connect_timeout=0.5,
+            socket_timeout=0.5,
+        )
+    return _redis
+
+
+class LocalTTLCache:
+    """
+    Bounded in-process key/value store with per-key expiry, used as the
+    local fallback for the Redis-backed features. Evicts least recently
+    written keys once `max_entries` is reached.
+    """
+
+    def __init__(self, max_entries: int = 10_000):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _alive(self, key: str, now: float) -> Optional[Tuple[float, Any]]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= now:
+            del self._data[key]
+            return None
+        return entry
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            entry = self._alive(key, time.monotonic())
+            return entry[1] if entry else None
+
+    def _store(self, key: str, value: Any, ttl: float) -> None:
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        with self._lock:
+            self._store(key, value, ttl)
+
+    def set_nx(self, key: str, value: Any, ttl: float) -> Any:
+        """Stores `value` only if absent; returns the existing value, or None if stored."""
+        with self._lock:
+            entry = self._alive(key, time.monotonic())
+            if entry is not None:
+                return entry[1]
+            self._store(key, value, ttl)
+            return None
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._data)
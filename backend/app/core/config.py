@@ -1,6 +1,6 @@
 import os
 import logging
-from typing import List
+from typing import Dict, List
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 # Determine absolute path to .env file in project root
@@ -17,18 +17,169 @@ class Settings(BaseSettings):
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 8  # 8 days
     
     DATABASE_URL: str
-    REDIS_URL: str
+    # memory:// keeps caches, idempotency keys and invalidations in-process (single node)
+    REDIS_URL: str = "memory://"
+
+    # Embedded profile (DATABASE_URL=sqlite+aiosqlite:///path/to.db): pragmas set on every connection
+    SQLITE_JOURNAL_MODE: str = "WAL"
+    SQLITE_SYNCHRONOUS: str = "NORMAL"
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_CACHE_SIZE_KB: int = 65536
+    SQLITE_MMAP_SIZE_MB: int = 256
+    SQLITE_POOL_SIZE: int = 10
     
     OPENAI_API_KEY: str = "mock"
     OPENAI_BASE_URL: str = "http://d.frgochou.com/v1"
     OPENAI_PROXY: str = ""
     OPENAI_MODEL: str = "gpt-3.5-turbo-1106"
+    OPENAI_STT_MODEL: str = "whisper-1"
     INDEXTTS_BASE_URL: str = "http://192.168.2.252:8000"
+
+    # LLM routing (optional). Each endpoint: {"name", "base_url", "model", "api_key", "proxy", "timeout", "tags"};
+    # empty keeps the single OPENAI_BASE_URL / OPENAI_MODEL provider
+    LLM_ENDPOINTS: List[dict] = []
+    LLM_ROUTER_EWMA_ALPHA: float = 0.2
+    LLM_ROUTER_ERROR_PENALTY_SECONDS: float = 10.0
+    LLM_ROUTER_PROBE_SECONDS: float = 30.0
+    LLM_ROUTER_MAX_ATTEMPTS: int = 2
+    LLM_ROUTER_TIMEOUT_SECONDS: float = 30.0
+    LLM_SHORT_INPUT_TOKENS: int = 0
+    LLM_SHORT_INPUT_TAG: str = "fast"
+
+    # LLM request hedging (optional): a request still running at the observed LLM_HEDGE_PERCENTILE latency gets
+    # a second one (next best route, or LLM_HEDGE_MODEL on the single endpoint); extra requests <= LLM_HEDGE_BUDGET
+    LLM_HEDGE_ENABLED: bool = False
+    LLM_HEDGE_PERCENTILE: float = 0.9
+    LLM_HEDGE_MIN_DELAY_SECONDS: float = 0.5
+    LLM_HEDGE_BUDGET: float = 0.1
+    LLM_HEDGE_MODEL: str = ""
     
     # Security & Compliance
     DAILY_VOICE_LIMIT: int = 50
     MAX_AUDIO_DURATION_SEC: int = 60
 
+    # Transcription cache (model + normalized audio hash -> transcript; Redis, local fallback)
+    STT_CACHE_ENABLED: bool = True
+    STT_CACHE_TTL_SECONDS: int = 7 * 24 * 3600
+    STT_CACHE_MAX_ENTRIES: int = 100000
+
+    # Realtime voice (WebSocket; 16-bit mono PCM in, server-side energy endpointing)
+    REALTIME_SAMPLE_RATE: int = 16000
+    VAD_FRAME_MS: int = 30
+    VAD_SILENCE_MS: int = 600
+    VAD_MIN_SPEECH_MS: int = 240
+    VAD_THRESHOLD_RATIO: float = 3.0
+    VAD_MIN_RMS: float = 300.0
+
+    # Logging (json or text; LOG_SAMPLING maps logger name -> kept fraction of INFO lines)
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "json"
+    LOG_SAMPLING: Dict[str, float] = {}
+
+    # Tracing (exporters: "console", "otlp_file")
+    TRACING_EXPORTERS: List[str] = []
+    TRACING_OTLP_FILE: str = "traces/otlp.jsonl"
+
+    # Shutdown drain & startup recovery of interrupted pipeline runs
+    SHUTDOWN_DRAIN_SECONDS: float = 25.0
+    RECOVERY_ON_STARTUP: bool = True
+    RECOVERY_STALE_SECONDS: int = 300
+    RECOVERY_BATCH_SIZE: int = 200
+
+    # Readiness: /health/ready waits for warm-up (database, schema at the Alembic head, provider SDKs)
+    STARTUP_SCHEMA_CHECK: bool = True
+    READINESS_RETRY_SECONDS: float = 2.0
+    RECOVERY_MAX_ATTEMPTS: int = 1
+
+    # Idempotent sends (Idempotency-Key header or audio hash; stored in Redis, local fallback)
+    IDEMPOTENCY_TTL_SECONDS: int = 600
+
+    # Conversation context (verbatim recent turns within a token budget + rolling summary)
+    CONTEXT_MAX_TURNS: int = 12
+    CONTEXT_TOKEN_BUDGET: int = 2000
+    CONTEXT_SUMMARY_EVERY: int = 10
+    CONTEXT_SUMMARY_MAX_TOKENS: int = 300
+
+    # History ETags (conversation version cached in Redis; TTL bounds staleness after a lost publish)
+    CONVERSATION_VERSION_TTL_SECONDS: int = 300
+
+    # Persona cache (per-process; invalidated across workers via Redis pub/sub, TTL as a backstop)
+    PERSONA_CACHE_TTL_SECONDS: int = 300
+    PERSONA_CACHE_MAX_ENTRIES: int = 10000
+
+    # Long-term memory (per-conversation embedding index; IVF once a history is large)
+    MEMORY_ENABLED: bool = True
+    MEMORY_DIR: str = "data/memory"
+    MEMORY_EMBEDDING_MODEL: str = "text-embedding-3-small"
+    MEMORY_TOP_K: int = 3
+    MEMORY_MIN_SCORE: float = 0.25
+    MEMORY_TOKEN_BUDGET: int = 300
+    MEMORY_CACHE_CONVERSATIONS: int = 256
+    MEMORY_IVF_THRESHOLD: int = 20000
+    MEMORY_IVF_NPROBE: int = 8
+
+    # TTS output conformance (trim, resample, loudness normalize; 0 workers = run in a thread)
+    AUDIO_POSTPROCESS_ENABLED: bool = True
+    AUDIO_SAMPLE_RATE: int = 24000
+    AUDIO_TARGET_LUFS: float = -18.0
+    AUDIO_TRIM_THRESHOLD_DB: float = -45.0
+    AUDIO_POSTPROCESS_WORKERS: int = 2
+
+    # Waveform summaries stored with each audio message (buckets of peak/RMS level)
+    WAVEFORM_POINTS: int = 64
+
+    # Phrase packs (greeting and error fallbacks pre-synthesized in each persona's voice)
+    PHRASE_PACK_ENABLED: bool = True
+
+    # Pipeline Scheduling (concurrent upstream calls per stage, DRR weights per priority tier)
+    PIPELINE_STT_SLOTS: int = 4
+    PIPELINE_LLM_SLOTS: int = 8
+    PIPELINE_TTS_SLOTS: int = 2
+    PIPELINE_PRIORITY_WEIGHTS: Dict[str, int] = {"interactive": 4, "batch": 1}
+
+    # Adaptive concurrency per upstream ("fixed", "aimd" or "gradient"; adaptive limits start at the slots
+    # above and stay within 1..PIPELINE_MAX_SLOTS) and how long a call may queue for a slot (0 = no deadline)
+    PIPELINE_LIMIT_ALGORITHMS: Dict[str, str] = {"stt": "fixed", "llm": "fixed", "tts": "gradient"}
+    PIPELINE_MAX_SLOTS: int = 16
+    PIPELINE_LIMIT_SLOW_SECONDS: float = 10.0  # aimd: a call slower than this backs the limit off
+    PIPELINE_QUEUE_DEADLINE_SECONDS: float = 60.0
+
+    # Admission control for sends (expected pipeline seconds from queue depth x recent stage latency)
+    ADMISSION_ENABLED: bool = True
+    ADMISSION_MAX_PENDING_JOBS: int = 500
+    ADMISSION_REJECT_DELAY_SECONDS: float = 90.0
+    ADMISSION_TEXT_ONLY_DELAY_SECONDS: float = 30.0
+
+    # Archival of old history to the cold tier (only turns already folded into the summary)
+    ARCHIVE_AFTER_DAYS: int = 180
+    ARCHIVE_BATCH_SIZE: int = 500
+    ARCHIVE_DIR: str = "data/archive"
+    ARCHIVE_AUDIO_CODEC: str = "opus"  # or "original" to bundle the files as they are
+    ARCHIVE_OPUS_BITRATE: str = "24k"
+    ARCHIVE_FFMPEG: str = "ffmpeg"
+    ARCHIVE_RESTORE_TTL_DAYS: int = 7
+
+    # Conversation export (rows fetched per server-side cursor round trip)
+    EXPORT_CHUNK_SIZE: int = 500
+
+    # Usage rollups (hour/day counters per user x persona) and admin analytics
+    USAGE_ROLLUPS_ENABLED: bool = True
+    USAGE_BACKFILL_CHUNK: int = 5000
+
+    # Upstream usage accounting: batched rollup writes and per-user daily budgets (0 = unlimited)
+    USAGE_FLUSH_SECONDS: float = 5.0  # 0 writes every turn through
+    USAGE_FLUSH_MAX_BUCKETS: int = 500
+    USAGE_BUDGET_LLM_TOKENS: int = 0
+    USAGE_BUDGET_STT_SECONDS: int = 0
+    USAGE_BUDGET_TTS_CHARS: int = 0
+    USAGE_BUDGET_OVERRIDES: Dict[str, Dict[str, int]] = {}  # {"alice": {"llm_tokens": 500000}}
+    USAGE_BUDGET_DEGRADE_RATIO: float = 0.8  # text-only replies from here on
+    USAGE_BUDGET_REFRESH_SECONDS: float = 30.0
+
+    # Traffic recorder (opt-in): one anonymized JSON line per pipeline run, replayed by replay_traffic.py
+    TRAFFIC_RECORD_PATH: str = ""  # e.g. data/traffic/pipeline.jsonl; empty = off
+    TRAFFIC_RECORD_SAMPLE: float = 1.0  # fraction of runs recorded
+
     model_config = SettingsConfigDict(
         env_file=[".env", env_path], 
         case_sensitive=True,
@@ -37,14 +188,17 @@ class Settings(BaseSettings):
 
 settings = Settings()
 
-# Logging check
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger("config")
-
-if os.path.exists(env_path):
-    logger.info(f"✅ Loaded .env file from: {env_path}")
-elif os.path.exists(".env"):
-    logger.info("✅ Loaded .env file from current directory")
-else:
-    logger.warning(f"⚠️  WARNING: .env file NOT found at {env_path} or current directory. Using defaults/env vars.")
+def log_env_source() -> None:
+    """
+    Says which .env file the settings came from. Called once by the app
+    factory, after logging is configured, rather than probing the
+    filesystem and configuring logging as a side effect of this import.
+    """
+    logger = logging.getLogger("config")
+    if os.path.exists(env_path):
+        logger.info("Loaded .env file from: %s", env_path)
+    elif os.path.exists(".env"):
+        logger.info("Loaded .env file from current directory")
+    else:
+        logger.warning(".env file NOT found at %s or current directory. Using defaults/env vars.", env_path)
 
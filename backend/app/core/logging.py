@@ -1,13 +1,208 @@
+import atexit
+import contextvars
+import json
 import logging
+import logging.handlers
+import queue
+import random
 import sys
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from app.core.config import settings
+
+# Correlation ids attached to every record emitted while they are set.
+request_id_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("request_id", default=None)
+message_id_var: contextvars.ContextVar[Optional[int]] = contextvars.ContextVar("message_id", default=None)
+
+_PRIMITIVES = (str, int, float, bool, type(None))
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+@contextmanager
+def log_context(request_id: Optional[str] = None, message_id: Optional[int] = None):
+    """Set correlation ids for the duration of a block (request, pipeline job...)."""
+    tokens = []
+    if request_id is not None:
+        tokens.append((request_id_var, request_id_var.set(request_id)))
+    if message_id is not None:
+        tokens.append((message_id_var, message_id_var.set(message_id)))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+class ContextFilter(logging.Filter):
+    """Copies the correlation ids onto the record in the emitting task."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        record.message_id = message_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps only a fraction of INFO-and-below records for configured loggers.
+    Rates apply to the logger and its children, e.g. {"app.services": 0.1}.
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = dict(rates)
+        self._resolved: Dict[str, float] = {}
+
+    def _rate_for(self, name: str) -> float:
+        rate = self._resolved.get(name)
+        if rate is None:
+            rate = 1.0
+            candidate = name
+            while candidate:
+                if candidate in self.rates:
+                    rate = self.rates[candidate]
+                    break
+                candidate = candidate.rpartition(".")[0]
+            self._resolved[name] = rate
+        return rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.INFO:
+            return True
+        rate = self._rate_for(record.name)
+        return rate >= 1.0 or random.random() < rate
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that defers message formatting to the listener thread.
+    The stock prepare() renders the message on the caller (the event loop);
+    here only non-primitive arguments are stringified eagerly, so objects
+    such as ORM instances are never touched from the listener thread.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.args and isinstance(record.args, tuple):
+            if not all(isinstance(a, _PRIMITIVES) for a in record.args):
+                record.args = tuple(a if isinstance(a, _PRIMITIVES) else str(a) for a in record.args)
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            payload["request_id"] = request_id
+        message_id = getattr(record, "message_id", None)
+        if message_id is not None:
+            payload["message_id"] = message_id
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            line += f" [req={request_id}]"
+        message_id = getattr(record, "message_id", None)
+        if message_id is not None:
+            line += f" [msg={message_id}]"
+        return line
+
+
+def build_queue_handler(
+    stream=None,
+    fmt: str = "json",
+    sampling: Optional[Dict[str, float]] = None,
+):
+    """Returns (queue_handler, listener); the listener owns the real stream handler."""
+    stream_handler = logging.StreamHandler(stream or sys.stdout)
+    stream_handler.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    queue_handler = LazyQueueHandler(log_queue)
+    if sampling:
+        queue_handler.addFilter(SamplingFilter(sampling))
+    queue_handler.addFilter(ContextFilter())
+
+    listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    return queue_handler, listener
+
 
 def setup_logging():
-    logging.basicConfig(
-        level=logging.INFO,
-        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-        handlers=[logging.StreamHandler(sys.stdout)]
+    """
+    Routes all records through a queue so the event loop never blocks on a
+    slow stdout; a background listener thread formats and writes them.
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    queue_handler, listener = build_queue_handler(
+        fmt=settings.LOG_FORMAT,
+        sampling=settings.LOG_SAMPLING,
     )
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(settings.LOG_LEVEL)
+
+    listener.start()
+    atexit.register(listener.stop)
+    _listener = listener
+
     # Silence some libs
     logging.getLogger("httpx").setLevel(logging.WARNING)
+    return listener
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex
+
+
+class RequestContextMiddleware:
+    """Pure ASGI middleware tagging each HTTP request with a request id."""
+
+    def __init__(self, app, header: str = "x-request-id"):
+        self.app = app
+        self.header = header.encode("latin-1")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope.get("headers", ()):
+            if name == self.header:
+                request_id = value.decode("latin-1")[:64]
+                break
+        request_id = request_id or new_request_id()
+
+        async def send_with_header(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(self.header, request_id.encode("latin-1"))]
+            await send(message)
+
+        with log_context(request_id=request_id):
+            await self.app(scope, receive, send_with_header)
+
 
 logger = logging.getLogger("app")
@@ -0,0 +1,136 @@
+"""
+Startup warm-up and the state behind /health/ready.
+
+A fresh replica serves /health/live as soon as the app is up, and turns
+ready once warm-up has passed every check:
+
+- database: the database answers a trivial query
+- schema: its Alembic version is the head this build ships. Migrations run
+  as their own step (the `migrate` service in docker-compose), so a
+  replica only compares versions, once.
+- providers: the SDKs the first requests would otherwise import on the
+  request path (httpx, jose, passlib/bcrypt, openai when configured) are
+  loaded, off the event loop
+
+Failed checks are retried every READINESS_RETRY_SECONDS; passed ones are
+not run again.
+"""
+import asyncio
+import importlib
+import logging
+import os
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+OK = "ok"
+FAILED = "failed"
+
+ready_gauge = registry.gauge("app_ready", "1 once startup warm-up has passed every readiness check")
+warmup_seconds = registry.gauge("app_warmup_seconds", "Time from app start to ready")
+
+_ALEMBIC_INI = os.path.join(os.path.dirname(__file__), "..", "..", "alembic.ini")
+
+
+def schema_head() -> str:
+    """The Alembic head revision of this build. Blocking: reads the migration scripts."""
+    from alembic.config import Config
+    from alembic.script import ScriptDirectory
+
+    config = Config(_ALEMBIC_INI)
+    config.set_main_option("script_location", os.path.join(os.path.dirname(_ALEMBIC_INI), "alembic"))
+    return ScriptDirectory.from_config(config).get_current_head()
+
+
+def import_providers() -> None:
+    """Imports the provider SDKs and builds the password hasher. Blocking."""
+    from app.core.security import pwd_context
+
+    for module in ("httpx", "jose.jwt"):
+        importlib.import_module(module)
+    if settings.OPENAI_API_KEY and settings.OPENAI_API_KEY != "mock":
+        importlib.import_module("openai")
+    pwd_context()
+
+
+class Readiness:
+    def __init__(self):
+        self.started = time.monotonic()
+        self.ready_after: Optional[float] = None
+        self.checks: Dict[str, str] = {}
+        self.errors: Dict[str, str] = {}
+
+    @property
+    def ready(self) -> bool:
+        return self.ready_after is not None
+
+    def report(self) -> dict:
+        return {
+            "status": "ready" if self.ready else "warming_up",
+            "checks": dict(self.checks),
+            **({"errors": dict(self.errors)} if self.errors else {}),
+            "uptime_seconds": round(time.monotonic() - self.started, 3),
+            "warmup_seconds": round(self.ready_after, 3) if self.ready else None,
+        }
+
+    async def _run(self, name: str, check: Callable[[], Awaitable[None]]) -> None:
+        try:
+            await check()
+        except Exception as e:
+            self.checks[name] = FAILED
+            self.errors[name] = f"{type(e).__name__}: {e}"[:200]
+            return
+        self.checks[name] = OK
+        self.errors.pop(name, None)
+
+    async def warm_up(self, db_session_factory, schema_check: bool = True, retry_seconds: float = 2.0) -> None:
+        """Runs the checks until all pass. Meant to run as a background task for the app's lifetime."""
+
+        async def database():
+            async with db_session_factory() as db:
+                await db.execute(text("SELECT 1"))
+
+        async def schema():
+            expected = await asyncio.to_thread(schema_head)
+            async with db_session_factory() as db:
+                current = (await db.execute(text("SELECT version_num FROM alembic_version"))).scalar_one_or_none()
+            if current != expected:
+                raise RuntimeError(f"database schema is at {current}, this build expects {expected}")
+
+        async def providers():
+            await asyncio.to_thread(import_providers)
+
+        checks = {"database": database, "providers": providers}
+        if schema_check:
+            checks["schema"] = schema
+        self.checks = dict.fromkeys(checks, PENDING)
+        while True:
+            for name, check in checks.items():
+                if self.checks[name] != OK:
+                    await self._run(name, check)
+            if all(state == OK for state in self.checks.values()):
+                break
+            logger.warning("Not ready yet: %s", self.errors)
+            await asyncio.sleep(retry_seconds)
+
+        self.ready_after = time.monotonic() - self.started
+        ready_gauge.set(1)
+        warmup_seconds.set(self.ready_after)
+        logger.info("Ready after %.2fs", self.ready_after)
+
+
+_readiness: Optional[Readiness] = None
+
+
+def get_readiness() -> Readiness:
+    global _readiness
+    if _readiness is None:
+        _readiness = Readiness()
+    return _readiness
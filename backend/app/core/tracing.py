@@ -0,0 +1,421 @@
+import atexit
+import contextvars
+import json
+import logging
+import os
+import queue
+import secrets
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Lightweight tracer speaking W3C traceparent and OTLP/JSON, so a voice message
+# can be followed from the upload endpoint through the background pipeline,
+# every DB execute and every upstream HTTP call.
+
+
+class Span:
+    __slots__ = (
+        "name", "trace_id", "span_id", "parent_id", "kind",
+        "start_ns", "end_ns", "attributes", "status", "status_message",
+    )
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str] = None, kind: str = "internal"):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes: Dict[str, Any] = {}
+        self.status = "unset"
+        self.status_message = ""
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end_ns or time.time_ns()
+        return (end - self.start_ns) / 1e6
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def record_exception(self, exc: BaseException) -> None:
+        self.status = "error"
+        self.status_message = f"{type(exc).__name__}: {exc}"
+
+    def end(self) -> None:
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+            if self.status == "unset":
+                self.status = "ok"
+
+
+class _RemoteParent:
+    """Parent context received from another process or task (no export)."""
+
+    __slots__ = ("trace_id", "span_id")
+
+    def __init__(self, trace_id: str, span_id: str):
+        self.trace_id = trace_id
+        self.span_id = span_id
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+
+_current: contextvars.ContextVar[Optional[Any]] = contextvars.ContextVar("current_span", default=None)
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[_RemoteParent]:
+    if not value:
+        return None
+    parts = value.strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    return _RemoteParent(parts[1], parts[2])
+
+
+def current_span():
+    return _current.get()
+
+
+def current_trace_id() -> Optional[str]:
+    span = _current.get()
+    return span.trace_id if span is not None else None
+
+
+def current_traceparent() -> Optional[str]:
+    span = _current.get()
+    return span.traceparent if span is not None else None
+
+
+# Exporters
+
+class InMemorySpanExporter:
+    """Keeps finished spans in a list; meant for tests."""
+
+    def __init__(self):
+        self._spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def export(self, spans: List[Span]) -> None:
+        with self._lock:
+            self._spans.extend(spans)
+
+    def get_finished_spans(self) -> List[Span]:
+        with self._lock:
+            return list(self._spans)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._spans.clear()
+
+    def shutdown(self) -> None:
+        pass
+
+
+class ConsoleSpanExporter:
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+
+    def export(self, spans: List[Span]) -> None:
+        for span in spans:
+            self.stream.write(json.dumps({
+                "trace_id": span.trace_id,
+                "span_id": span.span_id,
+                "parent_id": span.parent_id,
+                "name": span.name,
+                "duration_ms": round(span.duration_ms, 3),
+                "status": span.status,
+                "attributes": span.attributes,
+            }, default=str) + "\n")
+        self.stream.flush()
+
+    def shutdown(self) -> None:
+        pass
+
+
+_OTLP_KIND = {"internal": 1, "server": 2, "client": 3}
+_OTLP_STATUS = {"unset": 0, "ok": 1, "error": 2}
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class OTLPFileSpanExporter:
+    """
+    Appends one OTLP/JSON ExportTraceServiceRequest per batch to a file, which
+    the OpenTelemetry collector's file receiver (or `otelcol` replay) can ingest.
+    """
+
+    def __init__(self, path: str, service_name: str):
+        self.path = path
+        self.service_name = service_name
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _encode(self, spans: List[Span]) -> Dict[str, Any]:
+        return {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.service_name}}]},
+            "scopeSpans": [{
+                "scope": {"name": "app"},
+                "spans": [{
+                    "traceId": s.trace_id,
+                    "spanId": s.span_id,
+                    "parentSpanId": s.parent_id or "",
+                    "name": s.name,
+                    "kind": _OTLP_KIND.get(s.kind, 1),
+                    "startTimeUnixNano": str(s.start_ns),
+                    "endTimeUnixNano": str(s.end_ns or s.start_ns),
+                    "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in s.attributes.items()],
+                    "status": {"code": _OTLP_STATUS[s.status], "message": s.status_message},
+                } for s in spans],
+            }],
+        }]}
+
+    def export(self, spans: List[Span]) -> None:
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(self._encode(spans)) + "\n")
+
+    def shutdown(self) -> None:
+        pass
+
+
+# Processors
+
+class SimpleSpanProcessor:
+    """Exports each span synchronously as it ends."""
+
+    def __init__(self, exporter):
+        self.exporter = exporter
+
+    def on_end(self, span: Span) -> None:
+        self.exporter.export([span])
+
+    def shutdown(self) -> None:
+        self.exporter.shutdown()
+
+
+class BatchSpanProcessor:
+    """Hands spans to a background thread so exporting never blocks the event loop."""
+
+    _STOP = object()
+
+    def __init__(self, exporter, max_batch: int = 256, interval: float = 1.0):
+        self.exporter = exporter
+        self.max_batch = max_batch
+        self.interval = interval
+        self._queue: "queue.SimpleQueue[Any]" = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._worker, name="span-exporter", daemon=True)
+        self._thread.start()
+
+    def on_end(self, span: Span) -> None:
+        self._queue.put(span)
+
+    def _worker(self) -> None:
+        stopping = False
+        while not stopping:
+            batch: List[Span] = []
+            try:
+                item = self._queue.get(timeout=self.interval)
+                while True:
+                    if item is self._STOP:
+                        stopping = True
+                        break
+                    batch.append(item)
+                    if len(batch) >= self.max_batch:
+                        break
+                    item = self._queue.get_nowait()
+            except queue.Empty:
+                pass
+            if batch:
+                try:
+                    self.exporter.export(batch)
+                except Exception:
+                    logger.exception("Span export failed")
+
+    def shutdown(self) -> None:
+        self._queue.put(self._STOP)
+        self._thread.join(timeout=5)
+        self.exporter.shutdown()
+
+
+class Tracer:
+    def __init__(self):
+        self._processors: List[Any] = []
+
+    def add_processor(self, processor) -> None:
+        self._processors.append(processor)
+
+    def remove_processor(self, processor) -> None:
+        if processor in self._processors:
+            self._processors.remove(processor)
+
+    def shutdown(self) -> None:
+        for processor in self._processors:
+            processor.shutdown()
+        self._processors.clear()
+
+    def start_detached(self, name: str, kind: str = "internal", attributes: Optional[Dict[str, Any]] = None) -> Span:
+        """Starts a child of the current span without making it current."""
+        parent = _current.get()
+        if parent is not None:
+            span = Span(name, parent.trace_id, parent.span_id, kind)
+        else:
+            span = Span(name, secrets.token_hex(16), None, kind)
+        if attributes:
+            span.attributes.update(attributes)
+        return span
+
+    def finish(self, span: Span) -> None:
+        span.end()
+        for processor in self._processors:
+            try:
+                processor.on_end(span)
+            except Exception:
+                logger.exception("Span processor failed")
+
+    @contextmanager
+    def start_span(
+        self, name: str, kind: str = "internal", attributes: Optional[Dict[str, Any]] = None
+    ) -> Iterator[Span]:
+        span = self.start_detached(name, kind, attributes)
+        token = _current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.record_exception(e)
+            raise
+        finally:
+            _current.reset(token)
+            self.finish(span)
+
+
+tracer = Tracer()
+
+
+@contextmanager
+def continue_trace(traceparent: Optional[str]):
+    """Makes a propagated traceparent the parent of spans started in this block."""
+    parent = parse_traceparent(traceparent)
+    if parent is None:
+        yield
+        return
+    token = _current.set(parent)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+# Instrumentation
+
+def instrument_engine(engine) -> None:
+    """Adds a client span around every cursor execute of an (async) engine."""
+    from sqlalchemy import event
+
+    sync_engine = getattr(engine, "sync_engine", engine)
+    if getattr(sync_engine, "_tracing_instrumented", False):
+        return
+    sync_engine._tracing_instrumented = True
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        span = tracer.start_detached("db.execute", kind="client", attributes={
+            "db.system": sync_engine.dialect.name,
+            "db.statement": statement[:500],
+        })
+        if context is not None:
+            context._trace_span = span
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        span = getattr(context, "_trace_span", None)
+        if span is not None:
+            tracer.finish(span)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _error(exception_context):
+        span = getattr(exception_context.execution_context, "_trace_span", None)
+        if span is not None:
+            span.record_exception(exception_context.original_exception)
+            tracer.finish(span)
+
+
+def traced_transport(transport=None, **transport_kwargs):
+    """Wraps an httpx async transport with client spans and traceparent injection."""
+    import httpx
+
+    class TracingTransport(httpx.AsyncBaseTransport):
+        def __init__(self, inner):
+            self.inner = inner
+
+        async def handle_async_request(self, request):
+            with tracer.start_span(f"HTTP {request.method}", kind="client", attributes={
+                "http.method": request.method,
+                "http.url": str(request.url.copy_with(query=None)),
+            }) as span:
+                request.headers["traceparent"] = span.traceparent
+                response = await self.inner.handle_async_request(request)
+                span.set_attribute("http.status_code", response.status_code)
+                if response.status_code >= 500:
+                    span.status = "error"
+                return response
+
+        async def aclose(self):
+            await self.inner.aclose()
+
+    return TracingTransport(transport or httpx.AsyncHTTPTransport(**transport_kwargs))
+
+
+def traced_async_client(proxy: Optional[str] = None, **kwargs):
+    """httpx.AsyncClient whose requests are traced (used by every provider)."""
+    import httpx
+
+    transport_kwargs = {"proxy": proxy} if proxy else {}
+    return httpx.AsyncClient(transport=traced_transport(**transport_kwargs), **kwargs)
+
+
+_configured = False
+
+
+def setup_tracing():
+    """Registers exporters from settings and instruments the DB engine once."""
+    global _configured
+    if _configured:
+        return tracer
+    _configured = True
+
+    for name in settings.TRACING_EXPORTERS:
+        if name == "console":
+            tracer.add_processor(BatchSpanProcessor(ConsoleSpanExporter()))
+        elif name == "otlp_file":
+            exporter = OTLPFileSpanExporter(settings.TRACING_OTLP_FILE, settings.PROJECT_NAME)
+            tracer.add_processor(BatchSpanProcessor(exporter))
+        else:
+            logger.warning("Unknown tracing exporter: %s", name)
+    atexit.register(tracer.shutdown)
+
+    from app.core.db import engine
+    instrument_engine(engine)
+    return tracer
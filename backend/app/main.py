@@ -1,34 +1,129 @@
+"""
+ASGI entry point. Run it through the factory:
+
+    uvicorn app.main:create_app --factory
+
+Importing this module builds nothing; routers, provider SDKs and logging
+are set up by create_app, and warm-up continues in the background after
+startup (see app.core.readiness). `app.main:app` still works and builds
+the app on first access.
+"""
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
-from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 from app.core.config import settings
-from app.api.v1 import auth, personas, chat
-from app.core.logging import setup_logging
-
-setup_logging()
-
-app = FastAPI(
-    title=settings.PROJECT_NAME,
-    openapi_url=f"{settings.API_V1_STR}/openapi.json"
-)
-
-# CORS
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-# Mount Static Audio
-app.mount("/static", StaticFiles(directory="static"), name="static")
-
-# Routers
-app.include_router(auth.router, prefix=f"{settings.API_V1_STR}/auth", tags=["auth"])
-app.include_router(personas.router, prefix=f"{settings.API_V1_STR}/personas", tags=["personas"])
-app.include_router(chat.router, prefix=f"{settings.API_V1_STR}", tags=["chat"])
-
-@app.get("/")
-def root():
-    return {"message": "Welcome to Emotional Voice Chat API"}
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    from app.core.db import AsyncSessionLocal
+    from app.core.readiness import get_readiness
+    from app.services.jobs import get_job_runner
+    from app.services.audio_postprocess import shutdown_pool as shutdown_audio_pool
+    from app.services.persona_cache import listen_for_invalidations
+    from app.services.recovery import recover_stuck_messages
+    from app.services.traffic_recorder import get_traffic_recorder
+    from app.services.usage_rollup import get_usage_batcher
+
+    runner = get_job_runner()
+    if settings.RECOVERY_ON_STARTUP:
+        # Runs as a tracked job so it does not delay serving traffic
+        runner.submit(recover_stuck_messages, AsyncSessionLocal, runner)
+    warm_up = asyncio.create_task(get_readiness().warm_up(
+        AsyncSessionLocal, settings.STARTUP_SCHEMA_CHECK, settings.READINESS_RETRY_SECONDS
+    ))
+    invalidations = asyncio.create_task(listen_for_invalidations())
+    usage_batcher = get_usage_batcher()
+    usage_flusher = None
+    if settings.USAGE_FLUSH_SECONDS:
+        usage_flusher = asyncio.create_task(usage_batcher.run(AsyncSessionLocal, settings.USAGE_FLUSH_SECONDS))
+    yield
+    warm_up.cancel()
+    invalidations.cancel()
+    # Stop accepting pipeline jobs and let in-flight ones finish
+    await runner.drain(settings.SHUTDOWN_DRAIN_SECONDS)
+    if usage_flusher is not None:
+        usage_flusher.cancel()
+    # Drained turns have been counted; write what they left pending
+    await usage_batcher.flush(AsyncSessionLocal)
+    shutdown_audio_pool()
+    recorder = get_traffic_recorder()
+    if recorder is not None:
+        recorder.close()
+
+
+def create_app() -> FastAPI:
+    from fastapi.staticfiles import StaticFiles
+    from fastapi.middleware.cors import CORSMiddleware
+    from app.api.v1 import auth, personas, chat, realtime, admin
+    from app.core.config import log_env_source
+    from app.core.logging import setup_logging, RequestContextMiddleware
+    from app.core.metrics import registry
+    from app.core.readiness import get_readiness
+    from app.core.tracing import setup_tracing
+    from app.services.jobs import get_job_runner
+
+    setup_logging()
+    setup_tracing()
+    log_env_source()
+    readiness = get_readiness()
+
+    app = FastAPI(
+        title=settings.PROJECT_NAME,
+        lifespan=lifespan,
+        openapi_url=f"{settings.API_V1_STR}/openapi.json"
+    )
+
+    # CORS
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=["ETag"],
+    )
+
+    app.add_middleware(RequestContextMiddleware)
+
+    # Mount Static Audio
+    app.mount("/static", StaticFiles(directory="static"), name="static")
+
+    # Routers
+    app.include_router(auth.router, prefix=f"{settings.API_V1_STR}/auth", tags=["auth"])
+    app.include_router(personas.router, prefix=f"{settings.API_V1_STR}/personas", tags=["personas"])
+    app.include_router(chat.router, prefix=f"{settings.API_V1_STR}", tags=["chat"])
+    app.include_router(realtime.router, prefix=f"{settings.API_V1_STR}", tags=["realtime"])
+    app.include_router(admin.router, prefix=f"{settings.API_V1_STR}/admin", tags=["admin"])
+
+    @app.get("/")
+    def root():
+        return {"message": "Welcome to Emotional Voice Chat API"}
+
+    @app.get("/metrics", response_class=PlainTextResponse)
+    def metrics():
+        return registry.render()
+
+    @app.get("/health/live")
+    def live():
+        """The process is up and its event loop answers."""
+        return {"status": "alive", "uptime_seconds": readiness.report()["uptime_seconds"]}
+
+    @app.get("/health/ready")
+    def ready():
+        """200 once warm-up has passed; 503 while warming up or draining for shutdown."""
+        report = readiness.report()
+        if not get_job_runner().accepting:
+            report["status"] = "draining"
+        return JSONResponse(report, status_code=200 if report["status"] == "ready" else 503)
+
+    return app
+
+
+def __getattr__(name: str):
+    # `uvicorn app.main:app` keeps working; the module import alone stays cheap
+    if name == "app":
+        application = globals()["app"] = create_app()
+        return application
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,8 +1,8 @@
 from datetime import datetime
 from typing import Optional
-from sqlalchemy import String, Boolean, DateTime, ForeignKey, Text, JSON
+from sqlalchemy import String, Boolean, DateTime, ForeignKey, Text, JSON, UniqueConstraint
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy.sql import func
+from sqlalchemy.sql import false, func
 from app.core.db import Base
 
 class User(Base):
@@ -14,6 +14,8 @@ class User(Base):
     hashed_password: Mapped[str] = mapped_column(String(255))
     full_name: Mapped[Optional[str]] = mapped_column(String(100))
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
+    # Set out of band (create_admin.py), never through the API
+    is_admin: Mapped[bool] = mapped_column(Boolean, default=False, server_default=false())
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
 
     personas: Mapped[list["Persona"]] = relationship(back_populates="creator")
@@ -37,6 +39,9 @@ class Persona(Base):
     voice_file_path: Mapped[Optional[str]] = mapped_column(String(512)) # Absolute path from TTS service
     voice_id: Mapped[Optional[str]] = mapped_column(String(100)) # ID from IndexTTS
     voice_model_status: Mapped[str] = mapped_column(String(20), default="pending") # pending, ready, failed
+    # Pre-synthesized greeting/fallback clips in this voice:
+    # {"voice", "phrases": {key: {"text", "audio_url", "waveform"}}}
+    phrase_pack: Mapped[Optional[dict]] = mapped_column(JSON)
     
     # Compliance
     legal_confirmed: Mapped[bool] = mapped_column(Boolean, default=False)
@@ -55,6 +60,13 @@ class Conversation(Base):
     persona_id: Mapped[int] = mapped_column(ForeignKey("personas.id"))
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
     
+    # Rolling summary of turns older than the verbatim context window
+    summary: Mapped[Optional[str]] = mapped_column(Text)
+    summary_upto_id: Mapped[Optional[int]] = mapped_column() # Last message id folded into the summary
+    
+    # Bumped whenever one of its messages is added or changes; used as the history ETag
+    version: Mapped[int] = mapped_column(default=0, server_default="0")
+    
     user: Mapped["User"] = relationship(back_populates="conversations")
     persona: Mapped["Persona"] = relationship(back_populates="conversations")
     messages: Mapped[list["Message"]] = relationship(back_populates="conversation", cascade="all, delete-orphan")
@@ -72,6 +84,8 @@ class Message(Base):
     
     # Analysis / Metadata
     analysis: Mapped[Optional[dict]] = mapped_column(JSON) # {"emotion": "happy", "intent": "greeting"}
+    # Duration, sample rate and peak/RMS buckets of the audio, so clients can draw it without fetching
+    waveform: Mapped[Optional[dict]] = mapped_column(JSON)
     
     # Processing Status
     status: Mapped[str] = mapped_column(String(20), default="completed") # pending, processing, completed, failed
@@ -79,3 +93,56 @@ class Message(Base):
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
     
     conversation: Mapped["Conversation"] = relationship(back_populates="messages")
+
+
+class ArchivedMessage(Base):
+    """
+    Cold-tier copy of a message moved out of `messages` by the archiver
+    (same id). Keyed by conversation so MySQL can partition it by
+    conversation_id; no foreign keys, which partitioned tables do not support.
+    """
+    __tablename__ = "archived_messages"
+
+    conversation_id: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=False, index=True) # indexed for id-window scans
+
+    role: Mapped[str] = mapped_column(String(20))
+    content_text: Mapped[Optional[str]] = mapped_column(Text)
+    audio_url: Mapped[Optional[str]] = mapped_column(String(255)) # only for shared clips left in place (phrase packs)
+    analysis: Mapped[Optional[dict]] = mapped_column(JSON)
+    waveform: Mapped[Optional[dict]] = mapped_column(JSON)
+    status: Mapped[str] = mapped_column(String(20))
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+
+    # Audio moved into a compressed bundle: path under ARCHIVE_DIR and the member name inside it
+    audio_bundle: Mapped[Optional[str]] = mapped_column(String(255))
+    audio_member: Mapped[Optional[str]] = mapped_column(String(100))
+    archived_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+
+class UsageRollup(Base):
+    """Per-bucket usage counters for one user and persona; analytics read these instead of scanning messages."""
+    __tablename__ = "usage_rollups"
+    __table_args__ = (
+        UniqueConstraint("granularity", "bucket_start", "user_id", "persona_id", name="uq_usage_rollups_bucket"),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    granularity: Mapped[str] = mapped_column(String(8)) # hour, day
+    bucket_start: Mapped[datetime] = mapped_column(DateTime) # UTC, truncated to the granularity
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
+    persona_id: Mapped[int] = mapped_column(ForeignKey("personas.id"))
+
+    messages: Mapped[int] = mapped_column(default=0, server_default="0") # user turns
+    replies: Mapped[int] = mapped_column(default=0, server_default="0") # assistant replies delivered
+    stt_failures: Mapped[int] = mapped_column(default=0, server_default="0")
+    llm_failures: Mapped[int] = mapped_column(default=0, server_default="0")
+    tts_failures: Mapped[int] = mapped_column(default=0, server_default="0")
+    failures: Mapped[int] = mapped_column(default=0, server_default="0") # pipeline runs that errored out
+    latency_ms_sum: Mapped[int] = mapped_column(default=0, server_default="0")
+    latency_count: Mapped[int] = mapped_column(default=0, server_default="0")
+    # Upstream usage (app.services.usage_meter)
+    llm_tokens_in: Mapped[int] = mapped_column(default=0, server_default="0")
+    llm_tokens_out: Mapped[int] = mapped_column(default=0, server_default="0")
+    stt_audio_ms: Mapped[int] = mapped_column(default=0, server_default="0")
+    tts_chars: Mapped[int] = mapped_column(default=0, server_default="0")
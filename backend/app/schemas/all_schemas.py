@@ -54,10 +54,43 @@ class MessageResponse(MessageBase):
     id: int
     audio_url: Optional[str] = None
     analysis: Optional[Dict] = None
+    waveform: Optional[Dict] = None
     status: str
     created_at: datetime
+    archived: bool = False # served from the cold tier
     model_config = ConfigDict(from_attributes=True)
 
 class ChatResponse(BaseModel):
     user_message: MessageResponse
     assistant_message: MessageResponse
+
+# Analytics Schemas (read from the usage rollups)
+class UsageBucket(BaseModel):
+    bucket_start: datetime
+    active_users: int
+    messages: int
+    replies: int
+    stt_failure_rate: float
+    llm_failure_rate: float
+    tts_failure_rate: float
+    failure_rate: float
+    avg_reply_latency_ms: Optional[float] = None
+
+class PersonaUsage(BaseModel):
+    persona_id: int
+    persona_name: str
+    active_users: int
+    messages: int
+    replies: int
+
+class UpstreamUsage(BaseModel):
+    # Per user, or per conversation (user x persona) when persona_id is set
+    user_id: int
+    username: str
+    persona_id: Optional[int] = None
+    persona_name: Optional[str] = None
+    messages: int
+    llm_tokens_in: int
+    llm_tokens_out: int
+    stt_seconds: float
+    tts_chars: int
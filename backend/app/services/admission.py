@@ -0,0 +1,100 @@
+import logging
+import math
+from dataclasses import dataclass
+from typing import Optional
+
+from app.core.config import settings
+from app.core.metrics import registry
+from app.services.jobs import JobRunner
+from app.services.scheduler import PipelineScheduler
+
+logger = logging.getLogger(__name__)
+
+ACCEPT = "accept"
+TEXT_ONLY = "text_only"
+REJECT = "reject"
+
+admission_decisions = registry.counter(
+    "admission_decisions_total", "Send admission decisions (accept/text_only/reject)"
+)
+shed_requests = registry.counter("admission_shed_total", "Sends shed under load, by action and reason")
+estimated_delay = registry.gauge(
+    "admission_estimated_delay_seconds", "Expected pipeline time for a new send, per stage"
+)
+
+
+@dataclass
+class Admission:
+    decision: str
+    reason: Optional[str] = None
+    retry_after: int = 0
+
+
+class AdmissionController:
+    """
+    Decides whether a new voice send can be answered in reasonable time,
+    from the pipeline jobs already in flight and each stage's expected
+    time (recent call latency times its queue; see
+    PipelineScheduler.stage_estimate).
+
+    - more than `max_pending_jobs` jobs, or an expected total above
+      `reject_delay`: reject, with Retry-After
+    - expected TTS time above `text_only_delay`: accept, but reply with
+      text only so the job never waits on the TTS queue
+    """
+
+    def __init__(self, max_pending_jobs: int, reject_delay: float, text_only_delay: float, enabled: bool = True):
+        self.max_pending_jobs = max_pending_jobs
+        self.reject_delay = reject_delay
+        self.text_only_delay = text_only_delay
+        self.enabled = enabled
+
+    @classmethod
+    def from_settings(cls) -> "AdmissionController":
+        return cls(
+            max_pending_jobs=settings.ADMISSION_MAX_PENDING_JOBS,
+            reject_delay=settings.ADMISSION_REJECT_DELAY_SECONDS,
+            text_only_delay=settings.ADMISSION_TEXT_ONLY_DELAY_SECONDS,
+            enabled=settings.ADMISSION_ENABLED,
+        )
+
+    def decide(self, scheduler: PipelineScheduler, runner: JobRunner) -> Admission:
+        if not self.enabled:
+            return Admission(ACCEPT)
+
+        stages = {upstream: scheduler.stage_estimate(upstream) for upstream in scheduler.upstreams()}
+        for upstream, seconds in stages.items():
+            estimated_delay.set(seconds, stage=upstream)
+        total = sum(stages.values())
+
+        if runner.in_flight() >= self.max_pending_jobs:
+            admission = Admission(REJECT, "pending_jobs", self._retry_after(total))
+        elif total > self.reject_delay:
+            admission = Admission(REJECT, "delay", self._retry_after(total))
+        elif stages.get("tts", 0.0) > self.text_only_delay:
+            admission = Admission(TEXT_ONLY, "tts_delay")
+        else:
+            admission = Admission(ACCEPT)
+
+        admission_decisions.inc(decision=admission.decision)
+        if admission.decision != ACCEPT:
+            shed_requests.inc(action=admission.decision, reason=admission.reason)
+            logger.warning(
+                "Admission: %s (%s; %d jobs in flight, expected %.1fs)",
+                admission.decision, admission.reason, runner.in_flight(), total
+            )
+        return admission
+
+    def _retry_after(self, total: float) -> int:
+        # Roughly when the backlog ahead should have cleared, within sane bounds
+        return int(min(max(math.ceil(total - self.reject_delay), 1), 60))
+
+
+_controller: Optional[AdmissionController] = None
+
+
+def get_admission_controller() -> AdmissionController:
+    global _controller
+    if _controller is None:
+        _controller = AdmissionController.from_settings()
+    return _controller
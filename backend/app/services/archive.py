@@ -0,0 +1,255 @@
+"""
+Cold tier for old conversation history.
+
+The archiver moves messages older than ARCHIVE_AFTER_DAYS out of
+`messages` into `archived_messages`, and their audio out of
+`static/audio` into one compressed bundle (a zip of Opus clips) per
+conversation per batch under ARCHIVE_DIR. Only turns already folded
+into the conversation summary are moved, so building the LLM context
+never needs the cold tier.
+
+Reads page into the archive once the hot rows run out; archived clips are
+unpacked into a restore cache on first playback.
+"""
+import asyncio
+import contextlib
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import delete, select
+
+from app.core.config import settings
+from app.core.metrics import registry
+from app.models.all_models import ArchivedMessage, Conversation, Message
+from app.schemas.all_schemas import MessageResponse
+from app.services.conversation_version import bump_versions
+from app.services.phrase_pack import PHRASE_DIR
+from app.services.recovery import audio_path_from_url
+
+logger = logging.getLogger(__name__)
+
+RESTORE_DIR = "static/audio/restored"
+
+archived_messages = registry.counter("archive_messages_total", "Messages moved to the cold tier")
+archived_audio_bytes = registry.counter("archive_audio_bytes_total", "Audio bytes archived, by stage (original/stored)")
+restored_clips = registry.counter("archive_audio_restored_total", "Archived clips unpacked for playback")
+
+
+def _is_shared(audio_url: Optional[str]) -> bool:
+    # Phrase-pack clips are referenced by many messages and owned by the persona
+    return bool(audio_url) and audio_url.startswith(f"/{PHRASE_DIR}/")
+
+
+async def _encode_opus(src: str, dst: str) -> bool:
+    ffmpeg = shutil.which(settings.ARCHIVE_FFMPEG)
+    if ffmpeg is None:
+        return False
+    proc = await asyncio.create_subprocess_exec(
+        ffmpeg, "-nostdin", "-loglevel", "error", "-y", "-i", src,
+        "-c:a", "libopus", "-b:a", settings.ARCHIVE_OPUS_BITRATE, "-application", "voip", dst,
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    _, err = await proc.communicate()
+    if proc.returncode != 0:
+        logger.warning("Opus encode failed for %s: %s", src, err.decode(errors="replace").strip()[:200])
+        return False
+    return True
+
+
+def _zip(bundle_path: str, members: List[tuple]):
+    tmp_path = f"{bundle_path}.tmp"
+    with zipfile.ZipFile(tmp_path, "w") as bundle:
+        for source, name, compression in members:
+            bundle.write(source, name, compress_type=compression)
+    os.replace(tmp_path, bundle_path)
+
+
+async def write_bundle(conversation_id: int, messages: List[Message]) -> Dict[int, tuple]:
+    """
+    Packs the audio of `messages` into one bundle; returns
+    {message_id: (bundle, member)} for the clips it holds. Clips are
+    re-encoded to Opus when ffmpeg is available (ARCHIVE_AUDIO_CODEC=opus),
+    otherwise stored as they are, deflated. Missing and shared files are
+    left out.
+    """
+    sources = {}
+    for msg in messages:
+        path = audio_path_from_url(msg.audio_url)
+        if path and not _is_shared(msg.audio_url) and os.path.exists(path):
+            sources[msg.id] = path
+    if not sources:
+        return {}
+
+    relative = os.path.join(str(conversation_id), f"{min(sources)}-{max(sources)}.zip")
+    bundle_path = os.path.join(settings.ARCHIVE_DIR, relative)
+    os.makedirs(os.path.dirname(bundle_path), exist_ok=True)
+    members, bundled = [], {}
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(bundle_path)) as workdir:
+        for message_id, path in sources.items():
+            archived_audio_bytes.inc(os.path.getsize(path), stage="original")
+            encoded = os.path.join(workdir, f"{message_id}.ogg")
+            if settings.ARCHIVE_AUDIO_CODEC == "opus" and await _encode_opus(path, encoded):
+                member = (encoded, f"{message_id}.ogg", zipfile.ZIP_STORED)
+            else:
+                member = (path, f"{message_id}{os.path.splitext(path)[1]}", zipfile.ZIP_DEFLATED)
+            members.append(member)
+            bundled[message_id] = (relative, member[1])
+        await asyncio.to_thread(_zip, bundle_path, members)
+    archived_audio_bytes.inc(os.path.getsize(bundle_path), stage="stored")
+    return bundled
+
+
+def _archived_copy(msg: Message, bundle: Optional[tuple]) -> ArchivedMessage:
+    return ArchivedMessage(
+        conversation_id=msg.conversation_id,
+        id=msg.id,
+        role=msg.role,
+        content_text=msg.content_text,
+        audio_url=msg.audio_url if _is_shared(msg.audio_url) else None,
+        analysis=msg.analysis,
+        waveform=msg.waveform,
+        status=msg.status,
+        created_at=msg.created_at,
+        audio_bundle=bundle[0] if bundle else None,
+        audio_member=bundle[1] if bundle else None,
+    )
+
+
+async def archive_old_messages(
+    db_session_factory,
+    older_than_days: Optional[int] = None,
+    batch_size: Optional[int] = None,
+    max_batches: Optional[int] = None,
+) -> Dict[str, int]:
+    """
+    Moves finished messages older than `older_than_days` (and covered by
+    their conversation's summary) to the cold tier, `batch_size` messages
+    per transaction in id order, so each statement touches a bounded
+    slice of `messages`. Bundles are written before the rows move and the
+    original files are deleted only after the commit, so an interrupted
+    run loses nothing; at worst it leaves a stray bundle or file.
+    """
+    older_than_days = settings.ARCHIVE_AFTER_DAYS if older_than_days is None else older_than_days
+    batch_size = batch_size or settings.ARCHIVE_BATCH_SIZE
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+
+    stats = {"messages": 0, "audio_files": 0, "batches": 0}
+    last_id = 0
+    while max_batches is None or stats["batches"] < max_batches:
+        async with db_session_factory() as db:
+            stmt = (
+                select(Message)
+                .join(Conversation, Message.conversation_id == Conversation.id)
+                .where(
+                    Message.id > last_id,
+                    Message.created_at < cutoff,
+                    Message.status.in_(("completed", "failed")),
+                    Message.id <= Conversation.summary_upto_id,
+                )
+                .order_by(Message.id)
+                .limit(batch_size)
+            )
+            batch = (await db.execute(stmt)).scalars().all()
+            if not batch:
+                break
+            last_id = batch[-1].id
+
+            by_conversation = defaultdict(list)
+            for msg in batch:
+                by_conversation[msg.conversation_id].append(msg)
+            bundled = {}
+            for conversation_id, messages in by_conversation.items():
+                bundled.update(await write_bundle(conversation_id, messages))
+
+            db.add_all(_archived_copy(msg, bundled.get(msg.id)) for msg in batch)
+            await db.execute(delete(Message).where(Message.id.in_([msg.id for msg in batch])))
+            # Cached history pages still point at the files about to be removed
+            await bump_versions(db, by_conversation)
+            await db.commit()
+
+        for msg in batch:
+            if msg.id in bundled:
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(audio_path_from_url(msg.audio_url))
+        archived_messages.inc(len(batch))
+        stats["messages"] += len(batch)
+        stats["audio_files"] += len(bundled)
+        stats["batches"] += 1
+
+    stats["restored_pruned"] = await asyncio.to_thread(prune_restored)
+    if stats["messages"]:
+        logger.info(
+            "Archived %s messages (%s audio files) in %s batches",
+            stats["messages"], stats["audio_files"], stats["batches"],
+        )
+    return stats
+
+
+def prune_restored(max_age_days: Optional[float] = None) -> int:
+    """Deletes unpacked clips nobody has played for `max_age_days`."""
+    max_age_days = settings.ARCHIVE_RESTORE_TTL_DAYS if max_age_days is None else max_age_days
+    cutoff = time.time() - max_age_days * 86400
+    removed = 0
+    for root, _, files in os.walk(RESTORE_DIR):
+        for name in files:
+            path = os.path.join(root, name)
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+    return removed
+
+
+def _extract(bundle: str, member: str, dest: str) -> bool:
+    """Unpacks `member` to `dest` unless it is there already; True if it was unpacked."""
+    if os.path.exists(dest):
+        os.utime(dest)  # keeps it out of the next prune
+        return False
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    # Per thread, so two pages restoring the same clip do not write into one file
+    tmp_path = f"{dest}.{threading.get_ident()}.tmp"
+    with zipfile.ZipFile(os.path.join(settings.ARCHIVE_DIR, bundle)) as archive, archive.open(member) as src:
+        with open(tmp_path, "wb") as out:
+            shutil.copyfileobj(src, out)
+    os.replace(tmp_path, dest)
+    return True
+
+
+async def restore_audio(msg: ArchivedMessage) -> Optional[str]:
+    """Public URL for an archived message's audio, unpacking it on first use; None if it is gone."""
+    if msg.audio_member is None:
+        return msg.audio_url
+    dest = os.path.join(RESTORE_DIR, str(msg.conversation_id), msg.audio_member)
+    try:
+        # Every file operation runs in a worker thread: this is on the history request path
+        if await asyncio.to_thread(_extract, msg.audio_bundle, msg.audio_member, dest):
+            restored_clips.inc()
+    except (OSError, KeyError, zipfile.BadZipFile) as e:
+        logger.warning("Could not restore %s from %s (%s)", msg.audio_member, msg.audio_bundle, e)
+        return None
+    return f"/{dest}"
+
+
+async def archived_page(db, conversation_id: int, before_id: Optional[int], limit: int) -> List[MessageResponse]:
+    """Up to `limit` archived messages older than `before_id`, oldest first, with playable audio URLs."""
+    stmt = select(ArchivedMessage).where(ArchivedMessage.conversation_id == conversation_id)
+    if before_id is not None:
+        stmt = stmt.where(ArchivedMessage.id < before_id)
+    rows = (await db.execute(stmt.order_by(ArchivedMessage.id.desc()).limit(limit))).scalars().all()
+    rows = list(reversed(rows))
+    audio_urls = await asyncio.gather(*(restore_audio(row) for row in rows))
+    page = []
+    for row, audio_url in zip(rows, audio_urls):
+        response = MessageResponse.model_validate(row)
+        response.audio_url = audio_url
+        response.archived = True
+        page.append(response)
+    return page
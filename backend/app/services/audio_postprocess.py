@@ -0,0 +1,251 @@
+"""
+Conforms synthesized speech before it is stored or streamed: one sample
+rate, one loudness, no dead air at either end.
+
+The DSP functions are plain NumPy on (memory-mapped) arrays and run in a
+process pool, so a burst of long replies does not hold the GIL the event
+loop needs.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+import wave
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing
+from typing import Optional
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.metrics import registry
+from app.services.wav import open_pcm
+
+logger = logging.getLogger(__name__)
+
+postprocess_seconds = registry.summary("audio_postprocess_seconds", "Wall time to conform one TTS clip")
+postprocess_gain = registry.summary("audio_postprocess_gain_db", "Gain applied to reach the target loudness")
+postprocess_failures = registry.counter("audio_postprocess_failures_total", "TTS clips left as synthesized")
+
+_BLOCK_S, _STEP_S = 0.4, 0.1  # BS.1770 gating blocks: 400 ms, 75% overlap
+_ABSOLUTE_GATE_LUFS = -70.0
+_RELATIVE_GATE_LU = -10.0
+_PEAK_CEILING_DB = -1.0
+_SILENCE_LUFS = -120.0
+
+
+def _biquad_magnitude(b, a, w: np.ndarray) -> np.ndarray:
+    z = np.exp(-1j * w)
+    return np.abs((b[0] + b[1] * z + b[2] * z * z) / (a[0] + a[1] * z + a[2] * z * z))
+
+
+def k_weighting(freqs: np.ndarray, rate: int) -> np.ndarray:
+    """
+    Magnitude response of the BS.1770 K-weighting pre-filter (a +4 dB
+    high shelf around 1.5 kHz and a 38 Hz high-pass), evaluated at `freqs`.
+    Applied in the frequency domain; loudness only depends on the magnitude.
+    """
+    w = 2 * np.pi * freqs / rate
+    # High shelf, +4 dB (RBJ cookbook, Q = 1/sqrt(2))
+    gain = 10 ** (4.0 / 40)
+    w0 = 2 * np.pi * 1500.0 / rate
+    alpha = np.sin(w0) / 2 * np.sqrt(2)
+    cos_w0, sqrt_a = np.cos(w0), np.sqrt(gain)
+    shelf_b = [
+        gain * ((gain + 1) + (gain - 1) * cos_w0 + 2 * sqrt_a * alpha),
+        -2 * gain * ((gain - 1) + (gain + 1) * cos_w0),
+        gain * ((gain + 1) + (gain - 1) * cos_w0 - 2 * sqrt_a * alpha),
+    ]
+    shelf_a = [
+        (gain + 1) - (gain - 1) * cos_w0 + 2 * sqrt_a * alpha,
+        2 * ((gain - 1) - (gain + 1) * cos_w0),
+        (gain + 1) - (gain - 1) * cos_w0 - 2 * sqrt_a * alpha,
+    ]
+    # High-pass
+    w0 = 2 * np.pi * 38.0 / rate
+    alpha, cos_w0 = np.sin(w0) / (2 * 0.5), np.cos(w0)
+    hp_b = [(1 + cos_w0) / 2, -(1 + cos_w0), (1 + cos_w0) / 2]
+    hp_a = [1 + alpha, -2 * cos_w0, 1 - alpha]
+    return _biquad_magnitude(shelf_b, shelf_a, w) * _biquad_magnitude(hp_b, hp_a, w)
+
+
+def integrated_loudness(mono: np.ndarray, rate: int) -> float:
+    """Gated integrated loudness (LUFS) of a mono float signal in -1..1."""
+    if mono.size == 0:
+        return _SILENCE_LUFS
+    spectrum = np.fft.rfft(mono)
+    spectrum *= k_weighting(np.fft.rfftfreq(mono.size, 1 / rate), rate)
+    weighted = np.fft.irfft(spectrum, mono.size)
+
+    block, step = int(_BLOCK_S * rate), int(_STEP_S * rate)
+    energy = np.concatenate(([0.0], np.cumsum(weighted.astype(np.float64) ** 2)))
+    if mono.size <= block:
+        powers = np.array([energy[-1] / mono.size])
+    else:
+        starts = np.arange(0, mono.size - block + 1, step)
+        powers = (energy[starts + block] - energy[starts]) / block
+
+    with np.errstate(divide="ignore"):
+        loudness = -0.691 + 10 * np.log10(powers)
+    gated = powers[loudness > _ABSOLUTE_GATE_LUFS]
+    if gated.size == 0:
+        return _SILENCE_LUFS
+    relative = -0.691 + 10 * np.log10(gated.mean()) + _RELATIVE_GATE_LU
+    gated = gated[-0.691 + 10 * np.log10(gated) > relative]
+    return float(-0.691 + 10 * np.log10(gated.mean()))
+
+
+def speech_bounds(pcm, threshold_db: float, keep_ms: float, window_ms: float = 10.0):
+    """
+    First and last frame worth keeping: windows whose peak is above
+    `threshold_db` (dBFS), widened by `keep_ms` so word onsets and decays
+    survive. Reads the memory map a chunk of windows at a time.
+    """
+    window = max(1, int(pcm.sample_rate * window_ms / 1000))
+    windows = pcm.frames // window
+    if windows == 0:
+        return 0, pcm.frames
+    threshold = 10 ** (threshold_db / 20)
+    rows_per_chunk = max(1, (1 << 18) // window)
+    loud = np.empty(windows, dtype=bool)
+    for row in range(0, windows, rows_per_chunk):
+        rows = min(rows_per_chunk, windows - row)
+        block = np.abs(pcm.normalized(row * window, (row + rows) * window))
+        loud[row:row + rows] = block.reshape(rows, window, -1).max(axis=(1, 2)) > threshold
+    voiced = np.flatnonzero(loud)
+    if voiced.size == 0:
+        # Nothing above the threshold: leave the length alone rather than emit an empty clip
+        return 0, pcm.frames
+    keep = int(pcm.sample_rate * keep_ms / 1000)
+    start = max(0, voiced[0] * window - keep)
+    stop = min(pcm.frames, (voiced[-1] + 1) * window + keep)
+    return start, stop
+
+
+def resample(mono: np.ndarray, rate: int, target_rate: int) -> np.ndarray:
+    """Band-limited resampling by truncating or zero-padding the spectrum."""
+    if rate == target_rate or mono.size == 0:
+        return mono
+    length = max(1, int(round(mono.size * target_rate / rate)))
+    spectrum = np.fft.rfft(mono)
+    bins = length // 2 + 1
+    if bins <= spectrum.size:
+        spectrum = spectrum[:bins]
+    else:
+        spectrum = np.concatenate((spectrum, np.zeros(bins - spectrum.size, dtype=spectrum.dtype)))
+    return np.fft.irfft(spectrum, length) * (length / mono.size)
+
+
+def conform_wav(
+    path: str,
+    target_rate: int,
+    target_lufs: float,
+    trim_db: float,
+    keep_ms: float = 120.0,
+    max_gain_db: float = 20.0,
+) -> Optional[dict]:
+    """
+    Rewrites `path` in place as 16-bit mono PCM at `target_rate`, trimmed
+    and gained to `target_lufs` (limited by `max_gain_db` and a -1 dBFS
+    peak ceiling). Returns what was done, or None if the file is not
+    uncompressed WAV and was left alone. Blocking; meant for the pool.
+    """
+    cpu_started = time.process_time()
+    pcm = open_pcm(path)
+    if pcm is None:
+        return None
+    duration_in, rate_in = pcm.duration, pcm.sample_rate
+
+    start, stop = speech_bounds(pcm, trim_db, keep_ms)
+    mono = pcm.normalized(start, stop).mean(axis=1)
+    del pcm  # release the map before the file is replaced
+
+    mono = resample(mono, rate_in, target_rate)
+    loudness = integrated_loudness(mono, target_rate)
+    gain_db = 0.0
+    if loudness > _SILENCE_LUFS:
+        gain_db = min(target_lufs - loudness, max_gain_db)
+        peak = float(np.abs(mono).max())
+        if peak > 0:
+            gain_db = min(gain_db, _PEAK_CEILING_DB - 20 * np.log10(peak))
+        mono = mono * (10 ** (gain_db / 20))
+
+    samples = np.clip(np.rint(mono * 32767), -32768, 32767).astype("<i2")
+    tmp_path = f"{path}.conform.tmp"
+    with closing(wave.open(tmp_path, "wb")) as out:
+        out.setnchannels(1)
+        out.setsampwidth(2)
+        out.setframerate(target_rate)
+        out.writeframes(samples.tobytes())
+    os.replace(tmp_path, path)
+
+    return {
+        "duration_in": round(duration_in, 3),
+        "duration_out": round(samples.size / target_rate, 3),
+        "rate_in": rate_in,
+        "loudness_in": round(loudness, 2),
+        "gain_db": round(float(gain_db), 2),
+        "cpu_seconds": time.process_time() - cpu_started,
+    }
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _get_pool() -> Optional[ProcessPoolExecutor]:
+    global _pool
+    if settings.AUDIO_POSTPROCESS_WORKERS <= 0:
+        return None
+    if _pool is None:
+        # spawn: forking a process that runs an event loop and open sockets is asking for trouble
+        _pool = ProcessPoolExecutor(
+            max_workers=settings.AUDIO_POSTPROCESS_WORKERS, mp_context=multiprocessing.get_context("spawn")
+        )
+    return _pool
+
+
+def shutdown_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=True, cancel_futures=True)
+        _pool = None
+
+
+def _is_wav(path: str) -> bool:
+    # Checked here so other formats never cost a trip to the pool
+    with open(path, "rb") as f:
+        header = f.read(12)
+    return header[:4] == b"RIFF" and header[8:12] == b"WAVE"
+
+
+async def postprocess_tts_output(path: str) -> Optional[dict]:
+    """
+    Conforms a freshly synthesized clip (see conform_wav) in the process
+    pool, or a thread if AUDIO_POSTPROCESS_WORKERS is 0. On any failure the
+    clip is kept as synthesized; a reply with odd loudness beats none.
+    """
+    if not settings.AUDIO_POSTPROCESS_ENABLED or not _is_wav(path):
+        return None
+    args = (
+        path,
+        settings.AUDIO_SAMPLE_RATE,
+        settings.AUDIO_TARGET_LUFS,
+        settings.AUDIO_TRIM_THRESHOLD_DB,
+    )
+    started = time.perf_counter()
+    try:
+        pool = _get_pool()
+        if pool is None:
+            result = await asyncio.to_thread(conform_wav, *args)
+        else:
+            result = await asyncio.get_running_loop().run_in_executor(pool, conform_wav, *args)
+    except Exception as e:
+        postprocess_failures.inc()
+        logger.warning("Audio post-processing failed for %s (%s: %s)", path, type(e).__name__, e)
+        return None
+    finally:
+        postprocess_seconds.observe(time.perf_counter() - started)
+    if result is not None:
+        postprocess_gain.observe(result["gain_db"])
+    return result
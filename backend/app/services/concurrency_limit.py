@@ -0,0 +1,99 @@
+"""
+Concurrency limits for the scheduler's upstream lanes.
+
+A lane asks its limit how many calls may be in flight, and reports every
+finished call back: how long it took, how many calls were in flight when
+it started, and whether it failed. FixedLimit ignores the samples; the
+adaptive limits move between min_limit and max_limit, after the limit
+algorithms of Netflix's concurrency-limits:
+
+    aimd      one more slot per round of calls that fills at least half
+              the limit; halved (`backoff`, as TCP does) on an error or a
+              call slower than `slow_seconds`
+    gradient  compares the recent call time with the best recent pace;
+              shrinks as calls slow down (a GPU host thrashing), grows by
+              a slot or so while they keep it
+
+Limits are floats; the lane uses int(limit), at least 1.
+"""
+from typing import Optional
+
+
+class FixedLimit:
+    def __init__(self, initial: int):
+        self.limit = float(max(1, initial))
+
+    def update(self, rtt: float, in_flight: int, dropped: bool) -> None:
+        pass
+
+
+class AIMDLimit:
+    def __init__(self, initial: int, min_limit: int = 1, max_limit: int = 32, backoff: float = 0.5,
+                 slow_seconds: float = 10.0):
+        self.limit = float(min(max(initial, min_limit), max_limit))
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.slow_seconds = slow_seconds
+
+    def update(self, rtt: float, in_flight: int, dropped: bool) -> None:
+        if dropped or rtt > self.slow_seconds:
+            self.limit = max(self.min_limit, self.limit * self.backoff)
+        elif in_flight * 2 >= self.limit:
+            # +1 per `limit` samples: one slot per round of calls, as TCP congestion avoidance does
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+
+class GradientLimit:
+    """
+    new limit = limit x clamp(tolerance x baseline_rtt / short_rtt, 0.5, 1) + 1,
+    smoothed. short_rtt is a moving average of call time over about
+    `short_window` calls; baseline_rtt follows it down at once but rises
+    at most 2x per `long_window` calls, enough to track replies getting
+    longer but not a limit's own slowdown. The one slot of headroom lets
+    the limit probe upwards; concurrency-limits' sqrt(limit) would keep a
+    single-GPU host at 4 or more calls.
+    """
+
+    def __init__(self, initial: int, min_limit: int = 1, max_limit: int = 32, smoothing: float = 0.2,
+                 tolerance: float = 1.5, long_window: int = 500, short_window: int = 5, backoff: float = 0.9):
+        self.limit = float(min(max(initial, min_limit), max_limit))
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.smoothing = smoothing
+        self.tolerance = tolerance
+        self.backoff = backoff
+        self._drift = 2 ** (1 / long_window)
+        self._short_alpha = 2 / (short_window + 1)
+        self.baseline_rtt: Optional[float] = None
+        self.short_rtt: Optional[float] = None
+
+    def update(self, rtt: float, in_flight: int, dropped: bool) -> None:
+        rtt = max(rtt, 1e-6)
+        if self.baseline_rtt is None:
+            self.baseline_rtt = self.short_rtt = rtt
+        else:
+            self.short_rtt += self._short_alpha * (rtt - self.short_rtt)
+            self.baseline_rtt = min(self.short_rtt, self.baseline_rtt * self._drift)
+
+        if dropped:
+            self.limit = max(self.min_limit, self.limit * self.backoff)
+            return
+        if in_flight < self.limit / 2:
+            # The limit was not what held calls back, so call times say nothing about it
+            return
+        gradient = max(0.5, min(1.0, self.tolerance * self.baseline_rtt / self.short_rtt))
+        target = self.limit * gradient + 1
+        self.limit = (1 - self.smoothing) * self.limit + self.smoothing * target
+        self.limit = max(self.min_limit, min(self.max_limit, self.limit))
+
+
+def build_limit(algorithm: str, initial: int, max_limit: int, slow_seconds: float = 10.0):
+    """The limit named in PIPELINE_LIMIT_ALGORITHMS ("fixed", "aimd" or "gradient")."""
+    if algorithm == "aimd":
+        return AIMDLimit(initial, max_limit=max_limit, slow_seconds=slow_seconds)
+    if algorithm == "gradient":
+        return GradientLimit(initial, max_limit=max_limit)
+    if algorithm == "fixed":
+        return FixedLimit(initial)
+    raise ValueError(f"Unknown concurrency limit algorithm: {algorithm}")
@@ -0,0 +1,231 @@
+import logging
+from dataclasses import dataclass, field
+from typing import List, Optional, Set
+
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.metrics import registry
+from app.models.all_models import Conversation, Message
+from app.services.llm_service import FALLBACK_RESPONSE
+
+logger = logging.getLogger(__name__)
+
+prompt_tokens = registry.histogram(
+    "llm_prompt_tokens",
+    "Estimated prompt size sent to the LLM (system prompt + summary + history + user text)",
+    buckets=(250, 500, 1000, 1500, 2000, 3000, 4000, 8000),
+)
+summary_refreshes = registry.counter("conversation_summary_refreshes_total", "Rolling summary updates")
+
+SUMMARY_PROMPT = """
+You maintain a running memory of a conversation between a user and {persona_name}.
+Merge the previous summary with the new turns into one updated summary.
+Keep names, relationships, events, dates, feelings and promises; drop small talk.
+Write it from {persona_name}'s point of view in at most {max_tokens} tokens.
+Reply in JSON format:
+{{
+    "tone": "neutral",
+    "content": "the_updated_summary"
+}}
+"""
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """
+    Cheap token estimate without a tokenizer: CJK characters count as one
+    token each, everything else as roughly four characters per token.
+    """
+    if not text:
+        return 0
+    cjk = sum(1 for ch in text if "\u3000" <= ch <= "\u9fff" or "\uac00" <= ch <= "\ud7af")
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def _clip_to_tokens(text: str, max_tokens: int) -> str:
+    """Hard cap so a verbose summarizer cannot make every later prompt grow."""
+    tokens = estimate_tokens(text)
+    if tokens <= max_tokens:
+        return text
+    return text[: max(1, len(text) * max_tokens // tokens)]
+
+
+@dataclass
+class ConversationContext:
+    history: List[dict] = field(default_factory=list)
+    prompt_tokens: int = 0
+    needs_summary: bool = False
+    # Id of the oldest turn sent verbatim; long-term memory only recalls older messages
+    oldest_turn_id: Optional[int] = None
+
+    def add_memories(self, snippets: List[str], token_budget: Optional[int] = None) -> int:
+        """
+        Adds recalled messages as a system note after the summary, within
+        their own token budget. Returns how many snippets were kept.
+        """
+        token_budget = token_budget or settings.MEMORY_TOKEN_BUDGET
+        kept, used = [], 0
+        for snippet in snippets:
+            cost = estimate_tokens(snippet)
+            if used + cost > token_budget:
+                break
+            kept.append(snippet)
+            used += cost
+        if not kept:
+            return 0
+        note = {
+            "role": "system",
+            "content": "Things the user told you in earlier conversations:\n" + "\n".join(f"- {s}" for s in kept),
+        }
+        position = 1 if self.history and self.history[0]["role"] == "system" else 0
+        self.history.insert(position, note)
+        self.prompt_tokens += estimate_tokens(note["content"])
+        return len(kept)
+
+
+def _as_chat_message(msg: Message) -> dict:
+    return {"role": "assistant" if msg.role == "assistant" else "user", "content": msg.content_text}
+
+
+async def build_context(
+    db: AsyncSession,
+    conversation: Conversation,
+    current_msg_id: int,
+    system_prompt: str,
+    user_text: str,
+    max_turns: Optional[int] = None,
+    token_budget: Optional[int] = None,
+) -> ConversationContext:
+    """
+    Chat history for the next reply: the rolling summary (if any) followed
+    by the most recent turns verbatim, newest first until either `max_turns`
+    or the token budget is used up. Only turns newer than the summary are
+    read, so the cost of this query does not grow with the conversation.
+    """
+    max_turns = max_turns or settings.CONTEXT_MAX_TURNS
+    token_budget = token_budget or settings.CONTEXT_TOKEN_BUDGET
+    upto = conversation.summary_upto_id or 0
+
+    stmt = (
+        select(Message)
+        .where(
+            Message.conversation_id == conversation.id,
+            Message.id > upto,
+            Message.id < current_msg_id,
+            Message.status == "completed",
+            Message.content_text.is_not(None),
+        )
+        .order_by(Message.id.desc())
+        .limit(max_turns + settings.CONTEXT_SUMMARY_EVERY)
+    )
+    candidates = (await db.execute(stmt)).scalars().all()
+
+    used = estimate_tokens(system_prompt) + estimate_tokens(user_text)
+    summary_message = None
+    if conversation.summary:
+        summary_message = {
+            "role": "system",
+            "content": f"Summary of your earlier conversation with the user: {conversation.summary}",
+        }
+        used += estimate_tokens(summary_message["content"])
+
+    turns: List[dict] = []
+    oldest_turn_id = None
+    for msg in candidates[:max_turns]:
+        cost = estimate_tokens(msg.content_text)
+        if used + cost > token_budget:
+            break
+        turns.append(_as_chat_message(msg))
+        oldest_turn_id = msg.id
+        used += cost
+    turns.reverse()
+
+    history = ([summary_message] if summary_message else []) + turns
+    # Turns that fell out of the verbatim window are only remembered once folded into the summary
+    unsummarized_overflow = len(candidates) - len(turns)
+    return ConversationContext(
+        history=history,
+        prompt_tokens=used,
+        needs_summary=unsummarized_overflow >= settings.CONTEXT_SUMMARY_EVERY,
+        oldest_turn_id=oldest_turn_id or current_msg_id,
+    )
+
+
+_refreshing: Set[int] = set()
+
+
+async def refresh_summary(conversation_id: int, db_session_factory, llm, persona_name: str) -> bool:
+    """
+    Folds turns that left the verbatim window into the conversation summary.
+    Incremental: only messages after `summary_upto_id` are read, and the
+    newest CONTEXT_MAX_TURNS are left for the verbatim window. Meant to run
+    as a low-priority background job, never on the request path.
+    """
+    if conversation_id in _refreshing:
+        return False
+    _refreshing.add(conversation_id)
+    try:
+        async with db_session_factory() as db:
+            conversation = (
+                await db.execute(select(Conversation).where(Conversation.id == conversation_id))
+            ).scalar_one()
+            upto = conversation.summary_upto_id or 0
+            previous = conversation.summary
+
+            newer = (
+                await db.execute(
+                    select(func.count(Message.id)).where(
+                        Message.conversation_id == conversation_id, Message.id > upto
+                    )
+                )
+            ).scalar_one()
+            foldable = newer - settings.CONTEXT_MAX_TURNS
+            if foldable <= 0:
+                return False
+
+            stmt = (
+                select(Message)
+                .where(Message.conversation_id == conversation_id, Message.id > upto)
+                .order_by(Message.id)
+                .limit(foldable)
+            )
+            batch = (await db.execute(stmt)).scalars().all()
+            last_id = batch[-1].id
+            transcript = "\n".join(
+                f"{'You' if m.role == 'assistant' else 'User'}: {m.content_text}"
+                for m in batch if m.content_text
+            )
+
+        # No session is held across the upstream call
+        prompt = SUMMARY_PROMPT.format(
+            persona_name=persona_name, max_tokens=settings.CONTEXT_SUMMARY_MAX_TOKENS
+        )
+        user_text = f"Previous summary:\n{previous or '(none)'}\n\nNew turns:\n{transcript}"
+        result = await llm.generate_response(prompt, user_text)
+        content = (result.get("content") or "").strip()
+        if content == FALLBACK_RESPONSE["content"]:
+            # The LLM failed: these turns stay verbatim (and out of the archive) until the next refresh
+            logger.warning("Summary refresh for conversation %s skipped: LLM unavailable", conversation_id)
+            return False
+        new_summary = _clip_to_tokens(content, settings.CONTEXT_SUMMARY_MAX_TOKENS)
+        if not new_summary:
+            return False
+
+        async with db_session_factory() as db:
+            # Optimistic: skip if another worker already moved the summary on
+            updated = await db.execute(
+                update(Conversation)
+                .where(Conversation.id == conversation_id)
+                .where(
+                    Conversation.summary_upto_id.is_(None) if upto == 0 else Conversation.summary_upto_id == upto
+                )
+                .values(summary=new_summary, summary_upto_id=last_id)
+            )
+            await db.commit()
+        if updated.rowcount:
+            summary_refreshes.inc()
+            logger.info("Conversation %s summary now covers up to message %s", conversation_id, last_id)
+        return bool(updated.rowcount)
+    finally:
+        _refreshing.discard(conversation_id)
@@ -0,0 +1,144 @@
+import asyncio
+import logging
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from sqlalchemy import event, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.cache import get_redis
+from app.core.config import settings
+from app.core.metrics import registry
+from app.models.all_models import Conversation, Message
+
+logger = logging.getLogger(__name__)
+
+version_lookups = registry.counter("conversation_version_lookups_total", "History version checks by source (cache/db)")
+
+_CHANGED = "conversation_version.changed"  # session.info: conversation ids touched since the last flush
+_BUMPED = "conversation_version.bumped"  # session.info: (user_id, persona_id) -> version, published on commit
+
+# Only ever raises the cached value, so publishes landing out of order cannot move it backwards
+_SET_IF_NEWER = """
+local current = redis.call('GET', KEYS[1])
+if (not current) or tonumber(current) < tonumber(ARGV[1]) then
+    redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+end
+"""
+
+_publishing: Set[asyncio.Task] = set()
+
+
+def _cache_key(user_id: int, persona_id: int) -> str:
+    return f"conv_version:{user_id}:{persona_id}"
+
+
+def _bump(session: Session, conversation_ids: Iterable[int]) -> None:
+    ids = sorted(set(conversation_ids))
+    if not ids:
+        return
+    conn = session.connection()
+    conn.execute(update(Conversation).where(Conversation.id.in_(ids)).values(version=Conversation.version + 1))
+    rows = conn.execute(
+        select(Conversation.user_id, Conversation.persona_id, Conversation.version).where(Conversation.id.in_(ids))
+    )
+    bumped = session.info.setdefault(_BUMPED, {})
+    for user_id, persona_id, version in rows:
+        bumped[(user_id, persona_id)] = version
+
+
+@event.listens_for(Session, "before_flush")
+def _collect_changed_messages(session: Session, flush_context, instances) -> None:
+    changed = session.info.setdefault(_CHANGED, set())
+    for obj in session.new:
+        if isinstance(obj, Message):
+            changed.add(obj.conversation_id)
+    for obj in session.dirty:
+        if isinstance(obj, Message) and session.is_modified(obj, include_collections=False):
+            changed.add(obj.conversation_id)
+
+
+@event.listens_for(Session, "after_flush")
+def _bump_after_flush(session: Session, flush_context) -> None:
+    _bump(session, session.info.pop(_CHANGED, ()))
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_after_commit(session: Session) -> None:
+    bumped = session.info.pop(_BUMPED, None)
+    if not bumped or get_redis() is None:
+        return
+    try:
+        task = asyncio.get_running_loop().create_task(_publish(bumped))
+    except RuntimeError:
+        return
+    _publishing.add(task)
+    task.add_done_callback(_publishing.discard)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _forget_on_rollback(session: Session, previous_transaction) -> None:
+    session.info.pop(_CHANGED, None)
+    session.info.pop(_BUMPED, None)
+
+
+async def _publish(bumped: Dict[Tuple[int, int], int]) -> None:
+    redis = get_redis()
+    try:
+        for (user_id, persona_id), version in bumped.items():
+            await redis.eval(
+                _SET_IF_NEWER, 1, _cache_key(user_id, persona_id), version, settings.CONVERSATION_VERSION_TTL_SECONDS
+            )
+    except Exception as e:
+        logger.warning("Conversation version: could not publish to Redis (%s)", e)
+
+
+async def bump_versions(db: AsyncSession, conversation_ids: Iterable[int]) -> None:
+    """
+    Explicit bump for bulk `update(Message)` statements, which bypass the
+    ORM flush the automatic bump hooks into. Call before committing.
+    """
+    ids = list(conversation_ids)
+    await db.run_sync(lambda session: _bump(session, ids))
+
+
+async def get_conversation_version(db: AsyncSession, user_id: int, persona_id: int) -> Optional[int]:
+    """
+    Current version of the user's conversation with a persona, or None if
+    there is none yet. Served from Redis when possible; a miss (or no
+    Redis) costs one primary-key-sized query. Writers publish after commit
+    and only ever raise the cached value, and a reader fills it with SET NX,
+    so a read that raced a write cannot overwrite the newer version.
+    """
+    redis = get_redis()
+    key = _cache_key(user_id, persona_id)
+    if redis is not None:
+        try:
+            cached = await redis.get(key)
+            if cached is not None:
+                version_lookups.inc(source="cache")
+                return int(cached)
+        except Exception as e:
+            logger.warning("Conversation version: Redis unavailable, reading from the database (%s)", e)
+            redis = None
+
+    version_lookups.inc(source="db")
+    version = (
+        await db.execute(
+            select(Conversation.version).where(
+                Conversation.user_id == user_id, Conversation.persona_id == persona_id
+            )
+        )
+    ).scalar_one_or_none()
+    if version is not None and redis is not None:
+        try:
+            await redis.set(key, version, nx=True, ex=settings.CONVERSATION_VERSION_TTL_SECONDS)
+        except Exception:
+            pass
+    return version
+
+
+def history_etag(version: int, limit: int, before_id: Optional[int] = None) -> str:
+    if before_id is not None:
+        return f'W/"v{version}-l{limit}-b{before_id}"'
+    return f'W/"v{version}-l{limit}"'
@@ -0,0 +1,100 @@
+import abc
+import logging
+import re
+import zlib
+from typing import List
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.tracing import traced_async_client
+
+logger = logging.getLogger(__name__)
+
+_WORD = re.compile(r"[^\W\d_]+|\d+", re.UNICODE)
+_CJK = re.compile(r"[\u3000-\u9fff\uac00-\ud7af]")
+_STOPWORDS = frozenset(
+    "a about an and are as at be but by can do did does for from had has have he her his how i if in is it its "
+    "just me my now no not of on or our she so that the their them then there they this to was we were what when "
+    "who will with you your".split()
+)
+
+
+class EmbeddingProvider(abc.ABC):
+    dim: int
+
+    @abc.abstractmethod
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        """
+        Returns a (len(texts), dim) float32 matrix of L2-normalised rows, so
+        cosine similarity is a plain dot product.
+        """
+        pass
+
+
+def _normalise(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32, copy=False)
+
+
+class HashingEmbeddingProvider(EmbeddingProvider):
+    """
+    Local stand-in embedder: signed feature hashing of words and CJK
+    character bigrams. No model download or network call, deterministic,
+    and good enough for keyword-level recall ("Lily", "hospital", "生日").
+    """
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+
+    def _features(self, text: str) -> List[str]:
+        text = text.lower()
+        words = [w for w in _WORD.findall(text) if w not in _STOPWORDS and not _CJK.match(w)]
+        cjk = "".join(_CJK.findall(text))
+        return words + list(cjk) + [cjk[i:i + 2] for i in range(len(cjk) - 1)]
+
+    def embed_sync(self, texts: List[str]) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text or ""):
+                h = zlib.crc32(feature.encode("utf-8"))
+                matrix[row, h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        return _normalise(matrix)
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        return self.embed_sync(texts)
+
+
+class OpenAIEmbeddingProvider(EmbeddingProvider):
+    def __init__(self):
+        from openai import AsyncOpenAI
+
+        self.client = AsyncOpenAI(
+            api_key=settings.OPENAI_API_KEY,
+            base_url=settings.OPENAI_BASE_URL,
+            http_client=traced_async_client(proxy=settings.OPENAI_PROXY or None)
+        )
+        self.dim = 0
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        response = await self.client.embeddings.create(model=settings.MEMORY_EMBEDDING_MODEL, input=texts)
+        matrix = np.asarray([item.embedding for item in response.data], dtype=np.float32)
+        self.dim = matrix.shape[1]
+        return _normalise(matrix)
+
+
+_provider = None
+
+
+def get_embedding_provider() -> EmbeddingProvider:
+    global _provider
+    if _provider is None:
+        api_key = settings.OPENAI_API_KEY
+        if not api_key or api_key == "mock":
+            logger.info("Embedding Provider: local hashing (API Key is missing or 'mock')")
+            _provider = HashingEmbeddingProvider()
+        else:
+            logger.info("Embedding Provider: OpenAI (%s)", settings.MEMORY_EMBEDDING_MODEL)
+            _provider = OpenAIEmbeddingProvider()
+    return _provider
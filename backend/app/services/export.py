@@ -0,0 +1,206 @@
+"""
+Streaming conversation export: NDJSON, or a zip (messages.ndjson plus the
+audio files) written on the fly.
+
+Rows come from a server-side cursor, `chunk_size` at a time, archived
+history first and then the hot table, so memory stays flat however long
+the conversation is. Every record carries its message id; passing the
+last id received as `after_id` resumes an interrupted export.
+"""
+import asyncio
+import json
+import os
+import zipfile
+from typing import AsyncIterator, Optional
+
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.core.metrics import registry
+from app.models.all_models import ArchivedMessage, Message
+from app.services.recovery import audio_path_from_url
+
+exported_messages = registry.counter("export_messages_total", "Messages written to conversation exports, by format")
+exported_bytes = registry.counter("export_bytes_total", "Bytes streamed by conversation exports, by format")
+
+_READ_BYTES = 1 << 16
+
+
+async def iter_messages(
+    db_session_factory,
+    conversation_id: int,
+    after_id: int = 0,
+    upto_id: Optional[int] = None,
+    limit: Optional[int] = None,
+    chunk_size: Optional[int] = None,
+) -> AsyncIterator:
+    """Messages with after_id < id <= upto_id in id order, archived ones first, fetched `chunk_size` rows at a time."""
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    remaining = limit
+    async with db_session_factory() as db:
+        for model in (ArchivedMessage, Message):
+            stmt = select(model).where(model.conversation_id == conversation_id, model.id > after_id)
+            if upto_id is not None:
+                stmt = stmt.where(model.id <= upto_id)
+            stmt = stmt.order_by(model.id)
+            if remaining is not None:
+                stmt = stmt.limit(remaining)
+            result = await db.stream(stmt.execution_options(yield_per=chunk_size))
+            async for msg in result.scalars():
+                yield msg
+                if remaining is not None:
+                    remaining -= 1
+            if remaining == 0:
+                return
+
+
+def _archived(msg) -> bool:
+    return isinstance(msg, ArchivedMessage)
+
+
+def audio_member_name(msg) -> Optional[str]:
+    """Where a message's audio goes inside the zip, or None if there is none to include."""
+    if _archived(msg) and msg.audio_member:
+        return f"audio/{msg.audio_member}"
+    path = audio_path_from_url(msg.audio_url)
+    if path is None or not os.path.exists(path):
+        return None
+    if "/phrases/" in path:
+        # Shared by many messages; stored once
+        return f"audio/phrases/{os.path.basename(path)}"
+    return f"audio/{msg.id}{os.path.splitext(path)[1]}"
+
+
+def message_record(msg, audio: Optional[str]) -> dict:
+    return {
+        "id": msg.id,
+        "role": msg.role,
+        "created_at": msg.created_at.isoformat() if msg.created_at else None,
+        "text": msg.content_text,
+        "status": msg.status,
+        "tone": (msg.analysis or {}).get("tone"),
+        "archived": _archived(msg),
+        "audio": audio,
+    }
+
+
+async def ndjson_stream(db_session_factory, conversation_id: int, after_id: int = 0,
+                        limit: Optional[int] = None, chunk_size: Optional[int] = None) -> AsyncIterator[bytes]:
+    """One JSON record per line; `audio` is the message's URL (null for archived clips)."""
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    lines = []
+    async for msg in iter_messages(db_session_factory, conversation_id, after_id, limit=limit, chunk_size=chunk_size):
+        audio = None if _archived(msg) and msg.audio_member else msg.audio_url
+        lines.append(json.dumps(message_record(msg, audio), ensure_ascii=False))
+        if len(lines) >= chunk_size:
+            yield _emit_lines(lines, "ndjson")
+    if lines:
+        yield _emit_lines(lines, "ndjson")
+
+
+def _emit_lines(lines: list, fmt: str) -> bytes:
+    data = ("\n".join(lines) + "\n").encode()
+    exported_messages.inc(len(lines), format=fmt)
+    exported_bytes.inc(len(data), format=fmt)
+    lines.clear()
+    return data
+
+
+def _open_file(audio_url: Optional[str]):
+    try:
+        return open(audio_path_from_url(audio_url), "rb")
+    except (OSError, TypeError):
+        return None
+
+
+class _Bundles:
+    """Keeps the archive bundle being read open across consecutive messages."""
+
+    def __init__(self):
+        self.name, self.zip = None, None
+
+    def open(self, msg: ArchivedMessage):
+        try:
+            if msg.audio_bundle != self.name:
+                self.close()
+                self.zip = zipfile.ZipFile(os.path.join(settings.ARCHIVE_DIR, msg.audio_bundle))
+                self.name = msg.audio_bundle
+            return self.zip.open(msg.audio_member)
+        except (OSError, KeyError, zipfile.BadZipFile):
+            return None
+
+    def close(self):
+        if self.zip is not None:
+            self.zip.close()
+        self.name, self.zip = None, None
+
+
+class _Sink:
+    """Unseekable file object zipfile writes into; the response drains it between writes."""
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def write(self, data) -> int:
+        self.buffer += data
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        exported_bytes.inc(len(data), format="zip")
+        return data
+
+
+async def zip_stream(db_session_factory, conversation_id: int, manifest: dict, after_id: int = 0,
+                     limit: Optional[int] = None, chunk_size: Optional[int] = None) -> AsyncIterator[bytes]:
+    """
+    conversation.json, messages.ndjson, the audio files (stored, not
+    recompressed), then complete.json with the message count and last id.
+    Two passes over the cursor, since a zip member must be finished before
+    the next starts; the second pass stops at the last id the first one
+    wrote, so both describe the same messages.
+    """
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    sink = _Sink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("conversation.json", json.dumps({**manifest, "after_id": after_id}, ensure_ascii=False))
+
+        last_id, count, lines = after_id, 0, []
+        with archive.open("messages.ndjson", "w", force_zip64=True) as member:
+            messages = iter_messages(db_session_factory, conversation_id, after_id, limit=limit, chunk_size=chunk_size)
+            async for msg in messages:
+                lines.append(json.dumps(message_record(msg, audio_member_name(msg)), ensure_ascii=False))
+                last_id, count = msg.id, count + 1
+                if len(lines) >= chunk_size:
+                    member.write(_emit_lines(lines, "zip"))
+                    yield sink.drain()
+            if lines:
+                member.write(_emit_lines(lines, "zip"))
+        yield sink.drain()
+
+        shared, bundles = set(), _Bundles()
+        try:
+            async for msg in iter_messages(db_session_factory, conversation_id, after_id, upto_id=last_id,
+                                           chunk_size=chunk_size):
+                name = audio_member_name(msg)
+                if name is None or name in shared:
+                    continue
+                if "/phrases/" in name:
+                    shared.add(name)
+                source = bundles.open(msg) if _archived(msg) and msg.audio_member else _open_file(msg.audio_url)
+                if source is None:
+                    continue
+                info = zipfile.ZipInfo(name, date_time=msg.created_at.timetuple()[:6])
+                with source, archive.open(info, "w", force_zip64=True) as member:
+                    while chunk := await asyncio.to_thread(source.read, _READ_BYTES):
+                        member.write(chunk)
+                        yield sink.drain()
+        finally:
+            bundles.close()
+        # Written last: an archive that has it is complete, and says where to resume
+        archive.writestr("complete.json", json.dumps({"messages": count, "last_id": last_id}))
+    yield sink.drain()
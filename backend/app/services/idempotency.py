@@ -0,0 +1,90 @@
+import hashlib
+import logging
+from typing import BinaryIO, Optional
+
+from app.core.cache import LocalTTLCache, get_redis
+from app.core.config import settings
+from app.core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+
+duplicate_sends = registry.counter("send_duplicates_total", "Send requests answered from the idempotency store")
+
+
+def hash_upload(fileobj: BinaryIO, chunk_size: int = 1 << 16) -> str:
+    """SHA-256 of an uploaded file, read in chunks; rewinds the file afterwards."""
+    digest = hashlib.sha256()
+    fileobj.seek(0)
+    for chunk in iter(lambda: fileobj.read(chunk_size), b""):
+        digest.update(chunk)
+    fileobj.seek(0)
+    return digest.hexdigest()
+
+
+def build_idempotency_key(user_id: int, persona_id: int, header_key: Optional[str], audio_digest: str) -> str:
+    """Prefers the client's Idempotency-Key; falls back to the audio content hash."""
+    if header_key:
+        return f"idem:{user_id}:{persona_id}:key:{header_key[:128]}"
+    return f"idem:{user_id}:{persona_id}:sha256:{audio_digest}"
+
+
+class IdempotencyStore:
+    """
+    Maps an idempotency key to the message created for it. A key is first
+    claimed as `pending`, then completed with the message id. Keys live in
+    Redis with a TTL; if Redis is disabled or unreachable the process-local
+    cache is used instead (deduplicating per replica only).
+    """
+
+    def __init__(self, ttl: int, local: Optional[LocalTTLCache] = None):
+        self.ttl = ttl
+        self.local = local or LocalTTLCache()
+
+    async def claim(self, key: str) -> Optional[str]:
+        """Returns None if the key is now ours, else the stored value (`pending` or a message id)."""
+        redis = get_redis()
+        if redis is not None:
+            try:
+                if await redis.set(key, PENDING, nx=True, ex=self.ttl):
+                    return None
+                existing = await redis.get(key)
+                if existing is not None:
+                    return existing
+                # Expired between SET and GET: try once more
+                return None if await redis.set(key, PENDING, nx=True, ex=self.ttl) else PENDING
+            except Exception as e:
+                logger.warning("Idempotency store: Redis unavailable, using local fallback (%s)", e)
+        return self.local.set_nx(key, PENDING, self.ttl)
+
+    async def complete(self, key: str, message_id: int) -> None:
+        value = str(message_id)
+        redis = get_redis()
+        if redis is not None:
+            try:
+                await redis.set(key, value, ex=self.ttl)
+                return
+            except Exception as e:
+                logger.warning("Idempotency store: Redis unavailable, using local fallback (%s)", e)
+        self.local.set(key, value, self.ttl)
+
+    async def release(self, key: str) -> None:
+        """Forgets a claim whose request failed, so the client's retry is processed."""
+        redis = get_redis()
+        if redis is not None:
+            try:
+                await redis.delete(key)
+            except Exception as e:
+                logger.warning("Idempotency store: Redis unavailable, using local fallback (%s)", e)
+        self.local.delete(key)
+
+
+_store: Optional[IdempotencyStore] = None
+
+
+def get_idempotency_store() -> IdempotencyStore:
+    global _store
+    if _store is None:
+        _store = IdempotencyStore(ttl=settings.IDEMPOTENCY_TTL_SECONDS)
+    return _store
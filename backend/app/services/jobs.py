@@ -0,0 +1,78 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Optional, Set
+
+from app.core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+jobs_in_flight = registry.gauge("pipeline_jobs_in_flight", "Background pipeline jobs currently running")
+jobs_cancelled = registry.counter("pipeline_jobs_cancelled_total", "Jobs cancelled because the drain deadline passed")
+
+
+class JobRunnerClosed(RuntimeError):
+    """Raised when a job is submitted after shutdown has started."""
+
+
+class JobRunner:
+    """
+    Owns the background pipeline tasks of this process so they can be
+    drained on shutdown instead of being dropped mid-stage.
+    """
+
+    def __init__(self):
+        self._tasks: Set[asyncio.Task] = set()
+        self._accepting = True
+
+    @property
+    def accepting(self) -> bool:
+        return self._accepting
+
+    def in_flight(self) -> int:
+        return len(self._tasks)
+
+    def submit(self, func: Callable[..., Awaitable[Any]], *args, **kwargs) -> asyncio.Task:
+        if not self._accepting:
+            raise JobRunnerClosed("Job runner is draining")
+        task = asyncio.create_task(func(*args, **kwargs))
+        self._tasks.add(task)
+        jobs_in_flight.set(len(self._tasks))
+        task.add_done_callback(self._on_done)
+        return task
+
+    def _on_done(self, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        jobs_in_flight.set(len(self._tasks))
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Background job crashed", exc_info=task.exception())
+
+    async def drain(self, timeout: float) -> int:
+        """
+        Stops accepting jobs and waits up to `timeout` seconds for running
+        ones. Stragglers are cancelled; their messages stay pending/processing
+        and are picked up by the startup recovery scan. Returns how many
+        jobs were cancelled.
+        """
+        self._accepting = False
+        if not self._tasks:
+            return 0
+
+        logger.info("Draining %d background jobs (deadline %.1fs)", len(self._tasks), timeout)
+        _, pending = await asyncio.wait(set(self._tasks), timeout=timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+            jobs_cancelled.inc(len(pending))
+            logger.warning("Cancelled %d background jobs after drain deadline", len(pending))
+        return len(pending)
+
+
+_runner: Optional[JobRunner] = None
+
+
+def get_job_runner() -> JobRunner:
+    global _runner
+    if _runner is None:
+        _runner = JobRunner()
+    return _runner
@@ -0,0 +1,124 @@
+"""
+Hedged LLM requests, to cut the tail that occasional slow completions add.
+
+A request that has not completed within the observed LLM_HEDGE_PERCENTILE
+latency (never less than LLM_HEDGE_MIN_DELAY_SECONDS) gets a second,
+identical one: to the next best route behind the router, or with
+LLM_HEDGE_MODEL on the single endpoint. The first valid JSON reply wins
+and the other request is cancelled; a request that fails before the other
+completes is not waited for.
+
+Hedges are paid for from a budget: every request earns LLM_HEDGE_BUDGET
+of a hedge, up to 10 banked, so at most that fraction of extra load is
+added however slow the upstream gets. Until 20 latencies have been seen
+there is no percentile to go by and nothing is hedged. A cancelled loser
+is not metered (its tokens never reach usage_meter); the extra load shows
+in llm_hedge_requests_total instead.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Optional, TypeVar
+
+from app.core.config import settings
+from app.core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+hedge_requests = registry.counter(
+    "llm_hedge_requests_total", "LLM requests by hedging outcome (not_needed/hedged/over_budget)"
+)
+hedge_wins = registry.counter(
+    "llm_hedge_wins_total", "Hedged LLM requests by which call answered first (primary/hedge)"
+)
+hedge_delay = registry.gauge("llm_hedge_delay_seconds", "Current wait before an LLM request is hedged")
+
+
+class Hedger:
+    def __init__(self, percentile: float = 0.9, min_delay: float = 0.5, budget: float = 0.1, window: int = 200,
+                 min_samples: int = 20, max_banked: float = 10.0):
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.budget = budget
+        self.min_samples = min_samples
+        self.max_banked = max_banked
+        self.banked = 0.0
+        self._latencies: Deque[float] = deque(maxlen=window)
+
+    def delay(self) -> Optional[float]:
+        """Seconds to wait before hedging, or None while too few latencies have been seen."""
+        if len(self._latencies) < self.min_samples:
+            return None
+        ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, int(self.percentile * len(ordered)))
+        return max(self.min_delay, ordered[index])
+
+    def observe(self, seconds: float) -> None:
+        self._latencies.append(seconds)
+
+    def _spend(self) -> bool:
+        if self.banked < 1.0:
+            return False
+        self.banked -= 1.0
+        return True
+
+    async def run(self, primary: Callable[[], Awaitable[T]], hedge: Callable[[], Awaitable[T]]) -> T:
+        """
+        Awaits primary(), starting hedge() as well if primary is still
+        running after delay(). Returns the first result; raises the
+        primary's error when no call succeeds.
+        """
+        self.banked = min(self.max_banked, self.banked + self.budget)
+        delay = self.delay()
+        if delay is not None:
+            hedge_delay.set(delay)
+        started = time.perf_counter()
+        first = asyncio.ensure_future(primary())
+        calls = {first: "primary"}
+        try:
+            done, _ = await asyncio.wait([first], timeout=delay)
+            if done or delay is None or not self._spend():
+                hedge_requests.inc(result="not_needed" if done or delay is None else "over_budget")
+                result = await first
+                self.observe(time.perf_counter() - started)
+                return result
+
+            hedge_requests.inc(result="hedged")
+            calls[asyncio.ensure_future(hedge())] = "hedge"
+            pending = set(calls)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winner = next((call for call in done if call.exception() is None), None)
+                if winner is not None:
+                    hedge_wins.inc(winner=calls[winner])
+                    # A primary still running has taken at least this long: a lower bound keeps the percentile honest
+                    self.observe(time.perf_counter() - started)
+                    return winner.result()
+                for call in done:
+                    logger.warning("Hedged LLM %s call failed: %s", calls[call], call.exception())
+            self.observe(time.perf_counter() - started)
+            return first.result()
+        finally:
+            for call in calls:
+                if not call.done():
+                    call.cancel()
+
+
+_hedger: Optional[Hedger] = None
+
+
+def get_llm_hedger() -> Optional[Hedger]:
+    """The shared hedger (latencies and budget outlive a request), or None when LLM_HEDGE_ENABLED is off."""
+    global _hedger
+    if not settings.LLM_HEDGE_ENABLED:
+        return None
+    if _hedger is None:
+        _hedger = Hedger(
+            percentile=settings.LLM_HEDGE_PERCENTILE,
+            min_delay=settings.LLM_HEDGE_MIN_DELAY_SECONDS,
+            budget=settings.LLM_HEDGE_BUDGET,
+        )
+    return _hedger
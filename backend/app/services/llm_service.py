@@ -1,60 +1,289 @@
 import abc
 import json
 import logging
+import time
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, List, Optional, Sequence
 from app.core.config import settings
-import httpx
+from app.core.metrics import registry
+from app.core.tracing import traced_async_client
+from app.services.llm_hedge import Hedger, get_llm_hedger
+from app.services.usage_meter import record_llm
+
+if TYPE_CHECKING:
+    import httpx
 
 logger = logging.getLogger(__name__)
 
+FALLBACK_RESPONSE = {"tone": "neutral", "content": "I'm having trouble thinking right now, but I'm here."}
+
+route_decisions = registry.counter(
+    "llm_route_decisions_total", "LLM endpoint picked per attempt, by endpoint and reason"
+)
+endpoint_latency = registry.summary("llm_endpoint_seconds", "LLM call duration per endpoint")
+endpoint_errors = registry.counter("llm_endpoint_errors_total", "Failed LLM calls per endpoint")
+endpoint_ewma = registry.gauge("llm_endpoint_ewma_seconds", "Smoothed LLM latency per endpoint")
+endpoint_error_rate = registry.gauge("llm_endpoint_error_rate", "Smoothed LLM error rate per endpoint")
+
 class LLMProvider(abc.ABC):
     @abc.abstractmethod
-    async def generate_response(self, system_prompt: str, user_text: str) -> dict:
+    async def generate_response(self, system_prompt: str, user_text: str, history: Optional[List[dict]] = None) -> dict:
+        """
+        history: earlier turns as chat messages ({"role", "content"}), oldest
+        first, placed between the system prompt and the new user text.
+        """
         pass
 
 class MockLLMProvider(LLMProvider):
-    async def generate_response(self, system_prompt: str, user_text: str) -> dict:
+    async def generate_response(self, system_prompt: str, user_text: str, history: Optional[List[dict]] = None) -> dict:
+        from app.services.context_builder import estimate_tokens
+
         logger.info("MOCK LLM: Generating response...")
+        content = f"Mock reply to: {user_text}. I hope you are doing well!"
+        # Estimated, so usage accounting behaves the same without an API key
+        prompt = [system_prompt, user_text, *(turn["content"] for turn in history or [])]
+        record_llm("mock", sum(estimate_tokens(text) for text in prompt), estimate_tokens(content))
         return {
             "tone": "gentle",
-            "content": f"Mock reply to: {user_text}. I hope you are doing well!"
+            "content": content
         }
 
 class OpenAILLMProvider(LLMProvider):
-    def __init__(self):
+    def __init__(
+        self,
+        base_url: Optional[str] = None,
+        model: Optional[str] = None,
+        api_key: Optional[str] = None,
+        proxy: Optional[str] = None,
+        timeout: Optional[float] = None,
+        max_retries: int = 2,
+        http_client: Optional["httpx.AsyncClient"] = None,
+        hedger: Optional[Hedger] = None,
+        hedge_model: Optional[str] = None
+    ):
         from openai import AsyncOpenAI
-        import httpx
-        
-        http_client = httpx.AsyncClient(proxy=settings.OPENAI_PROXY) if settings.OPENAI_PROXY else None
-        
+
+        if http_client is None:
+            http_client = traced_async_client(proxy=(settings.OPENAI_PROXY if proxy is None else proxy) or None)
+
+        self.model = model or settings.OPENAI_MODEL
+        # Slow requests are hedged with the same request, to hedge_model if set (see llm_hedge)
+        self.hedger = hedger
+        self.hedge_model = hedge_model or self.model
         self.client = AsyncOpenAI(
-            api_key=settings.OPENAI_API_KEY,
-            base_url=settings.OPENAI_BASE_URL,
-            http_client=http_client
+            api_key=api_key or settings.OPENAI_API_KEY,
+            base_url=base_url or settings.OPENAI_BASE_URL,
+            http_client=http_client,
+            max_retries=max_retries,
+            **({"timeout": timeout} if timeout else {})
         )
 
-    async def generate_response(self, system_prompt: str, user_text: str) -> dict:
+    async def complete(self, system_prompt: str, user_text: str, history: Optional[List[dict]] = None,
+                       model: Optional[str] = None) -> dict:
+        """Like generate_response, but raises instead of falling back."""
+        model = model or self.model
+        response = await self.client.chat.completions.create(
+            model=model,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                *(history or []),
+                {"role": "user", "content": user_text}
+            ],
+            response_format={"type": "json_object"}
+        )
+        if response.usage is not None:
+            record_llm(model, response.usage.prompt_tokens, response.usage.completion_tokens)
+        content = response.choices[0].message.content
+        return json.loads(content)
+
+    async def generate_response(self, system_prompt: str, user_text: str, history: Optional[List[dict]] = None) -> dict:
         try:
-            response = await self.client.chat.completions.create(
-                model=settings.OPENAI_MODEL,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_text}
-                ],
-                response_format={"type": "json_object"}
+            if self.hedger is None:
+                return await self.complete(system_prompt, user_text, history)
+            return await self.hedger.run(
+                lambda: self.complete(system_prompt, user_text, history),
+                lambda: self.complete(system_prompt, user_text, history, model=self.hedge_model),
             )
-            content = response.choices[0].message.content
-            return json.loads(content)
         except Exception as e:
-            logger.error(f"OpenAI Error: {e}")
+            logger.error("OpenAI Error: %s", e)
             # Fallback
-            return {"tone": "neutral", "content": "I'm having trouble thinking right now, but I'm here."}
+            return dict(FALLBACK_RESPONSE)
+
+@dataclass(eq=False)
+class LLMRoute:
+    """One endpoint/model pair behind the router, with its smoothed health."""
+    name: str
+    provider: OpenAILLMProvider
+    tags: Sequence[str] = ()
+    ewma_latency: Optional[float] = None
+    ewma_error: float = 0.0
+    last_used: float = field(default=0.0)
+
+    def score(self, error_penalty: float) -> float:
+        """Expected seconds to a usable answer; untried routes score 0 so they get traffic first."""
+        if self.ewma_latency is None:
+            return 0.0
+        return self.ewma_latency + self.ewma_error * error_penalty
+
+class RoutingLLMProvider(LLMProvider):
+    """
+    Spreads replies over several OpenAI-compatible endpoint/model pairs.
+    Each attempt goes to the route with the lowest expected latency: an
+    EWMA of observed call time plus the EWMA error rate times
+    `error_penalty` seconds. Inputs of at most `short_input_tokens` prefer
+    routes tagged `short_input_tag` (e.g. a small, fast model). Once per
+    `probe_interval`, a route idle for that long gets one request, so a
+    recovered endpoint is noticed. Failed calls fail over to the next best
+    route; when all attempts fail the usual fallback reply is returned.
+    With a `hedger`, an attempt still running at the hedge delay is
+    duplicated to the next best route (see llm_hedge).
+    """
+
+    def __init__(
+        self,
+        routes: List[LLMRoute],
+        alpha: float = 0.2,
+        error_penalty: float = 10.0,
+        short_input_tokens: int = 0,
+        short_input_tag: str = "fast",
+        probe_interval: float = 30.0,
+        max_attempts: int = 2,
+        hedger: Optional[Hedger] = None
+    ):
+        if not routes:
+            raise ValueError("RoutingLLMProvider needs at least one route")
+        self.routes = routes
+        self.alpha = alpha
+        self.error_penalty = error_penalty
+        self.short_input_tokens = short_input_tokens
+        self.short_input_tag = short_input_tag
+        self.probe_interval = probe_interval
+        self.max_attempts = max_attempts
+        self.hedger = hedger
+        self._last_probe = time.monotonic()
+
+    @classmethod
+    def from_settings(cls) -> "RoutingLLMProvider":
+        routes = []
+        for i, endpoint in enumerate(settings.LLM_ENDPOINTS):
+            provider = OpenAILLMProvider(
+                base_url=endpoint.get("base_url"),
+                model=endpoint.get("model"),
+                api_key=endpoint.get("api_key"),
+                proxy=endpoint.get("proxy"),
+                timeout=endpoint.get("timeout", settings.LLM_ROUTER_TIMEOUT_SECONDS),
+                max_retries=0
+            )
+            routes.append(LLMRoute(
+                name=endpoint.get("name") or f"{provider.model}#{i}",
+                provider=provider,
+                tags=tuple(endpoint.get("tags", ()))
+            ))
+        return cls(
+            routes,
+            alpha=settings.LLM_ROUTER_EWMA_ALPHA,
+            error_penalty=settings.LLM_ROUTER_ERROR_PENALTY_SECONDS,
+            short_input_tokens=settings.LLM_SHORT_INPUT_TOKENS,
+            short_input_tag=settings.LLM_SHORT_INPUT_TAG,
+            probe_interval=settings.LLM_ROUTER_PROBE_SECONDS,
+            max_attempts=settings.LLM_ROUTER_MAX_ATTEMPTS,
+            hedger=get_llm_hedger()
+        )
+
+    def choose(self, user_text: str, exclude: Sequence[LLMRoute] = ()) -> Optional[tuple]:
+        """Returns (route, reason) for the next attempt, or None if every route was tried."""
+        from app.services.context_builder import estimate_tokens
+
+        candidates = [r for r in self.routes if r not in exclude]
+        if not candidates:
+            return None
+        reason = "score"
+        if self.short_input_tokens and estimate_tokens(user_text) <= self.short_input_tokens:
+            tagged = [r for r in candidates if self.short_input_tag in r.tags]
+            if tagged:
+                candidates, reason = tagged, "short_input"
+        if exclude:
+            reason = "failover"
+
+        best = min(candidates, key=lambda r: r.score(self.error_penalty))
+        now = time.monotonic()
+        if not exclude and now - self._last_probe >= self.probe_interval:
+            stale = [r for r in candidates if r is not best and now - r.last_used >= self.probe_interval]
+            if stale:
+                self._last_probe = now
+                return min(stale, key=lambda r: r.last_used), "probe"
+        return best, reason
+
+    def _observe(self, route: LLMRoute, seconds: float, failed: bool) -> None:
+        a = self.alpha
+        route.ewma_latency = seconds if route.ewma_latency is None else (1 - a) * route.ewma_latency + a * seconds
+        route.ewma_error = (1 - a) * route.ewma_error + a * (1.0 if failed else 0.0)
+        endpoint_latency.observe(seconds, endpoint=route.name)
+        endpoint_ewma.set(route.ewma_latency, endpoint=route.name)
+        endpoint_error_rate.set(route.ewma_error, endpoint=route.name)
+        if failed:
+            endpoint_errors.inc(endpoint=route.name)
+
+    async def _attempt(
+        self, route: LLMRoute, system_prompt: str, user_text: str, history: Optional[List[dict]]
+    ) -> dict:
+        route.last_used = time.monotonic()
+        started = time.perf_counter()
+        try:
+            result = await route.provider.complete(system_prompt, user_text, history)
+        except Exception:
+            # A call cancelled after losing a hedge race is not observed: its latency is unknown, not a failure
+            self._observe(route, time.perf_counter() - started, failed=True)
+            raise
+        self._observe(route, time.perf_counter() - started, failed=False)
+        return result
+
+    async def _hedge(self, tried: List[LLMRoute], route: LLMRoute, system_prompt: str, user_text: str,
+                     history: Optional[List[dict]]) -> dict:
+        choice = self.choose(user_text, exclude=tried)
+        hedge_route = choice[0] if choice else route
+        route_decisions.inc(endpoint=hedge_route.name, reason="hedge")
+        if hedge_route not in tried:
+            tried.append(hedge_route)
+        return await self._attempt(hedge_route, system_prompt, user_text, history)
+
+    async def generate_response(self, system_prompt: str, user_text: str, history: Optional[List[dict]] = None) -> dict:
+        tried: List[LLMRoute] = []
+        while len(tried) < self.max_attempts:
+            choice = self.choose(user_text, exclude=tried)
+            if choice is None:
+                break
+            route, reason = choice
+            tried.append(route)
+            route_decisions.inc(endpoint=route.name, reason=reason)
+            try:
+                if self.hedger is None:
+                    return await self._attempt(route, system_prompt, user_text, history)
+                return await self.hedger.run(
+                    lambda: self._attempt(route, system_prompt, user_text, history),
+                    lambda: self._hedge(tried, route, system_prompt, user_text, history),
+                )
+            except Exception as e:
+                logger.warning("LLM route %s failed (%s: %s)", route.name, type(e).__name__, e)
+        logger.error("LLM routing: all attempts failed (%s)", ", ".join(r.name for r in tried))
+        return dict(FALLBACK_RESPONSE)
+
+_router: Optional[RoutingLLMProvider] = None
 
 def get_llm_provider() -> LLMProvider:
+    global _router
     api_key = settings.OPENAI_API_KEY
     if not api_key or api_key == "mock":
         logger.info("LLM Provider: Mock (API Key is missing or 'mock')")
         return MockLLMProvider()
-    
+
+    if settings.LLM_ENDPOINTS:
+        # Routing state (latency/error averages) must outlive a single request
+        if _router is None:
+            _router = RoutingLLMProvider.from_settings()
+            logger.info("LLM Provider: routing over %s", ", ".join(r.name for r in _router.routes))
+        return _router
+
     masked_key = api_key[:8] + "..." if len(api_key) > 8 else "..."
-    logger.info(f"LLM Provider: OpenAI (API Key starts with {masked_key})")
-    return OpenAILLMProvider()
+    logger.info("LLM Provider: OpenAI (API Key starts with %s)", masked_key)
+    return OpenAILLMProvider(hedger=get_llm_hedger(), hedge_model=settings.LLM_HEDGE_MODEL or None)
@@ -0,0 +1,290 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.metrics import registry
+from app.models.all_models import ArchivedMessage, Message
+from app.services.embedding_service import EmbeddingProvider, get_embedding_provider
+
+logger = logging.getLogger(__name__)
+
+retrieval_latency = registry.summary("memory_retrieval_seconds", "Top-k search over one conversation's memory index")
+indexed_messages = registry.counter("memory_indexed_messages_total", "Messages embedded into long-term memory")
+memory_hits = registry.counter("memory_hits_total", "Remembered snippets injected into prompts")
+
+# Below this many rows a search is cheaper inline than the hop to a worker thread
+_INLINE_SEARCH_ROWS = 4096
+
+
+class _IVF:
+    """
+    Inverted-file index over normalised vectors: a spherical k-means coarse
+    quantiser with ~sqrt(n) lists; a query only scores the rows of its
+    `nprobe` nearest lists.
+    """
+
+    def __init__(self, vectors: np.ndarray, iterations: int = 8, seed: int = 0):
+        n = len(vectors)
+        nlist = max(1, int(np.sqrt(n)))
+        rng = np.random.default_rng(seed)
+        sample = vectors[rng.choice(n, size=min(n, nlist * 32), replace=False)]
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, sample)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            moved = norms[:, 0] > 0
+            centroids[moved] = sums[moved] / norms[moved]
+
+        assign = np.concatenate([
+            np.argmax(vectors[start:start + 8192] @ centroids.T, axis=1) for start in range(0, n, 8192)
+        ])
+        self.centroids = centroids
+        self.order = np.argsort(assign, kind="stable")
+        self.offsets = np.searchsorted(assign[self.order], np.arange(nlist + 1))
+        self.size = n
+
+    def candidates(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        nprobe = min(nprobe, len(self.centroids))
+        probe = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        return np.concatenate([self.order[self.offsets[c]:self.offsets[c + 1]] for c in probe])
+
+
+class _ConversationIndex:
+    """In-memory copy of one conversation's files, grown in place as rows are appended."""
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self.n = 0
+        self._vectors = np.empty((0, dim), dtype=np.float32)
+        self._ids = np.empty(0, dtype=np.int64)
+        self.ivf: Optional[_IVF] = None
+
+    def extend(self, vectors: np.ndarray, ids: np.ndarray) -> None:
+        needed = self.n + len(ids)
+        if needed > len(self._ids):
+            capacity = max(needed, 2 * len(self._ids), 64)
+            grown_vectors = np.empty((capacity, self.dim), dtype=np.float32)
+            grown_vectors[:self.n] = self._vectors[:self.n]
+            grown_ids = np.empty(capacity, dtype=np.int64)
+            grown_ids[:self.n] = self._ids[:self.n]
+            self._vectors, self._ids = grown_vectors, grown_ids
+        self._vectors[self.n:needed] = vectors
+        self._ids[self.n:needed] = ids
+        self.n = needed
+
+    def snapshot(self) -> Tuple[np.ndarray, np.ndarray, Optional[_IVF]]:
+        # Views stay valid: rows below n are never rewritten and growth copies to a new buffer
+        return self._vectors[:self.n], self._ids[:self.n], self.ivf
+
+
+def _top_k(vectors: np.ndarray, ids: np.ndarray, ivf: Optional[_IVF], query: np.ndarray,
+           k: int, before_id: Optional[int], nprobe: int) -> List[Tuple[int, float]]:
+    if ivf is not None:
+        rows = np.concatenate([ivf.candidates(query, nprobe), np.arange(ivf.size, len(ids))])
+        vectors, ids = vectors[rows], ids[rows]
+    if not len(ids):
+        return []
+    scores = vectors @ query
+    if before_id is not None:
+        scores = np.where(ids < before_id, scores, -np.inf)
+    k = min(k, len(scores))
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top])]
+    return [(int(ids[i]), float(scores[i])) for i in top if np.isfinite(scores[i])]
+
+
+class MemoryStore:
+    """
+    Long-term memory: one embedding per completed message, kept per
+    conversation in two append-only files under `root`:
+
+        {conversation_id}-{dim}d.f32   row-major float32 vectors
+        {conversation_id}-{dim}d.ids   int64 message ids, written after the vectors
+
+    A row only counts once its id is written, so a torn append is dropped
+    on the next write. Loaded indexes are cached per process (LRU) and only
+    the new tail is read when the files grow. Histories of at least
+    `ivf_threshold` rows are searched through an IVF index instead of a
+    full scan; rows appended after the index was built are scanned directly
+    until it is rebuilt at twice its size.
+    """
+
+    def __init__(self, root: str, cache_size: int = 256, ivf_threshold: int = 20000, nprobe: int = 8):
+        self.root = root
+        self.cache_size = cache_size
+        self.ivf_threshold = ivf_threshold
+        self.nprobe = nprobe
+        self._cache: "OrderedDict[Tuple[int, int], _ConversationIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._write_locks: Dict[int, asyncio.Lock] = {}
+
+    def _paths(self, conversation_id: int, dim: int) -> Tuple[str, str]:
+        base = os.path.join(self.root, f"{conversation_id}-{dim}d")
+        return base + ".f32", base + ".ids"
+
+    def _append_files(self, conversation_id: int, ids: np.ndarray, vectors: np.ndarray) -> None:
+        vec_path, ids_path = self._paths(conversation_id, vectors.shape[1])
+        os.makedirs(self.root, exist_ok=True)
+        committed = os.path.getsize(ids_path) // 8 if os.path.exists(ids_path) else 0
+        with open(vec_path, "ab") as f:
+            f.truncate(committed * vectors.shape[1] * 4)
+            f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        with open(ids_path, "ab") as f:
+            f.truncate(committed * 8)
+            f.write(ids.astype(np.int64).tobytes())
+
+    def _load(self, conversation_id: int, dim: int) -> Optional[_ConversationIndex]:
+        """Returns the cached index for the conversation, reading any rows appended since."""
+        vec_path, ids_path = self._paths(conversation_id, dim)
+        key = (conversation_id, dim)
+        with self._lock:
+            if not os.path.exists(ids_path):
+                self._cache.pop(key, None)
+                return None
+            total = os.path.getsize(ids_path) // 8
+            index = self._cache.get(key)
+            if index is None or total < index.n:
+                # First use, or the files were replaced underneath us
+                index = self._cache[key] = _ConversationIndex(dim)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+            if total > index.n:
+                new_ids = np.fromfile(ids_path, dtype=np.int64, count=total - index.n, offset=index.n * 8)
+                new_vectors = np.fromfile(
+                    vec_path, dtype=np.float32, count=len(new_ids) * dim, offset=index.n * dim * 4
+                ).reshape(-1, dim)
+                index.extend(new_vectors, new_ids)
+            vectors, _, ivf = index.snapshot()
+
+        # Built outside the lock: it takes seconds on large histories and other conversations must not wait
+        if len(vectors) >= self.ivf_threshold and (ivf is None or len(vectors) >= 2 * ivf.size):
+            started = time.perf_counter()
+            index.ivf = _IVF(vectors)
+            logger.info("Memory: built IVF for conversation %s over %s rows in %.2fs",
+                        conversation_id, len(vectors), time.perf_counter() - started)
+        return index
+
+    def add_sync(self, conversation_id: int, message_ids: Sequence[int], vectors: np.ndarray) -> None:
+        self._append_files(conversation_id, np.asarray(message_ids, dtype=np.int64), vectors)
+        self._load(conversation_id, vectors.shape[1])
+
+    def search_sync(self, conversation_id: int, query: np.ndarray, k: int,
+                    before_id: Optional[int] = None) -> List[Tuple[int, float]]:
+        """Top-k (message_id, cosine score) pairs, best first; only ids below `before_id` if given."""
+        index = self._load(conversation_id, len(query))
+        if index is None:
+            return []
+        vectors, ids, ivf = index.snapshot()
+        return _top_k(vectors, ids, ivf, query, k, before_id, self.nprobe)
+
+    async def add(self, conversation_id: int, message_ids: Sequence[int], vectors: np.ndarray) -> None:
+        lock = self._write_locks.setdefault(conversation_id, asyncio.Lock())
+        async with lock:
+            await asyncio.to_thread(self.add_sync, conversation_id, message_ids, vectors)
+
+    async def search(self, conversation_id: int, query: np.ndarray, k: int,
+                     before_id: Optional[int] = None) -> List[Tuple[int, float]]:
+        started = time.perf_counter()
+        index = self._cache.get((conversation_id, len(query)))
+        if index is not None and index.n < _INLINE_SEARCH_ROWS:
+            hits = self.search_sync(conversation_id, query, k, before_id)
+        else:
+            hits = await asyncio.to_thread(self.search_sync, conversation_id, query, k, before_id)
+        retrieval_latency.observe(time.perf_counter() - started)
+        return hits
+
+
+_store: Optional[MemoryStore] = None
+
+
+def get_memory_store() -> MemoryStore:
+    global _store
+    if _store is None:
+        _store = MemoryStore(
+            settings.MEMORY_DIR,
+            cache_size=settings.MEMORY_CACHE_CONVERSATIONS,
+            ivf_threshold=settings.MEMORY_IVF_THRESHOLD,
+            nprobe=settings.MEMORY_IVF_NPROBE,
+        )
+    return _store
+
+
+def _format_memory(msg: Message) -> str:
+    return f"{'You' if msg.role == 'assistant' else 'User'}: {msg.content_text}"
+
+
+async def remember(
+    conversation_id: int,
+    items: Sequence[Tuple[int, Optional[str]]],
+    embedder: Optional[EmbeddingProvider] = None,
+    store: Optional[MemoryStore] = None,
+) -> int:
+    """
+    Embeds completed (message_id, text) pairs into the conversation's memory.
+    Runs as a background job after a reply is stored, never on the request path.
+    """
+    items = [(message_id, text) for message_id, text in items if text and text.strip()]
+    if not items:
+        return 0
+    embedder = embedder or get_embedding_provider()
+    store = store or get_memory_store()
+    vectors = await embedder.embed([text for _, text in items])
+    await store.add(conversation_id, [message_id for message_id, _ in items], vectors)
+    indexed_messages.inc(len(items))
+    return len(items)
+
+
+async def recall(
+    db: AsyncSession,
+    conversation_id: int,
+    query_text: str,
+    before_id: Optional[int],
+    k: Optional[int] = None,
+    embedder: Optional[EmbeddingProvider] = None,
+    store: Optional[MemoryStore] = None,
+) -> List[str]:
+    """
+    Earlier messages most similar to `query_text`, oldest first, formatted
+    for the prompt. Only messages older than `before_id` are considered, so
+    turns already sent verbatim are not repeated.
+    """
+    if not query_text or not query_text.strip():
+        return []
+    embedder = embedder or get_embedding_provider()
+    store = store or get_memory_store()
+    query = (await embedder.embed([query_text]))[0]
+    hits = await store.search(conversation_id, query, k or settings.MEMORY_TOP_K, before_id)
+    hits = [message_id for message_id, score in hits if score >= settings.MEMORY_MIN_SCORE]
+    if not hits:
+        return []
+
+    rows = (await db.execute(select(Message).where(Message.id.in_(hits)))).scalars().all()
+    missing = set(hits) - {msg.id for msg in rows}
+    if missing:
+        # Old turns may have moved to the cold tier since they were indexed
+        rows += (
+            await db.execute(
+                select(ArchivedMessage).where(
+                    ArchivedMessage.conversation_id == conversation_id, ArchivedMessage.id.in_(missing)
+                )
+            )
+        ).scalars().all()
+    rows = sorted(rows, key=lambda msg: msg.id)
+    snippets = [_format_memory(msg) for msg in rows if msg.content_text]
+    memory_hits.inc(len(snippets))
+    return snippets
@@ -0,0 +1,233 @@
+import asyncio
+import json
+import logging
+import textwrap
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.cache import LocalTTLCache, get_redis
+from app.core.config import settings
+from app.core.metrics import registry
+from app.models.all_models import Persona
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = "persona:invalidate"
+
+cache_requests = registry.counter("persona_cache_requests_total", "Persona cache lookups by result (hit/miss)")
+cache_invalidations = registry.counter("persona_cache_invalidations_total", "Persona cache invalidations by source")
+
+# Rendered once per persona and reused verbatim, so the prompt prefix stays
+# byte-identical between requests and upstream prompt caching can apply.
+PERSONA_PROMPT = textwrap.dedent("""\
+    You are roleplaying as {name}.
+    Your relationship to the user: {relationship_type}.
+    The user calls you: {persona_called_by}.
+    You call the user: {user_called_by}.
+
+    Analyze the user's input for emotion and intent.
+    Reply in JSON format:
+    {{
+        "tone": "emotion_label",
+        "content": "your_reply_text"
+    }}
+    Keep the reply conversational and concise.
+""")
+
+
+def render_prompt_prefix(persona: Persona) -> str:
+    return PERSONA_PROMPT.format(
+        name=persona.name,
+        relationship_type=persona.relationship_type,
+        persona_called_by=persona.persona_called_by,
+        user_called_by=persona.user_called_by,
+    )
+
+
+def resolve_voice_ref(persona: Persona) -> str:
+    """
+    Voice passed to TTS, by priority:
+    1. persona.voice_file_path (uploaded via the voice API, absolute path on the TTS server)
+    2. persona.voice_id (legacy or directly set ID)
+    3. "default"
+    """
+    return persona.voice_file_path if persona.voice_file_path else (persona.voice_id or "default")
+
+
+@dataclass(frozen=True)
+class CachedPersona:
+    """Immutable snapshot of a persona row plus everything derived from it per request."""
+
+    id: int
+    creator_id: int
+    name: str
+    relationship_type: str
+    user_called_by: str
+    persona_called_by: str
+    legal_confirmed: bool
+    avatar_url: Optional[str]
+    voice_sample_url: Optional[str]
+    voice_model_status: str
+    voice_id: Optional[str]
+    created_at: datetime
+    voice_ref: str
+    prompt_prefix: str
+    phrase_pack: Optional[dict] = None
+
+    @classmethod
+    def from_model(cls, persona: Persona) -> "CachedPersona":
+        return cls(
+            id=persona.id,
+            creator_id=persona.creator_id,
+            name=persona.name,
+            relationship_type=persona.relationship_type,
+            user_called_by=persona.user_called_by,
+            persona_called_by=persona.persona_called_by,
+            legal_confirmed=persona.legal_confirmed,
+            avatar_url=persona.avatar_url,
+            voice_sample_url=persona.voice_sample_url,
+            voice_model_status=persona.voice_model_status,
+            voice_id=persona.voice_id,
+            created_at=persona.created_at,
+            voice_ref=resolve_voice_ref(persona),
+            prompt_prefix=render_prompt_prefix(persona),
+            phrase_pack=persona.phrase_pack,
+        )
+
+
+class PersonaCache:
+    """
+    Process-local cache of personas by id, and of each user's persona list.
+    Writers call `invalidate` after committing; it drops the local entries
+    and publishes on INVALIDATION_CHANNEL so every other worker drops
+    theirs. Entries also expire after `ttl` to bound staleness should a
+    message be missed. Without Redis, invalidation is local only.
+    """
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self._entries = LocalTTLCache(max_entries)
+        # Bumped on every invalidation; a load that raced one is not stored
+        self._generation = 0
+
+    def _fill(self, key: str, value, generation: int) -> None:
+        if generation == self._generation:
+            self._entries.set(key, value, self.ttl)
+
+    async def get(self, db: AsyncSession, persona_id: int) -> Optional[CachedPersona]:
+        key = f"persona:{persona_id}"
+        cached = self._entries.get(key)
+        if cached is not None:
+            cache_requests.inc(result="hit")
+            return cached
+        cache_requests.inc(result="miss")
+        generation = self._generation
+        persona = (await db.execute(select(Persona).where(Persona.id == persona_id))).scalar_one_or_none()
+        if persona is None:
+            return None
+        cached = CachedPersona.from_model(persona)
+        self._fill(key, cached, generation)
+        return cached
+
+    async def get_owned(self, db: AsyncSession, persona_id: int, user_id: int) -> Optional[CachedPersona]:
+        """The persona if it exists and was created by `user_id`, else None."""
+        persona = await self.get(db, persona_id)
+        return persona if persona is not None and persona.creator_id == user_id else None
+
+    async def list_for_user(self, db: AsyncSession, user_id: int) -> List[CachedPersona]:
+        key = f"user:{user_id}"
+        cached = self._entries.get(key)
+        if cached is not None:
+            cache_requests.inc(result="hit")
+            return list(cached)
+        cache_requests.inc(result="miss")
+        generation = self._generation
+        rows = (await db.execute(select(Persona).where(Persona.creator_id == user_id))).scalars().all()
+        personas = tuple(CachedPersona.from_model(p) for p in rows)
+        self._fill(key, personas, generation)
+        for persona in personas:
+            self._fill(f"persona:{persona.id}", persona, generation)
+        return list(personas)
+
+    def drop(self, persona_id: Optional[int], creator_id: Optional[int]) -> None:
+        self._generation += 1
+        if persona_id is not None:
+            self._entries.delete(f"persona:{persona_id}")
+        if creator_id is not None:
+            self._entries.delete(f"user:{creator_id}")
+
+    def clear(self) -> None:
+        self._generation += 1
+        self._entries = LocalTTLCache(self._entries.max_entries)
+
+    async def invalidate(self, persona_id: Optional[int], creator_id: Optional[int]) -> None:
+        self.drop(persona_id, creator_id)
+        cache_invalidations.inc(source="local")
+        redis = get_redis()
+        if redis is None:
+            return
+        try:
+            await redis.publish(INVALIDATION_CHANNEL, json.dumps({"persona_id": persona_id, "creator_id": creator_id}))
+        except Exception as e:
+            logger.warning("Persona cache: could not publish invalidation (%s)", e)
+
+    def handle_message(self, data: str) -> None:
+        try:
+            payload = json.loads(data)
+            self.drop(payload.get("persona_id"), payload.get("creator_id"))
+            cache_invalidations.inc(source="remote")
+        except (ValueError, AttributeError):
+            logger.warning("Persona cache: ignoring malformed invalidation %r", data)
+
+
+_cache: Optional[PersonaCache] = None
+
+
+def get_persona_cache() -> PersonaCache:
+    global _cache
+    if _cache is None:
+        _cache = PersonaCache(ttl=settings.PERSONA_CACHE_TTL_SECONDS, max_entries=settings.PERSONA_CACHE_MAX_ENTRIES)
+    return _cache
+
+
+async def listen_for_invalidations(
+    cache: Optional[PersonaCache] = None, retry_delays: Tuple[float, ...] = (1, 2, 5, 10)
+):
+    """
+    Subscribes to INVALIDATION_CHANNEL for the life of the process. After a
+    reconnect the whole cache is cleared, since messages sent while the
+    subscription was down are lost.
+    """
+    cache = cache or get_persona_cache()
+    redis = get_redis()
+    if redis is None:
+        return
+    attempt = 0
+    while True:
+        pubsub = redis.pubsub(ignore_subscribe_messages=True)
+        try:
+            await pubsub.subscribe(INVALIDATION_CHANNEL)
+            if attempt:
+                cache.clear()
+                logger.info("Persona cache: invalidation channel reconnected, cache cleared")
+            attempt = 0
+            while True:
+                message = await pubsub.get_message(timeout=1.0)
+                if message is not None and message.get("type") == "message":
+                    cache.handle_message(message["data"])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            delay = retry_delays[min(attempt, len(retry_delays) - 1)]
+            attempt += 1
+            logger.warning("Persona cache: invalidation channel lost (%s), retrying in %ss", e, delay)
+            await asyncio.sleep(delay)
+        finally:
+            try:
+                await pubsub.aclose()
+            except Exception:
+                pass
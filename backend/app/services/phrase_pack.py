@@ -0,0 +1,136 @@
+import hashlib
+import logging
+import os
+from typing import Dict, Optional, Set
+
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.core.metrics import registry
+from app.models.all_models import Message, Persona
+from app.services.jobs import JobRunnerClosed, get_job_runner
+from app.services.llm_service import FALLBACK_RESPONSE
+from app.services.persona_cache import CachedPersona, get_persona_cache, resolve_voice_ref
+from app.services.scheduler import BATCH, get_pipeline_scheduler
+from app.services.tts_service import get_tts_provider
+from app.services.waveform import waveform_for
+
+logger = logging.getLogger(__name__)
+
+PHRASE_DIR = "static/audio/phrases"
+
+phrases_served = registry.counter("phrase_pack_served_total", "Replies served from a pre-synthesized phrase, by phrase")
+pack_builds = registry.counter("phrase_pack_builds_total", "Phrase pack builds by result")
+
+_building: Set[int] = set()
+
+
+def phrase_texts(user_called_by: str) -> Dict[str, str]:
+    """What each phrase says; a pack is stale once these no longer match it."""
+    return {
+        "greeting": f"Hi {user_called_by}, it's so good to hear from you. How have you been?",
+        "stt_fallback": f"Sorry {user_called_by}, I couldn't quite hear you. Could you say that again?",
+        "llm_fallback": FALLBACK_RESPONSE["content"],
+    }
+
+
+def phrase_for(persona: CachedPersona, key: str) -> Optional[dict]:
+    """
+    The stored {"text", "audio_url", "waveform"} for `key` if the persona's
+    pack was built for its current voice and wording and the clip is still
+    on disk.
+    """
+    pack = persona.phrase_pack
+    if not pack or pack.get("voice") != persona.voice_ref:
+        return None
+    phrase = pack.get("phrases", {}).get(key)
+    if phrase is None or phrase["text"] != phrase_texts(persona.user_called_by).get(key):
+        return None
+    if not os.path.exists(phrase["audio_url"].lstrip("/")):
+        return None
+    return phrase
+
+
+def greeting_message(persona: CachedPersona, conversation_id: int) -> Optional[Message]:
+    """Opening assistant message for a new conversation, or None without a usable greeting."""
+    phrase = phrase_for(persona, "greeting")
+    if phrase is None:
+        if settings.PHRASE_PACK_ENABLED and persona.voice_model_status == "ready":
+            # Older personas never had a pack built; the next conversation will get one
+            schedule_phrase_pack(persona.id)
+        return None
+    phrases_served.inc(phrase="greeting")
+    return Message(
+        conversation_id=conversation_id,
+        role="assistant",
+        content_text=phrase["text"],
+        audio_url=phrase["audio_url"],
+        waveform=phrase.get("waveform"),
+        analysis={"tone": "warm", "phrase": "greeting"},
+    )
+
+
+def schedule_phrase_pack(persona_id: int, db_session_factory=None) -> None:
+    """Builds the persona's pack as a background job, at most one build per persona at a time."""
+    if persona_id in _building:
+        return
+    if db_session_factory is None:
+        from app.core.db import AsyncSessionLocal
+        db_session_factory = AsyncSessionLocal
+    try:
+        task = get_job_runner().submit(build_phrase_pack, persona_id, db_session_factory)
+    except JobRunnerClosed:
+        return
+    _building.add(persona_id)
+    task.add_done_callback(lambda _: _building.discard(persona_id))
+
+
+async def build_phrase_pack(persona_id: int, db_session_factory) -> Optional[dict]:
+    """
+    Synthesizes every phrase in the persona's voice at batch priority, so
+    interactive replies keep the TTS slots, and stores the pack on the
+    persona. Phrases the TTS server could not voice are left out; callers
+    fall back to synthesizing (or silence) as before.
+    """
+    async with db_session_factory() as db:
+        persona = (await db.execute(select(Persona).where(Persona.id == persona_id))).scalar_one_or_none()
+        if persona is None or persona.voice_model_status != "ready":
+            return None
+        voice_ref = resolve_voice_ref(persona)
+        creator_id = persona.creator_id
+        texts = phrase_texts(persona.user_called_by)
+
+    # No session while synthesizing: each batch TTS call can queue for a slot for a long time
+    tts = get_tts_provider()
+    scheduler = get_pipeline_scheduler()
+    os.makedirs(PHRASE_DIR, exist_ok=True)
+    phrases = {}
+    for key, text in texts.items():
+        digest = hashlib.sha1(f"{voice_ref}\n{text}".encode()).hexdigest()[:12]
+        path = os.path.join(PHRASE_DIR, f"persona_{persona_id}_{key}_{digest}.wav")
+        if not os.path.exists(path):
+            ok = await scheduler.run(
+                "tts", creator_id, tts.generate_audio, text=text, voice_id=voice_ref, output_path=path,
+                priority=BATCH, fallback=False
+            )
+            if not ok:
+                # The provider wrote silence; that is no better than what we have without a pack
+                if os.path.exists(path):
+                    os.remove(path)
+                continue
+        phrases[key] = {"text": text, "audio_url": f"/{path}", "waveform": await waveform_for(path)}
+
+    async with db_session_factory() as db:
+        persona = (await db.execute(select(Persona).where(Persona.id == persona_id))).scalar_one_or_none()
+        # The voice may have been replaced (or the persona deleted) while we were synthesizing
+        if persona is None or resolve_voice_ref(persona) != voice_ref:
+            pack_builds.inc(result="stale")
+            return None
+        pack = {"voice": voice_ref, "phrases": phrases}
+        persona.phrase_pack = pack
+        await db.commit()
+
+    await get_persona_cache().invalidate(persona_id, creator_id)
+    pack_builds.inc(result="complete" if len(phrases) == len(phrase_texts("")) else "partial")
+    logger.info("Phrase pack built for persona %s (%d phrases)", persona_id, len(phrases))
+    return pack
@@ -0,0 +1,160 @@
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from sqlalchemy import select, update
+
+from app.core.config import settings
+from app.core.metrics import registry
+from app.models.all_models import Message
+from app.services.jobs import JobRunner, JobRunnerClosed
+
+logger = logging.getLogger(__name__)
+
+recovered_messages = registry.counter("pipeline_recovered_messages_total", "Stuck messages found by the recovery scan")
+
+
+def audio_path_from_url(audio_url: Optional[str]) -> Optional[str]:
+    """Maps a public /static/... URL back to the local file path."""
+    if not audio_url or not audio_url.startswith("/static/"):
+        return None
+    return audio_url.lstrip("/")
+
+
+async def _claim(db_session_factory, msg_id: int, analysis: dict) -> bool:
+    """
+    Moves a pending user message to `processing` unless another replica
+    already did; True if this one won and may enqueue it.
+    """
+    async with db_session_factory() as db:
+        result = await db.execute(
+            update(Message)
+            .where(Message.id == msg_id, Message.status == "pending")
+            .values(status="processing", analysis=analysis)
+        )
+        await db.commit()
+    return result.rowcount == 1
+
+
+async def _release(db_session_factory, msg_id: int, analysis: dict) -> None:
+    """Hands back a claim that could not be enqueued, attempt counter included."""
+    async with db_session_factory() as db:
+        await db.execute(
+            update(Message)
+            .where(Message.id == msg_id, Message.status == "processing")
+            .values(status="pending", analysis=analysis)
+        )
+        await db.commit()
+
+
+async def recover_stuck_messages(
+    db_session_factory,
+    runner: JobRunner,
+    stale_after: Optional[float] = None,
+    batch_size: Optional[int] = None,
+    max_attempts: Optional[int] = None,
+) -> Dict[str, int]:
+    """
+    Finds messages left in `pending`/`processing` by a process that died
+    before finishing them (older than `stale_after` seconds, so jobs still
+    running on other replicas are left alone).
+
+    - user messages still `pending` are re-enqueued through the pipeline,
+      at most `max_attempts` times, if their audio is still on disk
+    - everything else (assistant replies stuck in `processing`, exhausted
+      retries, missing audio) is marked `failed`
+
+    Replicas starting together scan the same rows, so each re-enqueue is
+    claimed first with a conditional pending -> processing update; only
+    the replica whose update matched enqueues it, and a claim younger than
+    `stale_after` is left to the replica running it. An attempt counts
+    once the job is submitted: a claim the runner refuses (shutting down)
+    is handed back unchanged.
+
+    Works in keyset-paginated batches of `batch_size`, committing after each
+    one, so a large backlog never holds long locks on the messages table.
+    """
+    from app.api.v1.chat import process_voice_message
+
+    stale_after = settings.RECOVERY_STALE_SECONDS if stale_after is None else stale_after
+    batch_size = batch_size or settings.RECOVERY_BATCH_SIZE
+    max_attempts = settings.RECOVERY_MAX_ATTEMPTS if max_attempts is None else max_attempts
+    cutoff = datetime.utcnow() - timedelta(seconds=stale_after)
+
+    counts = {"requeued": 0, "failed": 0}
+    last_id = 0
+    closed = False
+    while True:
+        async with db_session_factory() as db:
+            stmt = (
+                select(Message)
+                .where(
+                    Message.id > last_id,
+                    Message.status.in_(("pending", "processing")),
+                    Message.created_at <= cutoff,
+                )
+                .order_by(Message.id)
+                .limit(batch_size)
+            )
+            batch = (await db.execute(stmt)).scalars().all()
+            if not batch:
+                break
+
+            to_enqueue = []
+            for msg in batch:
+                analysis = dict(msg.analysis or {})
+                claimed_at = analysis.get("recovery_claimed_at", 0)
+                if msg.role == "user" and msg.status == "processing" and claimed_at > cutoff.timestamp():
+                    # Re-enqueued by a recovery scan that is still within its time
+                    continue
+                attempts = analysis.get("recovery_attempts", 0)
+                audio_path = audio_path_from_url(msg.audio_url)
+                requeue = (
+                    msg.role == "user"
+                    and msg.status == "pending"
+                    and attempts < max_attempts
+                    and audio_path is not None
+                    and os.path.exists(audio_path)
+                )
+                if requeue:
+                    to_enqueue.append((msg, analysis, audio_path))
+                    continue
+                if msg.role == "user" and msg.status == "pending" and closed:
+                    # Left for the next startup, like the one the runner refused
+                    continue
+                # Conditional, so a row another replica claimed meanwhile is not failed under it
+                result = await db.execute(
+                    update(Message)
+                    .where(Message.id == msg.id, Message.status == msg.status)
+                    .values(status="failed", analysis={**analysis, "failure": "interrupted"})
+                )
+                counts["failed"] += result.rowcount
+            last_id = batch[-1].id
+            await db.commit()
+
+        for msg, analysis, audio_path in to_enqueue:
+            if closed:
+                break
+            claim = {**analysis, "recovery_attempts": analysis.get("recovery_attempts", 0) + 1,
+                     "recovery_claimed_at": datetime.utcnow().timestamp()}
+            if not await _claim(db_session_factory, msg.id, claim):
+                continue
+            try:
+                runner.submit(process_voice_message, msg.conversation_id, msg.id, audio_path, db_session_factory)
+                counts["requeued"] += 1
+            except JobRunnerClosed:
+                # Still pending with its attempts intact; the next startup picks it up again.
+                await _release(db_session_factory, msg.id, analysis)
+                closed = True
+
+        if len(batch) < batch_size:
+            break
+
+    recovered_messages.inc(counts["requeued"], action="requeued")
+    recovered_messages.inc(counts["failed"], action="failed")
+    if counts["requeued"] or counts["failed"]:
+        logger.warning(
+            "Recovery scan: re-enqueued %d and failed %d stuck messages", counts["requeued"], counts["failed"]
+        )
+    return counts
@@ -0,0 +1,307 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import registry
+from app.services.concurrency_limit import FixedLimit, build_limit
+from app.services.traffic_recorder import note_stage
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+
+queue_depth = registry.gauge("pipeline_queue_depth", "Jobs waiting for an upstream slot, per priority tier")
+in_flight = registry.gauge("pipeline_in_flight", "Upstream calls currently holding a slot")
+queue_wait = registry.summary("pipeline_queue_wait_seconds", "Time spent waiting for an upstream slot")
+stage_latency = registry.summary("pipeline_stage_seconds", "Upstream call duration, excluding queue wait")
+concurrency_limit = registry.gauge("pipeline_concurrency_limit", "Upstream calls currently allowed in flight")
+deadline_expired = registry.counter("pipeline_queue_deadline_total", "Calls that gave up waiting for an upstream slot")
+
+# A flow is one (priority, user) pair; each flow gets its own queue per upstream.
+FlowKey = Tuple[str, Hashable]
+
+# run() without a fallback raises QueueDeadlineExceeded when the deadline passes
+_RAISE = object()
+
+
+class QueueDeadlineExceeded(Exception):
+    def __init__(self, upstream: str, waited: float):
+        super().__init__(f"No {upstream} slot within {waited:.1f}s")
+        self.upstream = upstream
+        self.waited = waited
+
+
+class _Lane:
+    """
+    Concurrency slots for one upstream (stt / llm / tts), as many as its
+    limit allows (see concurrency_limit). Waiting jobs are served with
+    deficit round-robin across flows, where the quantum of a flow is the
+    weight of its priority tier.
+    """
+
+    def __init__(self, name: str, limit, weights: Dict[str, int]):
+        self.name = name
+        self.limit = limit
+        self.weights = weights
+        self.in_flight = 0
+        self._queues: Dict[FlowKey, Deque[asyncio.Future]] = {}
+        self._active: Deque[FlowKey] = deque()
+        self._deficit: Dict[FlowKey, int] = {}
+
+    def _quantum(self, flow: FlowKey) -> int:
+        return max(1, self.weights.get(flow[0], 1))
+
+    def _set_depth(self, flow: FlowKey) -> None:
+        # Exported per lane and tier only: /metrics is not the place to list who is active
+        priority = flow[0]
+        depth = sum(len(q) for (tier, _), q in self._queues.items() if tier == priority)
+        queue_depth.set(depth, upstream=self.name, priority=priority)
+
+    @property
+    def slots(self) -> int:
+        return max(1, int(self.limit.limit))
+
+    def depth(self) -> int:
+        return sum(len(q) for q in self._queues.values())
+
+    def sample(self, rtt: float, in_flight: int, dropped: bool) -> None:
+        """Feeds a finished call to the limit; a raised limit admits waiting jobs at once."""
+        self.limit.update(rtt, in_flight, dropped)
+        concurrency_limit.set(self.slots, upstream=self.name)
+        self._dispatch()
+
+    async def acquire(self, flow: FlowKey, deadline: Optional[float] = None) -> None:
+        if self.in_flight < self.slots and not self._active:
+            self._grant()
+            return
+
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+        queue = self._queues.get(flow)
+        if queue is None:
+            queue = self._queues[flow] = deque()
+            self._active.append(flow)
+            self._deficit[flow] = 0
+        queue.append(waiter)
+        self._set_depth(flow)
+        expiry = loop.call_later(deadline, self._expire, flow, waiter, deadline) if deadline else None
+
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled() and waiter.exception() is None:
+                # Slot was granted just before cancellation: hand it back.
+                # (A waiter failed by _expire never had one.)
+                self.release()
+            else:
+                self._discard(flow, waiter)
+            raise
+        finally:
+            if expiry is not None:
+                expiry.cancel()
+
+    def _expire(self, flow: FlowKey, waiter: asyncio.Future, deadline: float) -> None:
+        if waiter.done():
+            return
+        self._discard(flow, waiter)
+        deadline_expired.inc(upstream=self.name, priority=flow[0])
+        waiter.set_exception(QueueDeadlineExceeded(self.name, deadline))
+
+    def _discard(self, flow: FlowKey, waiter: asyncio.Future) -> None:
+        queue = self._queues.get(flow)
+        if queue is None:
+            return
+        try:
+            queue.remove(waiter)
+        except ValueError:
+            pass
+        if not queue:
+            self._drop_flow(flow)
+        self._set_depth(flow)
+
+    def _drop_flow(self, flow: FlowKey) -> None:
+        self._queues.pop(flow, None)
+        self._deficit.pop(flow, None)
+        try:
+            self._active.remove(flow)
+        except ValueError:
+            pass
+
+    def _grant(self) -> None:
+        self.in_flight += 1
+        in_flight.set(self.in_flight, upstream=self.name)
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        in_flight.set(self.in_flight, upstream=self.name)
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        while self.in_flight < self.slots and self._active:
+            flow = self._active[0]
+            queue = self._queues[flow]
+            if self._deficit[flow] <= 0:
+                self._deficit[flow] += self._quantum(flow)
+
+            waiter = queue.popleft()
+            self._deficit[flow] -= 1
+            if not queue:
+                self._drop_flow(flow)
+            elif self._deficit[flow] <= 0:
+                self._active.rotate(-1)
+            self._set_depth(flow)
+
+            if waiter.done():
+                continue
+            self._grant()
+            waiter.set_result(None)
+
+
+class PipelineScheduler:
+    """
+    Sits in front of the STT / LLM / TTS stages of the voice pipeline so a
+    single busy user cannot monopolise upstream capacity.
+    """
+
+    def __init__(self, slots: Dict[str, int], weights: Optional[Dict[str, int]] = None, latency_alpha: float = 0.2,
+                 limits: Optional[Dict[str, object]] = None, queue_deadline: Optional[float] = None):
+        weights = dict(weights or {INTERACTIVE: 1})
+        # Limits default to the fixed slot counts; from_settings builds the adaptive ones
+        limits = limits or {}
+        self._lanes = {name: _Lane(name, limits.get(name) or FixedLimit(n), weights) for name, n in slots.items()}
+        for lane in self._lanes.values():
+            concurrency_limit.set(lane.slots, upstream=lane.name)
+        self.latency_alpha = latency_alpha
+        self.queue_deadline = queue_deadline
+        # Smoothed call duration per upstream, and start times of calls still running
+        self._latency: Dict[str, float] = {}
+        self._running: Dict[str, Dict[object, float]] = {name: {} for name in slots}
+
+    @classmethod
+    def from_settings(cls) -> "PipelineScheduler":
+        slots = {
+            "stt": settings.PIPELINE_STT_SLOTS,
+            "llm": settings.PIPELINE_LLM_SLOTS,
+            "tts": settings.PIPELINE_TTS_SLOTS,
+        }
+        return cls(
+            slots=slots,
+            weights=settings.PIPELINE_PRIORITY_WEIGHTS,
+            limits={
+                name: build_limit(
+                    settings.PIPELINE_LIMIT_ALGORITHMS.get(name, "fixed"), n, max(n, settings.PIPELINE_MAX_SLOTS),
+                    slow_seconds=settings.PIPELINE_LIMIT_SLOW_SECONDS,
+                )
+                for name, n in slots.items()
+            },
+            queue_deadline=settings.PIPELINE_QUEUE_DEADLINE_SECONDS or None,
+        )
+
+    @asynccontextmanager
+    async def slot(self, upstream: str, user_id: Hashable, priority: str = INTERACTIVE,
+                   deadline: Optional[float] = None):
+        lane = self._lanes[upstream]
+        started = time.perf_counter()
+        try:
+            await lane.acquire((priority, user_id), deadline)
+        finally:
+            queue_wait.observe(time.perf_counter() - started, upstream=upstream, priority=priority)
+        try:
+            yield
+        finally:
+            lane.release()
+
+    async def run(
+        self,
+        upstream: str,
+        user_id: Hashable,
+        func: Callable[..., Awaitable[Any]],
+        *args,
+        priority: str = INTERACTIVE,
+        fallback: Any = _RAISE,
+        **kwargs,
+    ) -> Any:
+        """
+        Calls func once a slot is free. `fallback` is what the provider
+        returns when it fails (False for TTS, STT_ERROR_TEXT, ...): a
+        result equal to it counts as an error for the lane's limit, and it
+        is returned as is when the queue deadline passes first.
+        """
+        lane = self._lanes[upstream]
+        queued = time.perf_counter()
+        try:
+            async with self.slot(upstream, user_id, priority, self.queue_deadline):
+                started = time.perf_counter()
+                in_flight_at_start = lane.in_flight
+                call = object()
+                self._running[upstream][call] = started
+                # Stays None when cancelled: the caller left, which says nothing about the upstream
+                dropped = None
+                try:
+                    result = await func(*args, **kwargs)
+                    dropped = fallback is not _RAISE and result == fallback
+                    return result
+                except Exception:
+                    dropped = True
+                    raise
+                finally:
+                    del self._running[upstream][call]
+                    elapsed = time.perf_counter() - started
+                    stage_latency.observe(elapsed, upstream=upstream)
+                    previous = self._latency.get(upstream)
+                    a = self.latency_alpha
+                    self._latency[upstream] = elapsed if previous is None else (1 - a) * previous + a * elapsed
+                    note_stage(f"{upstream}:{getattr(func, '__name__', 'call')}", started - queued, elapsed)
+                    if dropped is not None:
+                        lane.sample(elapsed, in_flight_at_start, dropped)
+        except QueueDeadlineExceeded as e:
+            logger.warning("%s (user %s)", e, user_id)
+            if fallback is _RAISE:
+                raise
+            return fallback
+
+    def upstreams(self):
+        return list(self._lanes)
+
+    def stage_estimate(self, upstream: str) -> float:
+        """
+        Rough seconds a job submitted now would spend in this stage: the
+        call time (smoothed, or the age of the oldest running call if that
+        is longer, so a stalled upstream shows before any call finishes)
+        times one plus the queue ahead of it per slot.
+        """
+        lane = self._lanes[upstream]
+        latency = self._latency.get(upstream, 0.0)
+        running = self._running[upstream]
+        if running:
+            latency = max(latency, time.perf_counter() - min(running.values()))
+        return latency * (1 + lane.depth() / lane.slots)
+
+    def queue_depth(self, upstream: Optional[str] = None) -> int:
+        lanes = [self._lanes[upstream]] if upstream else self._lanes.values()
+        return sum(lane.depth() for lane in lanes)
+
+    def user_queue_depths(self) -> Dict[str, Dict[str, int]]:
+        """Waiting jobs per upstream and user, for spotting who causes contention (GET /admin/pipeline/queues)."""
+        depths: Dict[str, Dict[str, int]] = {}
+        for name, lane in self._lanes.items():
+            per_user: Dict[str, int] = {}
+            for (_, user_id), queue in lane._queues.items():
+                per_user[str(user_id)] = per_user.get(str(user_id), 0) + len(queue)
+            depths[name] = per_user
+        return depths
+
+
+_scheduler: Optional[PipelineScheduler] = None
+
+
+def get_pipeline_scheduler() -> PipelineScheduler:
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = PipelineScheduler.from_settings()
+    return _scheduler
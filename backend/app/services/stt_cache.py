@@ -0,0 +1,125 @@
+"""
+Transcription cache in front of the STT provider.
+
+Keyed by the model name and a hash of the normalized audio: for WAV only
+the format and the sample data count, so the same recording with a
+different header (metadata chunks, padding) still hits. Entries live in
+Redis with a TTL, indexed by insertion time so the oldest beyond
+STT_CACHE_MAX_ENTRIES are dropped; without Redis a bounded process-local
+cache stands in.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from typing import Optional
+
+from app.core.cache import LocalTTLCache, get_redis
+from app.core.config import settings
+from app.core.metrics import registry
+from app.services.stt_service import STT_ERROR_TEXT, STTProvider
+from app.services.wav import open_pcm
+
+logger = logging.getLogger(__name__)
+
+stt_cache_lookups = registry.counter("stt_cache_lookups_total", "Transcription cache lookups by result (hit/miss)")
+stt_seconds_saved = registry.counter(
+    "stt_cache_seconds_saved_total", "Upstream STT seconds not spent thanks to cache hits"
+)
+
+_INDEX_KEY = "stt:index"
+_HASH_FRAMES = 1 << 16
+_HASH_BYTES = 1 << 20
+
+# Store the entry, index it by time, and drop the oldest entries beyond the bound
+_PUT = """
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+redis.call('ZADD', KEYS[2], ARGV[3], KEYS[1])
+local excess = redis.call('ZCARD', KEYS[2]) - tonumber(ARGV[4])
+if excess > 0 then
+    local oldest = redis.call('ZRANGE', KEYS[2], 0, excess - 1)
+    redis.call('ZREMRANGEBYRANK', KEYS[2], 0, excess - 1)
+    redis.call('DEL', unpack(oldest))
+end
+"""
+
+
+def audio_fingerprint(audio_path: str) -> str:
+    """SHA-256 of the sample format and data of a WAV file, or of the raw bytes of anything else. Blocking."""
+    digest = hashlib.sha256()
+    pcm = open_pcm(audio_path)
+    if pcm is not None:
+        digest.update(f"pcm:{pcm.sample_rate}:{pcm.channels}:{pcm.samples.dtype.str}:".encode())
+        for start in range(0, pcm.frames, _HASH_FRAMES):
+            digest.update(pcm.samples[start:start + _HASH_FRAMES].tobytes())
+        return digest.hexdigest()
+    with open(audio_path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_BYTES), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class TranscriptCache:
+    def __init__(self, ttl: int, max_entries: int, local: Optional[LocalTTLCache] = None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.local = local or LocalTTLCache(max_entries=max_entries)
+
+    async def get(self, key: str) -> Optional[dict]:
+        redis = get_redis()
+        if redis is not None:
+            try:
+                value = await redis.get(key)
+                return json.loads(value) if value is not None else None
+            except Exception as e:
+                logger.warning("STT cache: Redis unavailable, using local fallback (%s)", e)
+        return self.local.get(key)
+
+    async def put(self, key: str, entry: dict) -> None:
+        redis = get_redis()
+        if redis is not None:
+            try:
+                await redis.eval(_PUT, 2, key, _INDEX_KEY, json.dumps(entry), self.ttl, time.time(), self.max_entries)
+                return
+            except Exception as e:
+                logger.warning("STT cache: Redis unavailable, using local fallback (%s)", e)
+        self.local.set(key, entry, self.ttl)
+
+
+class CachedSTTProvider(STTProvider):
+    """Answers repeated audio from the cache; only successful transcripts are stored."""
+
+    def __init__(self, inner: STTProvider, cache: "TranscriptCache"):
+        self.inner = inner
+        self.cache = cache
+        self.model = getattr(inner, "model", type(inner).__name__)
+
+    async def transcribe(self, audio_path: str) -> str:
+        try:
+            digest = await asyncio.to_thread(audio_fingerprint, audio_path)
+        except OSError:
+            return await self.inner.transcribe(audio_path)
+        key = f"stt:{self.model}:{digest}"
+        cached = await self.cache.get(key)
+        if cached is not None:
+            stt_cache_lookups.inc(result="hit")
+            stt_seconds_saved.inc(cached.get("seconds", 0.0))
+            return cached["text"]
+
+        stt_cache_lookups.inc(result="miss")
+        started = time.perf_counter()
+        text = await self.inner.transcribe(audio_path)
+        if text != STT_ERROR_TEXT:
+            await self.cache.put(key, {"text": text, "seconds": round(time.perf_counter() - started, 3)})
+        return text
+
+
+_cache: Optional[TranscriptCache] = None
+
+
+def get_transcript_cache() -> TranscriptCache:
+    global _cache
+    if _cache is None:
+        _cache = TranscriptCache(ttl=settings.STT_CACHE_TTL_SECONDS, max_entries=settings.STT_CACHE_MAX_ENTRIES)
+    return _cache
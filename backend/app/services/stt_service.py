@@ -3,25 +3,42 @@ import shutil
 import os
 import logging
 from app.core.config import settings
+from app.core.tracing import traced_async_client
+from app.services.usage_meter import record_stt
+from app.services.wav import open_pcm
 
 logger = logging.getLogger(__name__)
 
+# Returned in place of a transcript when transcription fails
+STT_ERROR_TEXT = "Error transcribing audio."
+
+def wav_seconds(audio_path: str) -> float:
+    """Duration from the WAV header; 0.0 for compressed uploads, which would need decoding."""
+    try:
+        pcm = open_pcm(audio_path)
+    except OSError:
+        return 0.0
+    return pcm.duration if pcm is not None else 0.0
+
 class STTProvider(abc.ABC):
     @abc.abstractmethod
     async def transcribe(self, audio_path: str) -> str:
         pass
 
 class MockSTTProvider(STTProvider):
+    model = "mock"
+
     async def transcribe(self, audio_path: str) -> str:
-        logger.info(f"MOCK STT: Transcribing {audio_path}")
+        logger.info("MOCK STT: Transcribing %s", audio_path)
+        record_stt(self.model, wav_seconds(audio_path))
         return "This is a simulated transcription of your voice message."
 
 class OpenAIWhisperProvider(STTProvider):
     def __init__(self):
         from openai import AsyncOpenAI
-        import httpx
         
-        http_client = httpx.AsyncClient(proxy=settings.OPENAI_PROXY) if settings.OPENAI_PROXY else None
+        self.model = settings.OPENAI_STT_MODEL
+        http_client = traced_async_client(proxy=settings.OPENAI_PROXY or None)
 
         self.client = AsyncOpenAI(
             api_key=settings.OPENAI_API_KEY,
@@ -31,22 +48,36 @@ class OpenAIWhisperProvider(STTProvider):
 
     async def transcribe(self, audio_path: str) -> str:
         try:
-            size = os.path.getsize(audio_path) if os.path.exists(audio_path) else 0
-            logger.info(f"Whisper: Transcribing file {audio_path} (size={size} bytes)")
+            logger.info("Whisper: Transcribing file %s", audio_path)
+            # The size probe is a syscall; only pay for it when the line is emitted
+            if logger.isEnabledFor(logging.DEBUG):
+                size = os.path.getsize(audio_path) if os.path.exists(audio_path) else 0
+                logger.debug("Whisper: Transcribing file %s (size=%d bytes)", audio_path, size)
+            # Whisper models report the billed duration in verbose_json, WebM uploads included
+            verbose = self.model.startswith("whisper")
             with open(audio_path, "rb") as audio_file:
                 transcript = await self.client.audio.transcriptions.create(
-                    model="whisper-1", 
-                    file=audio_file
+                    model=self.model, 
+                    file=audio_file,
+                    **({"response_format": "verbose_json"} if verbose else {})
                 )
+            seconds = getattr(transcript, "duration", None)
+            record_stt(self.model, float(seconds) if seconds else wav_seconds(audio_path))
             return transcript.text
         except Exception as e:
-            logger.error(f"Whisper Error: {e} | path={audio_path}")
-            return "Error transcribing audio."
+            logger.error("Whisper Error: %s | path=%s", e, audio_path)
+            return STT_ERROR_TEXT
 
 def get_stt_provider() -> STTProvider:
     api_key = settings.OPENAI_API_KEY
     if not api_key or api_key == "mock":
         logger.info("STT Provider: Mock")
-        return MockSTTProvider()
-    logger.info("STT Provider: OpenAI Whisper")
-    return OpenAIWhisperProvider()
+        provider = MockSTTProvider()
+    else:
+        logger.info("STT Provider: OpenAI Whisper")
+        provider = OpenAIWhisperProvider()
+    if settings.STT_CACHE_ENABLED:
+        from app.services.stt_cache import CachedSTTProvider, get_transcript_cache
+
+        provider = CachedSTTProvider(provider, get_transcript_cache())
+    return provider
@@ -0,0 +1,29 @@
+"""
+The traffic recording file format (see traffic_recorder), readable
+without the app's settings: replay_traffic.py's parent process only reads
+the recording and the child reports, and needs no SECRET_KEY or database.
+"""
+import json
+from typing import List
+
+FORMAT_VERSION = 1
+
+
+def read_recording(path: str) -> List[dict]:
+    """The records of a recording in arrival order; a torn last line (a crash mid-write) is skipped."""
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if record.get("v") == FORMAT_VERSION:
+                records.append(record)
+    records.sort(key=lambda r: r["t"])
+    return records
+
+
+def saturated(summary: dict, max_wait: float) -> bool:
+    """Turns were shed, or p95 queueing across the stages exceeded `max_wait` seconds."""
+    return summary["shed_503"] > 0 or summary["text_only"] > 0 or summary["wait_p95_s"] > max_wait
@@ -0,0 +1,172 @@
+"""
+Opt-in recorder of pipeline traffic shape, for capacity planning.
+
+With TRAFFIC_RECORD_PATH set, every pipeline run (a TRAFFIC_RECORD_SAMPLE
+fraction of them) appends one JSON line:
+
+    {"v": 1, "t": 1760000000.123, "u": "9f2c41d0aa", "p": "interactive", "text_only": false,
+     "audio_ms": 2300, "in_chars": 42, "out_chars": 88, "tok_in": 610, "tok_out": 35, "tts_chars": 88,
+     "stages": {"stt:transcribe": [wait_ms, call_ms, calls], "llm:recall": [...],
+                "llm:generate_response": [...], "tts:generate_audio": [...]},
+     "e2e_ms": 3180, "outcome": "ok"}
+
+`t` is when the run started, `u` a keyed hash of the user id (stable
+within a deployment, so per-user fairness can be replayed, but not
+reversible without SECRET_KEY), `stages` the scheduler's queue wait and
+call time per upstream lane and function called through it. No text,
+audio or ids are written. The pipeline reports through a context
+variable, like usage_meter, and each line is a single buffered append.
+replay_traffic.py re-drives a recording.
+"""
+import hashlib
+import hmac
+import json
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional
+
+from app.core.config import settings
+from app.core.metrics import registry
+from app.services.traffic_format import FORMAT_VERSION
+
+logger = logging.getLogger(__name__)
+
+recorded_turns = registry.counter("traffic_recorded_turns_total", "Pipeline runs written by the traffic recorder")
+
+
+@dataclass
+class TurnTrace:
+    """What the recorder keeps of one pipeline run until it is written."""
+    arrival: float
+    priority: str
+    text_only: bool
+    started: float = field(default_factory=time.perf_counter)
+    user_id: Optional[int] = None
+    transcript_chars: int = 0
+    reply_chars: int = 0
+    outcome: Any = None
+    # "<upstream>:<function>" -> [wait_ms, call_ms, calls]
+    stages: Dict[str, List[int]] = field(default_factory=dict)
+    closed: bool = False
+
+
+def outcome_label(outcome) -> str:
+    """Collapses a usage_rollup.TurnOutcome to the one word the recording keeps."""
+    if outcome is None or outcome.failed:
+        return "failed"
+    for name in ("stt", "llm", "tts"):
+        if getattr(outcome, f"{name}_failed"):
+            return f"{name}_fallback"
+    return "ok"
+
+
+class TrafficRecorder:
+    def __init__(self, path: str, sample_rate: float = 1.0):
+        self.path = path
+        self.sample_rate = sample_rate
+        self._file = None
+        self._lock = threading.Lock()
+
+    def sampled(self) -> bool:
+        return self.sample_rate >= 1.0 or random.random() < self.sample_rate
+
+    def anonymize(self, user_id: Optional[int]) -> Optional[str]:
+        if user_id is None:
+            return None
+        return hmac.new(settings.SECRET_KEY.encode(), str(user_id).encode(), hashlib.sha256).hexdigest()[:10]
+
+    def line(self, trace: TurnTrace, usage) -> dict:
+        return {
+            "v": FORMAT_VERSION,
+            "t": round(trace.arrival, 3),
+            "u": self.anonymize(trace.user_id),
+            "p": trace.priority,
+            "text_only": trace.text_only,
+            "audio_ms": usage.stt_audio_ms,
+            "in_chars": trace.transcript_chars,
+            "out_chars": trace.reply_chars,
+            "tok_in": usage.llm_tokens_in,
+            "tok_out": usage.llm_tokens_out,
+            "tts_chars": usage.tts_chars,
+            "stages": trace.stages,
+            "e2e_ms": int((time.perf_counter() - trace.started) * 1000),
+            "outcome": outcome_label(trace.outcome),
+        }
+
+    def write(self, trace: TurnTrace, usage) -> None:
+        data = json.dumps(self.line(trace, usage), separators=(",", ":")) + "\n"
+        try:
+            with self._lock:
+                if self._file is None:
+                    os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                    # Line buffered: each record reaches the file whole, without an fsync per turn
+                    self._file = open(self.path, "a", buffering=1, encoding="utf-8")
+                self._file.write(data)
+        except OSError as e:
+            # Recording is diagnostics; it never fails a turn
+            logger.warning("Traffic recorder could not write to %s: %s", self.path, e)
+            return
+        recorded_turns.inc()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+_current: ContextVar[Optional[TurnTrace]] = ContextVar("turn_trace", default=None)
+
+
+@contextmanager
+def recording(usage, priority: str, text_only: bool) -> Iterator[Optional[TurnTrace]]:
+    """Records the pipeline run in this block, if the recorder is on and samples it; written on exit."""
+    recorder = get_traffic_recorder()
+    if recorder is None or not recorder.sampled():
+        yield None
+        return
+    trace = TurnTrace(arrival=time.time(), priority=priority, text_only=text_only)
+    token = _current.set(trace)
+    try:
+        yield trace
+    finally:
+        _current.reset(token)
+        # Tasks the run started keep the context; what they do afterwards is not part of the turn
+        trace.closed = True
+        recorder.write(trace, usage)
+
+
+def note(**fields) -> None:
+    """Sets TurnTrace fields (user_id, transcript_chars, reply_chars, outcome) on the run being recorded."""
+    trace = _current.get()
+    if trace is not None and not trace.closed:
+        for name, value in fields.items():
+            setattr(trace, name, value)
+
+
+def note_stage(name: str, wait: float, call: float) -> None:
+    """Adds one scheduled call ("<upstream>:<function>"; seconds waiting for a slot, seconds in the call) to the run."""
+    trace = _current.get()
+    if trace is None or trace.closed:
+        return
+    stage = trace.stages.setdefault(name, [0, 0, 0])
+    stage[0] += int(wait * 1000)
+    stage[1] += int(call * 1000)
+    stage[2] += 1
+
+
+_recorder: Optional[TrafficRecorder] = None
+
+
+def get_traffic_recorder() -> Optional[TrafficRecorder]:
+    """The recorder, or None when TRAFFIC_RECORD_PATH is not set."""
+    global _recorder
+    if _recorder is None and settings.TRAFFIC_RECORD_PATH:
+        _recorder = TrafficRecorder(settings.TRAFFIC_RECORD_PATH, settings.TRAFFIC_RECORD_SAMPLE)
+    return _recorder
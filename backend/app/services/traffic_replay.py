@@ -0,0 +1,208 @@
+"""
+Pieces of replay_traffic.py: stand-in providers that take as long as the
+recorded calls did, the upload that carries a recorded turn through the
+app, and the report.
+
+Each replayed turn uploads a silent WAV of the recorded audio length whose
+first two samples hold the record's index. The stand-in STT reads it back,
+sleeps for the recorded transcribe call time and returns a "#<index> ..."
+transcript of the recorded length, which is how the LLM and TTS stand-ins
+find the same record. Recorded fallbacks are reproduced; queue waits are
+not, they are what the replay measures.
+"""
+import asyncio
+import contextlib
+import io
+import re
+import statistics
+import time
+import wave
+from typing import Dict, List, Optional, Tuple
+
+from app.core.security import create_access_token
+from app.models.all_models import Conversation, Persona, User
+from app.services.llm_service import FALLBACK_RESPONSE, LLMProvider
+from app.services.stt_service import STT_ERROR_TEXT, STTProvider
+from app.services.traffic_recorder import TrafficRecorder, TurnTrace
+from app.services.tts_service import TTSProvider, generate_silent_wav
+from app.services.usage_meter import record_llm, record_stt, record_tts
+
+REPLAY_RATE = 8000
+_MARKER = re.compile(r"#(\d+) ")
+
+
+def turn_audio(index: int, audio_ms: int) -> bytes:
+    """Silent 8 kHz WAV of the recorded length, tagged with the record index."""
+    frames = bytearray(max(2, REPLAY_RATE * audio_ms // 1000) * 2)
+    frames[0:4] = (index & 0xFFFF).to_bytes(2, "little") + (index >> 16).to_bytes(2, "little")
+    buffer = io.BytesIO()
+    with contextlib.closing(wave.open(buffer, "wb")) as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(REPLAY_RATE)
+        f.writeframes(bytes(frames))
+    return buffer.getvalue()
+
+
+def turn_index(audio_path: str) -> int:
+    with contextlib.closing(wave.open(audio_path, "rb")) as f:
+        head = f.readframes(2)
+    return int.from_bytes(head[0:2], "little") | int.from_bytes(head[2:4], "little") << 16
+
+
+def _text(index: int, length: int) -> str:
+    marker = f"#{index} "
+    return marker + "a" * max(0, length - len(marker))
+
+
+def _call_seconds(record: dict, stage: str) -> float:
+    """Recorded time of one call of `stage` (calls of a turn averaged)."""
+    wait_ms, call_ms, calls = record.get("stages", {}).get(stage, (0, 0, 0))
+    return call_ms / max(1, calls) / 1000
+
+
+class _StandIn:
+    def __init__(self, records: List[dict]):
+        self.records = records
+
+    def _record(self, text: str) -> Optional[Tuple[int, dict]]:
+        match = _MARKER.match(text)
+        if match is None or int(match.group(1)) >= len(self.records):
+            return None
+        index = int(match.group(1))
+        return index, self.records[index]
+
+
+class StandInSTT(_StandIn, STTProvider):
+    model = "replay"
+
+    async def transcribe(self, audio_path: str) -> str:
+        index = turn_index(audio_path)
+        record = self.records[index]
+        await asyncio.sleep(_call_seconds(record, "stt:transcribe"))
+        record_stt(self.model, record["audio_ms"] / 1000)
+        if record["outcome"] == "stt_fallback":
+            return STT_ERROR_TEXT
+        return _text(index, record["in_chars"])
+
+
+class StandInLLM(_StandIn, LLMProvider):
+    async def generate_response(self, system_prompt: str, user_text: str, history: Optional[List[dict]] = None) -> dict:
+        found = self._record(user_text)
+        if found is None:
+            # Not a replayed turn (a summary refresh): answer at once
+            return {"tone": "neutral", "content": "summary"}
+        index, record = found
+        await asyncio.sleep(_call_seconds(record, "llm:generate_response"))
+        record_llm("replay", record["tok_in"], record["tok_out"])
+        if record["outcome"] == "llm_fallback":
+            return FALLBACK_RESPONSE
+        return {"tone": "warm", "content": _text(index, record["out_chars"])}
+
+
+class StandInTTS(_StandIn, TTSProvider):
+    async def clone_voice(self, audio_path: str, name: str) -> str:
+        return "replay"
+
+    async def generate_audio(self, text: str, voice_id: str, output_path: str) -> bool:
+        found = self._record(text)
+        record = found[1] if found else {}
+        await asyncio.sleep(_call_seconds(record, "tts:generate_audio") if found else 0)
+        record_tts(len(text))
+        generate_silent_wav(output_path, duration=0.5)
+        return record.get("outcome") != "tts_fallback"
+
+
+class CollectingRecorder(TrafficRecorder):
+    """Keeps the replayed turns' records in memory instead of appending them to a file."""
+
+    def __init__(self):
+        super().__init__(path="", sample_rate=1.0)
+        self.lines: List[dict] = []
+
+    def write(self, trace: TurnTrace, usage) -> None:
+        self.lines.append(self.line(trace, usage))
+
+
+async def seed_users(session_factory, records: List[dict]) -> Dict[str, Tuple[str, int]]:
+    """
+    One user, persona and conversation per recorded (anonymized) user;
+    returns u -> (bearer token, persona id). The conversation exists up
+    front, as it would for a returning user, so concurrent first sends do
+    not each start one.
+    """
+    seeded = {}
+    async with session_factory() as db:
+        for n, u in enumerate(sorted({str(r.get("u")) for r in records})):
+            user = User(username=f"replay{n}", email=f"replay{n}@example.com", hashed_password="x")
+            db.add(user)
+            await db.flush()
+            persona = Persona(creator_id=user.id, name="Replay", relationship_type="Friend", user_called_by="You",
+                              persona_called_by="Replay", voice_model_status="ready", legal_confirmed=True)
+            db.add(persona)
+            await db.flush()
+            db.add(Conversation(user_id=user.id, persona_id=persona.id))
+            seeded[u] = (create_access_token(user.username), persona.id)
+        await db.commit()
+    return seeded
+
+
+async def send_turns(client, records: List[dict], users: Dict[str, Tuple[str, int]], speed: float) -> List[dict]:
+    """
+    Uploads every record at its recorded offset from the first, divided by
+    `speed`. Returns per send: status code and how late the driver sent it.
+    """
+    origin = records[0]["t"]
+    started = time.perf_counter()
+
+    async def send(index: int, record: dict) -> dict:
+        due = (record["t"] - origin) / speed
+        await asyncio.sleep(max(0.0, due - (time.perf_counter() - started)))
+        late = time.perf_counter() - started - due
+        token, persona_id = users[str(record.get("u"))]
+        response = await client.post(
+            f"/api/v1/conversations/{persona_id}/send",
+            files={"file": (f"turn{index}.wav", turn_audio(index, record["audio_ms"]), "audio/wav")},
+            headers={"Authorization": f"Bearer {token}"},
+        )
+        return {"status": response.status_code, "late_s": late}
+
+    return await asyncio.gather(*(send(i, r) for i, r in enumerate(records)))
+
+
+def _p(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[int(q * 100) - 1]
+
+
+def summarize(speed: float, sends: List[dict], replayed: List[dict], wall: float) -> dict:
+    """Per replay speed: what was sent, shed and done, end-to-end latency and queue waits."""
+    statuses = [s["status"] for s in sends]
+    # Queue wait per upstream lane, over all the functions called through it
+    waits = {
+        lane: [sum(w for stage, (w, _, _) in r["stages"].items() if stage.startswith(f"{lane}:")) / 1000
+               for r in replayed]
+        for lane in ("stt", "llm", "tts")
+    }
+    total_wait = [sum(stage[0] for stage in r["stages"].values()) / 1000 for r in replayed]
+    # Time not spent waiting for or in an upstream call: database (pool checkouts included), disk, CPU
+    outside = [(r["e2e_ms"] - sum(w + c for w, c, _ in r["stages"].values())) / 1000 for r in replayed]
+    return {
+        "speed": speed,
+        "sent": len(sends),
+        "shed_503": statuses.count(503),
+        "over_budget_429": statuses.count(429),
+        "done": len(replayed),
+        "failed": sum(r["outcome"] == "failed" for r in replayed),
+        "text_only": sum(r["text_only"] for r in replayed),
+        "turns_per_s": round(len(replayed) / wall, 2) if wall else 0.0,
+        "e2e_p50_s": round(_p([r["e2e_ms"] / 1000 for r in replayed], 0.5), 3),
+        "e2e_p95_s": round(_p([r["e2e_ms"] / 1000 for r in replayed], 0.95), 3),
+        "wait_p95_s": round(_p(total_wait, 0.95), 3),
+        **{f"{name}_wait_p95_s": round(_p(values, 0.95), 3) for name, values in waits.items()},
+        "outside_p95_s": round(_p(outside, 0.95), 3),
+        "driver_late_max_s": round(max((s["late_s"] for s in sends), default=0.0), 3),
+    }
@@ -1,20 +1,65 @@
 import abc
 import logging
 import os
-import httpx
+import re
 import wave
 import contextlib
 from app.core.config import settings
+from app.core.tracing import traced_async_client
+from app.services.audio_postprocess import postprocess_tts_output
+from app.services.usage_meter import record_tts
 
 logger = logging.getLogger(__name__)
 
 def generate_silent_wav(path: str, duration: float = 2.0):
-    """Generate a dummy WAV file for mock purposes."""
+    """Generate a dummy WAV file for mock purposes, in the canonical output format."""
+    rate = settings.AUDIO_SAMPLE_RATE
     with contextlib.closing(wave.open(path, 'w')) as f:
         f.setnchannels(1)
         f.setsampwidth(2)
-        f.setframerate(44100)
-        f.writeframes(b'\x00' * int(44100 * duration * 2))
+        f.setframerate(rate)
+        f.writeframes(b'\x00' * int(rate * duration) * 2)
+
+_SENTENCE_END = re.compile(r"(?<=[.!?。！？；;…])\s*")
+
+def _join_sentences(first: str, second: str) -> str:
+    # CJK text is written without spaces between sentences
+    return first + second if ord(first[-1]) >= 0x3000 else f"{first} {second}"
+
+def split_sentences(text: str, min_chars: int = 12):
+    """
+    Splits a reply at sentence punctuation (Latin and CJK) for incremental
+    synthesis. Fragments shorter than `min_chars` are merged with their
+    neighbour so the TTS server is not called for "Oh!" on its own.
+    """
+    sentences = []
+    for piece in _SENTENCE_END.split(text.strip()):
+        if not piece:
+            continue
+        if sentences and len(sentences[-1]) < min_chars:
+            sentences[-1] = _join_sentences(sentences[-1], piece)
+        else:
+            sentences.append(piece)
+    if len(sentences) > 1 and len(sentences[-1]) < min_chars:
+        last = sentences.pop()
+        sentences[-1] = _join_sentences(sentences[-1], last)
+    return sentences
+
+def concat_wavs(paths, output_path: str):
+    """Joins WAV clips with identical formats into one file; clips in another format are skipped."""
+    with contextlib.closing(wave.open(paths[0], 'rb')) as first:
+        params = first.getparams()
+    with contextlib.closing(wave.open(output_path, 'wb')) as out:
+        out.setparams(params)
+        for path in paths:
+            with contextlib.closing(wave.open(path, 'rb')) as clip:
+                clip_params = clip.getparams()
+                if (clip_params.nchannels, clip_params.sampwidth, clip_params.framerate) != (
+                    params.nchannels, params.sampwidth, params.framerate
+                ):
+                    logger.warning("Skipping %s: WAV format differs from the first clip", path)
+                    continue
+                out.writeframes(clip.readframes(clip_params.nframes))
 
 class TTSProvider(abc.ABC):
     @abc.abstractmethod
@@ -29,11 +74,12 @@ class TTSProvider(abc.ABC):
 
 class MockTTSProvider(TTSProvider):
     async def clone_voice(self, audio_path: str, name: str) -> str:
-        logger.info(f"MOCK TTS: Cloning voice for {name} from {audio_path}")
+        logger.info("MOCK TTS: Cloning voice for %s from %s", name, audio_path)
         return "mock-voice-id-123"
 
     async def generate_audio(self, text: str, voice_id: str, output_path: str) -> bool:
-        logger.info(f"MOCK TTS: Generating audio for '{text}' with voice {voice_id}")
+        logger.info("MOCK TTS: Generating audio for '%s' with voice %s", text, voice_id)
+        record_tts(len(text))
         # Generate a real dummy wav file so frontend can play it
         generate_silent_wav(output_path)
         return True
@@ -41,7 +87,7 @@ class MockTTSProvider(TTSProvider):
 class IndexTTSClient(TTSProvider):
     def __init__(self):
         self.base_url = settings.INDEXTTS_BASE_URL.rstrip('/')
-        self.client = httpx.AsyncClient(timeout=120.0)
+        self.client = traced_async_client(timeout=120.0)
 
     async def clone_voice(self, audio_path: str, name: str) -> str:
         """
@@ -55,7 +101,7 @@ class IndexTTSClient(TTSProvider):
             with open(audio_path, 'rb') as f:
                 # Use the correct key 'file' as per docs
                 files = {'file': (os.path.basename(audio_path), f, 'audio/wav')}
-                logger.info(f"IndexTTS: Uploading {audio_path} to {upload_url}")
+                logger.info("IndexTTS: Uploading %s to %s", audio_path, upload_url)
                 
                 response = await self.client.post(upload_url, files=files)
             
@@ -66,11 +112,11 @@ class IndexTTSClient(TTSProvider):
             if not absolute_path:
                 raise ValueError(f"No 'absolute_path' in response: {data}")
                 
-            logger.info(f"IndexTTS: Upload success, server path: {absolute_path}")
+            logger.info("IndexTTS: Upload success, server path: %s", absolute_path)
             return absolute_path
             
         except Exception as e:
-            logger.error(f"IndexTTS Upload Error: {e}")
+            logger.error("IndexTTS Upload Error: %s", e)
             raise
 
     async def generate_audio(self, text: str, voice_id: str, output_path: str) -> bool:
@@ -96,29 +142,32 @@ class IndexTTSClient(TTSProvider):
                 "top_k": 20
             }
             
-            logger.info(f"IndexTTS: POST {tts_url} | Voice: {voice_id} | Text: {text[:20]}...")
+            logger.info("IndexTTS: POST %s | Voice: %s | Text: %.20s...", tts_url, voice_id, text)
+            record_tts(len(text))
             response = await self.client.post(tts_url, json=payload)
             
             if response.status_code != 200:
-                logger.error(f"IndexTTS Gen Error ({response.status_code}): {response.text}")
+                logger.error("IndexTTS Gen Error (%s): %s", response.status_code, response.text)
                 generate_silent_wav(output_path)
                 return False
                 
             # Verify we got audio content
             content_type = response.headers.get("content-type", "")
             if "application/json" in content_type:
-                logger.error(f"IndexTTS returned JSON error: {response.text}")
+                logger.error("IndexTTS returned JSON error: %s", response.text)
                 generate_silent_wav(output_path)
                 return False
 
             with open(output_path, "wb") as f:
                 f.write(response.content)
             
-            logger.info(f"IndexTTS: Audio saved to {output_path}")
+            # Same rate and loudness for every reply, whatever the server produced
+            await postprocess_tts_output(output_path)
+            logger.info("IndexTTS: Audio saved to %s", output_path)
             return True
             
         except Exception as e:
-            logger.error(f"IndexTTS Gen Exception: {e}")
+            logger.error("IndexTTS Gen Exception: %s", e)
             generate_silent_wav(output_path)
             return False
 
@@ -0,0 +1,155 @@
+"""
+Per-user daily budgets for upstream usage: LLM tokens (in + out), seconds
+of audio transcribed and characters synthesized, per UTC day.
+
+Limits are USAGE_BUDGET_LLM_TOKENS / _STT_SECONDS / _TTS_CHARS (0 means
+unlimited), with per-username overrides in USAGE_BUDGET_OVERRIDES. What a
+user has spent today comes from today's day rollups, cached for
+USAGE_BUDGET_REFRESH_SECONDS, plus this process's increments not flushed
+yet, so a check costs one query per user per refresh interval and none
+when no budget is set. Each batcher flush adds what it wrote to the cached
+totals, since it takes those increments out of the pending ones.
+
+Service degrades before a limit is hit: past USAGE_BUDGET_DEGRADE_RATIO
+of any limit replies come as text only (no TTS), and at the limit sends
+are refused until the next UTC day.
+"""
+import logging
+import math
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from sqlalchemy import func, select
+
+from app.core.cache import LocalTTLCache
+from app.core.config import settings
+from app.core.metrics import registry
+from app.models.all_models import UsageRollup
+from app.services.admission import ACCEPT, REJECT, TEXT_ONLY, Admission
+from app.services.usage_rollup import DAY, BucketKey, bucket_starts, get_usage_batcher
+
+logger = logging.getLogger(__name__)
+
+budget_decisions = registry.counter(
+    "usage_budget_decisions_total", "Sends degraded or refused by per-user budgets, by decision"
+)
+
+
+@dataclass
+class Budget:
+    llm_tokens: int = 0
+    stt_seconds: int = 0
+    tts_chars: int = 0
+
+    def limited(self) -> bool:
+        return any(asdict(self).values())
+
+
+def _spent(counts: Dict[str, int]) -> Dict[str, float]:
+    return {
+        "llm_tokens": counts["llm_tokens_in"] + counts["llm_tokens_out"],
+        "stt_seconds": counts["stt_audio_ms"] / 1000,
+        "tts_chars": counts["tts_chars"],
+    }
+
+
+class BudgetGuard:
+    def __init__(self, default: Budget, overrides: Optional[Dict[str, Budget]] = None, degrade_ratio: float = 0.8,
+                 refresh_seconds: float = 30.0, max_entries: int = 10_000):
+        self.default = default
+        self.overrides = overrides or {}
+        self.degrade_ratio = degrade_ratio
+        self.refresh_seconds = refresh_seconds
+        self._stored = LocalTTLCache(max_entries=max_entries)
+
+    @classmethod
+    def from_settings(cls) -> "BudgetGuard":
+        default = Budget(
+            llm_tokens=settings.USAGE_BUDGET_LLM_TOKENS,
+            stt_seconds=settings.USAGE_BUDGET_STT_SECONDS,
+            tts_chars=settings.USAGE_BUDGET_TTS_CHARS,
+        )
+        overrides = {
+            username: Budget(**{**asdict(default), **limits})
+            for username, limits in settings.USAGE_BUDGET_OVERRIDES.items()
+        }
+        return cls(
+            default,
+            overrides,
+            degrade_ratio=settings.USAGE_BUDGET_DEGRADE_RATIO,
+            refresh_seconds=settings.USAGE_BUDGET_REFRESH_SECONDS,
+        )
+
+    def budget_for(self, username: str) -> Budget:
+        return self.overrides.get(username, self.default)
+
+    def _key(self, user_id: int, day: datetime) -> str:
+        return f"{user_id}:{day:%Y%m%d}"
+
+    def flushed(self, totals: Dict[BucketKey, Dict[str, int]]):
+        """
+        Flush listener: moves the written increments into the cached stored
+        totals. A query racing the flush may already include them; counting
+        them twice until the next refresh errs on the safe side.
+        """
+        for (granularity, day, user_id, _), counts in totals.items():
+            stored = self._stored.get(self._key(user_id, day)) if granularity == DAY else None
+            if stored is not None:
+                for name in stored:
+                    stored[name] += counts[name]
+
+    async def spent_today(self, db, user_id: int, now: Optional[datetime] = None) -> Dict[str, float]:
+        """Today's usage: stored rollups (cached) plus increments still waiting for the next flush."""
+        day = bucket_starts(now or datetime.utcnow())[1]
+        key = self._key(user_id, day)
+        stored = self._stored.get(key)
+        if stored is None:
+            row = (await db.execute(
+                select(
+                    func.coalesce(func.sum(UsageRollup.llm_tokens_in), 0),
+                    func.coalesce(func.sum(UsageRollup.llm_tokens_out), 0),
+                    func.coalesce(func.sum(UsageRollup.stt_audio_ms), 0),
+                    func.coalesce(func.sum(UsageRollup.tts_chars), 0),
+                ).where(UsageRollup.granularity == DAY, UsageRollup.bucket_start == day, UsageRollup.user_id == user_id)
+            )).one()
+            stored = dict(zip(("llm_tokens_in", "llm_tokens_out", "stt_audio_ms", "tts_chars"), row))
+            self._stored.set(key, stored, self.refresh_seconds)
+        pending = get_usage_batcher().pending_for_user(DAY, day, user_id)
+        return _spent({name: stored[name] + pending[name] for name in stored})
+
+    async def check(self, db, user, now: Optional[datetime] = None) -> Admission:
+        """ACCEPT, TEXT_ONLY (degraded) or REJECT with Retry-After at the next UTC day."""
+        budget = self.budget_for(user.username)
+        if not budget.limited():
+            return Admission(ACCEPT)
+
+        now = now or datetime.utcnow()
+        spent = await self.spent_today(db, user.id, now)
+        name, fraction = max(
+            ((name, spent[name] / limit) for name, limit in asdict(budget).items() if limit),
+            key=lambda item: item[1],
+        )
+        if fraction >= 1.0:
+            tomorrow = bucket_starts(now)[1] + timedelta(days=1)
+            admission = Admission(REJECT, f"budget_{name}", max(1, math.ceil((tomorrow - now).total_seconds())))
+        elif fraction >= self.degrade_ratio:
+            admission = Admission(TEXT_ONLY, f"budget_{name}")
+        else:
+            return Admission(ACCEPT)
+
+        budget_decisions.inc(decision=admission.decision)
+        logger.info("Budget: %s for user %s (%s at %.0f%% of the daily limit)",
+                    admission.decision, user.id, name, fraction * 100)
+        return admission
+
+
+_guard: Optional[BudgetGuard] = None
+
+
+def get_budget_guard() -> BudgetGuard:
+    global _guard
+    if _guard is None:
+        _guard = BudgetGuard.from_settings()
+        get_usage_batcher().add_flush_listener(_guard.flushed)
+    return _guard
@@ -0,0 +1,95 @@
+"""
+Upstream usage per provider call: LLM tokens in and out, seconds of audio
+sent to STT, characters sent to TTS.
+
+Providers report every call with record_llm / record_stt / record_tts,
+which feed the metrics and, inside a pipeline run (see metering), add up
+on that run's TurnUsage. The pipeline copies the totals into
+Message.analysis and the usage rollups. Calls a run starts that finish
+after it was recorded (the summary refresh it schedules) go to the run's
+late sink instead, so they still count against the user.
+
+Reporting is a context variable lookup and a few integer additions; no
+I/O happens on the provider's path.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, Optional
+
+from app.core.metrics import registry
+
+llm_tokens = registry.counter("upstream_llm_tokens_total", "LLM tokens billed, by model and direction (in/out)")
+stt_audio_seconds = registry.counter(
+    "upstream_stt_audio_seconds_total", "Seconds of audio sent for transcription, by model"
+)
+tts_characters = registry.counter("upstream_tts_characters_total", "Characters sent for synthesis")
+
+
+@dataclass
+class TurnUsage:
+    """Upstream usage of one pipeline run."""
+    llm_tokens_in: int = 0
+    llm_tokens_out: int = 0
+    stt_audio_ms: int = 0
+    tts_chars: int = 0
+    # Set once the run has been recorded; later usage is handed to it as counts
+    late_sink: Optional[Callable[[Dict[str, int]], None]] = None
+
+    def add(self, **counts: int) -> None:
+        if self.late_sink is not None:
+            self.late_sink(counts)
+            return
+        for name, value in counts.items():
+            setattr(self, name, getattr(self, name) + value)
+
+    def counts(self) -> Dict[str, int]:
+        return {
+            "llm_tokens_in": self.llm_tokens_in,
+            "llm_tokens_out": self.llm_tokens_out,
+            "stt_audio_ms": self.stt_audio_ms,
+            "tts_chars": self.tts_chars,
+        }
+
+    def user_analysis(self) -> dict:
+        """What the user message stores under analysis["usage"]."""
+        return {"stt_seconds": round(self.stt_audio_ms / 1000, 3)}
+
+    def reply_analysis(self) -> dict:
+        """What the reply stores under analysis["usage"]."""
+        return {"llm_tokens_in": self.llm_tokens_in, "llm_tokens_out": self.llm_tokens_out, "tts_chars": self.tts_chars}
+
+
+_current: ContextVar[Optional[TurnUsage]] = ContextVar("turn_usage", default=None)
+
+
+@contextmanager
+def metering(usage: TurnUsage) -> Iterator[TurnUsage]:
+    """Provider calls made in this block, and in tasks it starts, are added to `usage`."""
+    token = _current.set(usage)
+    try:
+        yield usage
+    finally:
+        _current.reset(token)
+
+
+def record_llm(model: str, tokens_in: int, tokens_out: int) -> None:
+    llm_tokens.inc(tokens_in, model=model, direction="in")
+    llm_tokens.inc(tokens_out, model=model, direction="out")
+    usage = _current.get()
+    if usage is not None:
+        usage.add(llm_tokens_in=tokens_in, llm_tokens_out=tokens_out)
+
+
+def record_stt(model: str, seconds: float) -> None:
+    stt_audio_seconds.inc(seconds, model=model)
+    usage = _current.get()
+    if usage is not None:
+        usage.add(stt_audio_ms=int(seconds * 1000))
+
+
+def record_tts(characters: int) -> None:
+    tts_characters.inc(characters)
+    usage = _current.get()
+    if usage is not None:
+        usage.add(tts_chars=characters)
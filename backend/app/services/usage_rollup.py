@@ -0,0 +1,305 @@
+"""
+Usage rollups: per hour and per day counters for each user x persona,
+so analytics never scan `messages` (or parse its `analysis` JSON).
+
+Finished pipeline runs add to their buckets through the UsageBatcher,
+which writes everything pending with one upsert every
+USAGE_FLUSH_SECONDS; backfill_rollups rebuilds whole days from history
+in bounded id windows.
+"""
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+
+from app.core.config import settings
+from app.core.metrics import registry
+from app.models.all_models import ArchivedMessage, Conversation, Message, UsageRollup
+from app.services.llm_service import FALLBACK_RESPONSE
+from app.services.stt_service import STT_ERROR_TEXT
+from app.services.usage_meter import TurnUsage
+
+logger = logging.getLogger(__name__)
+
+HOUR = "hour"
+DAY = "day"
+COUNTERS = (
+    "messages", "replies", "stt_failures", "llm_failures", "tts_failures", "failures",
+    "latency_ms_sum", "latency_count", "llm_tokens_in", "llm_tokens_out", "stt_audio_ms", "tts_chars",
+)
+
+rollup_write_failures = registry.counter(
+    "usage_rollup_write_failures_total", "Rollup flushes that failed (kept for the next one)"
+)
+rollup_flushes = registry.summary("usage_rollup_flush_buckets", "Buckets written per rollup flush")
+
+BucketKey = Tuple[str, datetime, int, int]  # granularity, bucket_start, user_id, persona_id
+
+
+@dataclass
+class TurnOutcome:
+    """What one pipeline run did, as the rollups count it."""
+    replied: bool = False
+    stt_failed: bool = False
+    llm_failed: bool = False
+    tts_failed: bool = False
+    failed: bool = False
+    latency_ms: Optional[int] = None
+    usage: TurnUsage = field(default_factory=TurnUsage)
+
+    def counts(self) -> Dict[str, int]:
+        return {
+            **self.usage.counts(),
+            "messages": 1,
+            "replies": int(self.replied),
+            "stt_failures": int(self.stt_failed),
+            "llm_failures": int(self.llm_failed),
+            "tts_failures": int(self.tts_failed),
+            "failures": int(self.failed),
+            "latency_ms_sum": self.latency_ms or 0,
+            "latency_count": int(self.latency_ms is not None),
+        }
+
+
+def bucket_starts(at: datetime) -> Tuple[datetime, datetime]:
+    """Hour and day bucket of `at`, as naive UTC."""
+    if at.tzinfo is not None:
+        at = at.astimezone(timezone.utc).replace(tzinfo=None)
+    hour = at.replace(minute=0, second=0, microsecond=0)
+    return hour, hour.replace(hour=0)
+
+
+def _add(totals: Dict[BucketKey, Dict[str, int]], at: datetime, user_id: int, persona_id: int, counts: Dict[str, int]):
+    hour, day = bucket_starts(at)
+    for key in ((HOUR, hour, user_id, persona_id), (DAY, day, user_id, persona_id)):
+        bucket = totals.setdefault(key, dict.fromkeys(COUNTERS, 0))
+        for name, value in counts.items():
+            bucket[name] += value
+
+
+async def add_counts(db, totals: Dict[BucketKey, Dict[str, int]]):
+    """Adds `totals` onto the stored buckets (creating missing ones) in one statement."""
+    if not totals:
+        return
+    rows = [
+        {"granularity": g, "bucket_start": b, "user_id": u, "persona_id": p, **counts}
+        for (g, b, u, p), counts in totals.items()
+    ]
+    table = UsageRollup.__table__
+    dialect = db.get_bind().dialect.name
+    if dialect == "mysql":
+        stmt = mysql.insert(table).values(rows)
+        stmt = stmt.on_duplicate_key_update({c: table.c[c] + stmt.inserted[c] for c in COUNTERS})
+    else:
+        insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        stmt = insert(table).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["granularity", "bucket_start", "user_id", "persona_id"],
+            set_={c: table.c[c] + stmt.excluded[c] for c in COUNTERS},
+        )
+    await db.execute(stmt)
+
+
+class UsageBatcher:
+    """
+    Sums rollup increments in memory and writes them in one upsert per
+    flush: every USAGE_FLUSH_SECONDS from the app's flush loop, or as soon
+    as `max_buckets` buckets are pending. A failed flush keeps its
+    increments for the next one; a crash loses at most one interval, which
+    backfill_rollups can rebuild.
+    """
+
+    def __init__(self, max_buckets: int):
+        self.max_buckets = max_buckets
+        self._pending: Dict[BucketKey, Dict[str, int]] = {}
+        self._lock = asyncio.Lock()
+        self._flush_listeners: List[Callable[[Dict[BucketKey, Dict[str, int]]], None]] = []
+
+    def add_flush_listener(self, listener: Callable[[Dict[BucketKey, Dict[str, int]]], None]):
+        """Calls `listener(totals)` after each successful flush, with the increments it wrote."""
+        self._flush_listeners.append(listener)
+
+    def add(self, at: datetime, user_id: int, persona_id: int, counts: Dict[str, int]) -> bool:
+        """Queues `counts` for the hour and day buckets of `at`; True once a flush is due."""
+        _add(self._pending, at, user_id, persona_id, counts)
+        return len(self._pending) >= self.max_buckets
+
+    def pending_for_user(self, granularity: str, bucket_start: datetime, user_id: int) -> Dict[str, int]:
+        """Increments not written yet for one user's buckets (all personas) starting at `bucket_start`."""
+        totals = dict.fromkeys(COUNTERS, 0)
+        for (g, b, u, _), counts in list(self._pending.items()):
+            if (g, b, u) == (granularity, bucket_start, user_id):
+                for name, value in counts.items():
+                    totals[name] += value
+        return totals
+
+    async def flush(self, db_session_factory) -> int:
+        """Writes everything pending; returns the number of buckets written."""
+        async with self._lock:
+            totals, self._pending = self._pending, {}
+            if not totals:
+                return 0
+            try:
+                async with db_session_factory() as db:
+                    await add_counts(db, totals)
+                    await db.commit()
+            except Exception as e:
+                rollup_write_failures.inc()
+                logger.warning("Usage rollup flush failed, %s buckets kept (%s: %s)", len(totals), type(e).__name__, e)
+                for key, counts in totals.items():
+                    bucket = self._pending.setdefault(key, dict.fromkeys(COUNTERS, 0))
+                    for name, value in counts.items():
+                        bucket[name] += value
+                return 0
+            # Under the lock, so listeners see flushes one at a time and in order
+            for listener in self._flush_listeners:
+                listener(totals)
+        rollup_flushes.observe(len(totals))
+        return len(totals)
+
+    async def run(self, db_session_factory, interval: float):
+        """Flush loop for the app's lifetime; cancel it and flush once more on shutdown."""
+        while True:
+            await asyncio.sleep(interval)
+            # Shielded: a cancelled loop must not drop the buckets it took
+            await asyncio.shield(self.flush(db_session_factory))
+
+
+_batcher: Optional[UsageBatcher] = None
+
+
+def get_usage_batcher() -> UsageBatcher:
+    global _batcher
+    if _batcher is None:
+        _batcher = UsageBatcher(max_buckets=settings.USAGE_FLUSH_MAX_BUCKETS)
+    return _batcher
+
+
+async def record_turn(db_session_factory, user_id: int, persona_id: int, outcome: TurnOutcome,
+                      at: Optional[datetime] = None):
+    """
+    Adds one finished turn to its hour and day buckets. Queued for the next
+    batched write, or written now when USAGE_FLUSH_SECONDS is 0. Best
+    effort: a lost increment must not fail the turn it describes.
+    """
+    if not settings.USAGE_ROLLUPS_ENABLED:
+        return
+    batcher = get_usage_batcher()
+    if batcher.add(at or datetime.utcnow(), user_id, persona_id, outcome.counts()) or not settings.USAGE_FLUSH_SECONDS:
+        await batcher.flush(db_session_factory)
+
+
+def record_late_usage(user_id: int, persona_id: int, counts: Dict[str, int]):
+    """Queues upstream usage that arrived after its turn was recorded (see TurnUsage.late_sink)."""
+    if settings.USAGE_ROLLUPS_ENABLED:
+        get_usage_batcher().add(datetime.utcnow(), user_id, persona_id, counts)
+
+
+def _message_counts(role: str, status: str, analysis: Optional[dict], stt_error: bool, llm_fallback: bool):
+    """The same counts record_turn adds, recovered from one stored message."""
+    analysis = analysis or {}
+    usage = analysis.get("usage") or {}
+    if role == "user":
+        return {
+            "messages": 1,
+            "stt_failures": int(bool(stt_error)),
+            "failures": int(status == "failed"),
+            "stt_audio_ms": int(round(usage.get("stt_seconds", 0) * 1000)),
+        }
+    if status != "completed" or analysis.get("phrase") == "greeting":
+        return None
+    counts = {
+        "replies": 1,
+        "llm_failures": int(bool(llm_fallback)),
+        "tts_failures": int(analysis.get("tts_status") == "fallback"),
+        "llm_tokens_in": usage.get("llm_tokens_in", 0),
+        "llm_tokens_out": usage.get("llm_tokens_out", 0),
+        "tts_chars": usage.get("tts_chars", 0),
+    }
+    if analysis.get("latency_ms") is not None:
+        counts["latency_ms_sum"] = int(analysis["latency_ms"])
+        counts["latency_count"] = 1
+    return counts
+
+
+def _window(model, low: int, high: int, since: datetime, until: datetime):
+    return (
+        select(
+            model.role,
+            model.status,
+            model.analysis,
+            model.created_at,
+            (model.content_text == STT_ERROR_TEXT).label("stt_error"),
+            (model.content_text == FALLBACK_RESPONSE["content"]).label("llm_fallback"),
+            Conversation.user_id,
+            Conversation.persona_id,
+        )
+        .join(Conversation, model.conversation_id == Conversation.id)
+        .where(model.id > low, model.id <= high, model.created_at >= since, model.created_at < until)
+    )
+
+
+async def backfill_rollups(
+    db_session_factory,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    chunk_size: Optional[int] = None,
+) -> Dict[str, int]:
+    """
+    Rebuilds the rollups for whole UTC days in [since, until) from stored
+    messages, hot and archived (default: from the first message up to the
+    start of today).
+
+    Buckets in the range are cleared first, so re-running is idempotent.
+    Messages are read in windows of `chunk_size` ids, each window added
+    and committed on its own, so no statement scans or locks more than
+    one window of either table. Turns finishing inside the range while it
+    runs may be counted twice; run it over past days.
+
+    Each message counts in the buckets of its own created_at. Latency is
+    only known for replies that stored `latency_ms`, upstream usage only
+    for messages that stored `usage`; usage of runs that failed, and of
+    the summary refreshes turns schedule, is only counted live.
+    """
+    chunk_size = chunk_size or settings.USAGE_BACKFILL_CHUNK
+    async with db_session_factory() as db:
+        bounds = [
+            (await db.execute(select(func.min(model.created_at), func.max(model.id)))).one()
+            for model in (Message, ArchivedMessage)
+        ]
+    bounds = [(first_at, max_id) for first_at, max_id in bounds if max_id is not None]
+    if not bounds:
+        return {"messages": 0, "bucket_updates": 0}
+    first_at = min(first_at for first_at, _ in bounds)
+    max_id = max(max_id for _, max_id in bounds)
+
+    since = bucket_starts(since or first_at)[1]
+    until = bucket_starts(until or datetime.utcnow())[1]
+    if until <= since:
+        until = since + timedelta(days=1)
+
+    async with db_session_factory() as db:
+        await db.execute(
+            delete(UsageRollup).where(UsageRollup.bucket_start >= since, UsageRollup.bucket_start < until)
+        )
+        await db.commit()
+
+    stats = {"messages": 0, "bucket_updates": 0}
+    for low in range(0, max_id, chunk_size):
+        totals: Dict[BucketKey, Dict[str, int]] = {}
+        async with db_session_factory() as db:
+            for model in (Message, ArchivedMessage):
+                for row in (await db.execute(_window(model, low, low + chunk_size, since, until))).all():
+                    counts = _message_counts(row.role, row.status, row.analysis, row.stt_error, row.llm_fallback)
+                    if counts is not None:
+                        _add(totals, row.created_at, row.user_id, row.persona_id, counts)
+                    stats["messages"] += 1
+            await add_counts(db, totals)
+            await db.commit()
+        stats["bucket_updates"] += len(totals)
+    logger.info("Usage rollups rebuilt for %s..%s: %s", since.date(), until.date(), stats)
+    return stats
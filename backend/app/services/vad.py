@@ -0,0 +1,132 @@
+from collections import deque
+from dataclasses import dataclass
+from typing import List, Optional
+
+import numpy as np
+
+from app.core.config import settings
+
+
+@dataclass
+class VADEvent:
+    kind: str  # "start" or "end"
+    audio: bytes = b""  # the utterance (16-bit mono PCM), on "end" only
+
+
+class EnergyVAD:
+    """
+    Endpointing for a live stream of 16-bit little-endian mono PCM.
+
+    Audio is cut into fixed frames and a frame counts as speech when its RMS
+    is above both `min_rms` and `threshold_ratio` times the noise floor, an
+    EWMA of the RMS of non-speech frames. Speech starts after `min_speech_ms`
+    of consecutive voiced frames (short clicks are ignored) and ends after
+    `silence_ms` without speech, or at `max_utterance_ms`. The utterance
+    keeps `preroll_ms` before the detected start so onsets are not clipped.
+    """
+
+    def __init__(
+        self,
+        sample_rate: int = 16000,
+        frame_ms: int = 30,
+        silence_ms: int = 600,
+        min_speech_ms: int = 240,
+        max_utterance_ms: int = 60000,
+        threshold_ratio: float = 3.0,
+        min_rms: float = 300.0,
+        preroll_ms: int = 300,
+    ):
+        self.sample_rate = sample_rate
+        self.frame_ms = frame_ms
+        self.frame_bytes = sample_rate * frame_ms // 1000 * 2
+        self.silence_frames = max(1, silence_ms // frame_ms)
+        self.min_speech_frames = max(1, min_speech_ms // frame_ms)
+        self.max_utterance_bytes = sample_rate * max_utterance_ms // 1000 * 2
+        self.threshold_ratio = threshold_ratio
+        self.min_rms = min_rms
+        self.noise_rms: Optional[float] = None
+        self._pending = bytearray()
+        self._preroll = deque(maxlen=self.min_speech_frames + max(1, preroll_ms // frame_ms))
+        self._speech = bytearray()
+        self._in_speech = False
+        self._voiced_run = 0
+        self._silent_run = 0
+
+    @classmethod
+    def from_settings(cls, sample_rate: Optional[int] = None) -> "EnergyVAD":
+        return cls(
+            sample_rate=sample_rate or settings.REALTIME_SAMPLE_RATE,
+            frame_ms=settings.VAD_FRAME_MS,
+            silence_ms=settings.VAD_SILENCE_MS,
+            min_speech_ms=settings.VAD_MIN_SPEECH_MS,
+            max_utterance_ms=settings.MAX_AUDIO_DURATION_SEC * 1000,
+            threshold_ratio=settings.VAD_THRESHOLD_RATIO,
+            min_rms=settings.VAD_MIN_RMS,
+        )
+
+    @property
+    def in_speech(self) -> bool:
+        return self._in_speech
+
+    def feed(self, pcm: bytes) -> List[VADEvent]:
+        """Consumes any amount of audio; returns the start/end events it completed."""
+        self._pending += pcm
+        count = len(self._pending) // self.frame_bytes
+        if not count:
+            return []
+        block = bytes(self._pending[:count * self.frame_bytes])
+        del self._pending[:count * self.frame_bytes]
+
+        samples = np.frombuffer(block, dtype="<i2").astype(np.float32).reshape(count, -1)
+        levels = np.sqrt(np.mean(samples * samples, axis=1))
+        events = []
+        for i, level in enumerate(levels):
+            event = self._step(block[i * self.frame_bytes:(i + 1) * self.frame_bytes], float(level))
+            if event is not None:
+                events.append(event)
+        return events
+
+    def flush(self) -> Optional[VADEvent]:
+        """Ends the current utterance now (client said the turn is over, or hung up)."""
+        if not self._in_speech:
+            return None
+        self._speech += self._pending
+        self._pending.clear()
+        return self._finish(trailing_silence=0)
+
+    def _threshold(self) -> float:
+        return max(self.min_rms, (self.noise_rms or 0.0) * self.threshold_ratio)
+
+    def _step(self, frame: bytes, level: float) -> Optional[VADEvent]:
+        voiced = level >= self._threshold()
+        if not self._in_speech:
+            self._preroll.append(frame)
+            if voiced:
+                self._voiced_run += 1
+            else:
+                self._voiced_run = 0
+                self.noise_rms = level if self.noise_rms is None else 0.95 * self.noise_rms + 0.05 * level
+            if self._voiced_run >= self.min_speech_frames:
+                self._in_speech = True
+                self._speech = bytearray(b"".join(self._preroll))
+                self._preroll.clear()
+                self._silent_run = 0
+                return VADEvent("start")
+            return None
+
+        self._speech += frame
+        self._silent_run = 0 if voiced else self._silent_run + 1
+        if self._silent_run >= self.silence_frames or len(self._speech) >= self.max_utterance_bytes:
+            return self._finish(trailing_silence=self._silent_run)
+        return None
+
+    def _finish(self, trailing_silence: int) -> VADEvent:
+        # Keep a little of the trailing silence, drop the rest of the endpointing wait
+        keep_silence = min(trailing_silence, max(1, 200 // self.frame_ms))
+        cut = (trailing_silence - keep_silence) * self.frame_bytes
+        audio = bytes(self._speech[:len(self._speech) - cut] if cut else self._speech)
+        self._speech = bytearray()
+        self._in_speech = False
+        self._voiced_run = 0
+        self._silent_run = 0
+        return VADEvent("end", audio)
@@ -0,0 +1,95 @@
+import struct
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+# (format tag, bytes per sample) -> NumPy dtype of one sample
+_DTYPES = {
+    (1, 1): np.dtype("u1"),
+    (1, 2): np.dtype("<i2"),
+    (1, 4): np.dtype("<i4"),
+    (3, 4): np.dtype("<f4"),
+}
+_PCM, _FLOAT, _EXTENSIBLE = 1, 3, 0xFFFE
+
+
+@dataclass
+class PCMView:
+    """Samples of a WAV file, memory-mapped as (frames, channels) without reading the file."""
+    samples: np.ndarray
+    sample_rate: int
+
+    @property
+    def frames(self) -> int:
+        return self.samples.shape[0]
+
+    @property
+    def channels(self) -> int:
+        return self.samples.shape[1]
+
+    @property
+    def duration(self) -> float:
+        return self.frames / self.sample_rate if self.sample_rate else 0.0
+
+    def full_scale(self) -> float:
+        """Magnitude of a full-scale sample in this encoding."""
+        dtype = self.samples.dtype
+        if dtype.kind == "f":
+            return 1.0
+        if dtype.kind == "u":
+            return 128.0
+        return float(2 ** (8 * dtype.itemsize - 1))
+
+    def normalized(self, start: int = 0, stop: Optional[int] = None) -> np.ndarray:
+        """float32 copy of frames [start, stop) scaled to -1..1 (only that range is read)."""
+        block = np.asarray(self.samples[start:stop], dtype=np.float32)
+        if self.samples.dtype.kind == "u":
+            block -= 128.0
+        return block / self.full_scale()
+
+
+def open_pcm(path: str) -> Optional[PCMView]:
+    """
+    Memory-maps the sample data of an uncompressed WAV file. Returns None
+    for anything else (browser uploads are usually WebM/Opus) or for
+    sample formats NumPy cannot map directly, such as 24-bit PCM.
+    """
+    with open(path, "rb") as f:
+        header = f.read(12)
+        if len(header) < 12 or header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+            return None
+        fmt = None
+        while True:
+            chunk = f.read(8)
+            if len(chunk) < 8:
+                return None
+            chunk_id, size = chunk[:4], struct.unpack("<I", chunk[4:])[0]
+            if chunk_id == b"fmt ":
+                body = f.read(size)
+                tag, channels, rate = struct.unpack("<HHI", body[:8])
+                bits = struct.unpack("<H", body[14:16])[0]
+                if tag == _EXTENSIBLE and len(body) >= 26:
+                    tag = struct.unpack("<H", body[24:26])[0]
+                fmt = (tag, channels, rate, bits // 8)
+            elif chunk_id == b"data":
+                offset = f.tell()
+                break
+            else:
+                f.seek(size + (size & 1), 1)  # chunks are word-aligned
+        file_size = f.seek(0, 2)
+
+    if fmt is None:
+        return None
+    tag, channels, rate, width = fmt
+    dtype = _DTYPES.get((tag, width))
+    if dtype is None or channels < 1:
+        return None
+    # Streamed writers leave the data size at 0 or 0xFFFFFFFF; trust the file length instead
+    if size in (0, 0xFFFFFFFF) or offset + size > file_size:
+        size = file_size - offset
+    frames = size // (width * channels)
+    if frames == 0:
+        return PCMView(np.zeros((0, channels), dtype=dtype), rate)
+    samples = np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=(frames, channels))
+    return PCMView(samples, rate)
@@ -0,0 +1,36 @@
+"""
+Moves old, already summarized history to the cold tier (see app/services/archive.py).
+
+    cd backend && python archive_messages.py --older-than-days 180 --max-batches 20
+
+Meant for cron: each batch is its own short transaction, and --max-batches
+bounds how long one run keeps at it.
+"""
+import argparse
+import asyncio
+import logging
+
+from app.core.db import AsyncSessionLocal
+from app.services.archive import archive_old_messages
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+async def main(args):
+    stats = await archive_old_messages(
+        AsyncSessionLocal,
+        older_than_days=args.older_than_days,
+        batch_size=args.batch_size,
+        max_batches=args.max_batches,
+    )
+    logger.info(
+        "Archive run finished: %s messages, %s audio files, %s batches, %s restored clips pruned",
+        stats["messages"], stats["audio_files"], stats["batches"], stats["restored_pruned"],
+    )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--older-than-days", type=int, help="default ARCHIVE_AFTER_DAYS")
+    parser.add_argument("--batch-size", type=int, help="messages per transaction (default ARCHIVE_BATCH_SIZE)")
+    parser.add_argument("--max-batches", type=int, help="stop after this many batches (default: until done)")
+    asyncio.run(main(parser.parse_args()))
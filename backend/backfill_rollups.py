@@ -0,0 +1,33 @@
+"""
+Rebuilds the usage rollups for past days from stored messages.
+
+    cd backend && python backfill_rollups.py --since 2026-01-01 --until 2026-10-01
+
+Whole UTC days in [since, until) are cleared and recomputed, one window of
+message ids at a time, so it is safe to re-run and to run against a live
+database. Defaults: from the first message up to the start of today.
+"""
+import argparse
+import asyncio
+import logging
+from datetime import datetime
+
+from app.core.db import AsyncSessionLocal
+from app.services.usage_rollup import backfill_rollups
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def _day(value: str) -> datetime:
+    return datetime.strptime(value, "%Y-%m-%d")
+
+async def main(args):
+    stats = await backfill_rollups(AsyncSessionLocal, since=args.since, until=args.until, chunk_size=args.chunk_size)
+    logger.info("Backfill finished: %s messages read, %s bucket updates", stats["messages"], stats["bucket_updates"])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--since", type=_day, help="first day to rebuild (YYYY-MM-DD, UTC)")
+    parser.add_argument("--until", type=_day, help="day to stop before (YYYY-MM-DD, UTC)")
+    parser.add_argument("--chunk-size", type=int, help="message ids per window (default USAGE_BACKFILL_CHUNK)")
+    asyncio.run(main(parser.parse_args()))
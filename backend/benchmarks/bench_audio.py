@@ -0,0 +1,96 @@
+"""
+Throughput of TTS output conformance (trim, resample, loudness normalize).
+
+Writes synthetic replies (voiced bursts with dead air at both ends, at the
+sample rates TTS servers commonly return) and conforms them, first in this
+process and then across a process pool. Throughput is seconds of audio
+processed per CPU-second (from each call's process time) and, for the
+pool, per wall-clock second.
+
+    cd backend && python -m benchmarks.bench_audio --clips 64 --seconds 8 --workers 1 2 4
+"""
+import argparse
+import contextlib
+import multiprocessing
+import os
+import tempfile
+import time
+import wave
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# First: sets the environment app modules read at import
+from benchmarks import _env  # noqa: F401
+
+# isort: split
+from app.services.audio_postprocess import conform_wav
+
+RATES = (22050, 24000, 44100, 48000)
+
+
+def _write_reply(path: str, seconds: float, rate: int, rng: np.random.Generator):
+    t = np.arange(int(seconds * rate)) / rate
+    # Syllable-rate amplitude modulation over a few harmonics, plus a little noise
+    voiced = sum(np.sin(2 * np.pi * f * t) / (i + 1) for i, f in enumerate((180, 360, 540, 720)))
+    envelope = np.clip(np.sin(2 * np.pi * 4 * t), 0, None) * rng.uniform(0.05, 0.6)
+    signal = voiced * envelope + rng.normal(0, 0.002, t.size)
+    pad = np.zeros(int(rng.uniform(0.2, 0.8) * rate))
+    samples = (np.clip(np.concatenate((pad, signal, pad)), -1, 1) * 32767).astype("<i2")
+    with contextlib.closing(wave.open(path, "wb")) as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(rate)
+        f.writeframes(samples.tobytes())
+    return samples.size / rate
+
+
+def _conform(path: str) -> dict:
+    return conform_wav(path, target_rate=24000, target_lufs=-18.0, trim_db=-45.0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clips", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=8.0)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as root:
+        originals = []
+        audio_seconds = 0.0
+        for i in range(args.clips):
+            path = os.path.join(root, f"clip{i}.wav")
+            audio_seconds += _write_reply(path, args.seconds, RATES[i % len(RATES)], rng)
+            with open(path, "rb") as f:
+                originals.append((path, f.read()))
+
+        def reset():
+            for path, data in originals:
+                with open(path, "wb") as f:
+                    f.write(data)
+
+        print(f"{'mode':>10} {'wall_s':>8} {'cpu_s':>8} {'audio_s/cpu_s':>14} {'audio_s/wall_s':>15}")
+        started = time.perf_counter()
+        cpu = sum(_conform(path)["cpu_seconds"] for path, _ in originals)
+        wall = time.perf_counter() - started
+        print(f"{'inline':>10} {wall:>8.2f} {cpu:>8.2f} {audio_seconds / cpu:>14.1f} {audio_seconds / wall:>15.1f}")
+
+        for workers in args.workers:
+            reset()
+            with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+                list(pool.map(_conform, [originals[0][0]] * workers))  # start the workers outside the timing
+                reset()
+                started = time.perf_counter()
+                results = list(pool.map(_conform, [path for path, _ in originals]))
+                wall = time.perf_counter() - started
+            cpu = sum(r["cpu_seconds"] for r in results)
+            print(
+                f"{f'pool x{workers}':>10} {wall:>8.2f} {cpu:>8.2f}"
+                f" {audio_seconds / cpu:>14.1f} {audio_seconds / wall:>15.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
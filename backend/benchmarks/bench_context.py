@@ -0,0 +1,92 @@
+"""
+Prompt size and context-build latency as a conversation grows.
+
+Grows one conversation on a temporary SQLite database, building the LLM
+context before every reply (as process_voice_message does) and folding old
+turns into the rolling summary whenever the builder asks for it. Compares
+the resulting prompt tokens with naively sending the whole history.
+
+    cd backend && python -m benchmarks.bench_context --turns 2000
+"""
+import argparse
+import asyncio
+import tempfile
+import time
+
+# First: sets the environment app modules read at import
+from benchmarks import _env  # noqa: F401
+
+# isort: split
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.models.all_models import Base, Conversation, Message, Persona, User
+from app.services.context_builder import build_context, estimate_tokens, refresh_summary
+from app.services.llm_service import LLMProvider
+
+SYSTEM_PROMPT = "You are roleplaying as Grandma. Reply in JSON with tone and content." * 3
+UTTERANCE = "I went to the market today and bought the apples you like, do you remember the orchard?"
+
+
+class StandInSummarizer(LLMProvider):
+    async def generate_response(self, system_prompt, user_text, history=None):
+        return {"tone": "neutral", "content": "Summary: " + user_text[-900:]}
+
+
+async def run(turns: int, report_every: int):
+    directory = tempfile.mkdtemp()
+    engine = create_async_engine(f"sqlite+aiosqlite:///{directory}/bench.db")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async with session_factory() as db:
+        user = User(username="bench", email="bench@example.com", hashed_password="x")
+        db.add(user)
+        await db.flush()
+        persona = Persona(creator_id=user.id, name="Grandma", relationship_type="Grandmother",
+                          user_called_by="Sweetie", persona_called_by="Grandma", legal_confirmed=True)
+        db.add(persona)
+        await db.flush()
+        conversation = Conversation(user_id=user.id, persona_id=persona.id)
+        db.add(conversation)
+        await db.commit()
+        conversation_id = conversation.id
+
+    llm = StandInSummarizer()
+    naive_tokens = estimate_tokens(SYSTEM_PROMPT)
+    print(f"{'turns':>7} {'naive_tokens':>13} {'prompt_tokens':>14} {'build_ms':>9}")
+    for turn in range(1, turns + 1):
+        async with session_factory() as db:
+            user_msg = Message(conversation_id=conversation_id, role="user", content_text=UTTERANCE)
+            db.add(user_msg)
+            await db.commit()
+            query = select(Conversation).where(Conversation.id == conversation_id)
+            conversation = (await db.execute(query)).scalar_one()
+
+            started = time.perf_counter()
+            context = await build_context(db, conversation, user_msg.id, SYSTEM_PROMPT, UTTERANCE)
+            build_ms = (time.perf_counter() - started) * 1000
+
+            db.add(Message(conversation_id=conversation_id, role="assistant", content_text=UTTERANCE))
+            await db.commit()
+        naive_tokens += 2 * estimate_tokens(UTTERANCE)
+
+        if context.needs_summary:
+            await refresh_summary(conversation_id, session_factory, llm, "Grandma")
+        if turn % report_every == 0:
+            print(f"{turn:>7} {naive_tokens:>13} {context.prompt_tokens:>14} {build_ms:>9.2f}")
+
+    await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=1000)
+    parser.add_argument("--report-every", type=int, default=100)
+    args = parser.parse_args()
+    asyncio.run(run(args.turns, args.report_every))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Peak memory and throughput of streaming conversation export.
+
+Seeds one conversation of --messages rows on a temporary SQLite database
+(every --audio-every-th with a short clip on disk), then exports it as
+NDJSON and as a zip with audio, each in a fresh process so the peak RSS
+belongs to that export alone. "naive" loads the history through the ORM
+and serializes it in one go, for comparison.
+
+    cd backend && python -m benchmarks.bench_export --messages 100000 --audio-every 100
+"""
+import argparse
+import asyncio
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+# First: sets the environment app modules read at import
+from benchmarks import _env  # noqa: F401
+
+# isort: split
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.models.all_models import Base, Conversation, Message, Persona, User
+from app.services.tts_service import generate_silent_wav
+
+UTTERANCE = "I went to the market today and bought the apples you like, do you remember the orchard?"
+MODES = ("ndjson", "zip", "naive")
+
+
+def _peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def seed(path: str, messages: int, audio_every: int):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with session_factory() as db:
+        user = User(username="bench", email="bench@example.com", hashed_password="x")
+        db.add(user)
+        await db.flush()
+        persona = Persona(creator_id=user.id, name="Grandma", relationship_type="Grandmother",
+                          user_called_by="Sweetie", persona_called_by="Grandma", legal_confirmed=True)
+        db.add(persona)
+        await db.flush()
+        db.add(Conversation(user_id=user.id, persona_id=persona.id))
+        await db.commit()
+
+    os.makedirs("static/audio", exist_ok=True)
+    for start in range(0, messages, 10000):
+        rows = []
+        for i in range(start, min(start + 10000, messages)):
+            audio_url = None
+            if i % audio_every == 0:
+                audio_url = f"/static/audio/bench_{i}.wav"
+                generate_silent_wav(audio_url.lstrip("/"), duration=0.5)
+            rows.append({
+                "conversation_id": 1, "role": "user" if i % 2 == 0 else "assistant", "content_text": UTTERANCE,
+                "audio_url": audio_url, "analysis": {"tone": "warm"}, "status": "completed",
+            })
+        async with session_factory() as db:
+            await db.execute(insert(Message), rows)
+            await db.commit()
+    await engine.dispose()
+
+
+async def export(path: str, mode: str, output: str):
+    from app.services.export import ndjson_stream, zip_stream
+
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    rss_before = _peak_rss_mb()
+    started = time.perf_counter()
+    with open(output, "wb") as f:
+        if mode == "ndjson":
+            async for chunk in ndjson_stream(session_factory, 1):
+                f.write(chunk)
+        elif mode == "zip":
+            async for chunk in zip_stream(session_factory, 1, {"persona": "Grandma"}):
+                f.write(chunk)
+        else:
+            import json
+
+            from app.schemas.all_schemas import MessageResponse
+
+            async with session_factory() as db:
+                rows = (await db.execute(select(Message).where(Message.conversation_id == 1))).scalars().all()
+                f.write(json.dumps([MessageResponse.model_validate(m).model_dump(mode="json") for m in rows]).encode())
+    wall = time.perf_counter() - started
+    await engine.dispose()
+    print(f"{mode:>8} {wall:>8.2f} {os.path.getsize(output) / 2**20:>9.1f} {rss_before:>14.1f} {_peak_rss_mb():>12.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=100000)
+    parser.add_argument("--audio-every", type=int, default=100)
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--run", nargs=2, metavar=("DB", "MODE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        db_path, mode = args.run
+        asyncio.run(export(db_path, mode, os.path.join(os.path.dirname(db_path), f"export.{mode}")))
+        return
+
+    with tempfile.TemporaryDirectory() as root:
+        os.chdir(root)
+        db_path = os.path.join(root, "bench.db")
+        started = time.perf_counter()
+        asyncio.run(seed(db_path, args.messages, args.audio_every))
+        print(f"seeded {args.messages} messages in {time.perf_counter() - started:.1f}s")
+        print(f"{'mode':>8} {'wall_s':>8} {'output_mb':>9} {'rss_start_mb':>14} {'peak_rss_mb':>12}")
+        # Children run in the same directory, where the audio paths resolve
+        env = {**os.environ, "PYTHONPATH": os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))}
+        for mode in args.modes:
+            subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_export", "--run", db_path, mode], env=env, check=True
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Per-log-call cost on the calling thread (the event loop in production).
+
+Compares the old setup (synchronous StreamHandler, eager f-strings) with the
+queue handler + lazy %-formatting, writing to a deliberately slow stream that
+mimics a backed-up Docker stdout pipe.
+
+    cd backend && python -m benchmarks.bench_logging
+"""
+import argparse
+import io
+import logging
+import time
+
+# First: sets the environment app modules read at import
+from benchmarks import _env  # noqa: F401
+
+# isort: split
+from app.core.logging import build_queue_handler, log_context
+
+
+class SlowStream(io.StringIO):
+    def __init__(self, delay: float):
+        super().__init__()
+        self.delay = delay
+
+    def write(self, s):
+        time.sleep(self.delay)
+        return len(s)
+
+
+def _fresh_logger(name: str, handler: logging.Handler) -> logging.Logger:
+    logger = logging.getLogger(name)
+    logger.handlers[:] = [handler]
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    return logger
+
+
+def bench_sync(n: int, delay: float) -> float:
+    handler = logging.StreamHandler(SlowStream(delay))
+    handler.setFormatter(logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s"))
+    logger = _fresh_logger("bench.sync", handler)
+    text = "hello there, this is a reply text of moderate length"
+    start = time.perf_counter()
+    for i in range(n):
+        logger.info(f"IndexTTS: POST http://tts/tts | Voice: /voices/{i}.wav | Text: {text[:20]}...")
+    return (time.perf_counter() - start) / n
+
+
+def bench_queue(n: int, delay: float, sampling=None) -> float:
+    handler, listener = build_queue_handler(stream=SlowStream(delay), fmt="json", sampling=sampling)
+    logger = _fresh_logger("bench.queue", handler)
+    listener.start()
+    text = "hello there, this is a reply text of moderate length"
+    try:
+        with log_context(request_id="bench", message_id=1):
+            start = time.perf_counter()
+            for i in range(n):
+                logger.info("IndexTTS: POST %s | Voice: %s | Text: %.20s...", "http://tts/tts", i, text)
+            elapsed = time.perf_counter() - start
+    finally:
+        listener.stop()
+    return elapsed / n
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", type=int, default=2000, help="log calls per variant")
+    parser.add_argument("--delay-us", type=float, default=200.0, help="simulated stdout write latency")
+    args = parser.parse_args()
+    delay = args.delay_us / 1e6
+
+    results = [
+        ("sync StreamHandler + f-string", bench_sync(args.n, delay)),
+        ("QueueHandler + lazy json", bench_queue(args.n, delay)),
+        ("QueueHandler + lazy json, 10% sampled", bench_queue(args.n, delay, sampling={"bench": 0.1})),
+    ]
+    print(f"{'variant':<42} {'us/call':>10}")
+    for name, per_call in results:
+        print(f"{name:<42} {per_call * 1e6:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
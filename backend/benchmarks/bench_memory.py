@@ -0,0 +1,67 @@
+"""
+Long-term memory retrieval latency against history size.
+
+Fills one conversation's memory files with random unit vectors and times
+top-k search with a full NumPy scan and with the IVF index, reporting how
+often IVF returns the same best hit as the scan. Random vectors have no
+cluster structure, so the IVF recall printed here is a pessimistic bound;
+raise --nprobe to trade latency for recall.
+
+    cd backend && python -m benchmarks.bench_memory --sizes 1000 10000 100000 --dim 256
+"""
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+# First: sets the environment app modules read at import
+from benchmarks import _env  # noqa: F401
+
+# isort: split
+from app.services.memory_store import MemoryStore
+
+
+def _time_searches(store: MemoryStore, queries: np.ndarray, k: int):
+    started = time.perf_counter()
+    hits = [store.search_sync(1, q, k) for q in queries]
+    return (time.perf_counter() - started) * 1000 / len(queries), hits
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000, 200000])
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--nprobe", type=int, default=8)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'rows':>8} {'scan_ms':>9} {'ivf_ms':>8} {'ivf_build_s':>12} {'ivf_recall@1':>13} {'file_mb':>8}")
+    for size in args.sizes:
+        vectors = rng.standard_normal((size, args.dim)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        # Queries near stored rows, as a real follow-up question would be
+        picks = rng.choice(size, size=args.queries)
+        queries = vectors[picks] + 0.05 * rng.standard_normal((args.queries, args.dim)).astype(np.float32)
+        queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+        with tempfile.TemporaryDirectory() as root:
+            scan = MemoryStore(root, ivf_threshold=size + 1)
+            scan.add_sync(1, np.arange(size), vectors)
+            scan_ms, scan_hits = _time_searches(scan, queries, args.k)
+
+            ivf = MemoryStore(root, ivf_threshold=1, nprobe=args.nprobe)
+            started = time.perf_counter()
+            ivf.search_sync(1, queries[0], args.k)
+            build_s = time.perf_counter() - started
+            ivf_ms, ivf_hits = _time_searches(ivf, queries, args.k)
+
+            agree = np.mean([a[0][0] == b[0][0] for a, b in zip(scan_hits, ivf_hits)])
+            file_mb = size * (args.dim * 4 + 8) / 1e6
+        print(f"{size:>8} {scan_ms:>9.3f} {ivf_ms:>8.3f} {build_s:>12.2f} {agree:>13.2%} {file_mb:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
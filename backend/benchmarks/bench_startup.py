@@ -0,0 +1,126 @@
+"""
+Cold start: import time, app build, and time to first request and to ready.
+
+Each run is a fresh interpreter against a temporary SQLite database whose
+schema is stamped at the Alembic head, so the readiness checks can pass.
+Reported per run:
+
+    import_s     import app.main
+    factory_s    create_app(): routers, middleware, logging
+    startup_s    lifespan startup (until the server would accept connections)
+    first_req_s  first GET /health/live after startup
+    ready_s      from process start until /health/ready answers 200
+    login_s      first POST /auth/token (bcrypt verify), after ready
+
+plus which provider SDKs were already imported when the app was built.
+
+    cd backend && python -m benchmarks.bench_startup --runs 5
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks import _env  # noqa: F401
+
+PROVIDER_MODULES = ("httpx", "openai", "jose", "passlib")
+COLUMNS = ("import_s", "factory_s", "startup_s", "first_req_s", "ready_s", "login_s")
+
+
+async def _prepare(db_path: str):
+    from sqlalchemy import text
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    from app.core.readiness import schema_head
+    from app.core.security import get_password_hash
+    from app.models.all_models import Base, User
+
+    engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(text("CREATE TABLE alembic_version (version_num VARCHAR(32) NOT NULL)"))
+        await conn.execute(text("INSERT INTO alembic_version VALUES (:head)"), {"head": schema_head()})
+        await conn.execute(User.__table__.insert().values(
+            username="bench", email="bench@example.com", hashed_password=get_password_hash("secret")
+        ))
+    await engine.dispose()
+
+
+async def _measure(process_start: float) -> dict:
+    started = time.perf_counter()
+    import app.main
+
+    imported = time.perf_counter()
+    application = app.main.create_app()
+    built = time.perf_counter()
+    preloaded = [m for m in PROVIDER_MODULES if m in sys.modules]
+
+    import httpx
+
+    result = {"import_s": imported - started, "factory_s": built - imported}
+    async with application.router.lifespan_context(application):
+        up = time.perf_counter()
+        result["startup_s"] = up - built
+        transport = httpx.ASGITransport(app=application)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            await client.get("/health/live")
+            result["first_req_s"] = time.perf_counter() - up
+            while (await client.get("/health/ready")).status_code != 200:
+                await asyncio.sleep(0.005)
+            result["ready_s"] = time.monotonic() - process_start
+            login = time.perf_counter()
+            response = await client.post("/api/v1/auth/token", data={"username": "bench", "password": "secret"})
+            response.raise_for_status()
+            result["login_s"] = time.perf_counter() - login
+    result["preloaded"] = preloaded
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--run", nargs=2, metavar=("DB", "START"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        result = asyncio.run(_measure(float(args.run[1])))
+        print(json.dumps(result))
+        return
+
+    with tempfile.TemporaryDirectory() as root:
+        os.chdir(root)
+        os.makedirs("static/audio")
+        db_path = os.path.join(root, "bench.db")
+        asyncio.run(_prepare(db_path))
+        env = {
+            **os.environ,
+            "PYTHONPATH": os.path.abspath(os.path.join(os.path.dirname(__file__), "..")),
+            "DATABASE_URL": f"sqlite+aiosqlite:///{db_path}",
+            "RECOVERY_ON_STARTUP": "false",
+            "LOG_LEVEL": "WARNING",
+        }
+        results = []
+        for _ in range(args.runs):
+            # From just before the interpreter starts (the monotonic clock is system-wide), so
+            # ready_s includes Python's own startup
+            out = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_startup", "--run", db_path, str(time.monotonic())],
+                env=env, check=True, capture_output=True, text=True,
+            ).stdout
+            result = json.loads(out.strip().splitlines()[-1])
+            results.append(result)
+
+        print(" ".join(f"{c:>11}" for c in COLUMNS))
+        for result in results:
+            print(" ".join(f"{result[c]:>11.3f}" for c in COLUMNS))
+        print(" ".join(f"{statistics.median(r[c] for r in results):>11.3f}" for c in COLUMNS), " (median)")
+        print(f"provider SDKs imported before warm-up: {results[0]['preloaded'] or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
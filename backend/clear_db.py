@@ -3,7 +3,7 @@ import asyncio
 import logging
 from sqlalchemy import delete
 from app.core.db import engine, AsyncSessionLocal
-from app.models.all_models import User, Persona, Conversation, Message
+from app.models.all_models import User, Persona, Conversation, Message, UsageRollup, ArchivedMessage
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -18,16 +18,21 @@ async def clear_database():
             # 1. Messages (depends on Conversation)
             logger.info("Deleting Messages...")
             await db.execute(delete(Message))
+            await db.execute(delete(ArchivedMessage))
             
             # 2. Conversations (depends on User, Persona)
             logger.info("Deleting Conversations...")
             await db.execute(delete(Conversation))
             
-            # 3. Personas (depends on User)
+            # 3. Usage rollups (depend on User, Persona)
+            logger.info("Deleting Usage Rollups...")
+            await db.execute(delete(UsageRollup))
+            
+            # 4. Personas (depends on User)
             logger.info("Deleting Personas...")
             await db.execute(delete(Persona))
             
-            # 4. Users
+            # 5. Users
             logger.info("Deleting Users...")
             await db.execute(delete(User))
             
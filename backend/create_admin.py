@@ -1,25 +1,55 @@
+"""
+Creates the admin account (username "admin", flagged is_admin).
+
+    cd backend && python create_admin.py                 # prompts for the password
+    cd backend && ADMIN_PASSWORD=... python create_admin.py
+
+The password is never defaulted: with no ADMIN_PASSWORD and no terminal
+to prompt on, nothing is created. It is not taken as an argument, which
+would leave it in the process list and shell history.
+"""
 import asyncio
+import getpass
+import os
+import sys
 from sqlalchemy import select
 from app.core.db import AsyncSessionLocal
 from app.models.all_models import User
 from app.core.security import get_password_hash
 
-async def create_admin():
+def _read_password() -> str:
+    password = os.environ.get("ADMIN_PASSWORD", "")
+    if password or not sys.stdin.isatty():
+        return password
+    password = getpass.getpass("Admin password: ")
+    if password != getpass.getpass("Repeat password: "):
+        print("Passwords do not match.")
+        return ""
+    return password
+
+async def create_admin(password: str) -> bool:
     async with AsyncSessionLocal() as db:
         result = await db.execute(select(User).where(User.username == "admin"))
-        if result.scalar_one_or_none():
-            print("Admin user already exists.")
-            return
+        existing = result.scalar_one_or_none()
+        if existing is not None:
+            # Not promoted here: anyone could have registered the name
+            print("Admin user already exists." if existing.is_admin else "User 'admin' exists but is not an admin.")
+            return False
 
         new_user = User(
             username="admin",
             email="admin@example.com",
             full_name="Admin User",
-            hashed_password=get_password_hash("admin")
+            hashed_password=get_password_hash(password),
+            is_admin=True
         )
         db.add(new_user)
         await db.commit()
-        print("Admin user created successfully. Username: admin, Password: admin")
+        print("Admin user created successfully. Username: admin")
+        return True
 
 if __name__ == "__main__":
-    asyncio.run(create_admin())
+    password = _read_password()
+    if not password:
+        sys.exit("No password given (set ADMIN_PASSWORD or run in a terminal); admin user not created.")
+    asyncio.run(create_admin(password))
@@ -0,0 +1,118 @@
+"""
+Exports one conversation to disk, streaming (see app/services/export.py).
+
+    cd backend && python export_conversation.py --username alice --persona-id 3 --output grandma.ndjson
+    cd backend && python export_conversation.py --username alice --persona-id 3 --format zip --output grandma.zip
+
+Re-running the same command resumes: NDJSON output is appended after the
+last complete line; zip output is written as numbered parts of at most
+--part-size messages, and only parts missing or left unfinished are redone.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import zipfile
+from datetime import datetime
+
+from sqlalchemy import select
+
+from app.core.db import AsyncSessionLocal
+from app.models.all_models import Conversation, Persona, User
+from app.services.export import ndjson_stream, zip_stream
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def _resume_ndjson(path: str) -> int:
+    """Drops a partial trailing line left by an interrupted run; returns the last exported id."""
+    if not os.path.exists(path):
+        return 0
+    with open(path, "rb+") as f:
+        end = f.seek(0, os.SEEK_END)
+        position, tail = end, b""
+        while position > 0 and tail.count(b"\n") < 2:
+            step = min(4096, position)
+            position -= step
+            f.seek(position)
+            tail = f.read(step) + tail
+        complete = tail[:tail.rfind(b"\n") + 1]
+        f.truncate(position + len(complete))
+    lines = complete.splitlines()
+    return json.loads(lines[-1])["id"] if lines else 0
+
+def _part_path(output: str, number: int) -> str:
+    stem, ext = os.path.splitext(output)
+    return f"{stem}.part{number:04d}{ext or '.zip'}"
+
+def _finished_part(path: str):
+    """complete.json of a finished part, or None if the part is missing or was cut off."""
+    if not zipfile.is_zipfile(path):
+        return None
+    with zipfile.ZipFile(path) as part:
+        try:
+            return json.loads(part.read("complete.json"))
+        except KeyError:
+            return None
+
+async def _write(stream, path: str):
+    with open(path, "ab") as f:
+        async for chunk in stream:
+            f.write(chunk)
+
+async def main(args):
+    async with AsyncSessionLocal() as db:
+        row = (await db.execute(
+            select(Conversation.id, Persona.name)
+            .join(User, Conversation.user_id == User.id)
+            .join(Persona, Conversation.persona_id == Persona.id)
+            .where(User.username == args.username, Conversation.persona_id == args.persona_id)
+        )).one_or_none()
+    if row is None:
+        raise SystemExit(f"No conversation between {args.username} and persona {args.persona_id}")
+    conversation_id, persona_name = row
+
+    if args.format == "ndjson":
+        after_id = _resume_ndjson(args.output)
+        if after_id:
+            logger.info("Resuming after message %s", after_id)
+        await _write(ndjson_stream(AsyncSessionLocal, conversation_id, after_id), args.output)
+        logger.info("Export written to %s", args.output)
+        return
+
+    number, after_id = 1, 0
+    while (finished := _finished_part(_part_path(args.output, number))) is not None:
+        if finished["messages"] < args.part_size:
+            logger.info("Export already complete")
+            return
+        number, after_id = number + 1, finished["last_id"]
+    manifest = {
+        "conversation_id": conversation_id,
+        "persona": persona_name,
+        "exported_at": datetime.utcnow().isoformat(),
+    }
+    while True:
+        path = _part_path(args.output, number)
+        tmp_path = f"{path}.tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        await _write(zip_stream(AsyncSessionLocal, conversation_id, manifest, after_id, limit=args.part_size), tmp_path)
+        finished = _finished_part(tmp_path)
+        if finished["messages"] == 0 and number > 1:
+            os.remove(tmp_path)
+            break
+        os.replace(tmp_path, path)
+        logger.info("Wrote %s (%s messages)", path, finished["messages"])
+        if finished["messages"] < args.part_size:
+            break
+        number, after_id = number + 1, finished["last_id"]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--username", required=True)
+    parser.add_argument("--persona-id", type=int, required=True)
+    parser.add_argument("--format", choices=("ndjson", "zip"), default="ndjson")
+    parser.add_argument("--output", required=True)
+    parser.add_argument("--part-size", type=int, default=10000, help="messages per zip part")
+    asyncio.run(main(parser.parse_args()))
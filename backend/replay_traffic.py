@@ -0,0 +1,138 @@
+"""
+Replays a traffic recording (TRAFFIC_RECORD_PATH) against the app at
+several speeds, to find where the pipeline saturates.
+
+    cd backend && python replay_traffic.py data/traffic/pipeline.jsonl --speeds 1 5 10 20 50
+
+Each speed runs in a fresh process: the app (create_app, lifespan and all)
+on a temporary SQLite database in the embedded profile, with stand-in
+STT/LLM/TTS providers that take as long as the recorded calls did (see
+app/services/traffic_replay.py). Uploads follow the recorded arrival
+pattern compressed by the speed; scheduler slots and admission come from
+the usual settings, so e.g. PIPELINE_TTS_SLOTS=4 python replay_traffic.py
+... tries another capacity. Per speed it reports sends shed (503) or
+refused (429), turns done, end-to-end latency, queue waits per upstream
+and time spent outside the upstream lanes (database, disk), and marks
+the speed saturated when turns were shed or p95 queueing exceeded
+--max-wait seconds.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+logging.basicConfig(level=logging.WARNING)
+logger = logging.getLogger(__name__)
+
+COLUMNS = ("speed", "sent", "shed_503", "over_budget_429", "done", "failed", "text_only", "turns_per_s",
+           "e2e_p50_s", "e2e_p95_s", "stt_wait_p95_s", "llm_wait_p95_s", "tts_wait_p95_s", "outside_p95_s")
+
+
+def _select(records, window: float, limit: int):
+    if window:
+        records = [r for r in records if r["t"] - records[0]["t"] <= window]
+    return records[:limit] if limit else records
+
+
+async def replay(args):
+    """One speed, in this process; prints its summary as a JSON line."""
+    from unittest.mock import patch
+
+    import httpx
+
+    from app.core.db import AsyncSessionLocal, engine
+    from app.main import create_app
+    from app.models.all_models import Base
+    from app.services.jobs import get_job_runner
+    from app.services.traffic_format import read_recording
+    from app.services.traffic_replay import (
+        CollectingRecorder,
+        StandInLLM,
+        StandInSTT,
+        StandInTTS,
+        seed_users,
+        send_turns,
+        summarize,
+    )
+
+    records = _select(read_recording(args.recording), args.window, args.limit)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    collector = CollectingRecorder()
+    application = create_app()
+    with patch("app.api.v1.chat.get_stt_provider", return_value=StandInSTT(records)), \
+            patch("app.api.v1.chat.get_llm_provider", return_value=StandInLLM(records)), \
+            patch("app.api.v1.chat.get_tts_provider", return_value=StandInTTS(records)), \
+            patch("app.services.traffic_recorder._recorder", collector):
+        async with application.router.lifespan_context(application):
+            users = await seed_users(AsyncSessionLocal, records)
+            transport = httpx.ASGITransport(app=application)
+            async with httpx.AsyncClient(transport=transport, base_url="http://replay", timeout=None) as client:
+                started = time.perf_counter()
+                sends = await send_turns(client, records, users, args.child)
+                await get_job_runner().drain(args.drain_seconds)
+                wall = time.perf_counter() - started
+    print(json.dumps(summarize(args.child, sends, collector.lines, wall)))
+
+
+def main(args):
+    # Not the app's settings: this process needs no SECRET_KEY or database
+    from app.services.traffic_format import read_recording, saturated
+
+    records = _select(read_recording(args.recording), args.window, args.limit)
+    if not records:
+        logger.error("No records in %s", args.recording)
+        sys.exit(1)
+    span = records[-1]["t"] - records[0]["t"]
+    print(f"{len(records)} turns over {span:.0f}s recorded, from {len(set(r['u'] for r in records))} users")
+
+    results = []
+    for speed in args.speeds:
+        with tempfile.TemporaryDirectory() as root:
+            os.makedirs(os.path.join(root, "static", "audio"))
+            env = {
+                **os.environ,
+                "PYTHONPATH": os.path.dirname(os.path.abspath(__file__)),
+                "DATABASE_URL": f"sqlite+aiosqlite:///{os.path.join(root, 'replay.db')}",
+                # Only signs the replay's own tokens
+                "SECRET_KEY": os.environ.get("SECRET_KEY") or "replay",
+                "REDIS_URL": "memory://",
+                "RECOVERY_ON_STARTUP": "false",
+                "LOG_LEVEL": "WARNING",
+                "STARTUP_SCHEMA_CHECK": "false",
+                "TRAFFIC_RECORD_PATH": "",
+                "USAGE_FLUSH_SECONDS": "0",
+            }
+            child = [
+                sys.executable, os.path.abspath(__file__), os.path.abspath(args.recording), "--child", str(speed),
+                "--window", str(args.window), "--limit", str(args.limit), "--drain-seconds", str(args.drain_seconds),
+            ]
+            out = subprocess.run(child, env=env, cwd=root, check=True, stdout=subprocess.PIPE, text=True).stdout
+            results.append(json.loads(out.strip().splitlines()[-1]))
+
+    print(" ".join(f"{c:>10.10}" for c in COLUMNS), " saturated")
+    for result in results:
+        print(" ".join(f"{result[c]:>10}" for c in COLUMNS), f" {'yes' if saturated(result, args.max_wait) else 'no'}")
+    first = next((r["speed"] for r in results if saturated(r, args.max_wait)), None)
+    print(f"saturates at {first}x" if first else "no saturation at the speeds tried")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("recording", help="a TRAFFIC_RECORD_PATH file")
+    parser.add_argument("--speeds", type=float, nargs="+", default=[1, 5, 10, 20, 50], help="1x to 50x arrival rate")
+    parser.add_argument("--window", type=float, default=0, help="replay only the first N recorded seconds")
+    parser.add_argument("--limit", type=int, default=0, help="replay at most N turns")
+    parser.add_argument("--max-wait", type=float, default=2.0, help="p95 queue wait (s) counted as saturated")
+    parser.add_argument("--drain-seconds", type=float, default=600, help="how long to wait for turns in progress")
+    parser.add_argument("--child", type=float, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        asyncio.run(replay(args))
+    else:
+        main(args)
@@ -0,0 +1,42 @@
+import httpx
+from fastapi import APIRouter, FastAPI
+from sqlalchemy import select
+
+from app.api.v1 import admin, chat, personas
+from app.api.v1.deps import get_current_user
+from app.core.db import get_db
+from app.models.all_models import User
+
+
+async def _build_client(router: APIRouter, prefix: str, session_factory, user_id: int) -> httpx.AsyncClient:
+    app = FastAPI()
+    app.include_router(router, prefix=prefix)
+
+    async with session_factory() as db:
+        user = (await db.execute(select(User).where(User.id == user_id))).scalar_one()
+
+    async def override_get_db():
+        async with session_factory() as session:
+            yield session
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_current_user] = lambda: user
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+async def build_chat_client(session_factory, user_id: int) -> httpx.AsyncClient:
+    """
+    In-process client for the chat router backed by the test database, with
+    authentication bypassed for `user_id`.
+    """
+    return await _build_client(chat.router, "/api/v1", session_factory, user_id)
+
+
+async def build_personas_client(session_factory, user_id: int) -> httpx.AsyncClient:
+    """Same as build_chat_client, for the personas router."""
+    return await _build_client(personas.router, "/api/v1/personas", session_factory, user_id)
+
+
+async def build_admin_client(session_factory, user_id: int) -> httpx.AsyncClient:
+    """Same as build_chat_client, for the admin router."""
+    return await _build_client(admin.router, "/api/v1/admin", session_factory, user_id)
@@ -0,0 +1,12 @@
+import os
+import sys
+
+# Make the backend package importable and give Settings the required values
+# so tests never depend on a local .env file.
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite://")
+os.environ.setdefault("REDIS_URL", "memory://")
+os.environ.setdefault("OPENAI_API_KEY", "mock")
+os.environ.setdefault("INDEXTTS_BASE_URL", "http://mock-indextts")
@@ -0,0 +1,38 @@
+import os
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.db import create_engine
+from app.models.all_models import Base, Conversation, Persona, User
+
+
+async def create_test_db(directory: str):
+    """File-backed SQLite database (the embedded WAL profile) with the full schema, for pipeline tests."""
+    path = os.path.join(directory, "test.db")
+    engine = create_engine(f"sqlite+aiosqlite:///{path}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    return engine, async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+
+async def seed_conversation(session_factory, username: str = "alice", is_admin: bool = False):
+    """Creates a user, a persona and their conversation; returns the three ids."""
+    async with session_factory() as db:
+        user = User(username=username, email=f"{username}@example.com", hashed_password="x", is_admin=is_admin)
+        db.add(user)
+        await db.flush()
+        persona = Persona(
+            creator_id=user.id,
+            name="Grandma",
+            relationship_type="Grandmother",
+            user_called_by="Sweetie",
+            persona_called_by="Grandma",
+            voice_model_status="ready",
+            legal_confirmed=True,
+        )
+        db.add(persona)
+        await db.flush()
+        conversation = Conversation(user_id=user.id, persona_id=persona.id)
+        db.add(conversation)
+        await db.commit()
+        return user.id, persona.id, conversation.id
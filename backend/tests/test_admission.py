@@ -0,0 +1,127 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from sqlalchemy import select
+
+from app.core.cache import LocalTTLCache
+from app.models.all_models import Message
+from app.services.admission import AdmissionController, shed_requests
+from app.services.idempotency import IdempotencyStore
+from app.services.jobs import JobRunner
+from app.services.persona_cache import PersonaCache
+from app.services.scheduler import PipelineScheduler
+from app.services.tts_service import MockTTSProvider
+from app_utils import build_chat_client
+from db_utils import create_test_db, seed_conversation
+
+
+class SlowTTS(MockTTSProvider):
+    """Stands in for an overloaded TTS server: every call takes `delay` seconds."""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.started = asyncio.Event()
+        self.calls = 0
+
+    async def generate_audio(self, text: str, voice_id: str, output_path: str) -> bool:
+        self.calls += 1
+        self.started.set()
+        await asyncio.sleep(self.delay)
+        return await super().generate_audio(text, voice_id, output_path)
+
+
+class TestAdmissionControl(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.cwd = os.getcwd()
+        self.test_dir = tempfile.mkdtemp()
+        os.chdir(self.test_dir)
+        self.engine, self.session_factory = await create_test_db(self.test_dir)
+        user_id, self.persona_id, _ = await seed_conversation(self.session_factory)
+        self.client = await build_chat_client(self.session_factory, user_id)
+
+        self.runner = JobRunner()
+        self.scheduler = PipelineScheduler(slots={"stt": 4, "llm": 4, "tts": 1})
+        self.tts = SlowTTS(delay=1.5)
+        self.controller = AdmissionController(max_pending_jobs=50, reject_delay=1.0, text_only_delay=0.2)
+        self.patches = [
+            patch("app.api.v1.chat.get_job_runner", return_value=self.runner),
+            patch("app.api.v1.chat.get_pipeline_scheduler", return_value=self.scheduler),
+            patch("app.api.v1.chat.get_admission_controller", return_value=self.controller),
+            patch("app.api.v1.chat.get_tts_provider", return_value=self.tts),
+            patch("app.api.v1.chat.get_persona_cache", return_value=PersonaCache(ttl=60, max_entries=100)),
+            patch(
+                "app.api.v1.chat.get_idempotency_store",
+                return_value=IdempotencyStore(ttl=600, local=LocalTTLCache()),
+            ),
+            patch("app.core.db.AsyncSessionLocal", self.session_factory),
+        ]
+        for p in self.patches:
+            p.start()
+
+    async def asyncTearDown(self):
+        for p in self.patches:
+            p.stop()
+        await self.runner.drain(timeout=5)
+        await self.client.aclose()
+        await self.engine.dispose()
+        os.chdir(self.cwd)
+        shutil.rmtree(self.test_dir)
+
+    async def _send(self, audio: bytes):
+        return await self.client.post(
+            f"/api/v1/conversations/{self.persona_id}/send",
+            files={"file": ("clip.wav", audio, "audio/wav")},
+        )
+
+    async def test_slow_tts_degrades_then_rejects(self):
+        """As the stalled TTS call ages, sends first lose their audio, then get 503 with Retry-After."""
+        # Arrange
+        text_only = shed_requests.value(action="text_only", reason="tts_delay")
+        rejected = shed_requests.value(action="reject", reason="delay")
+        first = await self._send(b"RIFF-first")
+        await self.tts.started.wait()
+
+        # Act
+        await asyncio.sleep(0.3)
+        degraded = await self._send(b"RIFF-second")
+        await asyncio.sleep(0.9)
+        shed = await self._send(b"RIFF-third")
+        await self.runner.drain(timeout=5)
+
+        # Assert
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(degraded.status_code, 200)
+        self.assertEqual(degraded.json()["analysis"]["admission"], "text_only")
+        self.assertEqual(shed.status_code, 503)
+        self.assertGreaterEqual(int(shed.headers["Retry-After"]), 1)
+        self.assertEqual(shed_requests.value(action="text_only", reason="tts_delay"), text_only + 1)
+        self.assertEqual(shed_requests.value(action="reject", reason="delay"), rejected + 1)
+        async with self.session_factory() as db:
+            query = select(Message).where(Message.role == "assistant").order_by(Message.id)
+            replies = (await db.execute(query)).scalars().all()
+        self.assertEqual(len(replies), 2)
+        self.assertEqual(self.tts.calls, 1)
+        audio = {r.analysis.get("tts_status"): r.audio_url for r in replies}
+        self.assertIsNone(audio["skipped"])
+        self.assertIsNotNone(audio[None])
+
+    async def test_fast_upstreams_are_admitted(self):
+        """With quick stages and an empty queue every send gets a spoken reply."""
+        # Arrange
+        self.tts.delay = 0.0
+
+        # Act
+        responses = [await self._send(f"RIFF-{i}".encode()) for i in range(3)]
+        await self.runner.drain(timeout=5)
+
+        # Assert
+        self.assertEqual([r.status_code for r in responses], [200, 200, 200])
+        self.assertEqual(self.tts.calls, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,137 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+
+from sqlalchemy import select, update
+
+from app.core.config import settings
+from app.models.all_models import ArchivedMessage, Conversation, Message
+from app.services import archive
+from app.services.archive import archive_old_messages, archived_page
+from app.services.phrase_pack import PHRASE_DIR
+from app.services.tts_service import generate_silent_wav
+from app_utils import build_chat_client
+from db_utils import create_test_db, seed_conversation
+
+
+class TestArchive(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.cwd = os.getcwd()
+        self.test_dir = tempfile.mkdtemp()
+        os.chdir(self.test_dir)
+        os.makedirs(PHRASE_DIR)
+        self.engine, self.session_factory = await create_test_db(self.test_dir)
+        self.user_id, self.persona_id, self.conversation_id = await seed_conversation(self.session_factory)
+
+        # Six turns; the first four are old and folded into the summary, the second is a shared phrase clip
+        self.phrase_url = f"/{PHRASE_DIR}/persona_1_greeting.wav"
+        generate_silent_wav(self.phrase_url.lstrip("/"), duration=0.1)
+        async with self.session_factory() as db:
+            for i in range(6):
+                url = self.phrase_url if i == 1 else f"/static/audio/m{i}.wav"
+                if i != 1:
+                    generate_silent_wav(url.lstrip("/"), duration=0.2)
+                db.add(Message(
+                    conversation_id=self.conversation_id,
+                    role="user" if i % 2 == 0 else "assistant",
+                    content_text=f"turn {i}",
+                    audio_url=url,
+                    created_at=datetime(2020, 1, 1) if i < 4 else datetime.utcnow(),
+                ))
+            await db.commit()
+            self.ids = [m.id for m in (await db.execute(select(Message).order_by(Message.id))).scalars()]
+            await db.execute(
+                update(Conversation).where(Conversation.id == self.conversation_id)
+                .values(summary="Earlier chat.", summary_upto_id=self.ids[3])
+            )
+            await db.commit()
+        self.patch = patch.object(settings, "ARCHIVE_DIR", os.path.join(self.test_dir, "archive"))
+        self.patch.start()
+
+    async def asyncTearDown(self):
+        self.patch.stop()
+        await self.engine.dispose()
+        os.chdir(self.cwd)
+        shutil.rmtree(self.test_dir)
+
+    async def test_moves_old_summarized_turns_in_bounded_batches(self):
+        """Batches hold at most batch_size rows; audio moves into bundles, shared phrase clips stay put."""
+        # Act
+        first = await archive_old_messages(self.session_factory, older_than_days=30, batch_size=3, max_batches=1)
+        rest = await archive_old_messages(self.session_factory, older_than_days=30, batch_size=3)
+
+        # Assert
+        self.assertEqual((first["messages"], rest["messages"]), (3, 1))
+        async with self.session_factory() as db:
+            hot = [m.id for m in (await db.execute(select(Message).order_by(Message.id))).scalars()]
+            archived = (await db.execute(select(ArchivedMessage).order_by(ArchivedMessage.id))).scalars().all()
+        self.assertEqual(hot, self.ids[4:])
+        self.assertEqual([m.id for m in archived], self.ids[:4])
+        self.assertEqual(archived[1].audio_url, self.phrase_url)
+        self.assertIsNone(archived[1].audio_bundle)
+        self.assertTrue(os.path.exists(self.phrase_url.lstrip("/")))
+        self.assertFalse(os.path.exists("static/audio/m0.wav"))
+        self.assertTrue(os.path.exists("static/audio/m4.wav"))
+        self.assertEqual(len(os.listdir(os.path.join(settings.ARCHIVE_DIR, str(self.conversation_id)))), 2)
+
+    async def test_history_pages_into_the_archive(self):
+        """Scrolling back past the hot rows returns archived turns with playable, restored audio."""
+        # Arrange
+        await archive_old_messages(self.session_factory, older_than_days=30)
+        client = await build_chat_client(self.session_factory, self.user_id)
+        url = f"/api/v1/conversations/{self.persona_id}/messages"
+
+        # Act
+        async with client:
+            latest = (await client.get(url, params={"limit": 3})).json()
+            older = (await client.get(url, params={"limit": 3, "before_id": latest[0]["id"]})).json()
+
+        # Assert
+        self.assertEqual([m["id"] for m in latest], self.ids[3:])
+        self.assertEqual([m["archived"] for m in latest], [True, False, False])
+        self.assertEqual([m["id"] for m in older], self.ids[:3])
+        self.assertEqual(older[1]["audio_url"], self.phrase_url)
+        for message in older + latest[:1]:
+            self.assertTrue(os.path.exists(message["audio_url"].lstrip("/")))
+        self.assertTrue(older[0]["audio_url"].startswith("/static/audio/restored/"))
+
+    async def test_restores_clips_off_the_event_loop(self):
+        """A page's clips are unpacked in worker threads at once while the event loop keeps running."""
+        # Arrange
+        await archive_old_messages(self.session_factory, older_than_days=30)
+        ticks = 0
+        extract = archive._extract
+
+        def slow_extract(*args):
+            time.sleep(0.2)
+            return extract(*args)
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        # Act
+        with patch("app.services.archive._extract", side_effect=slow_extract):
+            ticking = asyncio.create_task(ticker())
+            started = time.perf_counter()
+            async with self.session_factory() as db:
+                page = await archived_page(db, self.conversation_id, None, 10)
+            elapsed = time.perf_counter() - started
+            ticking.cancel()
+
+        # Assert
+        self.assertEqual([m.id for m in page], self.ids[:4])
+        self.assertTrue(all(os.path.exists(m.audio_url.lstrip("/")) for m in page))
+        self.assertLess(elapsed, 0.5)  # Three clips, 0.2s each
+        self.assertGreater(ticks, 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+import contextlib
+import os
+import shutil
+import tempfile
+import unittest
+import wave
+from unittest.mock import patch
+
+import numpy as np
+
+from app.core.config import settings
+from app.services import audio_postprocess
+from app.services.audio_postprocess import conform_wav, integrated_loudness, postprocess_tts_output
+from app.services.wav import open_pcm
+
+
+def tone(seconds: float, rate: int, amplitude: float, freq: float = 1000.0) -> np.ndarray:
+    t = np.arange(int(seconds * rate)) / rate
+    return amplitude * np.sin(2 * np.pi * freq * t)
+
+
+def write_wav(path: str, signal: np.ndarray, rate: int, channels: int = 1):
+    samples = np.repeat((signal * 32767).astype("<i2")[:, None], channels, axis=1)
+    with contextlib.closing(wave.open(path, "wb")) as f:
+        f.setnchannels(channels)
+        f.setsampwidth(2)
+        f.setframerate(rate)
+        f.writeframes(samples.tobytes())
+
+
+class TestAudioPostprocess(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_loudness_of_reference_tone(self):
+        """A 1 kHz sine at -6 dBFS peak measures about -9 LUFS, as BS.1770 specifies."""
+        # Act
+        loudness = integrated_loudness(tone(3.0, 48000, 0.5), 48000)
+
+        # Assert
+        self.assertAlmostEqual(loudness, -9.03, delta=0.2)
+
+    def test_conform_trims_resamples_and_normalizes(self):
+        """Quiet stereo 44.1 kHz speech with dead air comes out mono, 24 kHz, trimmed and at the target loudness."""
+        # Arrange
+        path = os.path.join(self.test_dir, "reply.wav")
+        rate = 44100
+        silence = np.zeros(int(0.5 * rate))
+        write_wav(path, np.concatenate((silence, tone(1.0, rate, 0.05, freq=440.0), silence)), rate, channels=2)
+
+        # Act
+        result = conform_wav(path, target_rate=24000, target_lufs=-18.0, trim_db=-45.0, keep_ms=100)
+
+        # Assert
+        pcm = open_pcm(path)
+        self.assertEqual((pcm.sample_rate, pcm.channels), (24000, 1))
+        self.assertAlmostEqual(pcm.duration, 1.2, delta=0.03)
+        self.assertEqual(result["rate_in"], rate)
+        self.assertGreater(result["gain_db"], 0)
+        self.assertAlmostEqual(integrated_loudness(pcm.normalized()[:, 0], 24000), -18.0, delta=0.3)
+
+    async def test_runs_in_process_pool_and_skips_other_formats(self):
+        """Clips are conformed in the worker pool; non-WAV output is left untouched without a pool trip."""
+        # Arrange
+        wav_path = os.path.join(self.test_dir, "reply.wav")
+        write_wav(wav_path, tone(0.5, 16000, 0.3), 16000)
+        mp3_path = os.path.join(self.test_dir, "reply.mp3")
+        with open(mp3_path, "wb") as f:
+            f.write(b"ID3\x04" + b"\x00" * 64)
+
+        # Act
+        with patch.object(settings, "AUDIO_POSTPROCESS_WORKERS", 1):
+            try:
+                result = await postprocess_tts_output(wav_path)
+                skipped = await postprocess_tts_output(mp3_path)
+            finally:
+                audio_postprocess.shutdown_pool()
+
+        # Assert
+        self.assertEqual(open_pcm(wav_path).sample_rate, settings.AUDIO_SAMPLE_RATE)
+        self.assertGreater(result["cpu_seconds"], 0)
+        self.assertIsNone(skipped)
+        with open(mp3_path, "rb") as f:
+            self.assertTrue(f.read().startswith(b"ID3"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,150 @@
+import asyncio
+import statistics
+import time
+import unittest
+
+from app.services.concurrency_limit import AIMDLimit, FixedLimit, GradientLimit
+from app.services.scheduler import PipelineScheduler, concurrency_limit
+
+
+class StandInGPUServer:
+    """One GPU: calls past `capacity` at once all slow down, quadratically (it thrashes)."""
+
+    def __init__(self, capacity: int, base: float, fail_above: int = 0):
+        self.capacity = capacity
+        self.base = base
+        self.fail_above = fail_above
+        self.in_flight = 0
+        self.peak = 0
+        self.outcomes = []
+        self.latencies = []
+
+    async def generate_audio(self) -> bool:
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        overloaded = bool(self.fail_above) and self.in_flight > self.fail_above
+        try:
+            latency = self.base * max(1.0, self.in_flight / self.capacity) ** 2
+            await asyncio.sleep(latency)
+            self.latencies.append(latency)
+            self.outcomes.append(not overloaded)
+            return not overloaded
+        finally:
+            self.in_flight -= 1
+
+
+async def pound(limit, server: StandInGPUServer, clients: int = 16, calls: int = 5) -> float:
+    """Background tasks sending calls back to back through a TTS lane with `limit`; returns the wall time."""
+    scheduler = PipelineScheduler(slots={"tts": 2}, limits={"tts": limit})
+
+    async def client(user):
+        for _ in range(calls):
+            await scheduler.run("tts", user, server.generate_audio, fallback=False)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client(user) for user in range(clients)))
+    return time.perf_counter() - started
+
+
+def thrashing_rtt(in_flight: int, capacity: int, base: float = 0.01) -> float:
+    """Call time on a host that slows down quadratically past `capacity` concurrent calls."""
+    return base * max(1.0, in_flight / capacity) ** 2
+
+
+def drive(limit, capacity: int, rounds: int = 300) -> None:
+    """Feeds `limit` the call times a host of `capacity` would give with the lane running full."""
+    for _ in range(rounds):
+        in_flight = max(1, int(limit.limit))
+        limit.update(thrashing_rtt(in_flight, capacity), in_flight, False)
+
+
+class TestConcurrencyLimit(unittest.TestCase):
+    def test_aimd_halves_on_drops_and_slow_calls(self):
+        """A failed call or one slower than slow_seconds halves the limit, down to min_limit."""
+        # Arrange
+        limit = AIMDLimit(8, max_limit=8, slow_seconds=10.0)
+
+        # Act
+        limit.update(0.1, 8, dropped=True)
+        after_drop = limit.limit
+        limit.update(11.0, 4, dropped=False)
+        after_slow = limit.limit
+        for _ in range(5):
+            limit.update(0.1, 2, dropped=True)
+
+        # Assert
+        self.assertEqual((after_drop, after_slow), (4.0, 2.0))
+        self.assertEqual(limit.limit, 1.0)
+
+    def test_aimd_grows_one_slot_per_full_round(self):
+        """Calls that fill at least half the limit add one slot per `limit` of them; idle lanes do not grow."""
+        # Arrange
+        busy, idle = AIMDLimit(2, max_limit=8), AIMDLimit(2, max_limit=8)
+
+        # Act
+        for _ in range(2):
+            busy.update(0.1, 2, dropped=False)
+            idle.update(0.1, 0, dropped=False)
+
+        # Assert
+        self.assertAlmostEqual(busy.limit, 2 + 1 / 2 + 1 / 2.5)
+        self.assertEqual(idle.limit, 2.0)
+
+    def test_gradient_settles_near_a_thrashing_hosts_capacity(self):
+        """Against a host that slows down past 2 calls the gradient limit levels off near 2, not at its maximum of 8."""
+        # Arrange
+        limit = GradientLimit(2, max_limit=8)
+
+        # Act
+        drive(limit, capacity=2)
+
+        # Assert
+        self.assertLessEqual(int(limit.limit), 4)
+
+    def test_gradient_grows_while_calls_keep_their_pace(self):
+        """With capacity to spare the limit probes up to its maximum."""
+        # Arrange
+        limit = GradientLimit(2, max_limit=8)
+
+        # Act
+        drive(limit, capacity=16)
+
+        # Assert
+        self.assertEqual(limit.limit, 8)
+
+    def test_gradient_backs_off_on_drops_and_ignores_idle_lanes(self):
+        """A failed call shrinks the limit by `backoff`; samples from a mostly idle lane leave it alone."""
+        # Arrange
+        dropped, idle = GradientLimit(8, max_limit=8), GradientLimit(8, max_limit=8)
+
+        # Act
+        dropped.update(0.01, 8, dropped=True)
+        idle.update(0.01, 1, dropped=False)
+        idle.update(10.0, 1, dropped=False)
+
+        # Assert
+        self.assertAlmostEqual(dropped.limit, 8 * 0.9)
+        self.assertEqual(idle.limit, 8.0)
+
+
+class TestAdaptiveLane(unittest.IsolatedAsyncioTestCase):
+    async def test_gradient_limit_stops_a_thrashing_gpu(self):
+        """End to end through the scheduler: far fewer calls in flight than a fixed 8, and the gauge follows."""
+        # Arrange
+        fixed_server, adaptive_server = StandInGPUServer(2, 0.005), StandInGPUServer(2, 0.005)
+        adaptive = GradientLimit(2, max_limit=8)
+
+        # Act
+        await pound(FixedLimit(8), fixed_server)
+        await pound(adaptive, adaptive_server)
+
+        # Assert
+        # Coarse on purpose: these calls run on real timers
+        self.assertEqual(fixed_server.peak, 8)
+        self.assertLessEqual(int(adaptive.limit), 6)
+        self.assertLess(statistics.mean(adaptive_server.latencies), statistics.mean(fixed_server.latencies))
+        self.assertEqual(concurrency_limit.value(upstream="tts"), int(adaptive.limit))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,144 @@
+import shutil
+import tempfile
+import unittest
+
+import httpx
+from sqlalchemy import select
+
+from app.models.all_models import Conversation, Message
+from app.services.context_builder import build_context, estimate_tokens, refresh_summary
+from app.services.llm_service import LLMProvider, OpenAILLMProvider
+from db_utils import create_test_db, seed_conversation
+
+
+class ShortSummaryLLM(LLMProvider):
+    """Stand-in summarizer returning a fixed-size summary."""
+
+    def __init__(self):
+        self.calls = []
+
+    async def generate_response(self, system_prompt, user_text, history=None):
+        self.calls.append(user_text)
+        return {"tone": "neutral", "content": f"summary #{len(self.calls)}"}
+
+
+def failing_llm() -> OpenAILLMProvider:
+    """An OpenAI-compatible endpoint that answers every call with a 500, so the provider falls back."""
+    return OpenAILLMProvider(
+        base_url="http://down.local/v1",
+        model="summary-model",
+        api_key="test",
+        max_retries=0,
+        http_client=httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(500))),
+    )
+
+
+class TestContextBuilder(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.engine, self.session_factory = await create_test_db(self.test_dir)
+        _, _, self.conversation_id = await seed_conversation(self.session_factory)
+
+    async def asyncTearDown(self):
+        await self.engine.dispose()
+        shutil.rmtree(self.test_dir)
+
+    async def _add_turns(self, n, text="hello there"):
+        async with self.session_factory() as db:
+            for i in range(n):
+                role = "user" if i % 2 == 0 else "assistant"
+                db.add(Message(conversation_id=self.conversation_id, role=role, content_text=f"{text} {i}"))
+            await db.commit()
+
+    async def _current_message(self):
+        async with self.session_factory() as db:
+            msg = Message(conversation_id=self.conversation_id, role="user", content_text="now", status="pending")
+            db.add(msg)
+            await db.commit()
+            return msg.id
+
+    async def _context(self, current_id, **kwargs):
+        async with self.session_factory() as db:
+            conversation = (
+                await db.execute(select(Conversation).where(Conversation.id == self.conversation_id))
+            ).scalar_one()
+            return await build_context(db, conversation, current_id, "system", "now", **kwargs)
+
+    def test_estimate_tokens(self):
+        """Latin text is ~4 chars per token; CJK characters are one token each."""
+        self.assertEqual(estimate_tokens(""), 0)
+        self.assertEqual(estimate_tokens("abcdefgh"), 2)
+        self.assertEqual(estimate_tokens("你好"), 2)
+
+    async def test_recent_turns_oldest_first(self):
+        """Only the last K completed turns are sent, in chronological order."""
+        await self._add_turns(6)
+        current = await self._current_message()
+
+        context = await self._context(current, max_turns=4, token_budget=10_000)
+
+        self.assertEqual([m["content"] for m in context.history], [f"hello there {i}" for i in range(2, 6)])
+        self.assertEqual(context.history[0]["role"], "user")
+        self.assertEqual(context.history[1]["role"], "assistant")
+
+    async def test_token_budget_limits_history(self):
+        """Turns that do not fit in the budget are left out, newest kept."""
+        await self._add_turns(4, text="x" * 400)  # ~100 tokens each
+        current = await self._current_message()
+
+        context = await self._context(current, max_turns=10, token_budget=250)
+
+        self.assertEqual(len(context.history), 2)
+        self.assertLessEqual(context.prompt_tokens, 250)
+
+    async def test_summary_is_incremental_and_prompt_stays_bounded(self):
+        """Older turns are folded into the summary in steps; prompt size stops growing."""
+        llm = ShortSummaryLLM()
+        sizes = []
+        for batch in range(8):
+            await self._add_turns(10, text=f"batch{batch}")
+            current = await self._current_message()
+            context = await self._context(current)
+            sizes.append(context.prompt_tokens)
+            if context.needs_summary:
+                self.assertTrue(await refresh_summary(self.conversation_id, self.session_factory, llm, "Grandma"))
+
+        async with self.session_factory() as db:
+            conversation = (
+                await db.execute(select(Conversation).where(Conversation.id == self.conversation_id))
+            ).scalar_one()
+        self.assertTrue(conversation.summary.startswith("summary #"))
+        self.assertIsNotNone(conversation.summary_upto_id)
+        # Each refresh only saw turns newer than the previous summary
+        self.assertIn("summary #1", llm.calls[1])
+        self.assertNotIn("batch0 0", llm.calls[1])
+        self.assertLessEqual(max(sizes[2:]), max(sizes[:3]) + 20)
+
+        context = await self._context(await self._current_message())
+        self.assertEqual(context.history[0]["role"], "system")
+        self.assertIn(conversation.summary, context.history[0]["content"])
+
+    async def test_failed_summary_keeps_the_turns(self):
+        """An LLM failure leaves summary and summary_upto_id alone; the next refresh folds the same turns."""
+        # Arrange
+        await self._add_turns(30)
+        llm = ShortSummaryLLM()
+
+        # Act
+        refreshed = await refresh_summary(self.conversation_id, self.session_factory, failing_llm(), "Grandma")
+        async with self.session_factory() as db:
+            after_failure = (
+                await db.execute(select(Conversation).where(Conversation.id == self.conversation_id))
+            ).scalar_one()
+        retried = await refresh_summary(self.conversation_id, self.session_factory, llm, "Grandma")
+
+        # Assert
+        self.assertFalse(refreshed)
+        self.assertIsNone(after_failure.summary)
+        self.assertIsNone(after_failure.summary_upto_id)
+        self.assertTrue(retried)
+        self.assertIn("hello there 0", llm.calls[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+import shutil
+import tempfile
+import unittest
+
+from sqlalchemy import select
+
+from app.api.v1.chat import _mark_failed
+from app.models.all_models import Conversation, Message
+from app.services.conversation_version import version_lookups
+from app_utils import build_chat_client
+from db_utils import create_test_db, seed_conversation
+
+
+class TestConversationVersion(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.engine, self.session_factory = await create_test_db(self.test_dir)
+        self.user_id, self.persona_id, self.conversation_id = await seed_conversation(self.session_factory)
+
+    async def asyncTearDown(self):
+        await self.engine.dispose()
+        shutil.rmtree(self.test_dir)
+
+    async def _version(self):
+        async with self.session_factory() as db:
+            return (
+                await db.execute(select(Conversation.version).where(Conversation.id == self.conversation_id))
+            ).scalar_one()
+
+    async def _add_message(self, **fields):
+        async with self.session_factory() as db:
+            msg = Message(conversation_id=self.conversation_id, role="user", **fields)
+            db.add(msg)
+            await db.commit()
+            return msg.id
+
+    async def test_insert_and_changes_bump_version(self):
+        """Inserts, status and content changes bump once per commit; untouched flushes do not."""
+        # Arrange
+        msg_id = await self._add_message(status="pending")
+        after_insert = await self._version()
+
+        # Act
+        async with self.session_factory() as db:
+            msg = (await db.execute(select(Message).where(Message.id == msg_id))).scalar_one()
+            msg.content_text = "hello"
+            msg.status = "completed"
+            await db.commit()
+            after_update = await self._version()
+            await db.commit()
+        after_noop = await self._version()
+
+        # Assert
+        self.assertEqual(after_insert, 1)
+        self.assertEqual(after_update, 2)
+        self.assertEqual(after_noop, 2)
+
+    async def test_bulk_failure_update_bumps_version(self):
+        """`_mark_failed` uses bulk UPDATEs, which must bump explicitly."""
+        # Arrange
+        msg_id = await self._add_message(status="pending")
+
+        # Act
+        async with self.session_factory() as db:
+            await _mark_failed(db, self.conversation_id, msg_id, None, "RuntimeError")
+
+        # Assert
+        self.assertEqual(await self._version(), 2)
+
+    async def test_rolled_back_changes_do_not_bump(self):
+        """A flushed-then-rolled-back insert leaves the version as it was."""
+        # Act
+        async with self.session_factory() as db:
+            db.add(Message(conversation_id=self.conversation_id, role="user"))
+            await db.flush()
+            await db.rollback()
+
+        # Assert
+        self.assertEqual(await self._version(), 0)
+
+    async def test_conditional_get(self):
+        """Unchanged history answers 304 after a version lookup; a new message changes the ETag."""
+        # Arrange
+        await self._add_message(content_text="first")
+        client = await build_chat_client(self.session_factory, self.user_id)
+        url = f"/api/v1/conversations/{self.persona_id}/messages"
+
+        async with client:
+            first = await client.get(url)
+            etag = first.headers["ETag"]
+            lookups = version_lookups.value(source="db")
+
+            # Act
+            unchanged = await client.get(url, headers={"If-None-Match": etag})
+            other_limit = await client.get(url, params={"limit": 10}, headers={"If-None-Match": etag})
+            await self._add_message(content_text="second")
+            changed = await client.get(url, headers={"If-None-Match": etag})
+
+        # Assert
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(unchanged.status_code, 304)
+        self.assertEqual(unchanged.content, b"")
+        self.assertEqual(unchanged.headers["ETag"], etag)
+        self.assertEqual(version_lookups.value(source="db"), lookups + 3)
+        self.assertEqual(other_limit.status_code, 200)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed.headers["ETag"], etag)
+        self.assertEqual(sorted(m["content_text"] for m in changed.json()), ["first", "second"])
+
+
+if __name__ == "__main__":
+    unittest.main()
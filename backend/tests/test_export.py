@@ -0,0 +1,117 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+import zipfile
+from datetime import datetime
+from unittest.mock import patch
+
+from sqlalchemy import select, update
+
+from app.core.config import settings
+from app.models.all_models import Conversation, Message
+from app.services.archive import archive_old_messages
+from app.services.persona_cache import PersonaCache
+from app.services.phrase_pack import PHRASE_DIR
+from app.services.tts_service import generate_silent_wav
+from app_utils import build_chat_client
+from db_utils import create_test_db, seed_conversation
+
+
+class TestExport(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.cwd = os.getcwd()
+        self.test_dir = tempfile.mkdtemp()
+        os.chdir(self.test_dir)
+        os.makedirs(PHRASE_DIR)
+        self.engine, self.session_factory = await create_test_db(self.test_dir)
+        self.user_id, self.persona_id, self.conversation_id = await seed_conversation(self.session_factory)
+
+        # Seven turns, the first three archived; two replies share the same phrase clip
+        self.phrase_url = f"/{PHRASE_DIR}/persona_1_llm_fallback.wav"
+        generate_silent_wav(self.phrase_url.lstrip("/"), duration=0.1)
+        async with self.session_factory() as db:
+            for i in range(7):
+                url = self.phrase_url if i in (1, 5) else f"/static/audio/m{i}.wav"
+                if i not in (1, 5):
+                    generate_silent_wav(url.lstrip("/"), duration=0.1 + i / 100)
+                db.add(Message(
+                    conversation_id=self.conversation_id,
+                    role="user" if i % 2 == 0 else "assistant",
+                    content_text=f"turn {i}",
+                    audio_url=url,
+                    analysis={"tone": "warm"},
+                    created_at=datetime(2020, 1, 1) if i < 3 else datetime.utcnow(),
+                ))
+            await db.commit()
+            self.ids = [m.id for m in (await db.execute(select(Message).order_by(Message.id))).scalars()]
+            await db.execute(
+                update(Conversation).where(Conversation.id == self.conversation_id).values(summary_upto_id=self.ids[2])
+            )
+            await db.commit()
+        self.patches = [
+            patch.object(settings, "ARCHIVE_DIR", os.path.join(self.test_dir, "archive")),
+            patch.object(settings, "EXPORT_CHUNK_SIZE", 2),
+            patch("app.core.db.AsyncSessionLocal", self.session_factory),
+            patch("app.api.v1.chat.get_persona_cache", return_value=PersonaCache(ttl=60, max_entries=100)),
+        ]
+        for p in self.patches:
+            p.start()
+        with open("static/audio/m0.wav", "rb") as f:
+            self.first_clip = f.read()
+        await archive_old_messages(self.session_factory, older_than_days=30)
+        self.url = f"/api/v1/conversations/{self.persona_id}/export"
+
+    async def asyncTearDown(self):
+        for p in self.patches:
+            p.stop()
+        await self.engine.dispose()
+        os.chdir(self.cwd)
+        shutil.rmtree(self.test_dir)
+
+    async def test_ndjson_streams_archived_then_hot_and_resumes(self):
+        """Every message is one line in id order; after_id continues from the last line received."""
+        # Arrange
+        client = await build_chat_client(self.session_factory, self.user_id)
+
+        # Act
+        async with client:
+            full = await client.get(self.url)
+            resumed = await client.get(self.url, params={"after_id": self.ids[4]})
+
+        # Assert
+        records = [json.loads(line) for line in full.text.splitlines()]
+        self.assertEqual(full.headers["content-type"], "application/x-ndjson")
+        self.assertEqual([r["id"] for r in records], self.ids)
+        self.assertEqual([r["archived"] for r in records], [True] * 3 + [False] * 4)
+        self.assertEqual(records[0]["tone"], "warm")
+        self.assertEqual([json.loads(line)["id"] for line in resumed.text.splitlines()], self.ids[5:])
+
+    async def test_zip_embeds_audio_once_per_file(self):
+        """The zip holds the records and each clip, archived ones unpacked from their bundle and shared ones once."""
+        # Arrange
+        client = await build_chat_client(self.session_factory, self.user_id)
+
+        # Act
+        async with client:
+            response = await client.get(self.url, params={"format": "zip"})
+
+        # Assert
+        with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+            names = archive.namelist()
+            records = [json.loads(line) for line in archive.read("messages.ndjson").splitlines()]
+            first_clip = archive.read(records[0]["audio"])
+            complete = json.loads(archive.read("complete.json"))
+            manifest = json.loads(archive.read("conversation.json"))
+        self.assertEqual([r["id"] for r in records], self.ids)
+        self.assertEqual(first_clip, self.first_clip)
+        self.assertEqual(records[1]["audio"], records[5]["audio"])
+        self.assertEqual(len([n for n in names if n.startswith("audio/")]), 6)
+        self.assertEqual(complete, {"messages": 7, "last_id": self.ids[-1]})
+        self.assertEqual(manifest["persona"], "Grandma")
+
+
+if __name__ == "__main__":
+    unittest.main()
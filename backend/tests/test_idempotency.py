@@ -0,0 +1,102 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from sqlalchemy import func, select
+
+from app.core.cache import LocalTTLCache
+from app.models.all_models import Message
+from app.services.idempotency import PENDING, IdempotencyStore
+from app.services.jobs import JobRunner
+from app_utils import build_chat_client
+from db_utils import create_test_db, seed_conversation
+
+
+class TestIdempotencyStore(unittest.IsolatedAsyncioTestCase):
+    async def test_claim_complete_release(self):
+        """First claim wins; later claims see pending, then the message id."""
+        store = IdempotencyStore(ttl=60, local=LocalTTLCache())
+
+        self.assertIsNone(await store.claim("k"))
+        self.assertEqual(await store.claim("k"), PENDING)
+        await store.complete("k", 12)
+        self.assertEqual(await store.claim("k"), "12")
+        await store.release("k")
+        self.assertIsNone(await store.claim("k"))
+
+    async def test_keys_expire(self):
+        """Claims only deduplicate within the TTL window."""
+        store = IdempotencyStore(ttl=0, local=LocalTTLCache())
+        self.assertIsNone(await store.claim("k"))
+        self.assertIsNone(await store.claim("k"))
+
+
+class TestSendIdempotency(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.cwd = os.getcwd()
+        self.test_dir = tempfile.mkdtemp()
+        os.chdir(self.test_dir)
+        self.engine, self.session_factory = await create_test_db(self.test_dir)
+        user_id, self.persona_id, _ = await seed_conversation(self.session_factory)
+        self.client = await build_chat_client(self.session_factory, user_id)
+
+        self.runner = JobRunner()
+        self.store = IdempotencyStore(ttl=600, local=LocalTTLCache())
+        self.patches = [
+            patch("app.api.v1.chat.get_job_runner", return_value=self.runner),
+            patch("app.api.v1.chat.get_idempotency_store", return_value=self.store),
+            patch("app.core.db.AsyncSessionLocal", self.session_factory),
+        ]
+        for p in self.patches:
+            p.start()
+
+    async def asyncTearDown(self):
+        for p in self.patches:
+            p.stop()
+        await self.runner.drain(timeout=5)
+        await self.client.aclose()
+        await self.engine.dispose()
+        os.chdir(self.cwd)
+        shutil.rmtree(self.test_dir)
+
+    async def _send(self, audio: bytes, key=None):
+        headers = {"Idempotency-Key": key} if key else {}
+        return await self.client.post(
+            f"/api/v1/conversations/{self.persona_id}/send",
+            files={"file": ("clip.wav", audio, "audio/wav")},
+            headers=headers,
+        )
+
+    async def _count(self, role):
+        async with self.session_factory() as db:
+            return (await db.execute(select(func.count()).where(Message.role == role))).scalar_one()
+
+    async def test_retry_with_key_returns_original(self):
+        """A retried send with the same Idempotency-Key runs the pipeline once."""
+        first = await self._send(b"RIFF-one", key="abc")
+        second = await self._send(b"RIFF-one-reencoded", key="abc")
+        await self.runner.drain(timeout=5)
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.json()["id"], first.json()["id"])
+        self.assertEqual(await self._count("user"), 1)
+        self.assertEqual(await self._count("assistant"), 1)
+        self.assertEqual(len(os.listdir("static/audio")), 2)  # one upload + one reply
+
+    async def test_same_audio_without_key_is_deduplicated(self):
+        """Without a header, identical audio content is the fallback key."""
+        first = await self._send(b"RIFF-same")
+        second = await self._send(b"RIFF-same")
+        third = await self._send(b"RIFF-different")
+
+        self.assertEqual(second.json()["id"], first.json()["id"])
+        self.assertNotEqual(third.json()["id"], first.json()["id"])
+        await self.runner.drain(timeout=5)
+        self.assertEqual(await self._count("assistant"), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
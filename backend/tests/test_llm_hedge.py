@@ -0,0 +1,143 @@
+import asyncio
+import json
+import time
+import unittest
+
+import httpx
+
+from app.services.llm_hedge import Hedger, hedge_requests, hedge_wins
+from app.services.llm_service import LLMRoute, OpenAILLMProvider, RoutingLLMProvider, route_decisions
+
+
+def stand_in_gateway(name: str, replies: dict) -> OpenAILLMProvider:
+    """A local OpenAI-compatible gateway; replies maps model -> (delay seconds, message content)."""
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        model = json.loads(request.content)["model"]
+        delay, content = replies[model]
+        await asyncio.sleep(delay)
+        return httpx.Response(200, json={
+            "id": "chatcmpl-test",
+            "object": "chat.completion",
+            "created": 0,
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        })
+
+    return OpenAILLMProvider(
+        base_url=f"http://{name}.local/v1",
+        model=next(iter(replies)),
+        api_key="test",
+        max_retries=0,
+        http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+    )
+
+
+def primed_hedger(delay: float, budget: float = 1.0, percentile: float = 0.9) -> Hedger:
+    """A hedger that has already seen enough calls of `delay` seconds to hedge after about that long."""
+    hedger = Hedger(percentile=percentile, min_delay=delay, budget=budget, max_banked=1.0)
+    for _ in range(hedger.min_samples):
+        hedger.observe(delay)
+    return hedger
+
+
+def reply(content: str) -> str:
+    return json.dumps({"tone": "calm", "content": content})
+
+
+class TestLLMHedging(unittest.IsolatedAsyncioTestCase):
+    async def test_slow_primary_is_hedged_and_cancelled(self):
+        """Past the hedge delay a second call goes out; the first answer wins and the slow call is cancelled."""
+        # Arrange
+        hedger = primed_hedger(0.02)
+        primary_cancelled = asyncio.Event()
+        hedge_won = hedge_wins.value(winner="hedge")
+
+        async def primary():
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                primary_cancelled.set()
+                raise
+            return "primary"
+
+        async def hedge():
+            return "hedge"
+
+        # Act
+        started = time.perf_counter()
+        result = await hedger.run(primary, hedge)
+        elapsed = time.perf_counter() - started
+        await asyncio.sleep(0)
+
+        # Assert
+        self.assertEqual(result, "hedge")
+        self.assertLess(elapsed, 1.0)
+        self.assertTrue(primary_cancelled.is_set())
+        self.assertEqual(hedge_wins.value(winner="hedge"), hedge_won + 1)
+
+    async def test_hedges_stay_within_budget(self):
+        """However slow every call is, hedges are capped at the budget fraction of requests."""
+        # Arrange
+        # Hedging at the median, so the slow calls observed here do not move the delay past them
+        hedger = primed_hedger(0.005, budget=0.25, percentile=0.5)
+        hedged = hedge_requests.value(result="hedged")
+        over_budget = hedge_requests.value(result="over_budget")
+        hedges = 0
+
+        async def primary():
+            await asyncio.sleep(0.02)
+            return "primary"
+
+        async def hedge():
+            nonlocal hedges
+            hedges += 1
+            await asyncio.sleep(0.02)
+            return "hedge"
+
+        # Act
+        for _ in range(20):
+            await hedger.run(primary, hedge)
+
+        # Assert
+        self.assertEqual(hedges, 5)
+        self.assertEqual(hedge_requests.value(result="hedged"), hedged + 5)
+        self.assertEqual(hedge_requests.value(result="over_budget"), over_budget + 15)
+
+    async def test_invalid_json_does_not_win(self):
+        """The hedge model answers first but not with JSON, so the primary model's reply is used."""
+        # Arrange
+        provider = stand_in_gateway("gateway", {
+            "main-model": (0.15, reply("main")),
+            "spare-model": (0.0, "not json"),
+        })
+        provider.hedger, provider.hedge_model = primed_hedger(0.02), "spare-model"
+        primary_won = hedge_wins.value(winner="primary")
+
+        # Act
+        result = await provider.generate_response("system", "hello")
+
+        # Assert
+        self.assertEqual(result["content"], "main")
+        self.assertEqual(hedge_wins.value(winner="primary"), primary_won + 1)
+
+    async def test_router_hedges_to_next_best_route(self):
+        """A slow route is hedged to the other one, which answers; the cancelled call is not scored."""
+        # Arrange
+        slow = LLMRoute(name="slow", provider=stand_in_gateway("slow", {"slow-model": (5, reply("slow"))}))
+        spare = LLMRoute(name="spare", provider=stand_in_gateway("spare", {"spare-model": (0.0, reply("spare"))}))
+        router = RoutingLLMProvider([slow, spare], probe_interval=3600, hedger=primed_hedger(0.02))
+        hedges = route_decisions.value(endpoint="spare", reason="hedge")
+
+        # Act
+        result = await router.generate_response("system", "hello")
+
+        # Assert
+        self.assertEqual(result["content"], "spare")
+        self.assertEqual(route_decisions.value(endpoint="spare", reason="hedge"), hedges + 1)
+        self.assertIsNone(slow.ewma_latency)
+        self.assertIsNotNone(spare.ewma_latency)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+import asyncio
+import json
+import unittest
+
+import httpx
+
+from app.services.llm_service import (
+    FALLBACK_RESPONSE,
+    LLMRoute,
+    OpenAILLMProvider,
+    RoutingLLMProvider,
+    route_decisions,
+)
+
+
+def stand_in_endpoint(name: str, delay: float = 0.0, status: int = 200) -> LLMRoute:
+    """A local OpenAI-compatible endpoint answering chat completions after `delay` seconds."""
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(delay)
+        if status != 200:
+            return httpx.Response(status, json={"error": {"message": "upstream unavailable"}})
+        body = json.loads(request.content)
+        reply = {"tone": "calm", "content": f"{name}:{body['model']}"}
+        return httpx.Response(200, json={
+            "id": "chatcmpl-test",
+            "object": "chat.completion",
+            "created": 0,
+            "model": body["model"],
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": json.dumps(reply)},
+                "finish_reason": "stop",
+            }],
+        })
+
+    provider = OpenAILLMProvider(
+        base_url=f"http://{name}.local/v1",
+        model=f"{name}-model",
+        api_key="test",
+        max_retries=0,
+        http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+    )
+    return LLMRoute(name=name, provider=provider)
+
+
+class TestRoutingLLMProvider(unittest.IsolatedAsyncioTestCase):
+    async def test_prefers_lower_observed_latency(self):
+        """After each route has been tried once, traffic goes to the faster endpoint."""
+        # Arrange
+        slow, fast = stand_in_endpoint("slow", delay=0.05), stand_in_endpoint("fast")
+        router = RoutingLLMProvider([slow, fast], probe_interval=3600)
+
+        # Act
+        replies = [(await router.generate_response("system", "tell me about your day"))["content"] for _ in range(6)]
+
+        # Assert
+        self.assertEqual(set(replies[:2]), {"slow:slow-model", "fast:fast-model"})
+        self.assertEqual(replies[2:], ["fast:fast-model"] * 4)
+        self.assertGreater(slow.ewma_latency, fast.ewma_latency)
+
+    async def test_failover_then_fallback(self):
+        """A failing endpoint fails over to the next; when every attempt fails the fallback reply is used."""
+        # Arrange
+        broken, healthy = stand_in_endpoint("broken", status=503), stand_in_endpoint("healthy", delay=0.01)
+        router = RoutingLLMProvider([broken, healthy], probe_interval=3600)
+        failovers = route_decisions.value(endpoint="healthy", reason="failover")
+
+        # Act
+        first = await router.generate_response("system", "hello")
+        second = await router.generate_response("system", "hello")
+        all_down = await RoutingLLMProvider([stand_in_endpoint("down", status=500)]).generate_response("system", "hi")
+
+        # Assert
+        self.assertEqual(first["content"], "healthy:healthy-model")
+        self.assertEqual(route_decisions.value(endpoint="healthy", reason="failover"), failovers + 1)
+        self.assertGreater(broken.ewma_error, 0)
+        self.assertEqual(second["content"], "healthy:healthy-model")
+        self.assertEqual(all_down, FALLBACK_RESPONSE)
+
+    async def test_short_input_goes_to_fast_tag(self):
+        """Short utterances use routes tagged for them even when another route scores better."""
+        # Arrange
+        big, small = stand_in_endpoint("big"), stand_in_endpoint("small", delay=0.02)
+        small.tags = ("fast",)
+        big.ewma_latency, small.ewma_latency = 0.01, 0.5
+        router = RoutingLLMProvider([big, small], short_input_tokens=8, probe_interval=3600)
+
+        # Act
+        short = await router.generate_response("system", "goodnight mom")
+        long_text = "I need to tell you about everything that happened at work " * 3
+        long = await router.generate_response("system", long_text)
+
+        # Assert
+        self.assertEqual(short["content"], "small:small-model")
+        self.assertEqual(long["content"], "big:big-model")
+
+    def test_idle_route_is_probed_once_per_interval(self):
+        """A route that lost traffic is tried again after the probe interval, then scoring resumes."""
+        # Arrange
+        good, recovered = stand_in_endpoint("good"), stand_in_endpoint("recovered")
+        good.ewma_latency, recovered.ewma_latency, recovered.ewma_error = 0.2, 0.2, 0.9
+        router = RoutingLLMProvider([good, recovered], probe_interval=0.0)
+
+        # Act
+        probe, reason = router.choose("hello")
+        router.probe_interval = 3600
+        after, after_reason = router.choose("hello")
+
+        # Assert
+        self.assertIs(probe, recovered)
+        self.assertEqual(reason, "probe")
+        self.assertIs(after, good)
+        self.assertEqual(after_reason, "score")
+
+
+if __name__ == "__main__":
+    unittest.main()
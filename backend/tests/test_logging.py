@@ -0,0 +1,67 @@
+import io
+import json
+import logging
+import unittest
+
+from app.core.logging import LazyQueueHandler, SamplingFilter, build_queue_handler, log_context
+
+
+class TestQueueLogging(unittest.TestCase):
+    def _logger(self, name, handler):
+        logger = logging.getLogger(name)
+        logger.handlers[:] = [handler]
+        logger.propagate = False
+        logger.setLevel(logging.INFO)
+        return logger
+
+    def test_json_output_carries_ids(self):
+        """Records are written as JSON with request and message ids."""
+        # Arrange
+        stream = io.StringIO()
+        handler, listener = build_queue_handler(stream=stream, fmt="json")
+        logger = self._logger("test.json", handler)
+
+        # Act
+        listener.start()
+        with log_context(request_id="req-1", message_id=7):
+            logger.info("Text: %.5s", "abcdefgh")
+        logger.info("outside")
+        listener.stop()
+
+        # Assert
+        lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+        self.assertEqual(lines[0]["msg"], "Text: abcde")
+        self.assertEqual(lines[0]["request_id"], "req-1")
+        self.assertEqual(lines[0]["message_id"], 7)
+        self.assertNotIn("request_id", lines[1])
+
+    def test_prepare_does_not_format_on_caller(self):
+        """Primitive args stay unformatted until the listener renders them."""
+        # Arrange
+        handler = LazyQueueHandler(None)
+        record = logging.LogRecord("x", logging.INFO, __file__, 1, "a=%s b=%s", ("one", object()), None)
+
+        # Act
+        prepared = handler.prepare(record)
+
+        # Assert
+        self.assertEqual(prepared.msg, "a=%s b=%s")
+        self.assertEqual(prepared.args[0], "one")
+        self.assertIsInstance(prepared.args[1], str)
+
+    def test_sampling_applies_to_info_only(self):
+        """Sampled loggers drop INFO lines but always keep warnings."""
+        # Arrange
+        sampler = SamplingFilter({"app.services": 0.0})
+
+        def record(name, level):
+            return logging.LogRecord(name, level, __file__, 1, "m", None, None)
+
+        # Assert
+        self.assertFalse(sampler.filter(record("app.services.tts_service", logging.INFO)))
+        self.assertTrue(sampler.filter(record("app.services.tts_service", logging.WARNING)))
+        self.assertTrue(sampler.filter(record("app.api.v1.chat", logging.INFO)))
+
+
+if __name__ == "__main__":
+    unittest.main()
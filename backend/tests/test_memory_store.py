@@ -0,0 +1,135 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+from sqlalchemy import select
+
+from app.models.all_models import Conversation, Message
+from app.services.context_builder import build_context
+from app.services.embedding_service import HashingEmbeddingProvider
+from app.services.memory_store import MemoryStore, recall, remember
+from db_utils import create_test_db, seed_conversation
+
+
+class TestMemoryStore(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.store = MemoryStore(os.path.join(self.test_dir, "memory"))
+        self.embedder = HashingEmbeddingProvider()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_hashing_embedder_ranks_shared_words_higher(self):
+        """Rows are unit length and texts sharing content words score higher."""
+        vectors = self.embedder.embed_sync([
+            "My granddaughter Lily starts school in September",
+            "Lily loves her new school",
+            "The weather was cold and rainy",
+        ])
+        np.testing.assert_allclose(np.linalg.norm(vectors, axis=1), 1.0, rtol=1e-5)
+        self.assertGreater(vectors[0] @ vectors[1], vectors[0] @ vectors[2])
+
+    async def test_search_excludes_recent_ids_and_survives_reload(self):
+        """Hits come back best first, ids at or above `before_id` are skipped, and the files persist."""
+        # Arrange
+        texts = ["Lily has a piano recital", "We planted tomatoes", "Lily won the piano prize"]
+        await self.store.add(1, [10, 11, 12], await self.embedder.embed(texts))
+        query = (await self.embedder.embed(["How did Lily's piano go?"]))[0]
+
+        # Act
+        hits = await self.store.search(1, query, k=2)
+        older = await self.store.search(1, query, k=2, before_id=12)
+        reloaded = await MemoryStore(self.store.root).search(1, query, k=2)
+
+        # Assert
+        self.assertEqual({message_id for message_id, _ in hits}, {10, 12})
+        self.assertEqual(older[0][0], 10)
+        self.assertNotIn(12, [message_id for message_id, _ in older])
+        self.assertEqual(reloaded, hits)
+
+    async def test_torn_append_is_dropped(self):
+        """Vector bytes written without their ids (crash mid-append) are discarded by the next write."""
+        # Arrange
+        await self.store.add(1, [1], await self.embedder.embed(["first"]))
+        vec_path, _ = self.store._paths(1, self.embedder.dim)
+        with open(vec_path, "ab") as f:
+            f.write(b"\x00" * 100)
+
+        # Act
+        await self.store.add(1, [2], await self.embedder.embed(["second"]))
+        query = (await self.embedder.embed(["second"]))[0]
+        fresh = MemoryStore(self.store.root)
+
+        # Assert
+        self.assertEqual(fresh.search_sync(1, query, k=1)[0][0], 2)
+        self.assertEqual(os.path.getsize(vec_path), 2 * self.embedder.dim * 4)
+
+    def test_ivf_matches_brute_force_for_nearest_neighbour(self):
+        """Above the threshold an IVF index is used and still finds the exact match."""
+        # Arrange
+        rng = np.random.default_rng(7)
+        vectors = rng.standard_normal((3000, 64)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        store = MemoryStore(self.store.root, ivf_threshold=1000, nprobe=8)
+        store.add_sync(1, np.arange(3000), vectors)
+
+        # Act
+        found = [store.search_sync(1, vectors[i], k=1)[0][0] for i in range(0, 3000, 100)]
+
+        # Assert
+        self.assertIsNotNone(store._cache[(1, 64)].ivf)
+        self.assertEqual(found, list(range(0, 3000, 100)))
+
+
+class TestRecall(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.engine, self.session_factory = await create_test_db(self.test_dir)
+        _, _, self.conversation_id = await seed_conversation(self.session_factory)
+        self.store = MemoryStore(os.path.join(self.test_dir, "memory"))
+        self.embedder = HashingEmbeddingProvider()
+
+    async def asyncTearDown(self):
+        await self.engine.dispose()
+        shutil.rmtree(self.test_dir)
+
+    async def test_old_fact_is_recalled_into_the_prompt(self):
+        """A fact from long ago, outside the verbatim window, is injected as a system note."""
+        # Arrange
+        lines = ["My granddaughter is called Lily and she is seven"] + [f"small talk number {i}" for i in range(30)]
+        async with self.session_factory() as db:
+            messages = [Message(conversation_id=self.conversation_id, role="user", content_text=t) for t in lines]
+            db.add_all(messages)
+            await db.commit()
+            current = Message(conversation_id=self.conversation_id, role="user", content_text="now", status="pending")
+            db.add(current)
+            await db.commit()
+        await remember(
+            self.conversation_id, [(m.id, m.content_text) for m in messages], embedder=self.embedder, store=self.store
+        )
+
+        # Act
+        async with self.session_factory() as db:
+            conversation = (
+                await db.execute(select(Conversation).where(Conversation.id == self.conversation_id))
+            ).scalar_one()
+            context = await build_context(db, conversation, current.id, "system", "How old is Lily now?", max_turns=4)
+            snippets = await recall(
+                db, self.conversation_id, "How old is Lily now?", context.oldest_turn_id,
+                embedder=self.embedder, store=self.store,
+            )
+        kept = context.add_memories(snippets)
+
+        # Assert
+        self.assertIn("User: My granddaughter is called Lily and she is seven", snippets)
+        self.assertEqual(kept, len(snippets))
+        self.assertEqual(context.history[0]["role"], "system")
+        self.assertIn("Lily", context.history[0]["content"])
+        self.assertEqual(len(context.history), 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from sqlalchemy import delete, update
+
+from app.models.all_models import Conversation, Persona
+from app.services.persona_cache import PersonaCache, cache_requests
+from app_utils import build_personas_client
+from db_utils import create_test_db, seed_conversation
+
+
+class TestPersonaCache(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.cwd = os.getcwd()
+        self.test_dir = tempfile.mkdtemp()
+        os.chdir(self.test_dir)
+        self.engine, self.session_factory = await create_test_db(self.test_dir)
+        self.user_id, self.persona_id, _ = await seed_conversation(self.session_factory)
+        self.cache = PersonaCache(ttl=60, max_entries=100)
+
+    async def asyncTearDown(self):
+        await self.engine.dispose()
+        os.chdir(self.cwd)
+        shutil.rmtree(self.test_dir)
+
+    async def test_hit_skips_database_and_prefix_is_stable(self):
+        """The second lookup is served from memory with the same rendered prompt and voice."""
+        # Arrange
+        hits = cache_requests.value(result="hit")
+        async with self.session_factory() as db:
+            first = await self.cache.get(db, self.persona_id)
+            await db.execute(delete(Conversation).where(Conversation.persona_id == self.persona_id))
+            await db.execute(delete(Persona).where(Persona.id == self.persona_id))
+            await db.commit()
+
+            # Act
+            second = await self.cache.get(db, self.persona_id)
+
+        # Assert
+        self.assertIs(second, first)
+        self.assertEqual(cache_requests.value(result="hit"), hits + 1)
+        self.assertTrue(first.prompt_prefix.startswith("You are roleplaying as Grandma.\n"))
+        self.assertEqual(first.voice_ref, "default")
+
+    async def test_remote_invalidation_drops_entries(self):
+        """An invalidation published by another worker drops the persona and its owner's list."""
+        # Arrange
+        async with self.session_factory() as db:
+            await self.cache.list_for_user(db, self.user_id)
+            await db.execute(update(Persona).values(voice_file_path="/voices/grandma.wav"))
+            await db.commit()
+
+            # Act
+            self.cache.handle_message(json.dumps({"persona_id": self.persona_id, "creator_id": self.user_id}))
+            persona = await self.cache.get(db, self.persona_id)
+            listed = await self.cache.list_for_user(db, self.user_id)
+
+        # Assert
+        self.assertEqual(persona.voice_ref, "/voices/grandma.wav")
+        self.assertEqual(listed[0].voice_ref, "/voices/grandma.wav")
+
+    async def test_load_racing_an_invalidation_is_not_cached(self):
+        """A row read before an invalidation landed must not be stored as current."""
+        # Arrange
+        cache, persona_id = self.cache, self.persona_id
+
+        class InvalidatedDuringRead:
+            def __init__(self, session):
+                self.session = session
+
+            async def execute(self, stmt):
+                result = await self.session.execute(stmt)
+                cache.drop(persona_id, None)
+                return result
+
+        # Act
+        async with self.session_factory() as db:
+            await cache.get(InvalidatedDuringRead(db), self.persona_id)
+            misses = cache_requests.value(result="miss")
+            await cache.get(db, self.persona_id)
+
+        # Assert
+        self.assertEqual(cache_requests.value(result="miss"), misses + 1)
+
+    async def test_avatar_upload_refreshes_listing(self):
+        """Writes through the personas API invalidate, so the next listing shows the change."""
+        # Arrange
+        client = await build_personas_client(self.session_factory, self.user_id)
+        with patch("app.api.v1.personas.get_persona_cache", return_value=self.cache):
+            async with client:
+                before = (await client.get("/api/v1/personas/")).json()
+
+                # Act
+                response = await client.post(
+                    f"/api/v1/personas/{self.persona_id}/avatar",
+                    files={"file": ("face.png", b"png-bytes", "image/png")},
+                )
+                after = (await client.get("/api/v1/personas/")).json()
+                foreign = await client.post(
+                    "/api/v1/personas/999/avatar", files={"file": ("face.png", b"png-bytes", "image/png")}
+                )
+
+        # Assert
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(before[0]["avatar_url"])
+        self.assertEqual(after[0]["avatar_url"], response.json()["avatar_url"])
+        self.assertEqual(after[0]["relationship"], "Grandmother")
+        self.assertEqual(foreign.status_code, 404)
+
+
+if __name__ == "__main__":
+    unittest.main()
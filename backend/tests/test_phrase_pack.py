@@ -0,0 +1,169 @@
+import os
+import shutil
+import tempfile
+import unittest
+from contextlib import asynccontextmanager
+from unittest.mock import patch
+
+from sqlalchemy import delete, select, update
+
+from app.api.v1.chat import process_voice_message
+from app.models.all_models import Conversation, Message, Persona
+from app.services.llm_service import FALLBACK_RESPONSE, MockLLMProvider
+from app.services.persona_cache import PersonaCache
+from app.services.phrase_pack import build_phrase_pack, phrases_served
+from app.services.tts_service import MockTTSProvider, generate_silent_wav
+from app_utils import build_chat_client
+from db_utils import create_test_db, seed_conversation
+
+
+class CountingTTS(MockTTSProvider):
+    def __init__(self):
+        self.texts = []
+
+    async def generate_audio(self, text: str, voice_id: str, output_path: str) -> bool:
+        self.texts.append(text)
+        return await super().generate_audio(text, voice_id, output_path)
+
+
+class DownLLM(MockLLMProvider):
+    """Stands in for a provider whose upstream failed and returned the fallback reply."""
+
+    async def generate_response(self, system_prompt, user_text, history=None) -> dict:
+        return dict(FALLBACK_RESPONSE)
+
+
+class TestPhrasePack(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.cwd = os.getcwd()
+        self.test_dir = tempfile.mkdtemp()
+        os.chdir(self.test_dir)
+        os.makedirs("static/audio")
+        self.engine, self.session_factory = await create_test_db(self.test_dir)
+        self.user_id, self.persona_id, self.conversation_id = await seed_conversation(self.session_factory)
+        async with self.session_factory() as db:
+            await db.execute(
+                update(Persona).where(Persona.id == self.persona_id).values(voice_id="grandma-voice")
+            )
+            await db.commit()
+
+        self.cache = PersonaCache(ttl=60, max_entries=100)
+        self.tts = CountingTTS()
+        self.patches = [
+            patch("app.services.phrase_pack.get_tts_provider", return_value=self.tts),
+            patch("app.services.phrase_pack.get_persona_cache", return_value=self.cache),
+            patch("app.api.v1.chat.get_persona_cache", return_value=self.cache),
+            patch("app.api.v1.chat.get_tts_provider", return_value=self.tts),
+        ]
+        for p in self.patches:
+            p.start()
+
+    async def asyncTearDown(self):
+        for p in self.patches:
+            p.stop()
+        await self.engine.dispose()
+        os.chdir(self.cwd)
+        shutil.rmtree(self.test_dir)
+
+    async def test_build_stores_voiced_phrases(self):
+        """Every phrase is synthesized once in the persona's voice; a rebuild reuses the clips."""
+        # Act
+        pack = await build_phrase_pack(self.persona_id, self.session_factory)
+        calls = len(self.tts.texts)
+        await build_phrase_pack(self.persona_id, self.session_factory)
+
+        # Assert
+        self.assertEqual(pack["voice"], "grandma-voice")
+        self.assertEqual(set(pack["phrases"]), {"greeting", "stt_fallback", "llm_fallback"})
+        self.assertIn("Sweetie", pack["phrases"]["greeting"]["text"])
+        for phrase in pack["phrases"].values():
+            self.assertTrue(os.path.exists(phrase["audio_url"].lstrip("/")))
+        self.assertEqual(calls, 3)
+        self.assertEqual(len(self.tts.texts), 3)
+
+    async def test_no_session_is_held_while_synthesizing(self):
+        """TTS calls run with no database session open; a voice replaced meanwhile makes the pack stale."""
+        # Arrange
+        open_sessions = 0
+        seen = []
+
+        @asynccontextmanager
+        async def counting_factory():
+            nonlocal open_sessions
+            open_sessions += 1
+            try:
+                async with self.session_factory() as db:
+                    yield db
+            finally:
+                open_sessions -= 1
+
+        async def replace_voice(text: str, voice_id: str, output_path: str) -> bool:
+            seen.append(open_sessions)
+            async with self.session_factory() as db:
+                await db.execute(update(Persona).where(Persona.id == self.persona_id).values(voice_id="new-voice"))
+                await db.commit()
+            generate_silent_wav(output_path, duration=0.1)
+            return True
+
+        # Act
+        with patch.object(self.tts, "generate_audio", side_effect=replace_voice):
+            pack = await build_phrase_pack(self.persona_id, counting_factory)
+        async with self.session_factory() as db:
+            persona = (await db.execute(select(Persona).where(Persona.id == self.persona_id))).scalar_one()
+
+        # Assert
+        self.assertEqual(seen, [0, 0, 0])
+        self.assertIsNone(pack)
+        self.assertIsNone(persona.phrase_pack)
+
+    async def test_new_conversation_opens_with_greeting(self):
+        """Opening a conversation returns the stored greeting without calling TTS."""
+        # Arrange
+        await build_phrase_pack(self.persona_id, self.session_factory)
+        async with self.session_factory() as db:
+            await db.execute(delete(Conversation).where(Conversation.id == self.conversation_id))
+            await db.commit()
+        self.tts.texts.clear()
+        client = await build_chat_client(self.session_factory, self.user_id)
+
+        # Act
+        async with client:
+            opened = (await client.get(f"/api/v1/conversations/{self.persona_id}/messages")).json()
+            again = (await client.get(f"/api/v1/conversations/{self.persona_id}/messages")).json()
+
+        # Assert
+        self.assertEqual(len(opened), 1)
+        self.assertEqual(opened[0]["role"], "assistant")
+        self.assertEqual(opened[0]["analysis"]["phrase"], "greeting")
+        self.assertTrue(opened[0]["audio_url"].startswith("/static/audio/phrases/"))
+        self.assertEqual([m["id"] for m in again], [opened[0]["id"]])
+        self.assertEqual(self.tts.texts, [])
+
+    async def test_llm_failure_replies_with_voiced_fallback(self):
+        """When the LLM falls back, the reply uses the pre-synthesized clip instead of a TTS call."""
+        # Arrange
+        pack = await build_phrase_pack(self.persona_id, self.session_factory)
+        self.tts.texts.clear()
+        generate_silent_wav("static/audio/msg.wav", duration=0.1)
+        async with self.session_factory() as db:
+            user_msg = Message(conversation_id=self.conversation_id, role="user", status="pending")
+            db.add(user_msg)
+            await db.commit()
+        served = phrases_served.value(phrase="llm_fallback")
+
+        # Act
+        with patch("app.api.v1.chat.get_llm_provider", return_value=DownLLM()):
+            await process_voice_message(self.conversation_id, user_msg.id, "static/audio/msg.wav", self.session_factory)
+
+        # Assert
+        async with self.session_factory() as db:
+            reply = (await db.execute(select(Message).where(Message.role == "assistant"))).scalar_one()
+        self.assertEqual(reply.status, "completed")
+        self.assertEqual(reply.audio_url, pack["phrases"]["llm_fallback"]["audio_url"])
+        self.assertEqual(reply.analysis["phrase"], "llm_fallback")
+        self.assertEqual(self.tts.texts, [])
+        self.assertEqual(phrases_served.value(phrase="llm_fallback"), served + 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import httpx
+from sqlalchemy import text
+
+from app.core.readiness import FAILED, OK, Readiness, schema_head
+from app.services.jobs import JobRunner
+from db_utils import create_test_db
+
+
+class TestReadiness(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.cwd = os.getcwd()
+        self.test_dir = tempfile.mkdtemp()
+        os.chdir(self.test_dir)
+        os.makedirs("static/audio")
+        self.engine, self.session_factory = await create_test_db(self.test_dir)
+
+    async def asyncTearDown(self):
+        await self.engine.dispose()
+        os.chdir(self.cwd)
+        shutil.rmtree(self.test_dir)
+
+    async def _stamp(self, version: str):
+        async with self.session_factory() as db:
+            await db.execute(text("CREATE TABLE IF NOT EXISTS alembic_version (version_num VARCHAR(32) NOT NULL)"))
+            await db.execute(text("DELETE FROM alembic_version"))
+            await db.execute(text("INSERT INTO alembic_version VALUES (:v)"), {"v": version})
+            await db.commit()
+
+    async def test_ready_once_every_check_passes(self):
+        """A database stamped at this build's head passes warm-up and reports how long it took."""
+        # Arrange
+        await self._stamp(schema_head())
+        readiness = Readiness()
+        before = readiness.report()
+
+        # Act
+        await asyncio.wait_for(readiness.warm_up(self.session_factory, retry_seconds=0.01), timeout=10)
+
+        # Assert
+        self.assertEqual(before["status"], "warming_up")
+        self.assertIsNone(before["warmup_seconds"])
+        report = readiness.report()
+        self.assertEqual(report["status"], "ready")
+        self.assertEqual(report["checks"], {"database": OK, "providers": OK, "schema": OK})
+        self.assertNotIn("errors", report)
+        self.assertGreaterEqual(report["warmup_seconds"], 0)
+
+    async def test_schema_behind_head_keeps_retrying(self):
+        """An unmigrated database leaves the replica not ready, with the reason, until it is migrated."""
+        # Arrange
+        await self._stamp("0000000000")
+        readiness = Readiness()
+
+        # Act
+        warm_up = asyncio.create_task(readiness.warm_up(self.session_factory, retry_seconds=0.01))
+        await asyncio.sleep(0.5)
+        stuck = readiness.report()
+        await self._stamp(schema_head())
+        await asyncio.wait_for(warm_up, timeout=10)
+
+        # Assert
+        self.assertEqual(stuck["status"], "warming_up")
+        self.assertEqual(stuck["checks"]["schema"], FAILED)
+        self.assertEqual(stuck["checks"]["database"], OK)
+        self.assertIn("0000000000", stuck["errors"]["schema"])
+        self.assertTrue(readiness.ready)
+
+    async def test_health_endpoints(self):
+        """Liveness answers right away; readiness is 503 until warm-up passes and again while draining."""
+        # Arrange
+        from app.main import create_app
+
+        await self._stamp(schema_head())
+        readiness, runner = Readiness(), JobRunner()
+        with patch("app.core.readiness._readiness", readiness), patch("app.services.jobs._runner", runner), \
+                patch("app.core.logging.setup_logging"), patch("app.core.tracing.setup_tracing"):
+            application = create_app()
+            client = httpx.AsyncClient(transport=httpx.ASGITransport(app=application), base_url="http://test")
+
+            # Act
+            async with client:
+                live = await client.get("/health/live")
+                warming = await client.get("/health/ready")
+                await readiness.warm_up(self.session_factory, retry_seconds=0.01)
+                ready = await client.get("/health/ready")
+                await runner.drain(timeout=1)
+                draining = await client.get("/health/ready")
+
+        # Assert
+        self.assertEqual(live.status_code, 200)
+        self.assertEqual(live.json()["status"], "alive")
+        self.assertEqual((warming.status_code, warming.json()["status"]), (503, "warming_up"))
+        self.assertEqual((ready.status_code, ready.json()["status"]), (200, "ready"))
+        self.assertEqual((draining.status_code, draining.json()["status"]), (503, "draining"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,248 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+
+import numpy as np
+from fastapi import FastAPI
+from sqlalchemy import select
+from starlette.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from app.api.v1 import realtime
+from app.core.security import create_access_token
+from app.models.all_models import Message
+from app.services.admission import TEXT_ONLY, AdmissionController
+from app.services.jobs import JobRunner
+from app.services.persona_cache import PersonaCache
+from app.services.usage_budget import Budget, BudgetGuard
+from app.services.usage_rollup import COUNTERS, UsageBatcher
+from app.services.vad import EnergyVAD
+from db_utils import create_test_db, seed_conversation
+
+RATE = 16000
+
+
+def pcm(seconds: float, amplitude: float = 0.0, freq: float = 220.0, seed: int = 0) -> bytes:
+    """Low-level noise, plus a sine tone of `amplitude` (int16 units) if given."""
+    t = np.arange(int(seconds * RATE)) / RATE
+    noise = np.random.default_rng(seed).normal(0, 40, t.size)
+    return (amplitude * np.sin(2 * np.pi * freq * t) + noise).astype("<i2").tobytes()
+
+
+class TestEnergyVAD(unittest.TestCase):
+    def test_endpoints_a_spoken_utterance(self):
+        """Silence, one second of speech, silence: one start and one end holding about that second."""
+        # Arrange
+        vad = EnergyVAD(sample_rate=RATE, silence_ms=600)
+        stream = pcm(0.5) + pcm(1.0, amplitude=4000) + pcm(1.0, seed=1)
+
+        # Act
+        events = []
+        for i in range(0, len(stream), 3200):  # 100 ms chunks
+            events += vad.feed(stream[i:i + 3200])
+
+        # Assert
+        self.assertEqual([e.kind for e in events], ["start", "end"])
+        seconds = len(events[1].audio) / 2 / RATE
+        self.assertGreater(seconds, 1.0)
+        self.assertLess(seconds, 1.6)
+        self.assertFalse(vad.in_speech)
+
+    def test_ignores_clicks_and_flushes_on_request(self):
+        """Bursts shorter than min_speech_ms are not speech; flush ends an utterance before the silence timeout."""
+        # Arrange
+        vad = EnergyVAD(sample_rate=RATE, min_speech_ms=240)
+
+        # Act
+        click = vad.feed(pcm(0.3) + pcm(0.09, amplitude=8000) + pcm(0.3, seed=2))
+        started = vad.feed(pcm(0.5, amplitude=4000))
+        flushed = vad.flush()
+
+        # Assert
+        self.assertEqual(click, [])
+        self.assertEqual([e.kind for e in started], ["start"])
+        self.assertEqual(flushed.kind, "end")
+        self.assertIsNone(vad.flush())
+
+
+class TestRealtimeVoice(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.test_dir = tempfile.mkdtemp()
+        os.chdir(self.test_dir)
+
+        app = FastAPI()
+        app.include_router(realtime.router, prefix="/api/v1")
+        self.client = TestClient(app)
+        self.client.__enter__()
+        # The database lives on the app's event loop, like the real one
+        self.engine, self.session_factory = self.client.portal.call(create_test_db, self.test_dir)
+        seeded = self.client.portal.call(seed_conversation, self.session_factory)
+        self.user_id, self.persona_id, self.conversation_id = seeded
+        self.token = create_access_token("alice")
+
+        self.runner = JobRunner()
+        cache = PersonaCache(ttl=60, max_entries=100)
+        self.patches = [
+            patch("app.api.v1.realtime.get_job_runner", return_value=self.runner),
+            patch("app.api.v1.chat.get_job_runner", return_value=self.runner),
+            patch("app.api.v1.realtime.get_persona_cache", return_value=cache),
+            patch("app.api.v1.chat.get_persona_cache", return_value=cache),
+            patch("app.core.db.AsyncSessionLocal", self.session_factory),
+        ]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        self.client.portal.call(self.runner.drain, 5)
+        self.client.portal.call(self.engine.dispose)
+        self.client.__exit__(None, None, None)
+        os.chdir(self.cwd)
+        shutil.rmtree(self.test_dir)
+
+    def _messages(self):
+        async def load():
+            async with self.session_factory() as db:
+                return (await db.execute(select(Message).order_by(Message.id))).scalars().all()
+        return self.client.portal.call(load)
+
+    def test_spoken_turn_gets_streamed_reply(self):
+        """Speech then silence produces a transcript, a reply, streamed WAV clips and stored messages."""
+        # Arrange
+        url = f"/api/v1/conversations/{self.persona_id}/realtime?token={self.token}"
+        stream = pcm(0.3) + pcm(1.0, amplitude=4000) + pcm(1.0, seed=1)
+
+        # Act
+        received, clips = [], []
+        with self.client.websocket_connect(url) as ws:
+            ready = ws.receive_json()
+            for i in range(0, len(stream), 3200):
+                ws.send_bytes(stream[i:i + 3200])
+            while not received or received[-1]["type"] not in ("done", "failed"):
+                received.append(ws.receive_json())
+                if received[-1]["type"] == "audio":
+                    clips.append(ws.receive_bytes())
+        self.client.portal.call(self.runner.drain, 5)
+        user_msg, asst_msg = self._messages()
+
+        # Assert
+        self.assertEqual(ready, {"type": "ready", "conversation_id": self.conversation_id, "sample_rate": RATE})
+        kinds = [m["type"] for m in received]
+        self.assertEqual(kinds[:4], ["speech_start", "speech_end", "transcript", "reply"])
+        self.assertEqual(kinds[-1], "done")
+        self.assertGreaterEqual(len(clips), 1)
+        self.assertTrue(all(clip[:4] == b"RIFF" for clip in clips))
+        self.assertEqual(received[1]["message_id"], user_msg.id)
+        self.assertEqual(received[-1]["message_id"], asst_msg.id)
+        self.assertEqual(user_msg.analysis["source"], "realtime")
+        self.assertGreater(user_msg.waveform["duration"], 1.0)
+        self.assertEqual(user_msg.waveform["sample_rate"], RATE)
+        self.assertIsNotNone(asst_msg.waveform)
+        self.assertEqual((user_msg.status, asst_msg.status), ("completed", "completed"))
+        self.assertTrue(os.path.exists(asst_msg.audio_url.lstrip("/")))
+        self.assertFalse([f for f in os.listdir("static/audio") if ".part" in f])
+
+    def _speak(self, ws) -> list:
+        """Sends one utterance, ends the turn and collects the JSON events up to the turn's outcome."""
+        ws.send_bytes(pcm(0.3) + pcm(1.0, amplitude=4000))
+        ws.send_text(json.dumps({"type": "end_turn"}))
+        received = []
+        while not received or received[-1]["type"] not in ("done", "failed", "busy", "over_budget"):
+            received.append(ws.receive_json())
+            if received[-1]["type"] == "audio":
+                ws.receive_bytes()
+        return received
+
+    def test_bad_control_frames_get_error_events(self):
+        """Frames that are not JSON objects or carry a non-numeric rate are answered, and the call goes on."""
+        # Arrange
+        url = f"/api/v1/conversations/{self.persona_id}/realtime?token={self.token}"
+
+        # Act
+        with self.client.websocket_connect(url) as ws:
+            ws.receive_json()
+            errors = []
+            for frame in ("not json", "[1]", json.dumps({"type": "start", "sample_rate": "fast"})):
+                ws.send_text(frame)
+                errors.append(ws.receive_json())
+            # Far below any real rate: used to leave the VAD with a zero-byte frame
+            ws.send_text(json.dumps({"type": "start", "sample_rate": 10}))
+            received = self._speak(ws)
+        self.client.portal.call(self.runner.drain, 5)
+        user_msg, asst_msg = self._messages()
+
+        # Assert
+        self.assertEqual([e["reason"] for e in errors], ["invalid_frame", "invalid_frame", "invalid_sample_rate"])
+        self.assertEqual(received[-1]["type"], "done")
+        self.assertEqual(user_msg.waveform["sample_rate"], realtime.MIN_SAMPLE_RATE)
+
+    def test_turn_is_shed_under_load(self):
+        """With the admission controller rejecting, an utterance is answered with busy and nothing is stored."""
+        # Arrange
+        url = f"/api/v1/conversations/{self.persona_id}/realtime?token={self.token}"
+        controller = AdmissionController(max_pending_jobs=0, reject_delay=30, text_only_delay=10)
+
+        # Act
+        with patch("app.api.v1.realtime.get_admission_controller", return_value=controller):
+            with self.client.websocket_connect(url) as ws:
+                ws.receive_json()
+                received = self._speak(ws)
+
+        # Assert
+        self.assertEqual([e["type"] for e in received], ["speech_start", "busy"])
+        self.assertGreaterEqual(received[-1]["retry_after"], 1)
+        self.assertEqual(self._messages(), [])
+
+    def test_budget_is_rechecked_every_turn(self):
+        """Spend during a call makes the next reply text only, then ends the call once the budget is gone."""
+        # Arrange
+        url = f"/api/v1/conversations/{self.persona_id}/realtime?token={self.token}"
+        guard = BudgetGuard(Budget(llm_tokens=1000), degrade_ratio=0.8, refresh_seconds=60)
+        batcher = UsageBatcher(max_buckets=500)
+
+        def spend(tokens: int):
+            counts = {**dict.fromkeys(COUNTERS, 0), "llm_tokens_in": tokens}
+            batcher.add(datetime.utcnow(), self.user_id, self.persona_id, counts)
+
+        # Act
+        with patch("app.api.v1.realtime.get_budget_guard", return_value=guard), \
+                patch("app.services.usage_rollup._batcher", batcher):
+            with self.client.websocket_connect(url) as ws:
+                ws.receive_json()
+                spend(850)
+                degraded = self._speak(ws)
+                spend(200)
+                refused = self._speak(ws)
+                with self.assertRaises(WebSocketDisconnect) as ctx:
+                    ws.receive_json()
+            self.client.portal.call(self.runner.drain, 5)
+        messages = self._messages()
+
+        # Assert
+        self.assertEqual(degraded[-1]["type"], "done")
+        self.assertNotIn("audio", [e["type"] for e in degraded])
+        self.assertEqual(messages[0].analysis["admission"], TEXT_ONLY)
+        self.assertEqual(refused[-1]["type"], "over_budget")
+        self.assertGreaterEqual(refused[-1]["retry_after"], 1)
+        self.assertEqual(ctx.exception.code, realtime.CLOSE_OVER_BUDGET)
+        self.assertEqual(len(messages), 2)
+
+    def test_rejects_bad_token(self):
+        """An invalid token is refused before the socket is accepted."""
+        # Act
+        with self.assertRaises(WebSocketDisconnect) as ctx:
+            with self.client.websocket_connect(f"/api/v1/conversations/{self.persona_id}/realtime?token=nope"):
+                pass
+
+        # Assert
+        self.assertEqual(ctx.exception.code, realtime.CLOSE_UNAUTHORIZED)
+
+
+if __name__ == "__main__":
+    unittest.main()
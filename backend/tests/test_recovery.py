@@ -0,0 +1,198 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from sqlalchemy import select
+
+from app.api.v1.chat import process_voice_message
+from app.models.all_models import Message
+from app.services.jobs import JobRunner, JobRunnerClosed
+from app.services.llm_service import MockLLMProvider
+from app.services.recovery import recover_stuck_messages
+from app.services.stt_service import MockSTTProvider
+from app.services.tts_service import MockTTSProvider, generate_silent_wav
+from db_utils import create_test_db, seed_conversation
+
+
+class HangingSTT(MockSTTProvider):
+    """Blocks forever, standing in for a worker killed during STT."""
+
+    def __init__(self):
+        self.entered = asyncio.Event()
+
+    async def transcribe(self, audio_path: str) -> str:
+        self.entered.set()
+        await asyncio.Event().wait()
+
+
+class HangingTTS(MockTTSProvider):
+    def __init__(self):
+        self.entered = asyncio.Event()
+
+    async def generate_audio(self, text: str, voice_id: str, output_path: str) -> bool:
+        self.entered.set()
+        await asyncio.Event().wait()
+
+
+class FailingLLM(MockLLMProvider):
+    async def generate_response(self, system_prompt: str, user_text: str) -> dict:
+        raise RuntimeError("upstream exploded")
+
+
+class TestRecoveryAndDrain(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.cwd = os.getcwd()
+        self.test_dir = tempfile.mkdtemp()
+        os.chdir(self.test_dir)
+        os.makedirs("static/audio")
+        self.engine, self.session_factory = await create_test_db(self.test_dir)
+        _, _, self.conversation_id = await seed_conversation(self.session_factory)
+
+    async def asyncTearDown(self):
+        await self.engine.dispose()
+        os.chdir(self.cwd)
+        shutil.rmtree(self.test_dir)
+
+    async def _upload(self):
+        filename = f"msg_{self.conversation_id}.wav"
+        generate_silent_wav(os.path.join("static/audio", filename), duration=0.1)
+        async with self.session_factory() as db:
+            msg = Message(
+                conversation_id=self.conversation_id,
+                role="user",
+                audio_url=f"/static/audio/{filename}",
+                status="pending",
+            )
+            db.add(msg)
+            await db.commit()
+            return msg.id, os.path.join("static/audio", filename)
+
+    async def _messages(self):
+        async with self.session_factory() as db:
+            return (await db.execute(select(Message).order_by(Message.id))).scalars().all()
+
+    async def test_killed_during_stt_is_requeued_on_startup(self):
+        """A run cancelled mid-STT stays pending and is re-run by the recovery scan."""
+        # Arrange
+        msg_id, audio_path = await self._upload()
+        stt = HangingSTT()
+        runner = JobRunner()
+        with patch("app.api.v1.chat.get_stt_provider", return_value=stt):
+            runner.submit(process_voice_message, self.conversation_id, msg_id, audio_path, self.session_factory)
+            await stt.entered.wait()
+
+            # Act: shutdown deadline expires while STT is in flight
+            cancelled = await runner.drain(timeout=0.05)
+
+        # Assert
+        self.assertEqual(cancelled, 1)
+        self.assertEqual([m.status for m in await self._messages()], ["pending"])
+
+        # Act: next process starts and scans
+        restarted = JobRunner()
+        counts = await recover_stuck_messages(self.session_factory, restarted, stale_after=0)
+        await restarted.drain(timeout=5)
+
+        # Assert
+        self.assertEqual(counts, {"requeued": 1, "failed": 0})
+        messages = await self._messages()
+        self.assertEqual([(m.role, m.status) for m in messages], [("user", "completed"), ("assistant", "completed")])
+        self.assertEqual(messages[0].analysis["recovery_attempts"], 1)
+
+    async def test_killed_during_tts_marks_reply_failed(self):
+        """A reply stuck in processing after a crash during TTS is marked failed."""
+        # Arrange
+        msg_id, audio_path = await self._upload()
+        tts = HangingTTS()
+        runner = JobRunner()
+        with patch("app.api.v1.chat.get_tts_provider", return_value=tts):
+            runner.submit(process_voice_message, self.conversation_id, msg_id, audio_path, self.session_factory)
+            await tts.entered.wait()
+            await runner.drain(timeout=0.05)
+        self.assertEqual([m.status for m in await self._messages()], ["completed", "processing"])
+
+        # Act
+        counts = await recover_stuck_messages(self.session_factory, JobRunner(), stale_after=0)
+
+        # Assert
+        self.assertEqual(counts, {"requeued": 0, "failed": 1})
+        reply = (await self._messages())[1]
+        self.assertEqual(reply.status, "failed")
+        self.assertEqual(reply.analysis["failure"], "interrupted")
+
+    async def test_recovery_respects_threshold_and_attempts(self):
+        """Fresh messages are left alone; exhausted retries are failed in small batches."""
+        # Arrange
+        for _ in range(3):
+            await self._upload()
+
+        # Act / Assert: younger than the threshold, nothing happens
+        counts = await recover_stuck_messages(self.session_factory, JobRunner(), stale_after=3600)
+        self.assertEqual(counts, {"requeued": 0, "failed": 0})
+
+        counts = await recover_stuck_messages(
+            self.session_factory, JobRunner(), stale_after=0, batch_size=2, max_attempts=0
+        )
+        self.assertEqual(counts, {"requeued": 0, "failed": 3})
+        self.assertTrue(all(m.status == "failed" for m in await self._messages()))
+
+    async def test_replicas_starting_together_enqueue_once(self):
+        """Two scans over the same stuck message: one claims and re-runs it, the other leaves it alone."""
+        # Arrange
+        await self._upload()
+        first, second = JobRunner(), JobRunner()
+
+        # Act
+        counts = await asyncio.gather(
+            recover_stuck_messages(self.session_factory, first, stale_after=0),
+            recover_stuck_messages(self.session_factory, second, stale_after=0),
+        )
+        await first.drain(timeout=5)
+        await second.drain(timeout=5)
+
+        # Assert
+        self.assertEqual(sorted(c["requeued"] for c in counts), [0, 1])
+        self.assertEqual(sum(c["failed"] for c in counts), 0)
+        messages = await self._messages()
+        self.assertEqual([(m.role, m.status) for m in messages], [("user", "completed"), ("assistant", "completed")])
+        self.assertEqual(messages[0].analysis["recovery_attempts"], 1)
+
+    async def test_refused_submit_does_not_use_an_attempt(self):
+        """A runner already shutting down leaves the message pending, and the next startup still retries it."""
+        # Arrange
+        await self._upload()
+        closing = JobRunner()
+        await closing.drain(timeout=0)
+
+        # Act
+        refused = await recover_stuck_messages(self.session_factory, closing, stale_after=0, max_attempts=1)
+        restarted = JobRunner()
+        retried = await recover_stuck_messages(self.session_factory, restarted, stale_after=0, max_attempts=1)
+        await restarted.drain(timeout=5)
+
+        # Assert
+        self.assertEqual(refused, {"requeued": 0, "failed": 0})
+        self.assertEqual(retried, {"requeued": 1, "failed": 0})
+        self.assertEqual([m.status for m in await self._messages()], ["completed", "completed"])
+
+    async def test_pipeline_error_marks_failed(self):
+        """An upstream exception leaves the message failed instead of pending forever."""
+        msg_id, audio_path = await self._upload()
+        with patch("app.api.v1.chat.get_llm_provider", return_value=FailingLLM()):
+            await process_voice_message(self.conversation_id, msg_id, audio_path, self.session_factory)
+
+        self.assertEqual([m.status for m in await self._messages()], ["failed"])
+
+    async def test_drain_rejects_new_jobs(self):
+        """Once draining, the runner refuses new work."""
+        runner = JobRunner()
+        await runner.drain(timeout=0)
+        with self.assertRaises(JobRunnerClosed):
+            runner.submit(asyncio.sleep, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,178 @@
+import asyncio
+import unittest
+
+from app.services.scheduler import PipelineScheduler, QueueDeadlineExceeded, deadline_expired, queue_depth
+
+
+class TestPipelineScheduler(unittest.IsolatedAsyncioTestCase):
+    async def _occupy(self, scheduler, upstream, gate):
+        async with scheduler.slot(upstream, "blocker"):
+            await gate.wait()
+
+    async def test_respects_slot_limit(self):
+        """Never more concurrent calls than slots for an upstream."""
+        # Arrange
+        scheduler = PipelineScheduler(slots={"tts": 2})
+        active = 0
+        peak = 0
+
+        async def call():
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+
+        # Act
+        await asyncio.gather(*(scheduler.run("tts", i % 3, call) for i in range(10)))
+
+        # Assert
+        self.assertEqual(peak, 2)
+        self.assertEqual(scheduler.queue_depth(), 0)
+
+    async def test_round_robin_across_users(self):
+        """A user with a deep backlog does not starve a user with one job."""
+        # Arrange
+        scheduler = PipelineScheduler(slots={"llm": 1})
+        gate = asyncio.Event()
+        blocker = asyncio.create_task(self._occupy(scheduler, "llm", gate))
+        await asyncio.sleep(0)
+        order = []
+
+        async def call(user):
+            order.append(user)
+
+        tasks = [asyncio.create_task(scheduler.run("llm", "chatty", call, "chatty")) for _ in range(5)]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(scheduler.run("llm", "quiet", call, "quiet")))
+        await asyncio.sleep(0)
+
+        # Act
+        gate.set()
+        await asyncio.gather(blocker, *tasks)
+
+        # Assert
+        self.assertLessEqual(order.index("quiet"), 1)
+
+    async def test_priority_weights(self):
+        """Interactive flows get more turns per round than batch flows."""
+        # Arrange
+        scheduler = PipelineScheduler(slots={"tts": 1}, weights={"interactive": 3, "batch": 1})
+        gate = asyncio.Event()
+        blocker = asyncio.create_task(self._occupy(scheduler, "tts", gate))
+        await asyncio.sleep(0)
+        order = []
+
+        async def call(tag):
+            order.append(tag)
+
+        tasks = []
+        for _ in range(4):
+            tasks.append(asyncio.create_task(scheduler.run("tts", 1, call, "batch", priority="batch")))
+        for _ in range(4):
+            tasks.append(asyncio.create_task(scheduler.run("tts", 2, call, "interactive", priority="interactive")))
+        await asyncio.sleep(0)
+
+        # Act
+        gate.set()
+        await asyncio.gather(blocker, *tasks)
+
+        # Assert
+        self.assertEqual(order[:4], ["batch", "interactive", "interactive", "interactive"])
+
+    async def test_queue_depth_exported_per_tier(self):
+        """Waiting jobs show up per user in-process, but only per lane and tier in metrics; both clear once served."""
+        # Arrange
+        scheduler = PipelineScheduler(slots={"stt": 1})
+        gate = asyncio.Event()
+        blocker = asyncio.create_task(self._occupy(scheduler, "stt", gate))
+        await asyncio.sleep(0)
+
+        async def call():
+            return None
+
+        tasks = [asyncio.create_task(scheduler.run("stt", 42, call)) for _ in range(3)]
+        await asyncio.sleep(0)
+
+        # Assert
+        self.assertEqual(scheduler.user_queue_depths()["stt"], {"42": 3})
+        self.assertEqual(queue_depth.value(upstream="stt", priority="interactive"), 3)
+
+        gate.set()
+        await asyncio.gather(blocker, *tasks)
+        self.assertEqual(scheduler.user_queue_depths()["stt"], {})
+        self.assertEqual(queue_depth.value(upstream="stt", priority="interactive"), 0)
+
+    async def test_cancelled_waiter_does_not_leak_slot(self):
+        """Cancelling a queued job removes it without consuming a slot."""
+        # Arrange
+        scheduler = PipelineScheduler(slots={"llm": 1})
+        gate = asyncio.Event()
+        blocker = asyncio.create_task(self._occupy(scheduler, "llm", gate))
+        await asyncio.sleep(0)
+
+        waiting = asyncio.create_task(scheduler.run("llm", 7, asyncio.sleep, 0))
+        await asyncio.sleep(0)
+
+        # Act
+        waiting.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiting
+        gate.set()
+        await blocker
+
+        # Assert
+        self.assertEqual(scheduler.queue_depth(), 0)
+        self.assertEqual(await scheduler.run("llm", 7, asyncio.sleep, 0, result="ok"), "ok")
+
+    async def test_cancel_after_expiry_does_not_free_a_slot(self):
+        """A waiter cancelled after its deadline expired was never granted a slot, so none is handed back."""
+        # Arrange
+        scheduler = PipelineScheduler(slots={"llm": 1})
+        gate = asyncio.Event()
+        blocker = asyncio.create_task(self._occupy(scheduler, "llm", gate))
+        await asyncio.sleep(0)
+        waiting = asyncio.create_task(self._occupy(scheduler, "llm", gate))
+        await asyncio.sleep(0)
+        lane = scheduler._lanes["llm"]
+        flow, queue = next(iter(lane._queues.items()))
+
+        # Act
+        # Expiry and cancellation land in the same loop iteration, before the waiter resumes
+        lane._expire(flow, queue[0], 60)
+        waiting.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiting
+        in_flight_after_cancel = lane.in_flight
+        gate.set()
+        await blocker
+
+        # Assert
+        self.assertEqual(in_flight_after_cancel, 1)
+        self.assertEqual(lane.in_flight, 0)
+
+    async def test_queue_deadline_returns_fallback(self):
+        """A call still queued at the deadline gets the provider's failure result, or an error without one."""
+        # Arrange
+        scheduler = PipelineScheduler(slots={"tts": 1}, queue_deadline=0.05)
+        gate = asyncio.Event()
+        blocker = asyncio.create_task(self._occupy(scheduler, "tts", gate))
+        await asyncio.sleep(0)
+        expired = deadline_expired.value(upstream="tts", priority="interactive")
+
+        # Act
+        result = await scheduler.run("tts", 9, asyncio.sleep, 0, result=True, fallback=False)
+        with self.assertRaises(QueueDeadlineExceeded):
+            await scheduler.run("tts", 9, asyncio.sleep, 0, result=True)
+        gate.set()
+        await blocker
+
+        # Assert
+        self.assertIs(result, False)
+        self.assertEqual(deadline_expired.value(upstream="tts", priority="interactive"), expired + 2)
+        self.assertEqual(scheduler.queue_depth(), 0)
+        self.assertIs(await scheduler.run("tts", 9, asyncio.sleep, 0, result=True, fallback=False), True)
+
+
+if __name__ == "__main__":
+    unittest.main()
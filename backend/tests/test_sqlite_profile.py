@@ -0,0 +1,80 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from alembic import command
+from alembic.autogenerate import compare_metadata
+from alembic.config import Config
+from alembic.migration import MigrationContext
+from sqlalchemy import inspect, text
+
+from app.core.config import settings
+from app.core.db import create_engine
+from app.models.all_models import Base
+
+BACKEND = os.path.join(os.path.dirname(__file__), "..")
+
+
+def alembic_config() -> Config:
+    # No ini file: alembic.ini's logging setup would reconfigure the test run's loggers
+    config = Config()
+    config.set_main_option("script_location", os.path.join(BACKEND, "alembic"))
+    return config
+
+
+class TestSQLiteProfile(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.url = f"sqlite+aiosqlite:///{os.path.join(self.test_dir, 'embedded.db')}"
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def _inspect(self, inspector):
+        async def run():
+            engine = create_engine(self.url)
+            async with engine.connect() as conn:
+                result = await conn.run_sync(inspector)
+            await engine.dispose()
+            return result
+
+        return asyncio.run(run())
+
+    def test_migrations_build_the_model_schema(self):
+        """upgrade head on SQLite yields exactly the models' schema, and downgrade base undoes it."""
+        # Arrange
+        config = alembic_config()
+
+        # Act
+        with patch.object(settings, "DATABASE_URL", self.url):
+            command.upgrade(config, "head")
+            diffs = self._inspect(lambda conn: compare_metadata(MigrationContext.configure(conn), Base.metadata))
+            command.downgrade(config, "base")
+            left = self._inspect(lambda conn: inspect(conn).get_table_names())
+
+        # Assert
+        self.assertEqual(diffs, [])
+        self.assertEqual(left, ["alembic_version"])
+
+    def test_connections_get_the_embedded_pragmas(self):
+        """Every connection runs in WAL mode, waits on a busy writer and enforces foreign keys."""
+        # Arrange
+        pragmas = ("journal_mode", "synchronous", "busy_timeout", "foreign_keys")
+
+        # Act
+        values = self._inspect(lambda conn: {p: conn.execute(text(f"PRAGMA {p}")).scalar() for p in pragmas})
+
+        # Assert
+        self.assertEqual(values, {
+            "journal_mode": "wal",
+            "synchronous": 1,  # NORMAL
+            "busy_timeout": settings.SQLITE_BUSY_TIMEOUT_MS,
+            "foreign_keys": 1,
+        })
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+import contextlib
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+import wave
+
+import numpy as np
+
+from app.services.stt_cache import (
+    CachedSTTProvider,
+    TranscriptCache,
+    audio_fingerprint,
+    stt_cache_lookups,
+    stt_seconds_saved,
+)
+from app.services.stt_service import STT_ERROR_TEXT, STTProvider
+
+
+class CountingSTT(STTProvider):
+    model = "whisper-test"
+
+    def __init__(self, text: str = "hello grandma"):
+        self.text = text
+        self.calls = 0
+
+    async def transcribe(self, audio_path: str) -> str:
+        self.calls += 1
+        return self.text
+
+
+def write_wav(path: str, samples: np.ndarray, rate: int = 16000, extra_chunk: bytes = b""):
+    with contextlib.closing(wave.open(path, "wb")) as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(rate)
+        f.writeframes(samples.tobytes())
+    if extra_chunk:
+        # Same samples, different header: a metadata chunk ahead of the data
+        with open(path, "rb") as f:
+            data = f.read()
+        chunk = b"LIST" + struct.pack("<I", len(extra_chunk)) + extra_chunk
+        body = data[12:36] + chunk + data[36:]
+        with open(path, "wb") as f:
+            f.write(b"RIFF" + struct.pack("<I", 4 + len(body)) + b"WAVE" + body)
+
+
+class TestSTTCache(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.samples = (np.random.default_rng(0).normal(0, 3000, 16000)).astype("<i2")
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    async def test_same_audio_is_transcribed_once(self):
+        """A re-upload with a different WAV header is answered from the cache and counted as saved time."""
+        # Arrange
+        first, second = os.path.join(self.test_dir, "a.wav"), os.path.join(self.test_dir, "b.wav")
+        write_wav(first, self.samples)
+        write_wav(second, self.samples, extra_chunk=b"INFOsoftware")
+        inner = CountingSTT()
+        stt = CachedSTTProvider(inner, TranscriptCache(ttl=60, max_entries=10))
+        hits = stt_cache_lookups.value(result="hit")
+        saved = stt_seconds_saved.value()
+
+        # Act
+        texts = [await stt.transcribe(first), await stt.transcribe(second)]
+
+        # Assert
+        self.assertEqual(audio_fingerprint(first), audio_fingerprint(second))
+        self.assertEqual(texts, ["hello grandma", "hello grandma"])
+        self.assertEqual(inner.calls, 1)
+        self.assertEqual(stt_cache_lookups.value(result="hit"), hits + 1)
+        self.assertGreaterEqual(stt_seconds_saved.value(), saved)
+
+    async def test_failures_are_not_cached_and_size_is_bounded(self):
+        """Error transcripts go upstream again; past max_entries the oldest transcript is evicted."""
+        # Arrange
+        paths = []
+        for i in range(3):
+            paths.append(os.path.join(self.test_dir, f"{i}.wav"))
+            write_wav(paths[-1], self.samples + i)
+        failing = CountingSTT(STT_ERROR_TEXT)
+        failing_stt = CachedSTTProvider(failing, TranscriptCache(ttl=60, max_entries=10))
+        inner = CountingSTT()
+        stt = CachedSTTProvider(inner, TranscriptCache(ttl=60, max_entries=2))
+
+        # Act
+        for _ in range(2):
+            await failing_stt.transcribe(paths[0])
+        for path in paths + paths[:1]:
+            await stt.transcribe(path)
+
+        # Assert
+        self.assertEqual(failing.calls, 2)
+        self.assertEqual(inner.calls, 4)
+        self.assertEqual(len(stt.cache.local), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
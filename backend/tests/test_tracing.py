@@ -0,0 +1,115 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import httpx
+from sqlalchemy import select
+
+from app.api.v1.chat import process_voice_message
+from app.core.tracing import (
+    InMemorySpanExporter,
+    SimpleSpanProcessor,
+    continue_trace,
+    instrument_engine,
+    traced_transport,
+    tracer,
+)
+from app.models.all_models import Message
+from app.services.tts_service import generate_silent_wav
+from db_utils import create_test_db, seed_conversation
+
+
+class TestTracing(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.exporter = InMemorySpanExporter()
+        self.processor = SimpleSpanProcessor(self.exporter)
+        tracer.add_processor(self.processor)
+
+        self.cwd = os.getcwd()
+        self.test_dir = tempfile.mkdtemp()
+        os.chdir(self.test_dir)
+        os.makedirs("static/audio")
+        self.engine, self.session_factory = await create_test_db(self.test_dir)
+        instrument_engine(self.engine)
+
+    async def asyncTearDown(self):
+        tracer.remove_processor(self.processor)
+        await self.engine.dispose()
+        os.chdir(self.cwd)
+        shutil.rmtree(self.test_dir)
+
+    def test_child_spans_share_trace(self):
+        """Nested spans inherit the trace id and point at their parent."""
+        with tracer.start_span("parent") as parent:
+            with tracer.start_span("child") as child:
+                pass
+
+        self.assertEqual(child.trace_id, parent.trace_id)
+        self.assertEqual(child.parent_id, parent.span_id)
+        self.assertEqual([s.name for s in self.exporter.get_finished_spans()], ["child", "parent"])
+
+    def test_continue_trace_from_traceparent(self):
+        """A propagated traceparent becomes the parent of new spans."""
+        with tracer.start_span("request") as request_span:
+            traceparent = request_span.traceparent
+
+        with continue_trace(traceparent):
+            with tracer.start_span("job") as job:
+                pass
+
+        self.assertEqual(job.trace_id, request_span.trace_id)
+        self.assertEqual(job.parent_id, request_span.span_id)
+
+    async def test_http_client_span_injects_traceparent(self):
+        """Outgoing provider requests get a client span and a traceparent header."""
+        seen = {}
+
+        def handler(request):
+            seen["traceparent"] = request.headers.get("traceparent")
+            return httpx.Response(200, json={"ok": True})
+
+        client = httpx.AsyncClient(transport=traced_transport(httpx.MockTransport(handler)))
+        with tracer.start_span("pipeline.tts") as parent:
+            await client.post("http://tts.local/tts", json={})
+        await client.aclose()
+
+        http_span = next(s for s in self.exporter.get_finished_spans() if s.name == "HTTP POST")
+        self.assertEqual(http_span.parent_id, parent.span_id)
+        self.assertEqual(http_span.attributes["http.status_code"], 200)
+        self.assertEqual(seen["traceparent"], http_span.traceparent)
+
+    async def test_pipeline_spans_and_trace_id_on_message(self):
+        """The background job joins the upload trace, with DB spans, and records the trace id."""
+        # Arrange
+        _, _, conversation_id = await seed_conversation(self.session_factory)
+        async with self.session_factory() as db:
+            user_msg = Message(conversation_id=conversation_id, role="user", status="completed")
+            db.add(user_msg)
+            await db.commit()
+        audio_path = os.path.join("static/audio", "in.wav")
+        generate_silent_wav(audio_path, duration=0.1)
+
+        with tracer.start_span("chat.send_voice_message") as upload:
+            traceparent = upload.traceparent
+        self.exporter.clear()
+
+        # Act
+        await process_voice_message(
+            conversation_id, user_msg.id, audio_path, self.session_factory, traceparent=traceparent
+        )
+
+        # Assert
+        spans = self.exporter.get_finished_spans()
+        names = {s.name for s in spans}
+        self.assertTrue({"pipeline.process_voice_message", "pipeline.stt", "pipeline.llm", "pipeline.tts"} <= names)
+        self.assertIn("db.execute", names)
+        self.assertTrue(all(s.trace_id == upload.trace_id for s in spans))
+
+        async with self.session_factory() as db:
+            reply = (await db.execute(select(Message).where(Message.role == "assistant"))).scalar_one()
+        self.assertEqual(reply.analysis["trace_id"], upload.trace_id)
+
+
+if __name__ == "__main__":
+    unittest.main()
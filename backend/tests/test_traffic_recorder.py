@@ -0,0 +1,148 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import httpx
+from sqlalchemy import select
+
+from app.api.v1.chat import process_voice_message
+from app.core.cache import LocalTTLCache
+from app.models.all_models import Message
+from app.services.admission import AdmissionController
+from app.services.idempotency import IdempotencyStore
+from app.services.jobs import JobRunner
+from app.services.persona_cache import PersonaCache
+from app.services.scheduler import PipelineScheduler
+from app.services.stt_cache import TranscriptCache
+from app.services.traffic_format import read_recording
+from app.services.traffic_recorder import TrafficRecorder
+from app.services.traffic_replay import (
+    CollectingRecorder,
+    StandInLLM,
+    StandInSTT,
+    StandInTTS,
+    seed_users,
+    send_turns,
+    summarize,
+)
+from app.services.tts_service import generate_silent_wav
+from app.services.usage_rollup import UsageBatcher
+from db_utils import create_test_db, seed_conversation
+
+
+def recorded_turn(t: float, user: str, stt_ms: int, llm_ms: int, tts_ms: int) -> dict:
+    return {
+        "v": 1, "t": t, "u": user, "p": "interactive", "text_only": False, "audio_ms": 1500, "in_chars": 40,
+        "out_chars": 90, "tok_in": 500, "tok_out": 30, "tts_chars": 90, "e2e_ms": 0, "outcome": "ok",
+        "stages": {
+            "stt:transcribe": [0, stt_ms, 1],
+            "llm:generate_response": [0, llm_ms, 1],
+            "tts:generate_audio": [0, tts_ms, 1],
+        },
+    }
+
+
+class TestTrafficRecorder(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.cwd = os.getcwd()
+        self.test_dir = tempfile.mkdtemp()
+        os.chdir(self.test_dir)
+        os.makedirs("static/audio")
+        self.engine, self.session_factory = await create_test_db(self.test_dir)
+        self.runner = JobRunner()
+        self.scheduler = PipelineScheduler(slots={"stt": 2, "llm": 2, "tts": 1})
+        self.patches = [
+            patch("app.services.usage_rollup._batcher", UsageBatcher(max_buckets=500)),
+            patch("app.api.v1.chat.get_job_runner", return_value=self.runner),
+            patch("app.api.v1.chat.get_pipeline_scheduler", return_value=self.scheduler),
+            patch("app.api.v1.chat.get_admission_controller", return_value=AdmissionController(
+                max_pending_jobs=50, reject_delay=60, text_only_delay=60, enabled=False
+            )),
+            patch("app.api.v1.chat.get_persona_cache", return_value=PersonaCache(ttl=60, max_entries=100)),
+            patch(
+                "app.api.v1.chat.get_idempotency_store",
+                return_value=IdempotencyStore(ttl=600, local=LocalTTLCache()),
+            ),
+            patch("app.services.stt_cache._cache", TranscriptCache(ttl=60, max_entries=10)),
+            patch("app.core.db.AsyncSessionLocal", self.session_factory),
+        ]
+        for p in self.patches:
+            p.start()
+
+    async def asyncTearDown(self):
+        for p in self.patches:
+            p.stop()
+        await self.runner.drain(timeout=5)
+        await self.engine.dispose()
+        os.chdir(self.cwd)
+        shutil.rmtree(self.test_dir)
+
+    async def test_pipeline_run_is_recorded_anonymized(self):
+        """One line per run with lengths, audio seconds and per-stage timings, but no text or ids."""
+        # Arrange
+        user_id, _, conversation_id = await seed_conversation(self.session_factory)
+        generate_silent_wav("static/audio/msg.wav", duration=0.5)
+        async with self.session_factory() as db:
+            user_msg = Message(conversation_id=conversation_id, role="user", status="pending")
+            db.add(user_msg)
+            await db.commit()
+        path = os.path.join(self.test_dir, "traffic", "pipeline.jsonl")
+        recorder = TrafficRecorder(path)
+
+        # Act
+        with patch("app.services.traffic_recorder._recorder", recorder):
+            await process_voice_message(conversation_id, user_msg.id, "static/audio/msg.wav", self.session_factory)
+        recorder.close()
+
+        # Assert
+        async with self.session_factory() as db:
+            user_msg, reply = (await db.execute(select(Message).order_by(Message.id))).scalars().all()
+        [record] = read_recording(path)
+        with open(path) as f:
+            raw = f.read()
+        self.assertNotIn(user_msg.content_text, raw)
+        self.assertNotIn(reply.content_text, raw)
+        self.assertNotEqual(record["u"], str(user_id))
+        self.assertEqual(record["u"], recorder.anonymize(user_id))
+        self.assertEqual((record["audio_ms"], record["in_chars"], record["out_chars"]),
+                         (500, len(user_msg.content_text), len(reply.content_text)))
+        self.assertEqual(record["outcome"], "ok")
+        self.assertTrue({"stt:transcribe", "llm:generate_response", "tts:generate_audio"} <= set(record["stages"]))
+        self.assertTrue(all(calls == 1 for _, _, calls in record["stages"].values()))
+
+    async def test_replay_reproduces_call_times_and_measures_queueing(self):
+        """Two turns arriving together share the single TTS slot: the second one's wait shows in the report."""
+        # Arrange
+        from app.main import create_app
+
+        records = [recorded_turn(1000.0, "a", 50, 50, 300), recorded_turn(1000.1, "b", 50, 50, 300)]
+        collector = CollectingRecorder()
+        with patch("app.core.logging.setup_logging"), patch("app.core.tracing.setup_tracing"):
+            application = create_app()
+        users = await seed_users(self.session_factory, records)
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=application), base_url="http://replay")
+
+        # Act
+        with patch("app.api.v1.chat.get_stt_provider", return_value=StandInSTT(records)), \
+                patch("app.api.v1.chat.get_llm_provider", return_value=StandInLLM(records)), \
+                patch("app.api.v1.chat.get_tts_provider", return_value=StandInTTS(records)), \
+                patch("app.services.traffic_recorder._recorder", collector):
+            async with client:
+                sends = await send_turns(client, records, users, speed=10)
+                await self.runner.drain(timeout=10)
+        summary = summarize(10, sends, collector.lines, wall=1.0)
+
+        # Assert
+        self.assertEqual([s["status"] for s in sends], [200, 200])
+        self.assertEqual((summary["done"], summary["failed"], summary["shed_503"]), (2, 0, 0))
+        for line in collector.lines:
+            self.assertGreaterEqual(line["stages"]["tts:generate_audio"][1], 300)
+            self.assertEqual((line["in_chars"], line["out_chars"]), (40, 90))
+        self.assertGreater(summary["tts_wait_p95_s"], 0.1)
+        self.assertEqual(summary["stt_wait_p95_s"], 0.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
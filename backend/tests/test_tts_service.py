@@ -1,24 +1,12 @@
+import contextlib
 import unittest
+import wave
 import os
 import shutil
 import tempfile
 from unittest.mock import MagicMock, AsyncMock, patch
-import sys
 
-# Add backend to path
-sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
-
-# Mock app.core.config BEFORE importing app.services.tts_service
-# This avoids importing pydantic which is not installed/buildable in this environment
-mock_config_module = MagicMock()
-mock_config_module.settings.INDEXTTS_BASE_URL = "http://mock-url"
-sys.modules["app.core.config"] = mock_config_module
-
-# Also mock pydantic_settings just in case
-sys.modules["pydantic_settings"] = MagicMock()
-sys.modules["pydantic"] = MagicMock()
-
-from app.services.tts_service import IndexTTSClient
+from app.services.tts_service import IndexTTSClient, concat_wavs, generate_silent_wav, split_sentences
 
 class TestIndexTTSClient(unittest.IsolatedAsyncioTestCase):
     def setUp(self):
@@ -114,3 +102,38 @@ class TestIndexTTSClient(unittest.IsolatedAsyncioTestCase):
         self.assertFalse(result)
         self.assertTrue(os.path.exists(output_path))
         self.assertGreater(os.path.getsize(output_path), 0)
+
+
+class TestSentenceStreamingHelpers(unittest.TestCase):
+    def test_split_sentences(self):
+        """Replies split at Latin and CJK punctuation, with short fragments merged."""
+        self.assertEqual(
+            split_sentences("Oh! I missed you so much. How was school today? Tell me everything."),
+            ["Oh! I missed you so much.", "How was school today?", "Tell me everything."],
+        )
+        self.assertEqual(split_sentences("今天过得怎么样？我一直在想你。记得早点睡觉，别太累了。"),
+                         ["今天过得怎么样？我一直在想你。", "记得早点睡觉，别太累了。"])
+        self.assertEqual(split_sentences(""), [])
+
+    def test_concat_wavs(self):
+        """Clips are joined in order; a clip with a different format is left out."""
+        # Arrange
+        with tempfile.TemporaryDirectory() as d:
+            paths = [os.path.join(d, f"{i}.wav") for i in range(3)]
+            generate_silent_wav(paths[0], duration=0.5)
+            generate_silent_wav(paths[1], duration=0.25)
+            with contextlib.closing(wave.open(paths[2], "wb")) as f:
+                f.setnchannels(1)
+                f.setsampwidth(2)
+                f.setframerate(8000)
+                f.writeframes(b"\x00" * 1600)
+            output = os.path.join(d, "out.wav")
+
+            # Act
+            concat_wavs(paths, output)
+
+            # Assert
+            with contextlib.closing(wave.open(output, "rb")) as f:
+                rate = f.getframerate()
+                self.assertEqual(f.getnframes(), int(rate * 0.5) + int(rate * 0.25))
+
@@ -0,0 +1,239 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+
+import httpx
+from sqlalchemy import select
+
+from app.api.v1.chat import process_voice_message
+from app.core.cache import LocalTTLCache
+from app.models.all_models import Message, UsageRollup
+from app.services.admission import AdmissionController
+from app.services.idempotency import IdempotencyStore
+from app.services.jobs import JobRunner
+from app.services.llm_service import OpenAILLMProvider
+from app.services.persona_cache import PersonaCache
+from app.services.scheduler import PipelineScheduler
+from app.services.tts_service import generate_silent_wav
+from app.services.usage_budget import Budget, BudgetGuard
+from app.services.usage_meter import TurnUsage, llm_tokens, metering
+from app.services.usage_rollup import DAY, UsageBatcher, add_counts, backfill_rollups, bucket_starts, get_usage_batcher
+from app_utils import build_admin_client, build_chat_client
+from db_utils import create_test_db, seed_conversation
+
+
+def billed_endpoint(prompt_tokens: int, completion_tokens: int) -> OpenAILLMProvider:
+    """A local OpenAI-compatible endpoint that reports the given usage with every completion."""
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json={
+            "id": "chatcmpl-test",
+            "object": "chat.completion",
+            "created": 0,
+            "model": "billed-model",
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": json.dumps({"tone": "calm", "content": "Hello"})},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        })
+
+    return OpenAILLMProvider(
+        base_url="http://billed.local/v1",
+        model="billed-model",
+        api_key="test",
+        max_retries=0,
+        http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+    )
+
+
+def usage_counts(llm_in: int = 0, llm_out: int = 0, stt_ms: int = 0, tts_chars: int = 0) -> dict:
+    base = dict.fromkeys(("messages", "replies", "stt_failures", "llm_failures", "tts_failures", "failures",
+                          "latency_ms_sum", "latency_count"), 0)
+    return {**base, "messages": 1, "llm_tokens_in": llm_in, "llm_tokens_out": llm_out, "stt_audio_ms": stt_ms,
+            "tts_chars": tts_chars}
+
+
+class TestUsageMeter(unittest.IsolatedAsyncioTestCase):
+    async def test_provider_usage_adds_up_per_turn(self):
+        """Reported tokens land on the turn being metered; once it is recorded they go to its late sink."""
+        # Arrange
+        provider = billed_endpoint(prompt_tokens=120, completion_tokens=30)
+        usage, late = TurnUsage(), []
+        before = llm_tokens.value(model="billed-model", direction="in")
+
+        # Act
+        with metering(usage):
+            await provider.complete("system", "how are you?")
+            await provider.complete("system", "and the garden?")
+            usage.late_sink = late.append
+            await provider.complete("system", "summarize")
+        await provider.complete("system", "outside any turn")
+
+        # Assert
+        self.assertEqual((usage.llm_tokens_in, usage.llm_tokens_out), (240, 60))
+        self.assertEqual(late, [{"llm_tokens_in": 120, "llm_tokens_out": 30}])
+        self.assertEqual(llm_tokens.value(model="billed-model", direction="in"), before + 480)
+
+
+class TestUsageAccounting(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.cwd = os.getcwd()
+        self.test_dir = tempfile.mkdtemp()
+        os.chdir(self.test_dir)
+        os.makedirs("static/audio")
+        self.engine, self.session_factory = await create_test_db(self.test_dir)
+        self.user_id, self.persona_id, self.conversation_id = await seed_conversation(self.session_factory)
+        self.runner = JobRunner()
+        self.guard = BudgetGuard(Budget(llm_tokens=1000), degrade_ratio=0.8, refresh_seconds=60)
+        self.patches = [
+            patch("app.services.usage_rollup._batcher", UsageBatcher(max_buckets=500)),
+            patch("app.api.v1.chat.get_budget_guard", return_value=self.guard),
+            patch("app.api.v1.chat.get_job_runner", return_value=self.runner),
+            patch(
+                "app.api.v1.chat.get_pipeline_scheduler",
+                return_value=PipelineScheduler(slots={"stt": 1, "llm": 1, "tts": 1}),
+            ),
+            patch("app.api.v1.chat.get_admission_controller", return_value=AdmissionController(
+                max_pending_jobs=50, reject_delay=60, text_only_delay=60, enabled=False
+            )),
+            patch("app.api.v1.chat.get_persona_cache", return_value=PersonaCache(ttl=60, max_entries=100)),
+            patch(
+                "app.api.v1.chat.get_idempotency_store",
+                return_value=IdempotencyStore(ttl=600, local=LocalTTLCache()),
+            ),
+            patch("app.core.db.AsyncSessionLocal", self.session_factory),
+        ]
+        for p in self.patches:
+            p.start()
+
+    async def asyncTearDown(self):
+        for p in self.patches:
+            p.stop()
+        await self.runner.drain(timeout=5)
+        await self.engine.dispose()
+        os.chdir(self.cwd)
+        shutil.rmtree(self.test_dir)
+
+    async def _day_rollup(self):
+        async with self.session_factory() as db:
+            return (await db.execute(select(UsageRollup).where(UsageRollup.granularity == DAY))).scalar_one_or_none()
+
+    async def test_turn_usage_is_stored_on_messages_and_flushed_in_batches(self):
+        """Audio seconds go on the user message, tokens and characters on the reply; rollups wait for the flush."""
+        # Arrange
+        generate_silent_wav("static/audio/msg.wav", duration=0.5)
+        async with self.session_factory() as db:
+            user_msg = Message(conversation_id=self.conversation_id, role="user", status="pending")
+            db.add(user_msg)
+            await db.commit()
+
+        # Act
+        await process_voice_message(self.conversation_id, user_msg.id, "static/audio/msg.wav", self.session_factory)
+        before_flush = await self._day_rollup()
+        written = await get_usage_batcher().flush(self.session_factory)
+        live = await self._day_rollup()
+
+        # Assert
+        async with self.session_factory() as db:
+            user_msg, reply = (await db.execute(select(Message).order_by(Message.id))).scalars().all()
+        self.assertEqual(user_msg.analysis["usage"], {"stt_seconds": 0.5})
+        self.assertEqual(reply.analysis["usage"]["tts_chars"], len(reply.content_text))
+        self.assertGreater(reply.analysis["usage"]["llm_tokens_in"], reply.analysis["usage"]["llm_tokens_out"])
+        self.assertIsNone(before_flush)
+        self.assertEqual(written, 2)
+        self.assertEqual(live.stt_audio_ms, 500)
+        self.assertEqual(live.llm_tokens_in, reply.analysis["usage"]["llm_tokens_in"])
+        self.assertEqual(live.tts_chars, len(reply.content_text))
+        live_usage = (live.llm_tokens_in, live.llm_tokens_out, live.stt_audio_ms, live.tts_chars)
+        await backfill_rollups(self.session_factory)
+        rebuilt = await self._day_rollup()
+        self.assertEqual(
+            (rebuilt.llm_tokens_in, rebuilt.llm_tokens_out, rebuilt.stt_audio_ms, rebuilt.tts_chars), live_usage
+        )
+
+    async def test_budget_degrades_to_text_then_refuses(self):
+        """Past 80% of the token budget replies lose their audio; unflushed usage pushing past it gets 429."""
+        # Arrange
+        today = bucket_starts(datetime.utcnow())[1]
+        async with self.session_factory() as db:
+            await add_counts(db, {(DAY, today, self.user_id, self.persona_id): usage_counts(llm_in=700, llm_out=150)})
+            await db.commit()
+        client = await build_chat_client(self.session_factory, self.user_id)
+
+        # Act
+        async with client:
+            degraded = await client.post(f"/api/v1/conversations/{self.persona_id}/send",
+                                         files={"file": ("a.wav", b"RIFF-first", "audio/wav")})
+            get_usage_batcher().add(datetime.utcnow(), self.user_id, self.persona_id, usage_counts(llm_in=200))
+            refused = await client.post(f"/api/v1/conversations/{self.persona_id}/send",
+                                        files={"file": ("b.wav", b"RIFF-second", "audio/wav")})
+
+        # Assert
+        self.assertEqual(degraded.status_code, 200)
+        self.assertEqual(degraded.json()["analysis"]["admission"], "text_only")
+        self.assertEqual(refused.status_code, 429)
+        self.assertGreater(int(refused.headers["Retry-After"]), 0)
+        self.assertLessEqual(int(refused.headers["Retry-After"]), 86400)
+
+    async def test_flushed_usage_still_counts_while_totals_are_cached(self):
+        """A flush between two checks moves spend from pending into the cached stored total instead of losing it."""
+        # Arrange
+        batcher = get_usage_batcher()
+        batcher.add_flush_listener(self.guard.flushed)
+        now = datetime.utcnow()
+        batcher.add(now, self.user_id, self.persona_id, usage_counts(llm_in=300, llm_out=100))
+        async with self.session_factory() as db:
+            before = await self.guard.spent_today(db, self.user_id, now)
+
+        # Act
+        await batcher.flush(self.session_factory)
+        batcher.add(now, self.user_id, self.persona_id, usage_counts(llm_in=50))
+        async with self.session_factory() as db:
+            after = await self.guard.spent_today(db, self.user_id, now)
+
+        # Assert
+        self.assertEqual(before["llm_tokens"], 400)
+        self.assertEqual(after["llm_tokens"], 450)
+
+    async def test_admin_upstream_usage_per_user_and_conversation(self):
+        """Spend is reported per user and per conversation, biggest token spender first."""
+        # Arrange
+        admin_id, admin_persona, _ = await seed_conversation(self.session_factory, username="admin", is_admin=True)
+        day = datetime(2026, 3, 1)
+        alice = (DAY, day, self.user_id, self.persona_id)
+        async with self.session_factory() as db:
+            await add_counts(db, {
+                alice: usage_counts(llm_in=100, llm_out=20, stt_ms=4500, tts_chars=80),
+                (DAY, day, admin_id, admin_persona): usage_counts(llm_in=900, llm_out=100, stt_ms=1000, tts_chars=10),
+            })
+            await db.commit()
+        client = await build_admin_client(self.session_factory, admin_id)
+        params = {"start": "2026-03-01", "end": "2026-03-01"}
+
+        # Act
+        async with client:
+            users = (await client.get("/api/v1/admin/analytics/upstream", params=params)).json()
+            conversations = (await client.get("/api/v1/admin/analytics/upstream",
+                                              params={**params, "by": "conversation"})).json()
+
+        # Assert
+        self.assertEqual([(u["username"], u["llm_tokens_in"], u["llm_tokens_out"]) for u in users],
+                         [("admin", 900, 100), ("alice", 100, 20)])
+        self.assertIsNone(users[0]["persona_id"])
+        self.assertEqual(users[1]["stt_seconds"], 4.5)
+        self.assertEqual([(c["user_id"], c["persona_id"], c["persona_name"]) for c in conversations],
+                         [(admin_id, admin_persona, "Grandma"), (self.user_id, self.persona_id, "Grandma")])
+
+
+if __name__ == "__main__":
+    unittest.main()
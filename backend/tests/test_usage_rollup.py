@@ -0,0 +1,178 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+
+from sqlalchemy import select
+
+from app.api.v1.chat import process_voice_message
+from app.models.all_models import Message, UsageRollup
+from app.services.llm_service import FALLBACK_RESPONSE, MockLLMProvider
+from app.services.persona_cache import PersonaCache
+from app.services.scheduler import PipelineScheduler
+from app.services.tts_service import MockTTSProvider, generate_silent_wav
+from app.services.usage_rollup import DAY, HOUR, UsageBatcher, add_counts, backfill_rollups, get_usage_batcher
+from app_utils import build_admin_client
+from db_utils import create_test_db, seed_conversation
+
+
+class DownLLM(MockLLMProvider):
+    async def generate_response(self, system_prompt, user_text, history=None) -> dict:
+        return dict(FALLBACK_RESPONSE)
+
+
+class DownTTS(MockTTSProvider):
+    async def generate_audio(self, text: str, voice_id: str, output_path: str) -> bool:
+        generate_silent_wav(output_path, duration=0.1)
+        return False
+
+
+def counters(row: UsageRollup):
+    return (row.granularity, row.messages, row.replies, row.stt_failures, row.llm_failures, row.tts_failures,
+            row.failures, row.latency_count)
+
+
+class TestUsageRollup(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.cwd = os.getcwd()
+        self.test_dir = tempfile.mkdtemp()
+        os.chdir(self.test_dir)
+        os.makedirs("static/audio")
+        self.engine, self.session_factory = await create_test_db(self.test_dir)
+        self.user_id, self.persona_id, self.conversation_id = await seed_conversation(self.session_factory)
+        self.patches = [
+            patch("app.api.v1.chat.get_persona_cache", return_value=PersonaCache(ttl=60, max_entries=100)),
+            patch("app.services.usage_rollup._batcher", UsageBatcher(max_buckets=500)),
+        ]
+        for p in self.patches:
+            p.start()
+
+    async def asyncTearDown(self):
+        for p in self.patches:
+            p.stop()
+        await self.engine.dispose()
+        os.chdir(self.cwd)
+        shutil.rmtree(self.test_dir)
+
+    async def _turn(self):
+        generate_silent_wav("static/audio/msg.wav", duration=0.1)
+        async with self.session_factory() as db:
+            user_msg = Message(conversation_id=self.conversation_id, role="user", status="pending")
+            db.add(user_msg)
+            await db.commit()
+        await process_voice_message(self.conversation_id, user_msg.id, "static/audio/msg.wav", self.session_factory)
+
+    async def _rollups(self):
+        await get_usage_batcher().flush(self.session_factory)
+        async with self.session_factory() as db:
+            rows = (await db.execute(select(UsageRollup).order_by(UsageRollup.granularity))).scalars().all()
+        return [counters(row) for row in rows]
+
+    async def test_finished_turns_update_rollups_and_backfill_matches(self):
+        """Each run adds to its hour and day bucket; rebuilding from history gives the same counters, twice."""
+        # Arrange
+        await self._turn()
+        with patch("app.api.v1.chat.get_llm_provider", return_value=DownLLM()), \
+                patch("app.api.v1.chat.get_tts_provider", return_value=DownTTS()):
+            await self._turn()
+
+        # Act
+        live = await self._rollups()
+        await backfill_rollups(self.session_factory, chunk_size=1)
+        rebuilt = await backfill_rollups(self.session_factory, chunk_size=1)
+
+        # Assert
+        self.assertEqual(live, [(DAY, 2, 2, 0, 1, 1, 0, 2), (HOUR, 2, 2, 0, 1, 1, 0, 2)])
+        self.assertEqual(await self._rollups(), live)
+        self.assertEqual(rebuilt["messages"], 4)
+        async with self.session_factory() as db:
+            reply = (await db.execute(select(Message).where(Message.role == "assistant").limit(1))).scalar_one()
+        self.assertGreaterEqual(reply.analysis["latency_ms"], 0)
+
+    async def test_admin_analytics_read_rollups(self):
+        """Daily usage reports distinct users and failure rates; non-admins are refused."""
+        # Arrange
+        admin_id, admin_persona, _ = await seed_conversation(self.session_factory, username="admin", is_admin=True)
+        day1, day2 = datetime(2026, 3, 1), datetime(2026, 3, 2)
+        base = dict.fromkeys(("replies", "stt_failures", "llm_failures", "tts_failures", "failures"), 0)
+        async with self.session_factory() as db:
+            await add_counts(db, {
+                (DAY, day1, self.user_id, self.persona_id): {
+                    **base, "messages": 8, "replies": 8, "stt_failures": 2, "tts_failures": 4,
+                    "latency_ms_sum": 8000, "latency_count": 8,
+                },
+                (DAY, day1, admin_id, admin_persona): {
+                    **base, "messages": 2, "replies": 2, "latency_ms_sum": 0, "latency_count": 0,
+                },
+                (DAY, day2, self.user_id, self.persona_id): {
+                    **base, "messages": 1, "replies": 1, "latency_ms_sum": 500, "latency_count": 1,
+                },
+            })
+            await db.commit()
+        admin_client = await build_admin_client(self.session_factory, admin_id)
+        user_client = await build_admin_client(self.session_factory, self.user_id)
+        params = {"start": "2026-03-01", "end": "2026-03-02"}
+
+        # Act
+        async with admin_client, user_client:
+            usage = (await admin_client.get("/api/v1/admin/analytics/usage", params=params)).json()
+            personas = (await admin_client.get("/api/v1/admin/analytics/personas", params=params)).json()
+            refused = await user_client.get("/api/v1/admin/analytics/usage", params=params)
+
+        # Assert
+        self.assertEqual([b["active_users"] for b in usage], [2, 1])
+        self.assertEqual(usage[0]["messages"], 10)
+        self.assertEqual(usage[0]["stt_failure_rate"], 0.2)
+        self.assertEqual(usage[0]["tts_failure_rate"], 0.4)
+        self.assertEqual(usage[0]["avg_reply_latency_ms"], 1000.0)
+        self.assertEqual(
+            [(p["persona_id"], p["messages"]) for p in personas], [(self.persona_id, 9), (admin_persona, 2)]
+        )
+        self.assertEqual(refused.status_code, 403)
+
+    async def test_admin_sees_queue_depth_per_user(self):
+        """Jobs waiting for an upstream slot are listed per user for admins only."""
+        # Arrange
+        admin_id, _, _ = await seed_conversation(self.session_factory, username="admin", is_admin=True)
+        scheduler = PipelineScheduler(slots={"llm": 1})
+        gate = asyncio.Event()
+
+        async def call():
+            await gate.wait()
+
+        tasks = [asyncio.create_task(scheduler.run("llm", user, call)) for user in (self.user_id, 42, 42)]
+        await asyncio.sleep(0)
+        admin_client = await build_admin_client(self.session_factory, admin_id)
+        user_client = await build_admin_client(self.session_factory, self.user_id)
+
+        # Act
+        with patch("app.api.v1.admin.get_pipeline_scheduler", return_value=scheduler):
+            async with admin_client, user_client:
+                queues = (await admin_client.get("/api/v1/admin/pipeline/queues")).json()
+                refused = await user_client.get("/api/v1/admin/pipeline/queues")
+        gate.set()
+        await asyncio.gather(*tasks)
+
+        # Assert
+        self.assertEqual(queues, {"llm": {"42": 2}})
+        self.assertEqual(refused.status_code, 403)
+
+    async def test_admin_name_alone_is_not_admin(self):
+        """A registered user called "admin" is refused unless the account carries the admin flag."""
+        # Arrange
+        squatter_id, _, _ = await seed_conversation(self.session_factory, username="admin")
+        client = await build_admin_client(self.session_factory, squatter_id)
+
+        # Act
+        async with client:
+            response = await client.get("/api/v1/admin/analytics/usage")
+
+        # Assert
+        self.assertEqual(response.status_code, 403)
+
+
+if __name__ == "__main__":
+    unittest.main()
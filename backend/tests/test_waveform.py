@@ -0,0 +1,71 @@
+import contextlib
+import os
+import shutil
+import tempfile
+import unittest
+import wave
+from unittest.mock import patch
+
+import numpy as np
+
+from app.services.wav import open_pcm
+from app.services.waveform import compute_waveform, decode_levels
+
+
+def write_wav(path: str, samples: np.ndarray, rate: int, width: int = 2):
+    with contextlib.closing(wave.open(path, "wb")) as f:
+        f.setnchannels(samples.shape[1])
+        f.setsampwidth(width)
+        f.setframerate(rate)
+        f.writeframes(samples.tobytes())
+
+
+class TestWaveform(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_buckets_match_a_direct_computation(self):
+        """Chunked peak/RMS buckets equal a per-bucket computation over the whole file."""
+        # Arrange
+        path = os.path.join(self.test_dir, "stereo.wav")
+        samples = (np.random.default_rng(3).standard_normal((50001, 2)) * 4000).astype("<i2")
+        write_wav(path, samples, rate=22050)
+        mono = np.abs(samples.astype(np.float32).mean(axis=1) / 32768)
+        edges = np.linspace(0, len(mono), 33).astype(int)
+        expected_peaks = [mono[a:b].max() for a, b in zip(edges[:-1], edges[1:])]
+        expected_rms = [np.sqrt(np.mean(mono[a:b].astype(np.float64) ** 2)) for a, b in zip(edges[:-1], edges[1:])]
+
+        # Act
+        with patch("app.services.waveform._CHUNK_FRAMES", 4096):
+            summary = compute_waveform(path, points=32)
+
+        # Assert
+        self.assertEqual(summary["sample_rate"], 22050)
+        self.assertAlmostEqual(summary["duration"], 50001 / 22050, places=3)
+        np.testing.assert_allclose(decode_levels(summary["peaks"]), expected_peaks, atol=1 / 255)
+        np.testing.assert_allclose(decode_levels(summary["rms"]), expected_rms, atol=1 / 255)
+
+    def test_short_and_unsupported_files(self):
+        """Clips shorter than the bucket count get one bucket per frame; non-WAV input gives None."""
+        # Arrange
+        short = os.path.join(self.test_dir, "short.wav")
+        write_wav(short, np.array([[0], [16384], [-32768]], dtype="<i2"), rate=8000)
+        webm = os.path.join(self.test_dir, "voice.webm")
+        with open(webm, "wb") as f:
+            f.write(b"\x1aE\xdf\xa3" + b"\x00" * 64)
+
+        # Act
+        summary = compute_waveform(short, points=64)
+
+        # Assert
+        self.assertEqual(len(decode_levels(summary["peaks"])), 3)
+        self.assertEqual(list(np.round(decode_levels(summary["peaks"]), 2)), [0.0, 0.5, 1.0])
+        self.assertIsNone(compute_waveform(webm))
+        self.assertEqual(open_pcm(short).samples.shape, (3, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()